@@ -10,11 +10,14 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from config import config
+from .replicas import RoutingSession
 import os
 
 # Initialize extensions
 # These are initialized here but configured inside the factory
-db = SQLAlchemy()
+# The routing session sends read-only routes to replicas and per-user
+# tables to the user's shard when configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 cors = CORS()
 
@@ -51,10 +54,93 @@ def create_app(config_name='default'):
     from .auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
 
+    # --- Instrumentation ---
+    # On-demand profiling, request/SQL metrics and the `/metrics` scrape endpoint
+
+    from .profiling import init_profiling
+    init_profiling(app)
+
+    from .metrics import init_metrics
+    init_metrics(app, db)
+
+    from .query_budget import init_query_budget
+    init_query_budget(app)
+
+    # --- Admission Control ---
+
+    from .admission import init_admission
+    init_admission(app)
+
+    # --- Read Replicas and Shards ---
+
+    from .replicas import init_replicas
+    init_replicas(app)
+
+    from .sharding import init_sharding
+    init_sharding(app)
+
+    # --- Live Dashboard Events ---
+
+    from .events import init_events
+    init_events(app)
+
+    # --- Reference Data Cache ---
+
+    from .factor_cache import init_factor_cache
+    init_factor_cache(app)
+
+    from .analytics_cache import init_analytics_cache
+    init_analytics_cache(app)
+
+    # --- Write-Behind Ingestion ---
+
+    from .ingest_buffer import init_ingest_buffer
+    init_ingest_buffer(app)
+
+    # --- Worker Warm-Up and Readiness (`/ready`) ---
+
+    from .warmup import init_warmup
+    init_warmup(app)
+
     # --- Register CLI Commands ---
     # This adds commands like `flask seed_db`
     
     from .seed import seed_db_command
     app.cli.add_command(seed_db_command, "seed_db")
 
+    from .factor_import import import_factors_command
+    app.cli.add_command(import_factors_command, "import_factors")
+
+    from .interval import import_grid_profile_command
+    app.cli.add_command(import_grid_profile_command, "import_grid_profile")
+
+    from .allocations import allocate_inputs_command
+    app.cli.add_command(allocate_inputs_command, "allocate_inputs")
+
+    from .digests import rebuild_digests_command, stale_reports_command
+    app.cli.add_command(rebuild_digests_command, "rebuild_digests")
+    app.cli.add_command(stale_reports_command, "stale_reports")
+
+    from .scheduler import add_schedule_command, run_schedules_command
+    app.cli.add_command(add_schedule_command, "add_schedule")
+    app.cli.add_command(run_schedules_command, "run_schedules")
+
+    from .ingest_buffer import flush_ingest_buffer_command
+    app.cli.add_command(flush_ingest_buffer_command, "flush_ingest_buffer")
+
+    from .offline import calculate_files_command
+    app.cli.add_command(calculate_files_command, "calculate_files")
+
+    from .sharding import init_shards_command, move_user_command, rebalance_shards_command
+    app.cli.add_command(init_shards_command, "init_shards")
+    app.cli.add_command(move_user_command, "move_user")
+    app.cli.add_command(rebalance_shards_command, "rebalance_shards")
+
+    from .archive import archive_inputs_command
+    app.cli.add_command(archive_inputs_command, "archive_inputs")
+
+    from .organizations import add_org_member_command, remove_org_member_command
+    app.cli.add_command(add_org_member_command, "add_org_member")
+    app.cli.add_command(remove_org_member_command, "remove_org_member")
+
     return app
\ No newline at end of file
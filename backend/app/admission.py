@@ -0,0 +1,289 @@
+"""
+Admission Control (Cost Classes).
+
+Expensive endpoints (report generation, dashboard aggregation, uploads)
+declare a cost class with the `@cost_class(name)` decorator. Before the
+view runs, the request must get:
+
+- A per-user concurrency slot, so one tenant cannot occupy every worker.
+- A global concurrency slot for the class, so expensive work never takes
+  all workers and cheap endpoints keep their latency.
+- A token from the user's token bucket for the class (rate limit).
+
+Otherwise it is answered with 429 and a `Retry-After` header, without
+touching the database. Limits per class come from
+`ADMISSION_COST_CLASSES`; routes without a cost class are not limited.
+
+Backends:
+- LocalAdmissionBackend: counters and buckets in this process (shared by
+  the threads of one worker).
+- RedisAdmissionBackend: the same state in Redis, shared by every worker
+  and host. Enabled by setting `ADMISSION_BACKEND_URL` to a `redis://`
+  URL; the `redis` package is only required in that case. Concurrency
+  slots are leases that expire after `ADMISSION_LEASE_SECONDS`, so a
+  crashed worker cannot hold them forever.
+"""
+
+import math
+import threading
+import time
+import uuid
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from .auth import decode_auth_token
+from .metrics import record_admission_rejection
+
+
+class LocalAdmissionBackend:
+    """Concurrency counters and token buckets living in the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        # key -> (tokens, last refill as time.monotonic())
+        self._buckets = {}
+
+    def acquire(self, key, limit):
+        """
+        Takes a concurrency slot if fewer than `limit` are in use.
+
+        Returns:
+            str|None: A lease to pass to `release`, or None if full.
+        """
+        with self._lock:
+            active = self._active.get(key, 0)
+            if active >= limit:
+                return None
+            self._active[key] = active + 1
+        return key
+
+    def release(self, key, lease):
+        """Returns a slot taken with `acquire`."""
+        with self._lock:
+            active = self._active.get(key, 0) - 1
+            if active > 0:
+                self._active[key] = active
+            else:
+                self._active.pop(key, None)
+
+    def take_token(self, key, rate, burst):
+        """
+        Takes one token from a bucket refilled at `rate` tokens per
+        second, holding at most `burst`.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+        return (1 - tokens) / rate
+
+
+class RedisAdmissionBackend:
+    """
+    Shares concurrency slots and token buckets across processes through
+    Redis. Each operation is one atomic Lua script call.
+    """
+
+    KEY_PREFIX = 'ghg:admission:'
+
+    # Slots are members of a sorted set scored by their expiry time
+    ACQUIRE_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+    """
+
+    TOKEN_SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens, updated = tonumber(state[1]) or burst, tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, lease_seconds=120):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._acquire = self._redis.register_script(self.ACQUIRE_SCRIPT)
+        self._take_token = self._redis.register_script(self.TOKEN_SCRIPT)
+        self.lease_seconds = lease_seconds
+
+    def acquire(self, key, limit):
+        now = time.time()
+        lease = uuid.uuid4().hex
+        admitted = self._acquire(
+            keys=[f'{self.KEY_PREFIX}{key}'],
+            args=[now, now + self.lease_seconds, limit, lease, math.ceil(self.lease_seconds)]
+        )
+        return lease if admitted else None
+
+    def release(self, key, lease):
+        self._redis.zrem(f'{self.KEY_PREFIX}{key}', lease)
+
+    def take_token(self, key, rate, burst):
+        return float(self._take_token(keys=[f'{self.KEY_PREFIX}{key}'], args=[rate, burst, time.time()]))
+
+
+class AdmissionController:
+    """
+    Applies the configured limits of each cost class.
+
+    Args:
+        backend: A `LocalAdmissionBackend` or `RedisAdmissionBackend`.
+        cost_classes (dict): Class name -> limits: `user_concurrency`,
+            `global_concurrency`, `rate` (tokens per second per user) and
+            `burst`. Missing limits are not enforced.
+        retry_after (int): `Retry-After` seconds for concurrency rejections.
+    """
+
+    def __init__(self, backend, cost_classes, retry_after=1):
+        self.backend = backend
+        self.cost_classes = cost_classes
+        self.retry_after = retry_after
+
+    def admit(self, cost_class, client):
+        """
+        Tries to admit a request.
+
+        Args:
+            cost_class (str): The route's cost class.
+            client (str): Identifies the caller (user id or address).
+
+        Returns:
+            tuple: (release, None) when admitted, where `release()` must be
+            called once the request is done; (None, (reason, retry_after))
+            when rejected.
+
+        Raises:
+            KeyError: If the cost class is not configured.
+        """
+        limits = self.cost_classes[cost_class]
+        held = []
+
+        def release():
+            for key, lease in reversed(held):
+                self.backend.release(key, lease)
+
+        for key, limit, reason in (
+            (f'{cost_class}:user:{client}', limits.get('user_concurrency'), 'user_concurrency'),
+            (f'{cost_class}:global', limits.get('global_concurrency'), 'global_concurrency'),
+        ):
+            if limit is None:
+                continue
+            lease = self.backend.acquire(key, limit)
+            if lease is None:
+                release()
+                return None, (reason, self.retry_after)
+            held.append((key, lease))
+
+        # Tokens are only spent by requests that could run
+        if limits.get('rate'):
+            wait = self.backend.take_token(
+                f'{cost_class}:bucket:{client}', limits['rate'], limits.get('burst', 1)
+            )
+            if wait > 0:
+                release()
+                return None, ('rate', max(1, math.ceil(wait)))
+        return release, None
+
+
+def _client_key():
+    """
+    Identifies the caller from the JWT without a database lookup, so
+    rejected requests cost nothing; unauthenticated callers are keyed by
+    address (`@token_required` still rejects them afterwards).
+    """
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else None
+    if token:
+        user_id = decode_auth_token(token)
+        if not isinstance(user_id, str):
+            return f'user-{user_id}'
+    return f'addr-{request.remote_addr}'
+
+
+def cost_class(name):
+    """
+    Decorator declaring a route's cost class and enforcing its limits.
+
+    Place it below `@query_budget` and above `@read_replica` and
+    `@token_required`, so rejected requests never reach the database.
+
+    Args:
+        name (str): A key of `ADMISSION_COST_CLASSES`.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            controller = get_admission_controller()
+            if controller is None:
+                return f(*args, **kwargs)
+
+            release, rejection = controller.admit(name, _client_key())
+            if rejection is not None:
+                reason, retry_after = rejection
+                record_admission_rejection(name, reason)
+                response = jsonify({
+                    'message': 'Too many expensive requests in progress. Please retry shortly.'
+                    if reason != 'rate' else 'Rate limit exceeded. Please retry shortly.',
+                    'reason': reason
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                release()
+                raise
+            if response.is_streamed:
+                # Hold the slots until the body has been sent
+                response.call_on_close(release)
+            else:
+                release()
+            return response
+
+        decorated.cost_class = name
+        return decorated
+    return decorator
+
+
+def init_admission(app):
+    """Creates the configured admission controller and stores it on the app."""
+    if not app.config.get('ADMISSION_CONTROL_ENABLED', False):
+        app.extensions['ghg_admission'] = None
+        return
+    url = app.config.get('ADMISSION_BACKEND_URL')
+    if url:
+        backend = RedisAdmissionBackend(url, lease_seconds=app.config.get('ADMISSION_LEASE_SECONDS', 120))
+    else:
+        backend = LocalAdmissionBackend()
+    app.extensions['ghg_admission'] = AdmissionController(
+        backend, app.config.get('ADMISSION_COST_CLASSES', {}),
+        retry_after=app.config.get('ADMISSION_RETRY_AFTER_SECONDS', 1)
+    )
+
+
+def get_admission_controller():
+    """Returns the admission controller of the current application (or None)."""
+    return current_app.extensions.get('ghg_admission')
@@ -0,0 +1,239 @@
+"""
+Chunked Streaming Aggregation.
+
+This file folds large query results into running accumulators one
+fixed-size chunk at a time, so memory use is bounded by a single chunk
+regardless of how many rows a report range contains.
+
+- `iter_chunks` reads a statement through a server-side cursor
+  (`stream_results`) and yields one DataFrame per chunk. The chunk size
+  adapts to the configured memory ceiling after the first chunk.
+- Accumulators (`ScopeTotals`, `CategoryTotals`, `SummaryStats`,
+  `QuantileSketch`) implement `fold(df)` and `result()`.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+
+# The first chunk is kept small so the row size can be measured cheaply
+PROBE_CHUNK_ROWS = 1000
+
+
+class MemoryLimitExceeded(ValueError):
+    """Raised when a single chunk does not fit in the memory ceiling."""
+    pass
+
+
+def _chunk_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def iter_chunks(executor, statement, max_chunk_rows=50000, memory_limit_bytes=None):
+    """
+    Executes a statement with a server-side cursor and yields its rows
+    as DataFrames of at most `max_chunk_rows` rows.
+
+    Args:
+        executor: A SQLAlchemy Session or Connection.
+        statement: The SELECT statement to run.
+        max_chunk_rows (int): Upper bound on rows per chunk.
+        memory_limit_bytes (int): Optional ceiling for one chunk. After the
+            first chunk the chunk size is reduced so that a chunk stays
+            within half of the ceiling (leaving room for the fold).
+
+    Yields:
+        pandas.DataFrame: One chunk of rows.
+
+    Raises:
+        MemoryLimitExceeded: If a chunk exceeds the ceiling anyway.
+    """
+    result = executor.execute(statement.execution_options(stream_results=True))
+    columns = list(result.keys())
+    chunk_rows = min(PROBE_CHUNK_ROWS, max_chunk_rows)
+
+    try:
+        while True:
+            rows = result.fetchmany(chunk_rows)
+            if not rows:
+                return
+            df = pd.DataFrame.from_records(rows, columns=columns)
+            del rows
+
+            if memory_limit_bytes:
+                size = _chunk_bytes(df)
+                if size > memory_limit_bytes:
+                    raise MemoryLimitExceeded(
+                        f'A chunk of {len(df)} rows uses {size} bytes, above the '
+                        f'{memory_limit_bytes} byte ceiling.'
+                    )
+                bytes_per_row = max(size / len(df), 1)
+                chunk_rows = int(min(max_chunk_rows, (memory_limit_bytes // 2) / bytes_per_row))
+                chunk_rows = max(chunk_rows, 1)
+            else:
+                chunk_rows = max_chunk_rows
+
+            yield df
+    finally:
+        result.close()
+
+
+def fold_chunks(chunks, accumulators):
+    """
+    Feeds every chunk to every accumulator, holding one chunk at a time.
+
+    Args:
+        chunks (Iterable[pandas.DataFrame]): Typically from `iter_chunks`.
+        accumulators (Iterable): Objects with a `fold(df)` method.
+
+    Returns:
+        int: The number of rows processed.
+    """
+    rows = 0
+    for df in chunks:
+        rows += len(df)
+        for accumulator in accumulators:
+            accumulator.fold(df)
+    return rows
+
+
+# --- Accumulators ---
+
+class ScopeTotals:
+    """Running emissions total per scope."""
+
+    def __init__(self, value_column='calculated_emissions_kg'):
+        self.value_column = value_column
+        self.totals = {1: 0.0, 2: 0.0, 3: 0.0}
+
+    def fold(self, df):
+        for scope, total in df.groupby('scope')[self.value_column].sum().items():
+            self.totals[int(scope)] = self.totals.get(int(scope), 0.0) + float(total)
+
+    def result(self):
+        return dict(self.totals)
+
+
+class CategoryTotals:
+    """Running emissions total per (scope, category)."""
+
+    def __init__(self, value_column='calculated_emissions_kg'):
+        self.value_column = value_column
+        self.totals = {}
+
+    def fold(self, df):
+        grouped = df.groupby(['scope', 'category'])[self.value_column].sum()
+        for (scope, category), total in grouped.items():
+            key = (int(scope), category)
+            self.totals[key] = self.totals.get(key, 0.0) + float(total)
+
+    def result(self):
+        return [
+            {'scope': scope, 'category': category, 'total_kg': total}
+            for (scope, category), total in sorted(self.totals.items())
+        ]
+
+
+class SummaryStats:
+    """Running count, sum, min and max of one column."""
+
+    def __init__(self, value_column='calculated_emissions_kg'):
+        self.value_column = value_column
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def fold(self, df):
+        values = df[self.value_column]
+        if values.empty:
+            return
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def result(self):
+        return {
+            'count': self.count,
+            'total_kg': self.total,
+            'min_kg': self.minimum,
+            'max_kg': self.maximum,
+            'mean_kg': self.total / self.count if self.count else None
+        }
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles in constant memory.
+
+    Values are counted in logarithmic buckets, so every estimate is within
+    `relative_accuracy` of a true value while memory grows only with the
+    logarithm of the value range (a few hundred buckets), not with the
+    number of rows.
+    """
+
+    def __init__(self, value_column='calculated_emissions_kg', relative_accuracy=0.01):
+        self.value_column = value_column
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def fold(self, df):
+        values = df[self.value_column].to_numpy(dtype=float)
+        positive = values[values > 0]
+        self.zero_count += int(values.size - positive.size)
+        self.count += int(values.size)
+        if positive.size:
+            keys, counts = np.unique(
+                np.ceil(np.log(positive) / self._log_gamma).astype(np.int64),
+                return_counts=True
+            )
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q):
+        """
+        Estimates the q-th quantile (0 <= q <= 1).
+
+        Returns:
+            float|None: The estimate, or None if no values were folded.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def result(self, percentiles=(50, 90, 95, 99)):
+        return {f'p{p}': self.quantile(p / 100) for p in percentiles}
+
+
+class PerScope:
+    """Keeps one accumulator per scope, created on demand."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.accumulators = {}
+
+    def fold(self, df):
+        for scope, group in df.groupby('scope'):
+            scope = int(scope)
+            if scope not in self.accumulators:
+                self.accumulators[scope] = self.factory()
+            self.accumulators[scope].fold(group)
+
+    def result(self, *args, **kwargs):
+        return {
+            f'scope{scope}': accumulator.result(*args, **kwargs)
+            for scope, accumulator in sorted(self.accumulators.items())
+        }
@@ -0,0 +1,351 @@
+"""
+Input Apportionment (Monthly Allocations).
+
+An input covering several days or months (e.g., a quarterly gas bill with
+`date_period_start` and `date_period_end`) is spread over the months it
+covers in proportion to the number of days in each. The shares are
+stored as `InputAllocation` rows when the input is saved, so:
+
+- A month-aligned period total is a plain indexed sum over (user, month).
+- Only allocations cut by a period boundary (at most the first and last
+  month of the range) are pro-rated, in Python, after a grouped query.
+
+Inputs without an end date are allocated entirely to their start day.
+Inputs saved before allocations existed are allocated by their migration;
+`flask allocate_inputs` allocates any input still left without shares.
+The totals include the allocations of archived inputs (see archive.py).
+"""
+
+import time
+from datetime import timedelta
+import click
+import numpy as np
+from sqlalchemy import and_, case, insert, select
+from . import db
+from .archive import (
+    add_archived_daily_totals, archived_category_allocations, archived_scope_totals, archived_user_scope_totals
+)
+from .digests import allocation_changes, record_changes
+from .models import EmissionFactor, InputAllocation, UserInput
+from .sharding import scatter_gather
+
+DAY = np.timedelta64(1, 'D')
+
+
+def allocate(starts, ends, emissions):
+    """
+    Splits inputs into day-weighted monthly shares, in one vectorized pass.
+
+    Args:
+        starts (Sequence[date]): First day of every input.
+        ends (Sequence[date|None]): Last day of every input (None = start).
+        emissions (Sequence[float]): Emissions of every input.
+
+    Returns:
+        tuple[numpy.ndarray, ...]: `row` (index of the input each share
+        belongs to), `month`, `alloc_start`, `alloc_end` (datetime64[D])
+        and `emissions` of every share.
+
+    Raises:
+        ValueError: If an input ends before it starts.
+    """
+    starts = np.asarray(starts, dtype='datetime64[D]')
+    ends = np.asarray([end if end is not None else start for start, end in zip(starts.tolist(), ends)],
+                      dtype='datetime64[D]')
+    emissions = np.asarray(emissions, dtype=np.float64)
+    if np.any(ends < starts):
+        raise ValueError('date_period_end must not be before date_period_start.')
+
+    first_month = starts.astype('datetime64[M]')
+    spans = (ends.astype('datetime64[M]') - first_month).astype(np.int64) + 1
+
+    # One share per (input, month); `offset` counts months within each input
+    row = np.repeat(np.arange(len(starts)), spans)
+    offset = np.arange(int(spans.sum())) - np.repeat(np.cumsum(spans) - spans, spans)
+    month = first_month[row] + offset
+
+    month_start = month.astype('datetime64[D]')
+    alloc_start = np.maximum(month_start, starts[row])
+    alloc_end = np.minimum((month + 1).astype('datetime64[D]') - DAY, ends[row])
+    share = ((alloc_end - alloc_start) // DAY + 1) / ((ends - starts) // DAY + 1)[row]
+    return row, month_start, alloc_start, alloc_end, emissions[row] * share
+
+
+def allocation_rows(inputs):
+    """
+    Builds `input_allocations` rows for saved inputs.
+
+    Args:
+        inputs (Sequence[tuple]): (input_id, user_id, scope, start, end, emissions).
+
+    Returns:
+        list[dict]: Values for a bulk insert.
+    """
+    if not inputs:
+        return []
+    input_ids, user_ids, scopes, starts, ends, emissions = zip(*inputs)
+    row, month, alloc_start, alloc_end, shares = allocate(starts, ends, emissions)
+    return [
+        {
+            'input_id': input_ids[i], 'user_id': user_ids[i], 'scope': scopes[i],
+            'month': m, 'alloc_start': s, 'alloc_end': e, 'emissions_kg': v
+        }
+        for i, m, s, e, v in zip(
+            row.tolist(), month.tolist(), alloc_start.tolist(), alloc_end.tolist(), shares.tolist()
+        )
+    ]
+
+
+# --- Queries ---
+
+def _overlap_share(alloc_start, alloc_end, start_date, end_date):
+    """The fraction of an allocation's days that lie inside a range."""
+    first, last = max(alloc_start, start_date), min(alloc_end, end_date)
+    if last < first:
+        return 0.0
+    return ((last - first).days + 1) / ((alloc_end - alloc_start).days + 1)
+
+
+def _cut_span(start_date, end_date):
+    """
+    The span of an allocation cut by a range boundary, or NULL for one
+    inside the range. Queries group by these expressions themselves: a
+    bare `alloc_start` in GROUP BY would name the table column.
+    """
+    inside = and_(InputAllocation.alloc_start >= start_date, InputAllocation.alloc_end <= end_date)
+    return (
+        case((inside, None), else_=InputAllocation.alloc_start),
+        case((inside, None), else_=InputAllocation.alloc_end),
+    )
+
+
+def allocated_scope_totals(user_id, start_date, end_date):
+    """
+    Emissions per scope allocated to a date range.
+
+    Allocations inside the range are summed by the database; the few cut
+    by the range boundaries come back individually and are pro-rated.
+
+    Returns:
+        list[tuple[int, float]]: (scope, emissions_kg) pairs.
+    """
+    cut_start, cut_end = _cut_span(start_date, end_date)
+    rows = db.session.execute(
+        select(
+            InputAllocation.scope,
+            cut_start.label('cut_start'),
+            cut_end.label('cut_end'),
+            db.func.sum(InputAllocation.emissions_kg).label('emissions_kg')
+        ).where(
+            InputAllocation.user_id == user_id,
+            InputAllocation.month >= start_date.replace(day=1),
+            InputAllocation.month <= end_date
+        ).group_by(
+            InputAllocation.scope, cut_start, cut_end
+        )
+    ).all()
+    return [
+        (row.scope, row.emissions_kg if row.cut_start is None else
+         row.emissions_kg * _overlap_share(row.cut_start, row.cut_end, start_date, end_date))
+        for row in rows
+    ] + archived_scope_totals(user_id, start_date, end_date)
+
+
+def allocated_user_scope_totals(first_user_id, last_user_id, start_date, end_date):
+    """
+    Emissions per user and scope allocated to a date range, for a range
+    of user ids, with one grouped query (see `allocated_scope_totals`).
+
+    Returns:
+        list[tuple[int, int, float]]: (user_id, scope, emissions_kg).
+    """
+    cut_start, cut_end = _cut_span(start_date, end_date)
+    rows = db.session.execute(
+        select(
+            InputAllocation.user_id,
+            InputAllocation.scope,
+            cut_start.label('cut_start'),
+            cut_end.label('cut_end'),
+            db.func.sum(InputAllocation.emissions_kg).label('emissions_kg')
+        ).where(
+            InputAllocation.user_id.between(first_user_id, last_user_id),
+            InputAllocation.month >= start_date.replace(day=1),
+            InputAllocation.month <= end_date
+        ).group_by(
+            InputAllocation.user_id, InputAllocation.scope, cut_start, cut_end
+        )
+    ).all()
+    return [
+        (row.user_id, row.scope, row.emissions_kg if row.cut_start is None else
+         row.emissions_kg * _overlap_share(row.cut_start, row.cut_end, start_date, end_date))
+        for row in rows
+    ] + archived_user_scope_totals(first_user_id, last_user_id, start_date, end_date)
+
+
+def allocated_category_totals(user_id, periods):
+    """
+    Emissions per scope and category allocated to each of several date
+    ranges, with one grouped query over the months they cover.
+
+    Months holding no range boundary are summed whole by the database;
+    in the others, allocations come back per allocated days and are
+    pro-rated to each range, like in `allocated_scope_totals`.
+
+    Args:
+        user_id (int): The user's ID.
+        periods (list[tuple[date, date]]): The ranges.
+
+    Returns:
+        list[dict]: For every range, {(scope, category): emissions_kg}.
+    """
+    first_day = min(start for start, _ in periods)
+    last_day = max(end for _, end in periods)
+    boundary_months = {start.replace(day=1) for start, _ in periods} | {
+        (end + timedelta(days=1)).replace(day=1) for _, end in periods
+    }
+    split = InputAllocation.month.in_(sorted(boundary_months))
+    cut_start = case((split, InputAllocation.alloc_start), else_=None)
+    cut_end = case((split, InputAllocation.alloc_end), else_=None)
+    rows = db.session.execute(
+        select(
+            InputAllocation.scope,
+            EmissionFactor.category,
+            InputAllocation.month,
+            cut_start.label('cut_start'),
+            cut_end.label('cut_end'),
+            db.func.sum(InputAllocation.emissions_kg).label('emissions_kg')
+        ).join(
+            UserInput, InputAllocation.input_id == UserInput.id
+        ).join(
+            EmissionFactor, UserInput.factor_id == EmissionFactor.id
+        ).where(
+            InputAllocation.user_id == user_id,
+            InputAllocation.month >= first_day.replace(day=1),
+            InputAllocation.month <= last_day
+        ).group_by(
+            InputAllocation.scope, EmissionFactor.category, InputAllocation.month, cut_start, cut_end
+        )
+    ).all()
+    # A whole month spans every allocation in it
+    return category_totals_in_periods([
+        (row.scope, row.category, row.cut_start or row.month,
+         row.cut_end or _month_end(row.month), row.emissions_kg)
+        for row in rows
+    ] + archived_category_allocations(user_id, first_day, last_day), periods)
+
+
+def category_totals_in_periods(rows, periods):
+    """
+    Pro-rates allocation sums to several date ranges.
+
+    Args:
+        rows (list[tuple]): (scope, category, alloc_start, alloc_end, emissions_kg).
+        periods (list[tuple[date, date]]): The ranges.
+
+    Returns:
+        list[dict]: For every range, {(scope, category): emissions_kg}.
+    """
+    results = [{} for _ in periods]
+    if not rows:
+        return results
+    keys = [(scope, category) for scope, category, _, _, _ in rows]
+    starts = np.fromiter((row[2].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    ends = np.fromiter((row[3].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    emissions = np.fromiter((row[4] for row in rows), dtype=float, count=len(rows))
+    for totals, (start, end) in zip(results, periods):
+        first = np.maximum(starts, start.toordinal())
+        last = np.minimum(ends, end.toordinal())
+        shares = emissions * np.clip(last - first + 1, 0, None) / (ends - starts + 1)
+        for key, value in zip(keys, shares.tolist()):
+            if value:
+                totals[key] = totals.get(key, 0.0) + value
+    return results
+
+
+def _month_end(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def allocated_daily_totals(user_id, first_day, last_day):
+    """
+    Emissions per day and scope over a range, spreading every allocation
+    evenly over its days.
+
+    Returns:
+        numpy.ndarray: A (days, 3) array; row 0 is `first_day`.
+    """
+    rows = db.session.execute(
+        select(
+            InputAllocation.alloc_start, InputAllocation.alloc_end, InputAllocation.scope,
+            db.func.sum(InputAllocation.emissions_kg)
+        ).where(
+            InputAllocation.user_id == user_id,
+            InputAllocation.month >= first_day.replace(day=1),
+            InputAllocation.month <= last_day
+        ).group_by(
+            InputAllocation.alloc_start, InputAllocation.alloc_end, InputAllocation.scope
+        )
+    ).all()
+
+    day_count = (last_day - first_day).days + 1
+    # A difference array: +rate on the first day, -rate after the last day
+    diff = np.zeros((day_count + 1, 3))
+    if rows:
+        first_ord = first_day.toordinal()
+        starts = np.fromiter((r[0].toordinal() - first_ord for r in rows), dtype=np.int64, count=len(rows))
+        ends = np.fromiter((r[1].toordinal() - first_ord for r in rows), dtype=np.int64, count=len(rows))
+        scopes = np.fromiter((r[2] - 1 for r in rows), dtype=np.int64, count=len(rows))
+        rates = np.fromiter((r[3] for r in rows), dtype=float, count=len(rows)) / (ends - starts + 1)
+        np.add.at(diff, (np.clip(starts, 0, day_count), scopes), rates)
+        np.add.at(diff, (np.clip(ends + 1, 0, day_count), scopes), -rates)
+    return add_archived_daily_totals(np.cumsum(diff, axis=0)[:day_count], user_id, first_day, last_day)
+
+
+# --- Backfill ---
+
+def allocate_missing_inputs(chunk_rows=10000):
+    """
+    Creates allocations for inputs that have none (e.g., inputs saved
+    before allocations existed), in batches of `chunk_rows` inputs.
+
+    Returns:
+        int: The number of inputs allocated.
+    """
+    statement = select(
+        UserInput.id, UserInput.user_id, EmissionFactor.scope,
+        UserInput.date_period_start, UserInput.date_period_end, UserInput.calculated_emissions_kg
+    ).join(
+        EmissionFactor, UserInput.factor_id == EmissionFactor.id
+    ).where(
+        ~select(InputAllocation.id).where(InputAllocation.input_id == UserInput.id).exists()
+    ).order_by(UserInput.id)
+
+    allocated = 0
+    try:
+        # Each batch is written before the next is read, so the NOT EXISTS
+        # filter moves forward without holding a cursor open
+        while True:
+            batch = db.session.execute(statement.limit(chunk_rows)).all()
+            if not batch:
+                break
+            allocations = allocation_rows([tuple(row) for row in batch])
+            db.session.execute(insert(InputAllocation), allocations)
+            record_changes(allocation_changes(allocations))
+            allocated += len(batch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return allocated
+
+
+@click.command(name='allocate_inputs')
+def allocate_inputs_command():
+    """Creates monthly allocations for inputs that do not have any yet."""
+    start = time.perf_counter()
+    try:
+        allocated = sum(scatter_gather(allocate_missing_inputs))
+    except Exception as e:
+        click.echo(f'Error allocating inputs: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Allocated {allocated} inputs in {time.perf_counter() - start:.2f}s.')
@@ -0,0 +1,312 @@
+"""
+Per-User Analytics Cache (Columnar).
+
+This file keeps an optional in-process, array-backed copy of each active
+user's inputs so that arbitrary date-range totals and breakdowns can be
+answered without touching the database.
+
+Each `UserSeries` holds NumPy arrays (start and end date ordinals, scope,
+category code, factor id, emissions) sorted by start date, plus prefix
+sums of emissions in total and per scope. A range total is two
+`searchsorted` calls and two prefix-sum lookups; a category breakdown is
+one `bincount` over the slice. Inputs spanning several days are
+pro-rated by their days inside the range, like their allocations in
+reports (see allocations.py): only the inputs near the range boundaries
+(within the longest input period) are corrected.
+
+The cache is bounded by a global memory budget (`ANALYTICS_CACHE_MAX_MB`)
+with least-recently-used eviction. Inputs created in this process are
+inserted incrementally; inputs created by other workers are detected with
+a cheap count/max-id query and appended by loading only the new rows.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from . import db
+from .metrics import record_cache
+from .models import EmissionFactor, UserInput
+
+SCOPES = (1, 2, 3)
+
+
+class UserSeries:
+    """A user's inputs as date-sorted columnar arrays with prefix sums."""
+
+    def __init__(self, rows, categories=None):
+        """
+        Args:
+            rows (list[tuple]): (input_id, start, end, scope, category,
+                factor_id, emissions); `end` is None for single-day inputs.
+            categories (list[str]): Existing category names (codes are indexes).
+        """
+        self.categories = list(categories or [])
+        self._category_codes = {name: code for code, name in enumerate(self.categories)}
+        self.row_count = 0
+        self.max_input_id = 0
+        # The longest input period, in days after its start
+        self.max_span = 0
+
+        self.date_ord = np.empty(0, dtype=np.int32)
+        self.end_ord = np.empty(0, dtype=np.int32)
+        self.scope = np.empty(0, dtype=np.int8)
+        self.category = np.empty(0, dtype=np.int16)
+        self.factor_id = np.empty(0, dtype=np.int32)
+        self.emissions = np.empty(0, dtype=np.float64)
+        self._rebuild_prefix_sums()
+        self.extend(rows)
+
+    def _category_code(self, name):
+        code = self._category_codes.get(name)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(name)
+            self._category_codes[name] = code
+        return code
+
+    def extend(self, rows):
+        """Merges new rows into the arrays, keeping them sorted by date."""
+        if not rows:
+            return
+        if len(rows) == 1 and self.row_count:
+            self._insert_one(*rows[0])
+            return
+        input_ids, dates, ends, scopes, categories, factor_ids, emissions = zip(*rows)
+        new_dates = np.fromiter((d.toordinal() for d in dates), dtype=np.int32, count=len(rows))
+        new_ends = np.fromiter(
+            ((e or d).toordinal() for d, e in zip(dates, ends)), dtype=np.int32, count=len(rows)
+        )
+
+        date_ord = np.concatenate([self.date_ord, new_dates])
+        order = np.argsort(date_ord, kind='stable')
+        self.date_ord = date_ord[order]
+        self.end_ord = np.concatenate([self.end_ord, new_ends])[order]
+        self.max_span = max(self.max_span, int((new_ends - new_dates).max()))
+        self.scope = np.concatenate([self.scope, np.asarray(scopes, dtype=np.int8)])[order]
+        self.category = np.concatenate([
+            self.category,
+            np.fromiter((self._category_code(c) for c in categories), dtype=np.int16, count=len(rows))
+        ])[order]
+        self.factor_id = np.concatenate([self.factor_id, np.asarray(factor_ids, dtype=np.int32)])[order]
+        self.emissions = np.concatenate([self.emissions, np.asarray(emissions, dtype=np.float64)])[order]
+
+        self.row_count += len(rows)
+        self.max_input_id = max(self.max_input_id, max(input_ids))
+        self._rebuild_prefix_sums()
+
+    def _insert_one(self, input_id, day, end, scope, category, factor_id, emissions):
+        """Inserts a single row in place and shifts the prefix sums after it."""
+        position = int(np.searchsorted(self.date_ord, day.toordinal(), side='right'))
+        self.date_ord = np.insert(self.date_ord, position, day.toordinal())
+        self.end_ord = np.insert(self.end_ord, position, (end or day).toordinal())
+        self.max_span = max(self.max_span, ((end or day) - day).days)
+        self.scope = np.insert(self.scope, position, scope)
+        self.category = np.insert(self.category, position, self._category_code(category))
+        self.factor_id = np.insert(self.factor_id, position, factor_id)
+        self.emissions = np.insert(self.emissions, position, emissions)
+
+        self.prefix = np.insert(self.prefix, position + 1, self.prefix[position])
+        self.prefix[position + 1:] += emissions
+        for key, prefix in self.scope_prefix.items():
+            prefix = np.insert(prefix, position + 1, prefix[position])
+            if key == scope:
+                prefix[position + 1:] += emissions
+            self.scope_prefix[key] = prefix
+
+        self.row_count += 1
+        self.max_input_id = max(self.max_input_id, input_id)
+
+    def _rebuild_prefix_sums(self):
+        # prefix[i] is the sum of the first i values, so a slice [i, j) is prefix[j] - prefix[i]
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.emissions)])
+        self.scope_prefix = {
+            scope: np.concatenate([[0.0], np.cumsum(np.where(self.scope == scope, self.emissions, 0.0))])
+            for scope in SCOPES
+        }
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the arrays."""
+        arrays = [self.date_ord, self.end_ord, self.scope, self.category, self.factor_id, self.emissions, self.prefix]
+        return sum(a.nbytes for a in arrays) + sum(a.nbytes for a in self.scope_prefix.values())
+
+    def _slice(self, start_date, end_date):
+        i = int(np.searchsorted(self.date_ord, start_date.toordinal(), side='left'))
+        j = int(np.searchsorted(self.date_ord, end_date.toordinal(), side='right'))
+        return i, j
+
+    def _corrections(self, start_date, end_date, i, j):
+        """
+        The rows to correct the slice [i, j) with, and their weights:
+        inputs starting before the range but reaching into it count with
+        their share inside it, and inputs running past its end lose the
+        share outside it.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: Row indexes and weights.
+        """
+        first, last = start_date.toordinal(), end_date.toordinal()
+        k = int(np.searchsorted(self.date_ord, first - self.max_span, side='left'))
+        m = max(int(np.searchsorted(self.date_ord, last - self.max_span + 1, side='left')), i)
+        rows = np.concatenate([np.arange(k, i), np.arange(m, j)])
+        starts, ends = self.date_ord[rows], self.end_ord[rows]
+        inside = np.clip(np.minimum(ends, last) - np.maximum(starts, first) + 1, 0, None)
+        share = inside / (ends.astype(np.int64) - starts + 1)
+        # Rows of the slice are already counted whole
+        weights = np.where(rows >= i, share - 1.0, share)
+        return rows, weights
+
+    def range_summary(self, start_date, end_date):
+        """
+        Totals for an inclusive date range.
+
+        Returns:
+            dict: Scope totals, total, count of overlapping inputs and
+            category breakdown.
+        """
+        i, j = self._slice(start_date, end_date)
+        rows, weights = self._corrections(start_date, end_date, i, j)
+        corrections = self.emissions[rows] * weights
+        scope_totals = {
+            f'scope{scope}': float(
+                self.scope_prefix[scope][j] - self.scope_prefix[scope][i]
+                + corrections[self.scope[rows] == scope].sum()
+            )
+            for scope in SCOPES
+        }
+        by_category = np.bincount(
+            self.category[i:j], weights=self.emissions[i:j], minlength=len(self.categories)
+        ) + np.bincount(self.category[rows], weights=corrections, minlength=len(self.categories))
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'scope_totals': scope_totals,
+            'total': sum(scope_totals.values()),
+            'input_count': j - i + int(np.count_nonzero(weights[rows < i])),
+            'category_totals': {
+                self.categories[code]: float(total)
+                for code, total in enumerate(by_category) if total
+            }
+        }
+
+
+def _load_rows(user_id, after_input_id=0):
+    """Fetches a user's inputs (optionally only those after an id) as tuples."""
+    return db.session.execute(
+        select(
+            UserInput.id, UserInput.date_period_start, UserInput.date_period_end, EmissionFactor.scope,
+            EmissionFactor.category, UserInput.factor_id, UserInput.calculated_emissions_kg
+        ).join(
+            EmissionFactor, UserInput.factor_id == EmissionFactor.id
+        ).where(
+            UserInput.user_id == user_id, UserInput.id > after_input_id
+        )
+    ).all()
+
+
+class AnalyticsCache:
+    """LRU cache of `UserSeries` bounded by a global memory budget."""
+
+    def __init__(self, max_bytes, validate_interval):
+        self.max_bytes = max_bytes
+        self.validate_interval = validate_interval
+        self._entries = OrderedDict()
+        # The size of each entry when it was last stored: series grow in
+        # place, so their current `nbytes` is not what was counted
+        self._sizes = {}
+        self._validated_at = {}
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+
+    def _store(self, user_id, series):
+        self._entries.pop(user_id, None)
+        self.total_bytes -= self._sizes.pop(user_id, 0)
+        self._entries[user_id] = series
+        self._sizes[user_id] = series.nbytes
+        self.total_bytes += series.nbytes
+        # Evict least recently used users until within budget (keep at least one)
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self._validated_at.pop(evicted_id, None)
+            self.total_bytes -= self._sizes.pop(evicted_id)
+
+    def _is_current(self, user_id, series):
+        """Checks the cached series against the database (count and max id)."""
+        count, max_id = db.session.execute(
+            select(func.count(UserInput.id), func.max(UserInput.id)).where(UserInput.user_id == user_id)
+        ).one()
+        return count == series.row_count and (max_id or 0) == series.max_input_id, count
+
+    def get(self, user_id):
+        """
+        Returns the user's series, loading or refreshing it if needed.
+        """
+        with self._lock:
+            series = self._entries.get(user_id)
+            now = time.monotonic()
+            if series is not None:
+                self._entries.move_to_end(user_id)
+                if now - self._validated_at.get(user_id, 0) < self.validate_interval:
+                    record_cache('analytics', hit=True)
+                    return series
+
+                current, count = self._is_current(user_id, series)
+                if current:
+                    record_cache('analytics', hit=True)
+                    self._validated_at[user_id] = now
+                    return series
+
+                # Other workers appended rows: load only the new ones if
+                # that accounts for the difference, otherwise reload.
+                new_rows = _load_rows(user_id, after_input_id=series.max_input_id)
+                if series.row_count + len(new_rows) == count:
+                    record_cache('analytics', hit=True)
+                    series.extend(new_rows)
+                    self._store(user_id, series)
+                    self._validated_at[user_id] = now
+                    return series
+
+            record_cache('analytics', hit=False)
+            series = UserSeries(_load_rows(user_id))
+            self._store(user_id, series)
+            self._validated_at[user_id] = now
+            return series
+
+    def add_input(self, user_input, scope, category):
+        """
+        Inserts a newly created input into the user's cached series, if
+        that user is cached. Never queries the database.
+        """
+        with self._lock:
+            series = self._entries.get(user_input.user_id)
+            if series is None or user_input.id <= series.max_input_id:
+                return
+            series.extend([(
+                user_input.id, user_input.date_period_start, user_input.date_period_end, scope, category,
+                user_input.factor_id, user_input.calculated_emissions_kg
+            )])
+            self._store(user_input.user_id, series)
+
+    def discard(self, user_id):
+        """Drops a user's series (e.g., after inputs were deleted or moved)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._validated_at.pop(user_id, None)
+            self.total_bytes -= self._sizes.pop(user_id, 0)
+
+
+def init_analytics_cache(app):
+    """Creates the analytics cache when `ANALYTICS_CACHE_ENABLED` is set."""
+    if app.config.get('ANALYTICS_CACHE_ENABLED'):
+        app.extensions['ghg_analytics_cache'] = AnalyticsCache(
+            max_bytes=int(app.config.get('ANALYTICS_CACHE_MAX_MB', 256) * 1024 * 1024),
+            validate_interval=app.config.get('ANALYTICS_CACHE_VALIDATE_SECONDS', 2)
+        )
+
+
+def get_analytics_cache():
+    """Returns the analytics cache, or None when it is disabled."""
+    return current_app.extensions.get('ghg_analytics_cache')
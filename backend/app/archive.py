@@ -0,0 +1,457 @@
+"""
+Cold-Storage Archive of Old Inputs.
+
+Most queries touch recent data, so `user_inputs` and `input_allocations`
+only need to hold open periods. `flask archive_inputs` moves the inputs
+whose period ended before a cutoff (the first day of the month
+`ARCHIVE_AFTER_MONTHS` ago by default) and their allocations into
+compressed columnar files on local disk (`ARCHIVE_DIR`): one `.npz` file
+per user and year of data, split every `ARCHIVE_FILE_MAX_ROWS` inputs,
+holding one array per column. Files never change once written.
+
+Every file has an `ArchiveFile` row with small summary statistics (its
+date range, per-scope totals and per-month digests), and reports and
+dashboards merge archive aggregates with the live data:
+
+- Files whose date range lies outside a queried range are skipped
+  without being opened; files lying entirely inside it are answered from
+  their statistics when per-scope totals are enough. Only the others are
+  read, and kept in a small in-process cache.
+- Dashboards and organization rollups only use the statistics.
+- Monthly digests are left as they are (the data did not change), so
+  reports do not turn stale; `flask rebuild_digests` adds the archived
+  months back from the statistics.
+
+Archived inputs are no longer listed by `GET /api/inputs`, but still
+count in every report, breakdown, comparison and dashboard.
+"""
+
+import os
+import time
+import uuid
+from datetime import date, datetime
+from functools import lru_cache
+import click
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import delete, func, select
+from . import db
+from .models import ArchiveFile, EmissionFactor, InputAllocation, UserInput
+from .sharding import scatter_gather
+
+ARCHIVE_SUFFIX = '.npz'
+
+# Inputs and allocations are deleted in batches of this many ids
+DELETE_BATCH_SIZE = 1000
+
+# Columns of the row-level detail queries (see `CalculationService._detail_query`)
+DETAIL_COLUMNS = [
+    'id', 'date_period_start', 'scope', 'category', 'factor_name',
+    'activity_value', 'activity_unit', 'calculated_emissions_kg', 'date_period_end'
+]
+
+
+def default_cutoff(today=None):
+    """The first day of the month `ARCHIVE_AFTER_MONTHS` before today."""
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - current_app.config['ARCHIVE_AFTER_MONTHS']
+    return date(months // 12, months % 12 + 1, 1)
+
+
+# --- Files ---
+
+def _ordinals(days):
+    return np.fromiter((day.toordinal() for day in days), dtype=np.int32, count=len(days))
+
+
+def _archive_path(relative_path):
+    return os.path.join(current_app.config['ARCHIVE_DIR'], relative_path)
+
+
+def write_archive_file(path, inputs, allocations):
+    """
+    Writes inputs and their allocations as compressed columns. The file
+    is written under a temporary name, fsynced and renamed into place.
+
+    Args:
+        path (str): The destination.
+        inputs (list): Rows of (id, factor_id, scope, category,
+            factor_name, activity_value, activity_unit, date_period_start,
+            date_period_end, calculated_emissions_kg).
+        allocations (list): Rows of (input_id, scope, month, alloc_start,
+            alloc_end, emissions_kg).
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    columns = list(zip(*inputs))
+    alloc_columns = list(zip(*allocations)) if allocations else [()] * 6
+    arrays = {
+        'id': np.array(columns[0], dtype=np.int64),
+        'factor_id': np.array(columns[1], dtype=np.int32),
+        'scope': np.array(columns[2], dtype=np.int8),
+        'category': np.array(columns[3], dtype=str),
+        'factor_name': np.array(columns[4], dtype=str),
+        'activity_value': np.array(columns[5], dtype=np.float64),
+        'activity_unit': np.array(columns[6], dtype=str),
+        'date_period_start': _ordinals(columns[7]),
+        # 0 stands for an input without an end date
+        'date_period_end': np.array([day.toordinal() if day else 0 for day in columns[8]], dtype=np.int32),
+        'calculated_emissions_kg': np.array(columns[9], dtype=np.float64),
+        'alloc_input_id': np.array(alloc_columns[0], dtype=np.int64),
+        'alloc_scope': np.array(alloc_columns[1], dtype=np.int8),
+        'alloc_month': _ordinals(alloc_columns[2]),
+        'alloc_start': _ordinals(alloc_columns[3]),
+        'alloc_end': _ordinals(alloc_columns[4]),
+        'alloc_emissions_kg': np.array(alloc_columns[5], dtype=np.float64),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return os.path.getsize(path)
+
+
+@lru_cache(maxsize=32)
+def read_archive_file(path):
+    """Loads every column of an archive file (cached, as files never change)."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _summary_statistics(inputs, allocations):
+    scope_totals = [0.0, 0.0, 0.0]
+    for row in inputs:
+        scope_totals[row[2] - 1] += row[9]
+    monthly = {}
+    for input_id, _, month, _, _, emissions in allocations:
+        rows, total, max_id = monthly.get(month.isoformat(), (0, 0.0, 0))
+        monthly[month.isoformat()] = [rows + 1, total + emissions, max(max_id, input_id)]
+    return {
+        'min_date': min(row[7] for row in inputs),
+        'max_date': max(row[8] or row[7] for row in inputs),
+        'input_count': len(inputs),
+        'allocation_count': len(allocations),
+        'max_input_id': max(row[0] for row in inputs),
+        'total_scope1_kg': scope_totals[0],
+        'total_scope2_kg': scope_totals[1],
+        'total_scope3_kg': scope_totals[2],
+        'monthly': monthly,
+    }
+
+
+# --- Archiving ---
+
+def _ended_before(cutoff):
+    return func.coalesce(UserInput.date_period_end, UserInput.date_period_start) < cutoff
+
+
+def archive_user_year(user_id, year, cutoff, max_rows=100000):
+    """
+    Archives one user's inputs of one year (by start date) whose period
+    ended before `cutoff`, with their allocations, in one transaction.
+
+    Returns:
+        tuple[int, int]: The number of inputs archived and files written.
+    """
+    in_year = UserInput.date_period_start.between(date(year, 1, 1), date(year, 12, 31))
+    inputs = db.session.execute(
+        select(
+            UserInput.id, UserInput.factor_id, EmissionFactor.scope, EmissionFactor.category,
+            EmissionFactor.name, UserInput.activity_value, UserInput.activity_unit,
+            UserInput.date_period_start, UserInput.date_period_end, UserInput.calculated_emissions_kg
+        ).join(
+            EmissionFactor, UserInput.factor_id == EmissionFactor.id
+        ).where(
+            UserInput.user_id == user_id, _ended_before(cutoff), in_year
+        ).order_by(UserInput.date_period_start, UserInput.id)
+    ).all()
+    if not inputs:
+        return 0, 0
+
+    ids = {row[0] for row in inputs}
+    allocations = {}
+    for row in db.session.execute(
+        select(
+            InputAllocation.input_id, InputAllocation.scope, InputAllocation.month,
+            InputAllocation.alloc_start, InputAllocation.alloc_end, InputAllocation.emissions_kg
+        ).join(
+            UserInput, InputAllocation.input_id == UserInput.id
+        ).where(
+            UserInput.user_id == user_id, _ended_before(cutoff), in_year
+        )
+    ):
+        if row[0] in ids:
+            allocations.setdefault(row[0], []).append(tuple(row))
+
+    written = []
+    try:
+        for offset in range(0, len(inputs), max_rows):
+            chunk = [tuple(row) for row in inputs[offset:offset + max_rows]]
+            chunk_allocations = [row for input_row in chunk for row in allocations.get(input_row[0], [])]
+            relative_path = os.path.join(str(user_id), f'{year}-{uuid.uuid4().hex}{ARCHIVE_SUFFIX}')
+            path = _archive_path(relative_path)
+            size = write_archive_file(path, chunk, chunk_allocations)
+            written.append(path)
+            db.session.add(ArchiveFile(
+                user_id=user_id, path=relative_path, size_bytes=size,
+                **_summary_statistics(chunk, chunk_allocations)
+            ))
+
+        # Delete exactly the rows that were written (inputs saved since
+        # the read are left for the next run)
+        archived = sorted(ids)
+        for start in range(0, len(archived), DELETE_BATCH_SIZE):
+            batch = archived[start:start + DELETE_BATCH_SIZE]
+            db.session.execute(delete(InputAllocation).where(InputAllocation.input_id.in_(batch)))
+            db.session.execute(delete(UserInput).where(UserInput.id.in_(batch)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return len(inputs), len(written)
+
+
+def archive_closed_inputs(cutoff, max_rows=None):
+    """
+    Archives every input of the current shard whose period ended before
+    `cutoff`, one transaction per user and year.
+
+    Returns:
+        dict: The users, inputs and files archived.
+    """
+    from .analytics_cache import get_analytics_cache
+
+    max_rows = max_rows or current_app.config['ARCHIVE_FILE_MAX_ROWS']
+    first_year = func.min(UserInput.date_period_start)
+    candidates = db.session.execute(
+        select(UserInput.user_id, first_year).where(_ended_before(cutoff)).group_by(UserInput.user_id)
+    ).all()
+
+    result = {'users': 0, 'inputs': 0, 'files': 0}
+    cache = get_analytics_cache()
+    for user_id, first_day in candidates:
+        for year in range(first_day.year, cutoff.year + 1):
+            inputs, files = archive_user_year(user_id, year, cutoff, max_rows)
+            result['inputs'] += inputs
+            result['files'] += files
+        result['users'] += 1
+        if cache is not None:
+            cache.discard(user_id)
+    return result
+
+
+# --- Queries ---
+
+def _overlapping_files(start_date, end_date, *conditions):
+    """The archive files overlapping a range; the others are never opened."""
+    return db.session.execute(
+        select(ArchiveFile).where(
+            *conditions, ArchiveFile.min_date <= end_date, ArchiveFile.max_date >= start_date
+        ).order_by(ArchiveFile.user_id, ArchiveFile.min_date)
+    ).scalars().all()
+
+
+def _contains(archive, start_date, end_date):
+    return start_date <= archive.min_date and archive.max_date <= end_date
+
+
+def _file_scope_totals(archive):
+    return [archive.total_scope1_kg, archive.total_scope2_kg, archive.total_scope3_kg]
+
+
+def _allocated_in_range(archive, start_date, end_date):
+    """
+    Per-scope emissions of a file's allocations inside a range,
+    pro-rating the ones cut by the range boundaries.
+    """
+    if _contains(archive, start_date, end_date):
+        return _file_scope_totals(archive)
+    data = read_archive_file(_archive_path(archive.path))
+    first = np.maximum(data['alloc_start'], start_date.toordinal())
+    last = np.minimum(data['alloc_end'], end_date.toordinal())
+    share = np.clip(last - first + 1, 0, None) / (data['alloc_end'] - data['alloc_start'] + 1)
+    return np.bincount(
+        data['alloc_scope'] - 1, weights=data['alloc_emissions_kg'] * share, minlength=3
+    )[:3].tolist()
+
+
+def archived_scope_totals(user_id, start_date, end_date):
+    """
+    Archived emissions per scope allocated to a date range (see
+    `allocations.allocated_scope_totals`).
+
+    Returns:
+        list[tuple[int, float]]: (scope, emissions_kg) pairs.
+    """
+    totals = np.zeros(3)
+    for archive in _overlapping_files(start_date, end_date, ArchiveFile.user_id == user_id):
+        totals += _allocated_in_range(archive, start_date, end_date)
+    return [(scope, float(totals[scope - 1])) for scope in (1, 2, 3) if totals[scope - 1]]
+
+
+def archived_user_scope_totals(first_user_id, last_user_id, start_date, end_date):
+    """
+    Archived emissions per user and scope allocated to a date range, for
+    a range of user ids.
+
+    Returns:
+        list[tuple[int, int, float]]: (user_id, scope, emissions_kg).
+    """
+    totals = {}
+    for archive in _overlapping_files(
+        start_date, end_date, ArchiveFile.user_id.between(first_user_id, last_user_id)
+    ):
+        user_totals = totals.setdefault(archive.user_id, np.zeros(3))
+        user_totals += _allocated_in_range(archive, start_date, end_date)
+    return [
+        (user_id, scope, float(values[scope - 1]))
+        for user_id, values in totals.items() for scope in (1, 2, 3) if values[scope - 1]
+    ]
+
+
+def archived_category_allocations(user_id, first_day, last_day):
+    """
+    The archived allocations of the months overlapping a range, summed
+    per scope, category and allocated days (see
+    `allocations.allocated_category_totals`).
+
+    Returns:
+        list[tuple]: (scope, category, alloc_start, alloc_end, emissions_kg).
+    """
+    frames = []
+    for archive in _overlapping_files(first_day, last_day, ArchiveFile.user_id == user_id):
+        data = read_archive_file(_archive_path(archive.path))
+        mask = (data['alloc_end'] >= first_day.toordinal()) & (data['alloc_start'] <= last_day.toordinal())
+        if not mask.any():
+            continue
+        # Allocations carry the scope; the category is the input's
+        order = np.argsort(data['id'])
+        inputs = order[np.searchsorted(data['id'], data['alloc_input_id'][mask], sorter=order)]
+        frames.append(pd.DataFrame({
+            'scope': data['alloc_scope'][mask].astype(np.int64),
+            'category': data['category'][inputs].astype(object),
+            'alloc_start': data['alloc_start'][mask],
+            'alloc_end': data['alloc_end'][mask],
+            'emissions_kg': data['alloc_emissions_kg'][mask],
+        }))
+    if not frames:
+        return []
+    grouped = pd.concat(frames).groupby(['scope', 'category', 'alloc_start', 'alloc_end'])['emissions_kg'].sum()
+    return [
+        (int(scope), category, date.fromordinal(int(start)), date.fromordinal(int(end)), float(total))
+        for (scope, category, start, end), total in grouped.items()
+    ]
+
+
+def add_archived_daily_totals(daily, user_id, first_day, last_day):
+    """
+    Adds the archived allocations to a (days, 3) grid of daily emissions
+    per scope (see `allocations.allocated_daily_totals`), in place.
+    """
+    day_count = daily.shape[0]
+    first_ord = first_day.toordinal()
+    for archive in _overlapping_files(first_day, last_day, ArchiveFile.user_id == user_id):
+        data = read_archive_file(_archive_path(archive.path))
+        starts = data['alloc_start'].astype(np.int64) - first_ord
+        ends = data['alloc_end'].astype(np.int64) - first_ord
+        scopes = data['alloc_scope'].astype(np.int64) - 1
+        rates = data['alloc_emissions_kg'] / (ends - starts + 1)
+        diff = np.zeros((day_count + 1, 3))
+        np.add.at(diff, (np.clip(starts, 0, day_count), scopes), rates)
+        np.add.at(diff, (np.clip(ends + 1, 0, day_count), scopes), -rates)
+        daily += np.cumsum(diff, axis=0)[:day_count]
+    return daily
+
+
+def archived_inputs(user_id, start_date, end_date):
+    """
+    The archived inputs whose period overlaps a date range, shaped like
+    the row-level detail query.
+
+    Returns:
+        pandas.DataFrame: One row per input, ordered by start date.
+    """
+    frames = []
+    first, last = start_date.toordinal(), end_date.toordinal()
+    for archive in _overlapping_files(start_date, end_date, ArchiveFile.user_id == user_id):
+        data = read_archive_file(_archive_path(archive.path))
+        ends = np.where(data['date_period_end'] > 0, data['date_period_end'], data['date_period_start'])
+        mask = (data['date_period_start'] <= last) & (ends >= first)
+        if not mask.any():
+            continue
+        frames.append(pd.DataFrame({
+            'id': data['id'][mask],
+            'date_period_start': [date.fromordinal(int(day)) for day in data['date_period_start'][mask]],
+            'scope': data['scope'][mask].astype(np.int64),
+            'category': data['category'][mask].astype(object),
+            'factor_name': data['factor_name'][mask].astype(object),
+            'activity_value': data['activity_value'][mask],
+            'activity_unit': data['activity_unit'][mask].astype(object),
+            'calculated_emissions_kg': data['calculated_emissions_kg'][mask],
+            'date_period_end': [date.fromordinal(int(day)) if day else None for day in data['date_period_end'][mask]],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=DETAIL_COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values(['date_period_start', 'id'], kind='stable')
+
+
+def archive_summary(user_ids):
+    """
+    All-time archived totals of one or more users, from the statistics
+    only (no file is opened).
+
+    Args:
+        user_ids (int | list[int]): The user(s).
+
+    Returns:
+        tuple[dict, dict]: Emissions per scope, and per 'YYYY-MM' month.
+    """
+    user_ids = [user_ids] if isinstance(user_ids, int) else list(user_ids)
+    scope_totals, monthly = {}, {}
+    for archive in db.session.execute(
+        select(ArchiveFile).where(ArchiveFile.user_id.in_(user_ids))
+    ).scalars():
+        for scope, total in enumerate(_file_scope_totals(archive), start=1):
+            if total:
+                scope_totals[scope] = scope_totals.get(scope, 0.0) + total
+        for month, (_, emissions, _) in archive.monthly.items():
+            monthly[month[:7]] = monthly.get(month[:7], 0.0) + emissions
+    return scope_totals, monthly
+
+
+def archived_digest_changes():
+    """Digest changes for every archived month (see `digests.rebuild_digests`)."""
+    return [
+        (user_id, datetime.strptime(month, '%Y-%m-%d').date(), rows, emissions, max_id)
+        for user_id, monthly in db.session.execute(select(ArchiveFile.user_id, ArchiveFile.monthly))
+        for month, (rows, emissions, max_id) in monthly.items()
+    ]
+
+
+# --- CLI ---
+
+@click.command(name='archive_inputs')
+@click.option('--before', default=None, help='Cutoff date (YYYY-MM-DD); default: ARCHIVE_AFTER_MONTHS ago.')
+@click.option('--max-rows', type=int, default=None, help='Inputs per archive file.')
+def archive_inputs_command(before, max_rows):
+    """Moves inputs of closed periods into compressed archive files."""
+    start = time.perf_counter()
+    try:
+        cutoff = datetime.fromisoformat(before).date() if before else default_cutoff()
+        results = scatter_gather(archive_closed_inputs, cutoff, max_rows)
+    except Exception as e:
+        click.echo(f'Error archiving inputs: {str(e)}')
+        raise SystemExit(1)
+    totals = {key: sum(result[key] for result in results) for key in ('users', 'inputs', 'files')}
+    click.echo(
+        f"Archived {totals['inputs']} inputs of {totals['users']} users ended before {cutoff} "
+        f"into {totals['files']} files in {time.perf_counter() - start:.2f}s."
+    )
@@ -8,8 +8,11 @@ and a decorator (`@token_required`) to protect API endpoints.
 import jwt
 import datetime
 from functools import wraps
-from flask import request, jsonify, current_app, Blueprint
+from flask import request, jsonify, current_app, Blueprint, g
+from .events import redeem_stream_ticket
 from .models import User
+from .query_budget import query_budget
+from .sharding import ShardMoving, copy_user_to_shard, place_user, select_user_shard
 
 # Create a Blueprint for auth routes
 auth = Blueprint('auth', __name__)
@@ -55,8 +58,10 @@ def token_required(f):
     Decorator for protecting routes with JWT.
     
     It expects the token in the 'Authorization' header as 'Bearer <token>'.
-    It decodes the token, finds the user, and passes the user object
-    to the decorated function as the first argument.
+    SSE streams, which cannot send headers, pass a single-use stream
+    ticket as `?ticket=` instead (see events.py).
+    It decodes the token, finds the user, selects the user's shard and
+    passes the user object to the decorated function as the first argument.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -70,20 +75,35 @@ def token_required(f):
             except IndexError:
                 return jsonify({'message': 'Bearer token malformed.'}), 401
 
-        if not token:
+        if token:
+            # Decode the token
+            user_id = decode_auth_token(token)
+
+            # Handle decoding errors
+            if isinstance(user_id, str):
+                return jsonify({'message': user_id}), 401
+        elif request.accept_mimetypes.best == 'text/event-stream' and request.args.get('ticket'):
+            # The auth token itself never goes in a URL, where it would be logged
+            user_id = redeem_stream_ticket(request.args['ticket'])
+            if user_id is None:
+                return jsonify({'message': 'Stream ticket is invalid, expired or already used.'}), 401
+        else:
             return jsonify({'message': 'Token is missing.'}), 401
-
-        # Decode the token
-        user_id = decode_auth_token(token)
-        
-        # Handle decoding errors
-        if isinstance(user_id, str):
-            return jsonify({'message': user_id}), 401
         
         # Fetch the user from the database
         current_user = User.query.get(user_id)
         if not current_user:
             return jsonify({'message': 'User not found.'}), 401
+        # Read-your-writes pins are kept per user (see replicas.py)
+        g.user_id = current_user.id
+
+        # Route the user's queries to the shard holding their data
+        try:
+            select_user_shard(current_user)
+        except ShardMoving:
+            retry_after = current_app.config.get('SHARD_MOVE_RETRY_AFTER', 5)
+            return jsonify({'message': 'Your data is being moved, please retry shortly.'}), 503, \
+                {'Retry-After': str(retry_after)}
 
         # Pass the user object to the route
         return f(current_user, *args, **kwargs)
@@ -97,6 +117,7 @@ from . import db, bcrypt
 from .models import User
 
 @auth.route('/register', methods=['POST'])
+@query_budget(5)
 def register():
     """
     User Registration Endpoint.
@@ -122,7 +143,10 @@ def register():
             password=data['password'],
             company_name=data.get('company_name')
         )
+        place_user(new_user)
         db.session.add(new_user)
+        db.session.flush()
+        copy_user_to_shard(new_user)
         db.session.commit()
         
         # Generate token for the new user
@@ -144,6 +168,7 @@ def register():
 
 
 @auth.route('/login', methods=['POST'])
+@query_budget(1)
 def login():
     """
     User Login Endpoint.
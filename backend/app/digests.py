@@ -0,0 +1,279 @@
+"""
+Report Staleness Detection (Monthly Digests).
+
+Stored report totals drift from live data when inputs arrive late or
+readings are merged. Instead of regenerating reports to find out, every
+write also updates a small `MonthlyDigest` per user and month (row count,
+emissions sum and highest input id), and every report records the
+combined digest of the months it was built from.
+
+A report is stale when the combined digest of its months no longer
+matches the one it recorded. Checking is two indexed reads per batch of
+users plus a few array lookups per report, so thousands of reports are
+verified without touching `user_inputs`.
+
+Digests are kept at month granularity, so a late input in a report's
+first or last month is flagged even if it falls just outside the
+report's exact dates.
+"""
+
+import time
+from collections import defaultdict
+from datetime import date
+import click
+import numpy as np
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from . import db
+from .archive import archived_digest_changes
+from .models import InputAllocation, MonthlyDigest, ReadingBlock, Report
+from .sharding import scatter_gather
+
+# Emission sums are compared with this relative tolerance
+TOLERANCE = 1e-9
+
+# Reports are checked for this many users at a time
+USER_BATCH_SIZE = 500
+
+
+def _month(day):
+    return date(day.year, day.month, 1)
+
+
+# --- Maintenance ---
+
+def record_changes(changes):
+    """
+    Adds changes to the digests, in the current transaction, with a
+    single multi-row upsert.
+
+    Args:
+        changes (Iterable[tuple]): (user_id, month, row_delta,
+            emissions_delta, input_id) tuples; `month` may be any day of
+            the month and `input_id` may be None.
+    """
+    totals = {}
+    for user_id, month, rows, emissions, input_id in changes:
+        key = (user_id, _month(month))
+        count, total, max_id = totals.get(key, (0, 0.0, 0))
+        totals[key] = (count + rows, total + emissions, max(max_id, input_id or 0))
+    if not totals:
+        return
+
+    dialect = db.engine.dialect.name
+    upsert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(MonthlyDigest)
+    table = MonthlyDigest.__table__.c
+    db.session.execute(
+        upsert.on_conflict_do_update(
+            index_elements=['user_id', 'month'],
+            set_={
+                'row_count': table.row_count + upsert.excluded.row_count,
+                'emissions_kg': table.emissions_kg + upsert.excluded.emissions_kg,
+                'max_input_id': case(
+                    (upsert.excluded.max_input_id > table.max_input_id, upsert.excluded.max_input_id),
+                    else_=table.max_input_id
+                ),
+            }
+        ),
+        [
+            {'user_id': user_id, 'month': month, 'row_count': count,
+             'emissions_kg': total, 'max_input_id': max_id}
+            for (user_id, month), (count, total, max_id) in totals.items()
+        ]
+    )
+
+
+def allocation_changes(allocations):
+    """Digest changes for newly inserted allocation rows (see `allocations.py`)."""
+    return [
+        (row['user_id'], row['month'], 1, row['emissions_kg'], row['input_id'])
+        for row in allocations
+    ]
+
+
+def rebuild_digests():
+    """
+    Recomputes every digest from the allocations, reading blocks and
+    archive files (see `archive.py`).
+
+    Returns:
+        int: The number of digests written.
+    """
+    changes = [
+        (row.user_id, row.month, row.rows, row.emissions, row.max_id)
+        for row in db.session.execute(
+            select(
+                InputAllocation.user_id, InputAllocation.month,
+                func.count().label('rows'),
+                func.sum(InputAllocation.emissions_kg).label('emissions'),
+                func.max(InputAllocation.input_id).label('max_id')
+            ).group_by(InputAllocation.user_id, InputAllocation.month)
+        )
+    ] + [
+        (row.user_id, row.block_start, row.rows, row.emissions, None)
+        for row in db.session.execute(
+            select(
+                ReadingBlock.user_id, ReadingBlock.block_start,
+                func.count().label('rows'),
+                func.sum(ReadingBlock.total_emissions_kg).label('emissions')
+            ).group_by(ReadingBlock.user_id, ReadingBlock.block_start)
+        )
+    ] + archived_digest_changes()
+    try:
+        db.session.execute(delete(MonthlyDigest))
+        record_changes(changes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len({(user_id, _month(month)) for user_id, month, *_ in changes})
+
+
+# --- Comparison ---
+
+class DigestIndex:
+    """
+    One user's digests as sorted arrays with prefix sums, so the combined
+    digest of any month range is a few array lookups.
+    """
+
+    def __init__(self, digests):
+        digests = sorted(digests, key=lambda d: d[0])
+        self.months = np.array([d[0].toordinal() for d in digests], dtype=np.int64)
+        self.count_prefix = np.concatenate([[0], np.cumsum([d[1] for d in digests], dtype=np.int64)])
+        self.emissions_prefix = np.concatenate([[0.0], np.cumsum([d[2] for d in digests], dtype=np.float64)])
+        self.max_ids = np.array([d[3] for d in digests], dtype=np.int64)
+
+    def combined(self, start_date, end_date):
+        """
+        The combined digest of the months overlapping a date range.
+
+        Returns:
+            tuple[int, float, int]: (row_count, emissions_kg, max_input_id).
+        """
+        i = int(np.searchsorted(self.months, _month(start_date).toordinal(), side='left'))
+        j = int(np.searchsorted(self.months, end_date.toordinal(), side='right'))
+        max_id = int(self.max_ids[i:j].max()) if j > i else 0
+        return (
+            int(self.count_prefix[j] - self.count_prefix[i]),
+            float(self.emissions_prefix[j] - self.emissions_prefix[i]),
+            max_id
+        )
+
+
+def load_indexes(user_ids, start_date=None, end_date=None):
+    """
+    Loads the digests of several users with one query, optionally only
+    the months overlapping a date range.
+
+    Returns:
+        dict[int, DigestIndex]: One index per user.
+    """
+    query = select(
+        MonthlyDigest.user_id, MonthlyDigest.month, MonthlyDigest.row_count,
+        MonthlyDigest.emissions_kg, MonthlyDigest.max_input_id
+    ).where(MonthlyDigest.user_id.in_(list(user_ids)))
+    if start_date is not None:
+        query = query.where(MonthlyDigest.month >= _month(start_date), MonthlyDigest.month <= end_date)
+    digests = defaultdict(list)
+    for row in db.session.execute(query):
+        digests[row.user_id].append(tuple(row)[1:])
+    return {user_id: DigestIndex(digests.get(user_id, [])) for user_id in user_ids}
+
+
+def range_digests(user_id, ranges):
+    """
+    Combined digests for several date ranges of one user, with one query.
+
+    Args:
+        user_id (int): The user's ID.
+        ranges (list[tuple[date, date]]): The ranges.
+
+    Returns:
+        list[tuple[int, float, int]]: One digest per range.
+    """
+    first = min(start for start, _ in ranges)
+    last = max(end for _, end in ranges)
+    index = load_indexes([user_id], first, last)[user_id]
+    return [index.combined(start, end) for start, end in ranges]
+
+
+def is_stale(report, digest):
+    """Compares a report's recorded digest with a current one."""
+    if report.digest_row_count is None:
+        return True
+    count, emissions, max_id = digest
+    return (
+        report.digest_row_count != count
+        or report.digest_max_input_id != max_id
+        or abs(report.digest_emissions_kg - emissions) > TOLERANCE * max(1.0, abs(emissions))
+    )
+
+
+def find_stale_reports(user_id=None):
+    """
+    Lists reports whose source data changed after they were generated
+    (or that predate digests).
+
+    Args:
+        user_id (int): Only check this user's reports (default: everyone's).
+
+    Returns:
+        list[dict]: id, user_id, report_name, start_date and end_date of
+        every stale report.
+    """
+    query = select(
+        Report.id, Report.user_id, Report.report_name, Report.start_date, Report.end_date,
+        Report.digest_row_count, Report.digest_emissions_kg, Report.digest_max_input_id
+    ).order_by(Report.user_id, Report.id)
+    if user_id is not None:
+        query = query.where(Report.user_id == user_id)
+    reports = db.session.execute(query).all()
+
+    by_user = defaultdict(list)
+    for report in reports:
+        by_user[report.user_id].append(report)
+    users = list(by_user)
+
+    stale = []
+    for batch_start in range(0, len(users), USER_BATCH_SIZE):
+        batch = users[batch_start:batch_start + USER_BATCH_SIZE]
+        indexes = load_indexes(batch)
+        for user in batch:
+            index = indexes[user]
+            for report in by_user[user]:
+                if is_stale(report, index.combined(report.start_date, report.end_date)):
+                    stale.append({
+                        'id': report.id,
+                        'user_id': report.user_id,
+                        'report_name': report.report_name,
+                        'start_date': report.start_date.isoformat(),
+                        'end_date': report.end_date.isoformat()
+                    })
+    return stale
+
+
+@click.command(name='rebuild_digests')
+def rebuild_digests_command():
+    """Recomputes all monthly digests from the stored data."""
+    start = time.perf_counter()
+    try:
+        written = sum(scatter_gather(rebuild_digests))
+    except Exception as e:
+        click.echo(f'Error rebuilding digests: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Rebuilt {written} monthly digests in {time.perf_counter() - start:.2f}s.')
+
+
+@click.command(name='stale_reports')
+@click.option('--user-id', type=int, default=None, help='Only check this user\'s reports.')
+def stale_reports_command(user_id):
+    """Lists reports whose source data changed since they were generated."""
+    start = time.perf_counter()
+    stale = [report for found in scatter_gather(find_stale_reports, user_id=user_id) for report in found]
+    for report in stale:
+        click.echo(
+            f"{report['id']}\tuser {report['user_id']}\t{report['report_name']}\t"
+            f"{report['start_date']}..{report['end_date']}"
+        )
+    click.echo(f'{len(stale)} stale report(s) found in {time.perf_counter() - start:.3f}s.')
@@ -0,0 +1,337 @@
+"""
+Live Dashboard Events (Pub/Sub).
+
+This file provides the publish/subscribe layer used to push incremental
+dashboard updates to open Server-Sent Events (SSE) streams.
+
+Brokers:
+- InProcessBroker: delivers messages to subscribers in the same process.
+- RedisBroker: publishes through Redis so that every gunicorn worker
+  (and every host) receives the message, then delivers it locally.
+  Enabled by setting `EVENT_BROKER_URL` to a `redis://` URL; the
+  `redis` package is only required in that case.
+
+Subscribers are plain bounded queues, so an idle stream costs one
+blocked thread and no database connection. Each worker serves at most
+`SSE_MAX_STREAMS_PER_WORKER` streams at once (`StreamSlots`), so open
+dashboards cannot take every request thread away from the API.
+
+EventSource cannot send an `Authorization` header, so a stream is opened
+with a stream ticket (`?ticket=`) instead of the auth token: a JWT valid
+for `SSE_TICKET_SECONDS` that only the stream accepts, and only once
+(its id is claimed in a `LocalTicketStore`, or in Redis when
+`EVENT_BROKER_URL` is set). A ticket that ends up in an access log is
+therefore useless.
+"""
+
+import json
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import jwt
+from flask import current_app
+
+STREAM_TICKET_AUDIENCE = 'dashboard-stream'
+
+
+def dashboard_channel(user_id):
+    """Returns the channel name carrying a user's dashboard updates."""
+    return f'user:{user_id}:dashboard'
+
+
+def format_sse(data, event=None):
+    """
+    Formats a message in the `text/event-stream` wire format.
+
+    Args:
+        data (dict): The JSON-serializable payload.
+        event (str): Optional event name.
+
+    Returns:
+        str: The encoded SSE message.
+    """
+    message = f'data: {json.dumps(data)}\n\n'
+    if event is not None:
+        message = f'event: {event}\n{message}'
+    return message
+
+
+class Subscription:
+    """A single subscriber's message queue on one channel."""
+
+    def __init__(self, broker, channel, max_queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=max_queue_size)
+
+    def get(self, timeout):
+        """
+        Waits for the next message.
+
+        Returns:
+            dict|None: The message, or None if the timeout elapsed.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Detaches the subscription from its broker."""
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Delivers messages to subscribers living in the current process."""
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Registers a new subscription on a channel."""
+        subscription = Subscription(self, channel, self.max_queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Removes a subscription; safe to call more than once."""
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        """Sends a message to every subscriber of a channel."""
+        self._deliver(channel, message)
+
+    def after_fork(self):
+        """
+        Resets the broker in a forked worker; subscribers of the parent
+        process are not inherited, and its lock may have been held.
+        """
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # A stalled client must not block publishers; it will
+                # resynchronize by refetching the summary on reconnect.
+                pass
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Fans messages out across processes through Redis pub/sub.
+    A single background thread per process relays Redis messages to
+    the local subscribers.
+    """
+
+    CHANNEL_PREFIX = 'ghg:'
+
+    def __init__(self, url, max_queue_size=100):
+        super().__init__(max_queue_size=max_queue_size)
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._start_relay()
+
+    def _start_relay(self):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f'{self.CHANNEL_PREFIX}*')
+        self._thread = threading.Thread(target=self._relay, name='ghg-event-relay', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """
+        Starts a relay thread of the worker's own: threads do not survive
+        a fork, and the parent's pub/sub connection must not be shared.
+        """
+        super().after_fork()
+        # redis-py opens new connections in a process with a different pid
+        self._start_relay()
+
+    def publish(self, channel, message):
+        self._redis.publish(f'{self.CHANNEL_PREFIX}{channel}', json.dumps(message))
+
+    def _relay(self):
+        for item in self._pubsub.listen():
+            channel = item['channel'].decode('utf-8')[len(self.CHANNEL_PREFIX):]
+            self._deliver(channel, json.loads(item['data']))
+
+
+class StreamSlots:
+    """Counts the SSE streams open in this worker process."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a slot; returns False when every slot is taken."""
+        with self._lock:
+            if self.open >= self.limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+# --- Stream Tickets ---
+
+class LocalTicketStore:
+    """Ticket ids claimed in this process (enough for a single worker)."""
+
+    # Expired ids are dropped once the store holds this many
+    PRUNE_SIZE = 10000
+
+    def __init__(self):
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def claim(self, ticket_id, seconds):
+        """Marks a ticket as used; returns False if it already was."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) >= self.PRUNE_SIZE:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+            if self._until.get(ticket_id, 0) > now:
+                return False
+            self._until[ticket_id] = now + seconds
+            return True
+
+
+class RedisTicketStore:
+    """Ticket ids claimed by any worker, as Redis keys expiring with the ticket."""
+
+    KEY_PREFIX = 'ghg:ticket:'
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+
+    def claim(self, ticket_id, seconds):
+        try:
+            return bool(self._redis.set(
+                f'{self.KEY_PREFIX}{ticket_id}', 1, nx=True, px=int(seconds * 1000)
+            ))
+        except self._errors:
+            # Without the store a ticket could be replayed; the client asks for a new one
+            current_app.logger.exception('Failed to claim stream ticket')
+            return False
+
+
+def issue_stream_ticket(user_id):
+    """
+    Issues a single-use ticket opening the user's dashboard stream.
+
+    Args:
+        user_id (int): The user the stream belongs to.
+
+    Returns:
+        str: The ticket, valid for `SSE_TICKET_SECONDS`.
+    """
+    now = datetime.now(timezone.utc)
+    payload = {
+        'sub': user_id,
+        # The audience keeps tickets from being accepted as auth tokens
+        'aud': STREAM_TICKET_AUDIENCE,
+        'jti': secrets.token_urlsafe(16),
+        'iat': now,
+        'exp': now + timedelta(seconds=current_app.config.get('SSE_TICKET_SECONDS', 30)),
+    }
+    return jwt.encode(payload, current_app.config.get('SECRET_KEY'), algorithm='HS256')
+
+
+def redeem_stream_ticket(ticket):
+    """
+    Checks a stream ticket and claims it.
+
+    Args:
+        ticket (str): A ticket from `issue_stream_ticket`.
+
+    Returns:
+        int | None: The ticket's user, or None if the ticket is invalid,
+        expired or was already used.
+    """
+    try:
+        payload = jwt.decode(
+            ticket, current_app.config.get('SECRET_KEY'),
+            algorithms=['HS256'], audience=STREAM_TICKET_AUDIENCE
+        )
+    except jwt.InvalidTokenError:
+        return None
+    seconds = current_app.config.get('SSE_TICKET_SECONDS', 30)
+    if not current_app.extensions['ghg_ticket_store'].claim(payload['jti'], seconds):
+        return None
+    return payload['sub']
+
+
+def init_events(app):
+    """Creates the configured broker, stream slots and ticket store and stores them on the app."""
+    url = app.config.get('EVENT_BROKER_URL')
+    max_queue_size = app.config.get('SSE_MAX_QUEUE_SIZE', 100)
+    if url:
+        broker = RedisBroker(url, max_queue_size=max_queue_size)
+        tickets = RedisTicketStore(url)
+    else:
+        broker = InProcessBroker(max_queue_size=max_queue_size)
+        tickets = LocalTicketStore()
+    app.extensions['ghg_events'] = broker
+    app.extensions['ghg_ticket_store'] = tickets
+    app.extensions['ghg_stream_slots'] = StreamSlots(app.config.get('SSE_MAX_STREAMS_PER_WORKER', 16))
+
+
+def get_broker():
+    """Returns the broker of the current application."""
+    return current_app.extensions['ghg_events']
+
+
+def get_stream_slots():
+    """Returns the stream slots of the current worker."""
+    return current_app.extensions['ghg_stream_slots']
+
+
+def publish_input_created(user_input, scope, allocations=None):
+    """
+    Publishes the dashboard delta caused by a newly created input:
+    the scope total grows by the input's emissions, and every month
+    bucket it is allocated to grows by its share.
+
+    Args:
+        user_input (UserInput): The saved input.
+        scope (int): The GHG scope of the input's emission factor.
+        allocations (list[tuple[date, float]]): (month, emissions) shares;
+            defaults to the whole input in its start month.
+    """
+    if allocations is None:
+        allocations = [(user_input.date_period_start, user_input.calculated_emissions_kg)]
+    get_broker().publish(dashboard_channel(user_input.user_id), {
+        'type': 'input_created',
+        'input_id': user_input.id,
+        'scope': scope,
+        'month': user_input.date_period_start.strftime('%Y-%m'),
+        'delta_kg': user_input.calculated_emissions_kg,
+        'months': [
+            {'month': month.strftime('%Y-%m'), 'delta_kg': emissions}
+            for month, emissions in allocations
+        ],
+    })
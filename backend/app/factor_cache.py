@@ -0,0 +1,204 @@
+"""
+Emission Factor Cache and Search Index.
+
+This file keeps an in-process snapshot of the emission factor catalogue
+together with an inverted index used by the typeahead search endpoint.
+
+- The snapshot is rebuilt only when the catalogue version (see
+  `CatalogueVersion`) changes. The version is checked with a single
+  primary-key lookup, at most once every `FACTOR_CACHE_CHECK_SECONDS`.
+- The index maps every token of a factor's name, category, unit and
+  source to the factor ids containing it. Prefix matching uses a
+  sorted token list and `bisect`, so a query only touches the tokens
+  it actually matches.
+"""
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import select, update
+from . import db
+from .metrics import record_cache
+from .models import CatalogueVersion, EmissionFactor
+
+FACTOR_CATALOGUE = 'emission_factors'
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Splits text into lowercase alphanumeric tokens."""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+# --- Catalogue Versioning ---
+
+def current_catalogue_version(name=FACTOR_CATALOGUE):
+    """Returns the stored version of a catalogue (0 if never bumped)."""
+    version = db.session.execute(
+        select(CatalogueVersion.version).where(CatalogueVersion.name == name)
+    ).scalar()
+    return version or 0
+
+
+def bump_catalogue_version(name=FACTOR_CATALOGUE):
+    """
+    Increments a catalogue's version in the current transaction.
+    Call it alongside any change to the catalogue, before committing.
+    """
+    result = db.session.execute(
+        update(CatalogueVersion)
+        .where(CatalogueVersion.name == name)
+        .values(version=CatalogueVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(CatalogueVersion(name=name, version=1))
+
+
+# --- Search Index ---
+
+class FactorSearchIndex:
+    """
+    An inverted index over factor name, category, unit and source.
+    Built once per catalogue version and read without locking.
+    """
+
+    def __init__(self, factors):
+        """
+        Args:
+            factors (list[dict]): Factors in display order (`to_dict` shape).
+        """
+        postings = {}
+        for position, factor in enumerate(factors):
+            text = ' '.join(
+                str(factor[field]) for field in ('name', 'category', 'unit', 'source')
+                if factor[field]
+            )
+            for token in set(tokenize(text)):
+                postings.setdefault(token, []).append(position)
+
+        self._tokens = sorted(postings)
+        self._postings = [frozenset(postings[token]) for token in self._tokens]
+        self._factors = factors
+        self._by_scope = {
+            scope: frozenset(
+                position for position, factor in enumerate(factors) if factor['scope'] == scope
+            )
+            for scope in (1, 2, 3)
+        }
+
+    def _prefix_matches(self, prefix):
+        """Returns the positions of factors with a token starting with `prefix`."""
+        start = bisect_left(self._tokens, prefix)
+        end = start
+        while end < len(self._tokens) and self._tokens[end].startswith(prefix):
+            end += 1
+        if end - start == 1:
+            return self._postings[start]
+        return frozenset().union(*self._postings[start:end])
+
+    def search(self, query, scope=None, page=1, per_page=20):
+        """
+        Finds factors where every query token prefixes some factor token.
+
+        Args:
+            query (str): Free text typed by the user.
+            scope (int): Optional scope filter (1, 2 or 3).
+            page (int): 1-based page number.
+            per_page (int): Page size.
+
+        Returns:
+            dict: The page of matching factors and pagination details.
+        """
+        candidates = [self._prefix_matches(token) for token in set(tokenize(query))]
+        if scope is not None:
+            candidates.append(self._by_scope.get(scope, frozenset()))
+
+        if candidates:
+            # Intersect from the smallest set so each step stays cheap
+            candidates.sort(key=len)
+            positions = candidates[0]
+            for matches in candidates[1:]:
+                if not positions:
+                    break
+                positions = positions & matches
+        else:
+            positions = range(len(self._factors))
+
+        total = len(positions)
+        start = (page - 1) * per_page
+        # Positions follow display order, so only the requested page is sorted
+        page_positions = heapq.nsmallest(start + per_page, positions)[start:]
+        return {
+            'factors': [self._factors[p] for p in page_positions],
+            'total_items': total,
+            'total_pages': (total + per_page - 1) // per_page,
+            'current_page': page
+        }
+
+
+class FactorCatalogue:
+    """An immutable snapshot of the catalogue at one version."""
+
+    def __init__(self, version, factors):
+        self.version = version
+        self.factors = factors
+        self.by_id = {factor['id']: factor for factor in factors}
+        self.index = FactorSearchIndex(factors)
+
+
+# --- Cache ---
+
+class FactorCache:
+    """Holds the current `FactorCatalogue` and rebuilds it on change."""
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Forces a version check on the next lookup."""
+        self._checked_at = 0.0
+
+    def get(self):
+        """
+        Returns the current catalogue snapshot, reloading it if the
+        stored catalogue version has changed.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            record_cache('factors', hit=True)
+            return snapshot
+
+        with self._lock:
+            version = current_catalogue_version()
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                record_cache('factors', hit=True)
+            else:
+                record_cache('factors', hit=False)
+                factors = EmissionFactor.query.order_by(
+                    EmissionFactor.category, EmissionFactor.name
+                ).all()
+                snapshot = FactorCatalogue(version, [factor.to_dict() for factor in factors])
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+
+def init_factor_cache(app):
+    """Creates the factor cache for an application."""
+    app.extensions['ghg_factor_cache'] = FactorCache(
+        check_interval=app.config.get('FACTOR_CACHE_CHECK_SECONDS', 5)
+    )
+
+
+def get_factor_cache():
+    """Returns the factor cache of the current application."""
+    return current_app.extensions['ghg_factor_cache']
@@ -0,0 +1,270 @@
+"""
+Emission Factor Catalogue Import.
+
+This file provides the `flask import_factors` CLI command and the
+importer behind it. Large catalogues (e.g., full DEFRA or EPA releases)
+are streamed from CSV, JSON or JSON Lines files, diffed against the
+existing factors on their natural key (name, unit, source), and applied
+with bulk INSERT and UPDATE statements in a single transaction.
+
+Factors already referenced by user inputs (on any shard) are never
+modified or deleted, so stored emissions stay consistent with their
+factor. Applied changes are copied to the shards.
+"""
+
+import csv
+import json
+import os
+import time
+import click
+from sqlalchemy import insert, select, update
+from . import db
+from .factor_cache import bump_catalogue_version
+from .models import EmissionFactor
+from .sharding import referenced_factor_ids, replicate_catalogue
+
+# Columns compared when deciding whether an existing factor changed
+COMPARED_FIELDS = ('category', 'scope', 'factor_value', 'co2e_unit')
+
+# Rows are buffered and written in batches of this size
+BATCH_SIZE = 1000
+
+# At most this many validation errors are kept in the result
+MAX_REPORTED_ERRORS = 20
+
+
+# --- File Readers ---
+
+def _iter_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_json_lines(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_json_array(path, chunk_size=64 * 1024):
+    """
+    Streams the objects of a top-level JSON array without loading the
+    whole document, by decoding one object at a time from a buffer.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError('JSON catalogue must be an array of factor objects.')
+        buffer = buffer[1:]
+
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError('JSON catalogue ended unexpectedly.')
+                buffer += more
+                continue
+            yield item
+            buffer = buffer[end:]
+
+
+def iter_catalogue_rows(path):
+    """
+    Yields raw factor rows from a catalogue file, one at a time.
+
+    Args:
+        path (str): A `.csv`, `.json` (array) or `.jsonl`/`.ndjson` file.
+
+    Returns:
+        Iterator[dict]: The rows as read from the file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return _iter_csv(path)
+    if extension in ('.jsonl', '.ndjson'):
+        return _iter_json_lines(path)
+    if extension == '.json':
+        return _iter_json_array(path)
+    raise ValueError(f"Unsupported catalogue format '{extension}'. Use .csv, .json or .jsonl.")
+
+
+# --- Row Validation ---
+
+def normalize_factor_row(row):
+    """
+    Validates a raw catalogue row and converts it to column values.
+
+    Args:
+        row (dict): A row from a catalogue file.
+
+    Returns:
+        dict: Values for the `emission_factors` columns.
+
+    Raises:
+        ValueError: If a required field is missing or invalid.
+    """
+    missing = [field for field in ('name', 'category', 'scope', 'factor_value', 'unit')
+               if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    scope = int(row['scope'])
+    if scope not in (1, 2, 3):
+        raise ValueError(f'Invalid scope {scope}; expected 1, 2 or 3.')
+
+    return {
+        'name': str(row['name']).strip(),
+        'category': str(row['category']).strip(),
+        'scope': scope,
+        'factor_value': float(row['factor_value']),
+        'unit': str(row['unit']).strip(),
+        'co2e_unit': (row.get('co2e_unit') or 'kg CO2e').strip(),
+        'source': (str(row['source']).strip() or None) if row.get('source') else None,
+    }
+
+
+def natural_key(values):
+    """Returns the (name, unit, source) key identifying a factor."""
+    return (values['name'], values['unit'], values['source'])
+
+
+# --- Importer ---
+
+def import_factor_rows(rows, dry_run=False):
+    """
+    Diffs catalogue rows against the existing factors and applies the
+    changes with bulk statements.
+
+    Args:
+        rows (Iterable[dict]): Raw catalogue rows (streamed).
+        dry_run (bool): Compute the counts without writing anything.
+
+    Returns:
+        dict: Counts of inserted, updated, unchanged, skipped (referenced),
+              duplicate and invalid rows, plus the first validation errors.
+    """
+    result = {
+        'inserted': 0, 'updated': 0, 'unchanged': 0,
+        'skipped_referenced': 0, 'duplicates': 0, 'invalid': 0,
+        'errors': []
+    }
+
+    # 1. Load the existing catalogue as plain tuples (no ORM objects)
+    existing = {}
+    for row in db.session.execute(select(
+        EmissionFactor.id, EmissionFactor.name, EmissionFactor.unit, EmissionFactor.source,
+        *(getattr(EmissionFactor, field) for field in COMPARED_FIELDS)
+    )):
+        existing[(row.name, row.unit, row.source)] = row
+
+    referenced_ids = referenced_factor_ids()
+
+    inserts, updates, seen = [], [], set()
+
+    def flush():
+        if not dry_run:
+            if inserts:
+                db.session.execute(insert(EmissionFactor), inserts)
+            if updates:
+                db.session.execute(update(EmissionFactor), updates)
+        inserts.clear()
+        updates.clear()
+
+    try:
+        # 2. Stream the file and classify every row
+        for line_number, raw in enumerate(rows, start=1):
+            try:
+                values = normalize_factor_row(raw)
+            except (TypeError, ValueError) as e:
+                result['invalid'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append(f'Row {line_number}: {e}')
+                continue
+
+            key = natural_key(values)
+            if key in seen:
+                result['duplicates'] += 1
+                continue
+            seen.add(key)
+
+            current = existing.get(key)
+            if current is None:
+                inserts.append(values)
+                result['inserted'] += 1
+            elif all(getattr(current, field) == values[field] for field in COMPARED_FIELDS):
+                result['unchanged'] += 1
+            elif current.id in referenced_ids:
+                result['skipped_referenced'] += 1
+            else:
+                updates.append({'id': current.id, **{f: values[f] for f in COMPARED_FIELDS}})
+                result['updated'] += 1
+
+            # 3. Apply in bounded batches to keep memory flat
+            if len(inserts) + len(updates) >= BATCH_SIZE:
+                flush()
+
+        flush()
+        if dry_run:
+            db.session.rollback()
+        else:
+            if result['inserted'] or result['updated']:
+                bump_catalogue_version()
+            db.session.commit()
+            if result['inserted'] or result['updated']:
+                replicate_catalogue()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+def import_factor_catalogue(path, dry_run=False):
+    """
+    Imports a catalogue file. See `import_factor_rows`.
+
+    Args:
+        path (str): Path to a `.csv`, `.json` or `.jsonl` file.
+        dry_run (bool): Compute the counts without writing anything.
+
+    Returns:
+        dict: The import counts.
+    """
+    return import_factor_rows(iter_catalogue_rows(path), dry_run=dry_run)
+
+
+@click.command(name='import_factors')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Report the changes without applying them.')
+def import_factors_command(path, dry_run):
+    """
+    Imports an emission factor catalogue (CSV, JSON or JSON Lines).
+
+    Existing factors are matched on (name, unit, source). New factors are
+    inserted, changed ones updated, and factors used by inputs left alone.
+    """
+    start = time.perf_counter()
+    try:
+        result = import_factor_catalogue(path, dry_run=dry_run)
+    except Exception as e:
+        click.echo(f'Error importing catalogue: {str(e)}')
+        raise SystemExit(1)
+
+    elapsed = time.perf_counter() - start
+    prefix = '[dry run] ' if dry_run else ''
+    click.echo(
+        f"{prefix}Inserted {result['inserted']}, updated {result['updated']}, "
+        f"unchanged {result['unchanged']}, skipped (referenced) {result['skipped_referenced']}, "
+        f"duplicates {result['duplicates']}, invalid {result['invalid']} "
+        f"in {elapsed:.2f}s."
+    )
+    for error in result['errors']:
+        click.echo(f'  {error}')
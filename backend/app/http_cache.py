@@ -0,0 +1,77 @@
+"""
+HTTP Conditional Caching.
+
+Helpers for endpoints whose responses change only with a cheap version
+marker (a report's id and `generated_at`, the factor catalogue version).
+The marker becomes the ETag (and Last-Modified where there is a time),
+so a repeat request carrying `If-None-Match` or `If-Modified-Since` is
+answered with 304 before the data is loaded or serialized.
+
+Responses are per user, so `Cache-Control` is `private` for browsers.
+The nginx proxy (see `frontend/nginx.conf`) keys its cache on the
+Authorization header and takes its lifetime from `X-Accel-Expires`,
+which it reads in place of `Cache-Control` and strips before replying;
+afterwards it revalidates with the ETag.
+"""
+
+from datetime import timezone
+from flask import Response, request
+
+
+def _utc(moment):
+    # SQLite returns naive timestamps; they are stored as UTC
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Checks the request's validators against the current ones.
+    `If-None-Match` takes precedence over `If-Modified-Since`.
+
+    Args:
+        etag (str): The current ETag value (unquoted).
+        last_modified (datetime): When the resource last changed.
+
+    Returns:
+        bool: True if the client's copy is current.
+    """
+    if request.if_none_match:
+        # Weak comparison: nginx turns strong ETags into weak ones when it
+        # compresses a response
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def with_cache_headers(response, etag, last_modified=None, cache_control='private, no-cache', proxy_max_age=None):
+    """
+    Adds validators and caching directives to a response.
+
+    Args:
+        response (Response): The response to decorate.
+        etag (str): The ETag value (unquoted).
+        last_modified (datetime): When the resource last changed.
+        cache_control (str): The `Cache-Control` directives (browsers).
+        proxy_max_age (int): Seconds nginx may serve the response without
+            revalidating (None: nginx does not cache it).
+
+    Returns:
+        Response: The same response.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    response.headers['Cache-Control'] = cache_control
+    if proxy_max_age is not None:
+        response.headers['X-Accel-Expires'] = str(proxy_max_age)
+    # Responses depend on the caller's token
+    response.vary.add('Authorization')
+    return response
+
+
+def not_modified(etag, last_modified=None, cache_control='private, no-cache', proxy_max_age=None):
+    """Builds an empty 304 response carrying the same cache headers."""
+    return with_cache_headers(Response(status=304), etag, last_modified, cache_control, proxy_max_age)
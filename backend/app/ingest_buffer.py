@@ -0,0 +1,518 @@
+"""
+Write-Behind Input Buffer.
+
+An opt-in ingestion mode for high-rate single inputs (e.g. IoT gateways).
+When `INGEST_BUFFER_ENABLED` is set, a `POST /api/inputs` carrying the
+header `Prefer: respond-async` is validated and calculated in the request
+(see `CalculationService.prepare_input`), appended to a durable local
+buffer and answered with 202. A background flusher thread commits the
+buffered rows in large batches, each batch in one transaction with its
+allocations and digest updates.
+
+The buffer is a directory (`INGEST_BUFFER_DIR`) of append-only segment
+files holding one JSON row per line. A row is fsynced before the request
+is answered; concurrent requests share fsyncs (group commit). Each
+process appends to its own active segment, which is sealed once it holds
+`INGEST_FLUSH_BATCH_ROWS` rows or is `INGEST_FLUSH_INTERVAL_SECONDS` old.
+
+- Backpressure: a process holds at most `INGEST_BUFFER_MAX_ROWS` rows not
+  yet committed; further requests get 503 with `Retry-After` until the
+  flusher catches up.
+- Crash recovery: a process holds an exclusive `flock` on each segment
+  until it is committed. Any segment that can be locked therefore
+  belongs to a dead process and is replayed by the next flusher that
+  finds it (on start and every `INGEST_RECOVERY_INTERVAL_SECONDS`), or by
+  `flask flush_ingest_buffer`. The segment's name is committed with its
+  rows (`IngestedSegment`, on each shard it touches), so a segment is
+  never inserted twice.
+- A segment whose rows the database refuses (e.g. a deleted factor) is
+  renamed to `<name>.rejected` for inspection instead of being retried.
+
+The buffer directory must be on persistent local storage. Inputs
+accepted but not yet flushed are missing from reports and dashboards;
+`ghg_ingest_flush_lag_seconds` shows how far behind the flusher is.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .allocations import allocation_rows
+from .analytics_cache import get_analytics_cache
+from .digests import allocation_changes, record_changes
+from .events import publish_input_created
+from .metrics import record_ingest, record_ingest_buffered, record_ingest_flush_lag
+from .models import IngestedSegment, InputAllocation, UserInput
+from .sharding import shard_context, sharding_enabled, users_by_shard
+
+SEGMENT_SUFFIX = '.seg'
+DATE_FIELDS = ('date_period_start', 'date_period_end')
+# Buffered keys that are not `user_inputs` columns
+EXTRA_FIELDS = ('scope', 'category', 'accepted_at')
+
+
+class BufferFull(Exception):
+    """Raised when the buffer holds `INGEST_BUFFER_MAX_ROWS` uncommitted rows."""
+
+    def __init__(self, retry_after):
+        super().__init__('The ingestion buffer is full.')
+        self.retry_after = retry_after
+
+
+class Segment:
+    """An append-only segment file, exclusively locked while open."""
+
+    def __init__(self, path, file):
+        self.path = path
+        self.name = os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+        self.file = file
+        self.rows = 0
+        self.synced_rows = 0
+        self.created = time.monotonic()
+        self.closed = False
+        self.sync_lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory):
+        """Creates and locks a new, uniquely named segment."""
+        name = f'{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        path = os.path.join(directory, name + SEGMENT_SUFFIX)
+        # Lock before the file gets its final name, so recovery never
+        # mistakes a new segment for an orphan
+        file = open(path + '.new', 'ab')
+        fcntl.flock(file, fcntl.LOCK_EX)
+        os.rename(path + '.new', path)
+        return cls(path, file)
+
+    @classmethod
+    def claim(cls, path):
+        """
+        Locks an existing segment left by another process.
+
+        Returns:
+            Segment|None: The segment, or None if a live process holds it.
+        """
+        try:
+            file = open(path, 'ab')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+        if not os.path.exists(path):
+            # Committed and deleted by its owner while we were opening it
+            file.close()
+            return None
+        return cls(path, file)
+
+    def sync(self, rows):
+        """Makes the first `rows` rows durable, sharing fsyncs between callers."""
+        with self.sync_lock:
+            if self.closed or self.synced_rows >= rows:
+                return
+            written = self.rows
+            os.fsync(self.file.fileno())
+            self.synced_rows = written
+
+    def read_rows(self):
+        """
+        Reads the segment's rows. A partial last line (the process died
+        while writing it, before the row was acknowledged) is skipped.
+        """
+        rows = []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    current_app.logger.warning('Skipping a partial row in segment %s', self.name)
+                    continue
+                for field in DATE_FIELDS:
+                    if row[field] is not None:
+                        row[field] = date.fromisoformat(row[field])
+                rows.append(row)
+        return rows
+
+    def close(self, remove=False, rename_to=None):
+        """Releases the lock, optionally deleting or renaming the file first."""
+        with self.sync_lock:
+            if remove:
+                os.remove(self.path)
+            elif rename_to is not None:
+                os.rename(self.path, rename_to)
+            self.closed = True
+            self.file.close()
+
+
+def _input_columns(row):
+    return {key: value for key, value in row.items() if key not in EXTRA_FIELDS}
+
+
+def commit_segment(name, rows):
+    """
+    Inserts a segment's rows with their allocations and digest changes,
+    and records the segment as ingested, in one transaction.
+
+    Args:
+        name (str): The segment's name.
+        rows (list[dict]): Its rows (see `Segment.read_rows`).
+
+    Returns:
+        tuple: (list of (UserInput, scope, category) for the saved rows,
+        allocations by input id); empty if the segment was committed before.
+
+    Raises:
+        SQLAlchemyError: If the transaction failed (it is rolled back).
+    """
+    try:
+        if db.session.get(IngestedSegment, name) is not None:
+            return [], {}
+        db.session.add(IngestedSegment(name=name, row_count=len(rows)))
+        ids = db.session.execute(
+            insert(UserInput).returning(UserInput.id, sort_by_parameter_order=True),
+            [_input_columns(row) for row in rows]
+        ).scalars().all() if rows else []
+        allocations = allocation_rows([
+            (input_id, row['user_id'], row['scope'], row['date_period_start'],
+             row['date_period_end'], row['calculated_emissions_kg'])
+            for input_id, row in zip(ids, rows)
+        ])
+        if allocations:
+            db.session.execute(insert(InputAllocation), allocations)
+        record_changes(allocation_changes(allocations))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    by_input = {}
+    for allocation in allocations:
+        by_input.setdefault(allocation['input_id'], []).append(allocation)
+    inputs = [
+        (UserInput(id=input_id, **_input_columns(row)), row['scope'], row['category'])
+        for input_id, row in zip(ids, rows)
+    ]
+    return inputs, by_input
+
+
+def commit_segment_by_shard(name, rows):
+    """
+    Commits a segment with `commit_segment`, once on every shard holding
+    some of its users (each shard records the segment with its rows).
+
+    Returns:
+        list[tuple]: The (inputs, allocations) committed on each shard.
+
+    Raises:
+        ShardMoving: If one of the users is being moved; the segment is
+            kept for a retry.
+    """
+    if not sharding_enabled():
+        return [commit_segment(name, rows)]
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row['user_id'], []).append(row)
+    results = []
+    for shard, user_ids in users_by_shard(by_user, for_write=True).items():
+        with shard_context(shard):
+            results.append(commit_segment(name, [row for user_id in user_ids for row in by_user[user_id]]))
+    return results
+
+
+def _after_inputs_created(inputs, allocations):
+    """Feeds committed inputs to the analytics cache and open dashboards."""
+    cache = get_analytics_cache()
+    for user_input, scope, category in inputs:
+        if cache is not None:
+            try:
+                cache.add_input(user_input, scope, category)
+            except Exception:
+                current_app.logger.exception('Failed to update analytics cache')
+                cache.discard(user_input.user_id)
+        try:
+            publish_input_created(user_input, scope, [
+                (allocation['month'], allocation['emissions_kg'])
+                for allocation in allocations.get(user_input.id, [])
+            ])
+        except Exception:
+            current_app.logger.exception('Failed to publish dashboard update')
+
+
+def flush_segment(segment, owned=True):
+    """
+    Commits a sealed segment and deletes it.
+
+    Args:
+        segment (Segment): A locked segment.
+        owned (bool): Whether this process buffered the rows, rather
+            than recovering them from a dead process (for metrics).
+
+    Returns:
+        int: The number of rows committed.
+
+    Raises:
+        SQLAlchemyError: If the database is unavailable; the segment is
+            kept locked for a retry.
+    """
+    rows = segment.read_rows()
+    try:
+        committed = commit_segment_by_shard(segment.name, rows)
+    except IntegrityError:
+        current_app.logger.exception('Rejected buffered segment %s', segment.name)
+        record_ingest('failed', len(rows))
+        segment.close(rename_to=segment.path[:-len(SEGMENT_SUFFIX)] + '.rejected')
+        return 0
+
+    segment.close(remove=True)
+    saved = sum(len(inputs) for inputs, _ in committed)
+    if saved:
+        record_ingest('flushed' if owned else 'recovered', saved)
+        record_ingest_flush_lag(max(0.0, time.time() - min(row['accepted_at'] for row in rows)))
+        # Input ids are only unique within a shard
+        for inputs, allocations in committed:
+            _after_inputs_created(inputs, allocations)
+    return saved
+
+
+def recover_segments(directory, exclude=()):
+    """
+    Replays the segments of dead processes found in `directory`.
+
+    Returns:
+        int: The number of rows committed.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    committed = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(SEGMENT_SUFFIX) or path in exclude:
+            continue
+        segment = Segment.claim(path)
+        if segment is None:
+            continue
+        try:
+            committed += flush_segment(segment, owned=False)
+        except Exception:
+            segment.close()
+            raise
+    return committed
+
+
+class IngestBuffer:
+    """
+    The write-behind buffer of one process and its flusher thread.
+
+    Args:
+        app (Flask): The application (the flusher runs in its context).
+        directory (str): Where segment files are kept.
+        max_rows (int): Uncommitted rows held before rejecting appends.
+        batch_rows (int): Rows per segment, i.e. per flush transaction.
+        flush_interval (float): Seconds before a non-full segment is sealed.
+        recovery_interval (float): Seconds between scans for orphaned segments.
+        retry_after (int): `Retry-After` seconds when the buffer is full.
+        fsync (bool): Whether rows are fsynced before being acknowledged.
+    """
+
+    def __init__(self, app, directory, max_rows=50000, batch_rows=1000, flush_interval=1.0,
+                 recovery_interval=30.0, retry_after=1, fsync=True):
+        self.app = app
+        self.directory = directory
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.recovery_interval = recovery_interval
+        self.retry_after = retry_after
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._active = None
+        self._sealed = []
+        self._pending = 0
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def pending(self):
+        """Rows accepted by this process and not yet committed."""
+        return self._pending
+
+    def append(self, row):
+        """
+        Durably buffers one prepared input.
+
+        Args:
+            row (dict): A row from `CalculationService.prepare_input`.
+
+        Raises:
+            BufferFull: If too many rows are waiting to be committed.
+        """
+        record = dict(row, accepted_at=time.time())
+        for field in DATE_FIELDS:
+            if record[field] is not None:
+                record[field] = record[field].isoformat()
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+
+        with self._lock:
+            if self._pending >= self.max_rows:
+                record_ingest('rejected')
+                raise BufferFull(self.retry_after)
+            if self._active is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._active = Segment.create(self.directory)
+            segment = self._active
+            segment.file.write(line)
+            segment.file.flush()
+            segment.rows += 1
+            position = segment.rows
+            self._pending += 1
+            record_ingest_buffered(self._pending)
+            if segment.rows >= self.batch_rows:
+                self._seal()
+        record_ingest('accepted')
+
+        if self.fsync:
+            segment.sync(position)
+        self.start()
+
+    def _seal(self):
+        # Called with self._lock held
+        if self._active is not None and self._active.rows:
+            self._sealed.append(self._active)
+            self._active = None
+            self._wakeup.set()
+
+    def flush(self, force=False):
+        """
+        Commits the sealed segments (and the active one when it is due, or
+        always with `force`), oldest first.
+
+        Returns:
+            int: The number of rows committed.
+
+        Raises:
+            SQLAlchemyError: If the database is unavailable; the remaining
+                segments are kept for the next flush.
+        """
+        with self._lock:
+            active = self._active
+            if active is not None and (
+                force or time.monotonic() - active.created >= self.flush_interval
+            ):
+                self._seal()
+            sealed = list(self._sealed)
+
+        committed = 0
+        with self.app.app_context():
+            try:
+                for segment in sealed:
+                    if self.fsync:
+                        segment.sync(segment.rows)
+                    rows = segment.rows
+                    committed += flush_segment(segment)
+                    with self._lock:
+                        self._sealed.remove(segment)
+                        self._pending -= rows
+                        record_ingest_buffered(self._pending)
+            finally:
+                db.session.remove()
+        return committed
+
+    def recover(self):
+        """Replays orphaned segments of dead processes."""
+        with self._lock:
+            own = {segment.path for segment in self._sealed}
+            if self._active is not None:
+                own.add(self._active.path)
+        with self.app.app_context():
+            try:
+                return recover_segments(self.directory, exclude=own)
+            finally:
+                db.session.remove()
+
+    def start(self):
+        """Starts the flusher thread of this process if it is not running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ghg-ingest-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_recovery = 0.0
+        while not self._stopping:
+            try:
+                if time.monotonic() >= next_recovery:
+                    self.recover()
+                    next_recovery = time.monotonic() + self.recovery_interval
+                self.flush()
+            except Exception:
+                # The database is unavailable; segments stay buffered
+                self.app.logger.exception('Write-behind flush failed')
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+    def close(self):
+        """Stops the flusher and commits everything buffered (on shutdown)."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush(force=True)
+
+
+def prefers_async(request):
+    """Whether the request asked for `Prefer: respond-async` (RFC 7240)."""
+    preferences = ','.join(request.headers.getlist('Prefer'))
+    return any(
+        preference.split(';')[0].strip().lower() == 'respond-async'
+        for preference in preferences.split(',')
+    )
+
+
+@click.command(name='flush_ingest_buffer')
+@with_appcontext
+def flush_ingest_buffer_command():
+    """
+    Replays buffered input segments left by stopped or crashed processes.
+    Segments held by running processes are skipped.
+    """
+    directory = current_app.config['INGEST_BUFFER_DIR']
+    committed = recover_segments(directory)
+    click.echo(f'Committed {committed} buffered inputs from {directory}.')
+
+
+def init_ingest_buffer(app):
+    """Creates the write-behind buffer when `INGEST_BUFFER_ENABLED` is set."""
+    if not app.config.get('INGEST_BUFFER_ENABLED', False):
+        app.extensions['ghg_ingest_buffer'] = None
+        return
+    app.extensions['ghg_ingest_buffer'] = IngestBuffer(
+        app,
+        app.config['INGEST_BUFFER_DIR'],
+        max_rows=app.config.get('INGEST_BUFFER_MAX_ROWS', 50000),
+        batch_rows=app.config.get('INGEST_FLUSH_BATCH_ROWS', 1000),
+        flush_interval=app.config.get('INGEST_FLUSH_INTERVAL_SECONDS', 1.0),
+        recovery_interval=app.config.get('INGEST_RECOVERY_INTERVAL_SECONDS', 30.0),
+        retry_after=app.config.get('INGEST_RETRY_AFTER_SECONDS', 1),
+        fsync=app.config.get('INGEST_BUFFER_FSYNC', True),
+    )
+
+
+def get_ingest_buffer():
+    """Returns the write-behind buffer of the current application (or None)."""
+    return current_app.extensions.get('ghg_ingest_buffer')
@@ -0,0 +1,357 @@
+"""
+Interval Meter Data (Scope 2, Hourly Intensity).
+
+This file computes location- or market-based Scope 2 emissions from
+smart-meter interval data (e.g., 15-minute kWh readings) and hourly grid
+carbon intensity profiles, instead of a flat annual grid factor.
+
+- Profiles (`GridIntensityProfile`) hold one float32 value per hour of a
+  year and are imported with the `flask import_grid_profile` command.
+- Readings are parsed in bulk with pandas. Each reading is aligned to its
+  hour of the year (timestamps are UTC; naive timestamps are taken as
+  UTC) and weighted by that hour's intensity, so each meter-month total
+  is a dot product of consumption and intensity, computed for all meters
+  at once with `np.bincount`.
+- The result is stored as one `UserInput` per meter and month rather
+  than one row per reading, keyed by the meter id (`series_key`).
+  Importing a meter-month again replaces its input, so every upload
+  should hold whole months.
+"""
+
+import calendar
+from datetime import date
+import click
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, select, update
+from . import db
+from .allocations import allocation_rows
+from .analytics_cache import get_analytics_cache
+from .digests import allocation_changes, record_changes
+from .models import EmissionFactor, GridIntensityProfile, InputAllocation, UserInput
+
+PROFILE_DTYPE = np.dtype('<f4')
+
+BASES = ('location', 'market')
+
+READING_COLUMNS = ('meter_id', 'timestamp', 'kwh')
+
+
+def hours_in_year(year):
+    return 8784 if calendar.isleap(year) else 8760
+
+
+# --- Profiles ---
+
+def pack_profile(values, year):
+    """
+    Validates hourly intensities and packs them for storage.
+
+    Args:
+        values (Iterable[float]): kg CO2e per kWh, one per hour of the year.
+        year (int): The profile year.
+
+    Returns:
+        bytes: The packed float32 array.
+
+    Raises:
+        ValueError: If the number of values does not match the year.
+    """
+    array = np.asarray(values, dtype=PROFILE_DTYPE)
+    expected = hours_in_year(year)
+    if array.shape != (expected,):
+        raise ValueError(f'A {year} profile needs {expected} hourly values, got {array.size}.')
+    if not np.all(np.isfinite(array)) or np.any(array < 0):
+        raise ValueError('Profile values must be finite and non-negative.')
+    return array.tobytes()
+
+
+def unpack_profile(profile):
+    """Returns a profile's hourly intensities as a read-only float32 array."""
+    return np.frombuffer(profile.values, dtype=PROFILE_DTYPE)
+
+
+def save_profile(region, year, values, basis='location', source=None):
+    """
+    Creates or replaces the profile for (region, year, basis).
+
+    Returns:
+        GridIntensityProfile: The saved profile (committed).
+    """
+    if basis not in BASES:
+        raise ValueError(f"Invalid basis '{basis}'; expected one of {', '.join(BASES)}.")
+    packed = pack_profile(values, year)
+    profile = db.session.execute(
+        select(GridIntensityProfile).filter_by(region=region, year=year, basis=basis)
+    ).scalar_one_or_none()
+    if profile is None:
+        profile = GridIntensityProfile(region=region, year=year, basis=basis)
+        db.session.add(profile)
+    profile.values = packed
+    profile.source = source
+    db.session.commit()
+    return profile
+
+
+def load_profiles(region, years, basis='location'):
+    """
+    Loads the hourly intensities of a region for several years.
+
+    Returns:
+        dict[int, numpy.ndarray]: Intensities by year.
+
+    Raises:
+        ValueError: If a year has no profile.
+    """
+    profiles = db.session.execute(
+        select(GridIntensityProfile).where(
+            GridIntensityProfile.region == region,
+            GridIntensityProfile.basis == basis,
+            GridIntensityProfile.year.in_(list(years))
+        )
+    ).scalars()
+    arrays = {profile.year: unpack_profile(profile) for profile in profiles}
+    missing = sorted(set(years) - set(arrays))
+    if missing:
+        raise ValueError(
+            f"No {basis}-based intensity profile for region '{region}' in "
+            f"{', '.join(str(year) for year in missing)}."
+        )
+    return arrays
+
+
+# --- Readings ---
+
+def read_readings(source):
+    """
+    Parses interval readings from a CSV file or file-like object with the
+    columns `meter_id`, `timestamp` (ISO 8601, start of the interval) and
+    `kwh`.
+
+    Returns:
+        pandas.DataFrame: The readings, with UTC timestamps.
+
+    Raises:
+        ValueError: If columns are missing or values cannot be parsed.
+    """
+    try:
+        df = pd.read_csv(source, usecols=list(READING_COLUMNS), dtype={'meter_id': str, 'kwh': 'float64'})
+    except ValueError as e:
+        raise ValueError(f'Invalid readings file: {e}')
+    return readings_frame(df)
+
+
+def readings_from_records(records):
+    """Builds a readings DataFrame from a list of {meter_id, timestamp, kwh} dicts."""
+    return readings_frame(pd.DataFrame.from_records(records, columns=list(READING_COLUMNS)))
+
+
+def readings_frame(df):
+    """Validates a readings DataFrame and normalizes its timestamps to UTC."""
+    missing = [column for column in READING_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing reading columns: {', '.join(missing)}")
+    df = df.loc[:, list(READING_COLUMNS)]
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True, format='ISO8601')
+    df['kwh'] = df['kwh'].astype('float64')
+    if df['kwh'].isna().any() or df['meter_id'].isna().any():
+        raise ValueError('Readings must have a meter_id and a kwh value.')
+    if (df['kwh'] < 0).any():
+        raise ValueError('Readings must not be negative.')
+    return df
+
+
+def hourly_intensities(timestamps, profiles):
+    """
+    Looks up the grid intensity for the hour of every timestamp.
+
+    Args:
+        timestamps (pandas.Series): UTC timestamps.
+        profiles (dict[int, numpy.ndarray]): Intensities by year.
+
+    Returns:
+        numpy.ndarray: One intensity per timestamp.
+    """
+    years = timestamps.dt.year.to_numpy()
+    hours = (timestamps.dt.dayofyear.to_numpy() - 1) * 24 + timestamps.dt.hour.to_numpy()
+    intensities = np.empty(len(timestamps), dtype=np.float64)
+    for year, profile in profiles.items():
+        mask = years == year
+        intensities[mask] = profile[hours[mask]]
+    return intensities
+
+
+def meter_month_totals(df, profiles):
+    """
+    Aggregates readings into kWh and emissions per meter and month.
+
+    Every group's emissions are the dot product of its readings with the
+    hourly intensities they fall in.
+
+    Returns:
+        pandas.DataFrame: Columns meter_id, year, month, kwh, emissions_kg
+        and readings, sorted by meter and month.
+    """
+    timestamps = df['timestamp']
+    kwh = df['kwh'].to_numpy()
+    weighted = kwh * hourly_intensities(timestamps, profiles)
+
+    meter_codes, meters = pd.factorize(df['meter_id'], sort=True)
+    month_keys = timestamps.dt.year.to_numpy() * 12 + timestamps.dt.month.to_numpy() - 1
+    first_month = int(month_keys.min())
+    month_span = int(month_keys.max()) - first_month + 1
+
+    group = meter_codes.astype(np.int64) * month_span + (month_keys - first_month)
+    keys, inverse = np.unique(group, return_inverse=True)
+    month_keys = keys % month_span + first_month
+    return pd.DataFrame({
+        'meter_id': np.asarray(meters)[keys // month_span],
+        'year': month_keys // 12,
+        'month': month_keys % 12 + 1,
+        'kwh': np.bincount(inverse, weights=kwh),
+        'emissions_kg': np.bincount(inverse, weights=weighted),
+        'readings': np.bincount(inverse),
+    })
+
+
+def import_interval_readings(user_id, df, region, factor_id, basis='location'):
+    """
+    Computes hourly-intensity emissions for interval readings and stores
+    one `UserInput` per meter and month, in one transaction. A meter-month
+    imported before with the same factor is replaced, so uploading a file
+    again (e.g., a corrected export) does not count it twice.
+
+    Args:
+        user_id (int): The owning user's ID.
+        df (pandas.DataFrame): Readings (see `read_readings`).
+        region (str): The grid region of the profiles to use.
+        factor_id (int): A Scope 2, kWh-based factor that labels the inputs
+            (its `factor_value` is not used for the calculation).
+        basis (str): 'location' or 'market'.
+
+    Returns:
+        dict: Counts and totals, plus the per-meter totals.
+
+    Raises:
+        ValueError: If the factor, profiles or readings are invalid.
+    """
+    if df.empty:
+        raise ValueError('No readings to import.')
+
+    factor = db.session.get(EmissionFactor, factor_id)
+    if factor is None or factor.scope != 2 or factor.unit.lower() != 'kwh':
+        raise ValueError('factor_id must reference a Scope 2 factor measured in kWh.')
+
+    profiles = load_profiles(region, df['timestamp'].dt.year.unique().tolist(), basis=basis)
+    totals = meter_month_totals(df, profiles)
+
+    rows = [
+        {
+            'user_id': user_id,
+            'factor_id': factor_id,
+            'series_key': str(row.meter_id),
+            'activity_value': float(row.kwh),
+            'activity_unit': 'kWh',
+            'date_period_start': date(int(row.year), int(row.month), 1),
+            'date_period_end': date(int(row.year), int(row.month),
+                                    calendar.monthrange(int(row.year), int(row.month))[1]),
+            'calculated_emissions_kg': float(row.emissions_kg),
+        }
+        for row in totals.itertuples(index=False)
+    ]
+
+    # Meter-months imported before are replaced, in one query
+    existing = {
+        (row.series_key, row.date_period_start): row
+        for row in db.session.execute(
+            select(UserInput.id, UserInput.series_key, UserInput.date_period_start,
+                   UserInput.calculated_emissions_kg).where(
+                UserInput.user_id == user_id,
+                UserInput.factor_id == factor_id,
+                UserInput.series_key.in_({row['series_key'] for row in rows}),
+                UserInput.date_period_start.in_({row['date_period_start'] for row in rows})
+            )
+        )
+    }
+    inserts, updates, updated_inputs, replaced = [], [], [], []
+    for row in rows:
+        current = existing.get((row['series_key'], row['date_period_start']))
+        if current is None:
+            inserts.append(row)
+        else:
+            updates.append({
+                'id': current.id,
+                'activity_value': row['activity_value'],
+                'calculated_emissions_kg': row['calculated_emissions_kg'],
+            })
+            updated_inputs.append((
+                current.id, row['date_period_start'], row['date_period_end'], row['calculated_emissions_kg']
+            ))
+            # Each meter-month input has a single allocation, for its month
+            replaced.append((user_id, current.date_period_start, -1, -current.calculated_emissions_kg, None))
+
+    try:
+        saved = db.session.execute(
+            insert(UserInput).returning(
+                UserInput.id, UserInput.date_period_start, UserInput.date_period_end,
+                UserInput.calculated_emissions_kg
+            ),
+            inserts
+        ).all() if inserts else []
+        if updates:
+            db.session.execute(update(UserInput), updates)
+            db.session.execute(
+                delete(InputAllocation).where(InputAllocation.input_id.in_([row['id'] for row in updates]))
+            )
+        allocations = allocation_rows([
+            (input_id, user_id, factor.scope, start, end, emissions)
+            for input_id, start, end, emissions in updated_inputs + [tuple(row) for row in saved]
+        ])
+        db.session.execute(insert(InputAllocation), allocations)
+        record_changes(replaced + allocation_changes(allocations))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Cached series only notice new inputs, not changed ones
+    cache = get_analytics_cache()
+    if updates and cache is not None:
+        cache.discard(user_id)
+
+    per_meter = totals.groupby('meter_id')[['kwh', 'emissions_kg']].sum()
+    return {
+        'readings': int(len(df)),
+        'meters': int(len(per_meter)),
+        'inputs_created': len(inserts),
+        'inputs_updated': len(updates),
+        'total_kwh': float(totals['kwh'].sum()),
+        'total_emissions_kg': float(totals['emissions_kg'].sum()),
+        'by_meter': [
+            {'meter_id': meter_id, 'kwh': float(values.kwh), 'emissions_kg': float(values.emissions_kg)}
+            for meter_id, values in per_meter.iterrows()
+        ]
+    }
+
+
+@click.command(name='import_grid_profile')
+@click.argument('region')
+@click.argument('year', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--basis', type=click.Choice(BASES), default='location', show_default=True)
+@click.option('--source', default=None, help='Where the intensities come from.')
+@click.option('--column', default='intensity', show_default=True,
+              help='CSV column holding kg CO2e per kWh (one row per hour).')
+def import_grid_profile_command(region, year, path, basis, source, column):
+    """
+    Imports an hourly grid intensity profile (kg CO2e/kWh) from a CSV
+    file with one row per hour of the year, starting at 00:00 UTC on
+    January 1st.
+    """
+    try:
+        values = pd.read_csv(path, usecols=[column])[column].to_numpy()
+        save_profile(region, year, values, basis=basis, source=source)
+    except Exception as e:
+        click.echo(f'Error importing profile: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Imported {len(values)} hourly values for {region} {year} ({basis}).')
@@ -0,0 +1,282 @@
+"""
+Instrumentation Layer (Prometheus Metrics).
+
+This file records request, SQL and cache metrics and exposes them
+on `/metrics` in the Prometheus text exposition format.
+
+Metrics recorded:
+- Per-endpoint request latency histograms and status code counters.
+- SQL statement counts and durations per request (SQLAlchemy engine events).
+- Connection-pool checkout wait time.
+- Cache hits and misses (via `record_cache`).
+- Write-behind ingestion: buffered rows, outcomes and flush lag.
+
+When the `PROMETHEUS_MULTIPROC_DIR` environment variable is set (see
+`gunicorn.conf.py`), every worker writes its samples to that directory
+and `/metrics` aggregates them, so a scrape of any worker returns the
+totals for the whole gunicorn process group.
+"""
+
+import os
+import time
+from collections import Counter as StatementCounter
+from flask import Blueprint, Response, current_app, g, has_app_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Blueprint for the scrape endpoint (registered without a URL prefix)
+metrics = Blueprint('metrics', __name__)
+
+
+# --- Metric Definitions ---
+
+REQUEST_COUNT = Counter(
+    'ghg_http_requests_total',
+    'Total HTTP requests by endpoint and status code.',
+    ['method', 'endpoint', 'status']
+)
+
+REQUEST_LATENCY = Histogram(
+    'ghg_http_request_duration_seconds',
+    'HTTP request latency by endpoint.',
+    ['method', 'endpoint'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+SQL_STATEMENTS = Histogram(
+    'ghg_sql_statements_per_request',
+    'Number of SQL statements executed per request.',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+)
+
+SQL_DURATION = Histogram(
+    'ghg_sql_duration_seconds_per_request',
+    'Total time spent executing SQL per request.',
+    ['endpoint'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    'ghg_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the pool.',
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+
+CACHE_REQUESTS = Counter(
+    'ghg_cache_requests_total',
+    'Cache lookups by cache name and result (hit/miss).',
+    ['cache', 'result']
+)
+
+ADMISSION_REJECTIONS = Counter(
+    'ghg_admission_rejections_total',
+    'Requests rejected by admission control, by cost class and reason.',
+    ['cost_class', 'reason']
+)
+
+INGEST_BUFFERED_ROWS = Gauge(
+    'ghg_ingest_buffered_rows',
+    'Inputs accepted into the write-behind buffer and not yet committed.',
+    multiprocess_mode='livesum'
+)
+
+INGEST_ROWS = Counter(
+    'ghg_ingest_rows_total',
+    'Write-behind inputs by outcome (accepted, rejected, flushed, recovered, failed).',
+    ['result']
+)
+
+INGEST_FLUSH_LAG = Histogram(
+    'ghg_ingest_flush_lag_seconds',
+    'Age of the oldest row of a write-behind batch when it was committed.',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+)
+
+
+def record_cache(cache_name, hit):
+    """
+    Records a single cache lookup.
+
+    Args:
+        cache_name (str): A short, stable name for the cache (e.g., "factors").
+        hit (bool): Whether the lookup was served from the cache.
+    """
+    CACHE_REQUESTS.labels(cache=cache_name, result='hit' if hit else 'miss').inc()
+
+
+def record_admission_rejection(cost_class, reason):
+    """Records a request turned away by admission control (see admission.py)."""
+    ADMISSION_REJECTIONS.labels(cost_class=cost_class, reason=reason).inc()
+
+
+def record_ingest(result, rows=1):
+    """
+    Records write-behind inputs (see ingest_buffer.py).
+
+    Args:
+        result (str): 'accepted', 'rejected' (buffer full), 'flushed'
+            (committed), 'recovered' (committed from a dead process's
+            buffer) or 'failed' (refused by the database).
+        rows (int): The number of inputs.
+    """
+    INGEST_ROWS.labels(result=result).inc(rows)
+
+
+def record_ingest_buffered(rows):
+    """Sets the number of rows this process holds uncommitted."""
+    INGEST_BUFFERED_ROWS.set(rows)
+
+
+def record_ingest_flush_lag(seconds):
+    """Records the age of a flushed batch's oldest row."""
+    INGEST_FLUSH_LAG.observe(seconds)
+
+
+# --- Per-Request SQL Statistics ---
+
+class RequestSQLStats:
+    """
+    Accumulates the SQL statements executed during one request.
+    An instance is stored on `flask.g` for the lifetime of a request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Raw statement text -> executions (used for N+1 detection)
+        self.statements = StatementCounter()
+
+    def record(self, statement, duration):
+        """Adds one executed statement to the running totals."""
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+
+def current_sql_stats():
+    """
+    Returns the `RequestSQLStats` for the active request, or None when
+    called outside a request (e.g., from a CLI command).
+    """
+    if not has_app_context():
+        return None
+    return g.get('sql_stats')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._ghg_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_sql_stats()
+    if stats is not None:
+        start = getattr(context, '_ghg_query_start', None)
+        duration = time.perf_counter() - start if start is not None else 0.0
+        stats.record(statement, duration)
+
+
+def _instrument_pool(pool):
+    """
+    Wraps the pool's internal checkout so the time spent waiting for a
+    free connection is observed. SQLAlchemy has no "before checkout"
+    event, so the wait can only be measured around `_do_get`.
+    """
+    if getattr(pool, '_ghg_instrumented', False):
+        return
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+    pool._ghg_instrumented = True
+
+
+# --- Request Hooks ---
+
+def _endpoint_label():
+    """
+    Uses the matched URL rule rather than the raw path so that
+    e.g. `/api/reports/1` and `/api/reports/2` share one series.
+    """
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def _start_request_timer():
+    g.request_start_time = time.perf_counter()
+    g.sql_stats = RequestSQLStats()
+
+
+def _record_request(response):
+    start = g.get('request_start_time')
+    if start is None:
+        return response
+
+    endpoint = _endpoint_label()
+    if endpoint == '/metrics':
+        return response
+
+    REQUEST_LATENCY.labels(method=request.method, endpoint=endpoint).observe(
+        time.perf_counter() - start
+    )
+    REQUEST_COUNT.labels(
+        method=request.method, endpoint=endpoint, status=str(response.status_code)
+    ).inc()
+
+    stats = g.get('sql_stats')
+    if stats is not None:
+        SQL_STATEMENTS.labels(endpoint=endpoint).observe(stats.count)
+        SQL_DURATION.labels(endpoint=endpoint).observe(stats.duration)
+
+    return response
+
+
+def init_metrics(app, db):
+    """
+    Installs the request hooks and pool instrumentation on the app.
+
+    Args:
+        app (Flask): The application instance.
+        db (SQLAlchemy): The Flask-SQLAlchemy extension (already initialized).
+    """
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_pool(engine.pool)
+
+    app.register_blueprint(metrics)
+
+
+# --- Scrape Endpoint ---
+
+@metrics.route('/metrics', methods=['GET'])
+def expose_metrics():
+    """
+    Exposes all metrics in the Prometheus text format.
+    Aggregates across worker processes in multiprocess mode.
+    """
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return Response('Metrics are disabled.\n', status=404, mimetype='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -3,15 +3,24 @@ Database Models.
 
 This file defines the SQLAlchemy ORM models for the application's database schema.
 Models:
-- User: Stores user account information and handles password hashing.
+- User: Stores user account information, handles password hashing and maps
+  the user to a shard.
 - EmissionFactor: Stores the GHG Protocol emission factors.
 - UserInput: Stores individual activity data inputs from users.
 - Report: Stores aggregated emission reports generated by users.
+- CatalogueVersion: A version counter bumped whenever reference data changes.
+- GridIntensityProfile: Hourly grid carbon intensities for a region and year.
+- ReadingBlock: A month of high-frequency readings packed into one row.
+- InputAllocation: The share of an input's emissions falling in each month.
+- MonthlyDigest: Per-user, per-month checksums used to detect stale reports.
+- ReportSchedule: A cron-like definition of automatically generated reports.
+- ScheduleRun: One due occurrence of a schedule and its per-partition checkpoints.
+- ArchiveFile: A cold-storage file of archived inputs and its summary statistics.
 """
 
 from . import db, bcrypt
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 class User(db.Model):
     """
@@ -24,8 +33,16 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
+    # Self-declared at registration; grants no access (see `organization_id`)
     company_name = db.Column(db.String(120), nullable=True)
+    # Organization membership, only assigned by an operator (`flask add_org_member`)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    # The shard map (see `sharding.py`): the `shard_` bind holding this
+    # user's data, or NULL for the primary database
+    shard = db.Column(db.String(50), nullable=True)
+    shard_moving = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Relationships
     inputs = relationship('UserInput', back_populates='user', lazy='dynamic')
@@ -50,6 +67,22 @@ class User(db.Model):
         return f'<User {self.username}>'
 
 
+class Organization(db.Model):
+    """
+    Organization Model
+    A group of users whose emissions are rolled up together
+    (`GET /api/organization/summary`).
+    """
+    __tablename__ = 'organizations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f'<Organization {self.name}>'
+
+
 class EmissionFactor(db.Model):
     """
     Emission Factor Model
@@ -92,10 +125,16 @@ class UserInput(db.Model):
     Stores a single activity data point from a user.
     """
     __tablename__ = 'user_inputs'
+    __table_args__ = (
+        # Interval imports keep one input per meter and month (see interval.py)
+        db.UniqueConstraint('user_id', 'series_key', 'factor_id', 'date_period_start',
+                            name='uq_user_input_series_month'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     factor_id = db.Column(db.Integer, db.ForeignKey('emission_factors.id'), nullable=False)
+    series_key = db.Column(db.String(100), nullable=True)  # The meter of an interval import
     
     activity_value = db.Column(db.Float, nullable=False) # e.g., 1000
     activity_unit = db.Column(db.String(50), nullable=False) # e.g., "liter"
@@ -111,6 +150,7 @@ class UserInput(db.Model):
     # Relationships
     user = relationship('User', back_populates='inputs')
     factor = relationship('EmissionFactor', back_populates='inputs')
+    allocations = relationship('InputAllocation', back_populates='input', cascade='all, delete-orphan')
 
     def to_dict(self):
         """Return a dictionary representation of the model."""
@@ -123,6 +163,7 @@ class UserInput(db.Model):
             'activity_value': self.activity_value,
             'activity_unit': self.activity_unit,
             'date_period_start': self.date_period_start.isoformat(),
+            'date_period_end': self.date_period_end.isoformat() if self.date_period_end else None,
             'calculated_emissions_kg': self.calculated_emissions_kg,
             'created_at': self.created_at.isoformat()
         }
@@ -149,6 +190,12 @@ class Report(db.Model):
     total_scope2_kg = db.Column(db.Float, nullable=False, default=0.0)
     total_scope3_kg = db.Column(db.Float, nullable=False, default=0.0)
     total_all_scopes_kg = db.Column(db.Float, nullable=False, default=0.0)
+
+    # The combined monthly digests the totals were computed from (see
+    # digests.py); NULL for reports generated before digests existed
+    digest_row_count = db.Column(db.Integer, nullable=True)
+    digest_emissions_kg = db.Column(db.Float, nullable=True)
+    digest_max_input_id = db.Column(db.Integer, nullable=True)
     
     generated_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
     
@@ -170,4 +217,294 @@ class Report(db.Model):
         }
         
     def __repr__(self):
-        return f'<Report {self.report_name} for User {self.user_id}>'
\ No newline at end of file
+        return f'<Report {self.report_name} for User {self.user_id}>'
+
+
+class CatalogueVersion(db.Model):
+    """
+    Catalogue Version Model
+    A counter per reference catalogue (e.g., "emission_factors") that is
+    bumped whenever the catalogue changes. In-process caches compare it
+    with one primary-key lookup instead of reloading the catalogue.
+    """
+    __tablename__ = 'catalogue_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f'<CatalogueVersion {self.name} v{self.version}>'
+
+
+class GridIntensityProfile(db.Model):
+    """
+    Grid Intensity Profile Model
+    Hourly grid carbon intensity (kg CO2e per kWh) for one region and
+    year, stored as a packed little-endian float32 array of 8760 values
+    (8784 in leap years). Hour 0 starts at January 1st, 00:00 UTC.
+    """
+    __tablename__ = 'grid_intensity_profiles'
+    __table_args__ = (
+        db.UniqueConstraint('region', 'year', 'basis', name='uq_grid_profile_region_year_basis'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    region = db.Column(db.String(100), nullable=False)  # e.g., "GB", "DE", "US-CAISO"
+    year = db.Column(db.Integer, nullable=False)
+    basis = db.Column(db.String(20), nullable=False, default='location')  # "location" or "market"
+    values = db.Column(db.LargeBinary, nullable=False)
+    source = db.Column(db.String(255), nullable=True)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        """Return a summary of the profile (without the hourly values)."""
+        return {
+            'id': self.id,
+            'region': self.region,
+            'year': self.year,
+            'basis': self.basis,
+            'hours': len(self.values) // 4,
+            'source': self.source
+        }
+
+    def __repr__(self):
+        return f'<GridIntensityProfile {self.region} {self.year} ({self.basis})>'
+
+
+class ReadingBlock(db.Model):
+    """
+    Reading Block Model
+    Stores one calendar month of fixed-interval readings for one series
+    (e.g., a meter) as a compressed float32 array, with one fixed unit and
+    emission factor. Missing intervals are NaN. The activity and emission
+    totals are stored alongside, so queries covering whole months never
+    load or decode `values`.
+    """
+    __tablename__ = 'reading_blocks'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'series_key', 'factor_id', 'block_start',
+                            name='uq_reading_block_series_month'),
+        db.Index('ix_reading_blocks_user_start', 'user_id', 'block_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    factor_id = db.Column(db.Integer, db.ForeignKey('emission_factors.id'), nullable=False)
+    series_key = db.Column(db.String(100), nullable=False)  # e.g., a meter id
+
+    block_start = db.Column(db.Date, nullable=False)  # First day of the month
+    block_end = db.Column(db.Date, nullable=False)    # Last day of the month
+    resolution_minutes = db.Column(db.Integer, nullable=False)
+    unit = db.Column(db.String(50), nullable=False)
+
+    reading_count = db.Column(db.Integer, nullable=False, default=0)
+    total_activity = db.Column(db.Float, nullable=False, default=0.0)
+    total_emissions_kg = db.Column(db.Float, nullable=False, default=0.0)
+    values = deferred(db.Column(db.LargeBinary, nullable=False))
+
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    factor = relationship('EmissionFactor')
+
+    def to_dict(self):
+        """Return a summary of the block (without the readings)."""
+        return {
+            'id': self.id,
+            'series_key': self.series_key,
+            'factor_id': self.factor_id,
+            'block_start': self.block_start.isoformat(),
+            'block_end': self.block_end.isoformat(),
+            'resolution_minutes': self.resolution_minutes,
+            'unit': self.unit,
+            'reading_count': self.reading_count,
+            'total_activity': self.total_activity,
+            'total_emissions_kg': self.total_emissions_kg
+        }
+
+    def __repr__(self):
+        return f'<ReadingBlock {self.series_key} {self.block_start} for User {self.user_id}>'
+
+
+class InputAllocation(db.Model):
+    """
+    Input Allocation Model
+    The part of an input's emissions that falls in one calendar month,
+    weighted by days. Written when the input is saved, so period totals
+    are a plain indexed sum over (user_id, month). `scope` is copied from
+    the factor so those sums need no join.
+    """
+    __tablename__ = 'input_allocations'
+    __table_args__ = (
+        db.Index('ix_input_allocations_user_month', 'user_id', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    input_id = db.Column(db.Integer, db.ForeignKey('user_inputs.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    scope = db.Column(db.Integer, nullable=False)
+
+    month = db.Column(db.Date, nullable=False)        # First day of the month
+    alloc_start = db.Column(db.Date, nullable=False)  # Days of the input within the month
+    alloc_end = db.Column(db.Date, nullable=False)
+    emissions_kg = db.Column(db.Float, nullable=False)
+
+    # Relationships
+    input = relationship('UserInput', back_populates='allocations')
+
+    def __repr__(self):
+        return f'<InputAllocation {self.month} of Input {self.input_id}>'
+
+
+class MonthlyDigest(db.Model):
+    """
+    Monthly Digest Model
+    A lightweight checksum of everything a report can read for one user
+    and month: the number of allocation and reading-block rows, their
+    emissions sum and the highest input id. Updated in the same
+    transaction as the data it summarizes.
+    """
+    __tablename__ = 'monthly_digests'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # First day of the month
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    emissions_kg = db.Column(db.Float, nullable=False, default=0.0)
+    max_input_id = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MonthlyDigest {self.month} for User {self.user_id}>'
+
+
+class ReportSchedule(db.Model):
+    """
+    Report Schedule Model
+    A cron expression (minute hour day-of-month month day-of-week, UTC)
+    and the period to report on when it fires. Schedules without a
+    `user_id` generate reports for every user (see scheduler.py).
+    """
+    __tablename__ = 'report_schedules'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    name = db.Column(db.String(120), nullable=False)
+    cron = db.Column(db.String(100), nullable=False)
+    period = db.Column(db.String(20), nullable=False, default='monthly')  # monthly, quarterly, annual
+    # Report names, with {label} replaced by e.g. "Mar 2025", "Q1 2025" or "2025"
+    name_template = db.Column(db.String(255), nullable=False, default='{label} report')
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    # The latest occurrence that has been fully processed
+    last_due_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        """Return a dictionary representation of the model."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'cron': self.cron,
+            'period': self.period,
+            'name_template': self.name_template,
+            'enabled': self.enabled,
+            'last_due_at': self.last_due_at.isoformat() if self.last_due_at else None
+        }
+
+    def __repr__(self):
+        return f'<ReportSchedule {self.name} ({self.cron})>'
+
+
+class ScheduleRun(db.Model):
+    """
+    Schedule Run Model
+    One occurrence of a schedule. Users are split into id ranges when the
+    run starts; each range is stored as a checkpoint that is marked done
+    in the same transaction as its reports, so an interrupted run resumes
+    with the remaining ranges.
+    """
+    __tablename__ = 'schedule_runs'
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'due_at', name='uq_schedule_run_due'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('report_schedules.id'), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    reports_created = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f'<ScheduleRun {self.due_at} of Schedule {self.schedule_id}>'
+
+
+class ScheduleCheckpoint(db.Model):
+    """
+    Schedule Checkpoint Model
+    A range of user ids processed as one unit of a schedule run.
+    """
+    __tablename__ = 'schedule_checkpoints'
+
+    run_id = db.Column(db.Integer, db.ForeignKey('schedule_runs.id', ondelete='CASCADE'), primary_key=True)
+    partition = db.Column(db.Integer, primary_key=True)
+    first_user_id = db.Column(db.Integer, nullable=False)
+    last_user_id = db.Column(db.Integer, nullable=False)
+    done = db.Column(db.Boolean, nullable=False, default=False)
+    reports_created = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ScheduleCheckpoint {self.partition} of Run {self.run_id}>'
+
+
+class IngestedSegment(db.Model):
+    """
+    Ingested Segment Model
+    A write-behind buffer segment whose rows have been committed. It is
+    written in the same transaction as the rows, so a segment replayed
+    after a crash is never inserted twice (see app/ingest_buffer.py).
+    """
+    __tablename__ = 'ingested_segments'
+
+    name = db.Column(db.String(100), primary_key=True)
+    row_count = db.Column(db.Integer, nullable=False)
+    flushed_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f'<IngestedSegment {self.name}>'
+
+
+class ArchiveFile(db.Model):
+    """
+    Archive File Model
+    One compressed columnar file of a user's archived inputs and their
+    allocations, with the summary statistics that let queries skip it or
+    answer from it without opening it (see app/archive.py).
+    """
+    __tablename__ = 'archive_files'
+    __table_args__ = (
+        db.Index('ix_archive_files_user_dates', 'user_id', 'min_date', 'max_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    path = db.Column(db.String(255), nullable=False)  # Relative to ARCHIVE_DIR
+
+    # Earliest input start and latest input end (or start) in the file
+    min_date = db.Column(db.Date, nullable=False)
+    max_date = db.Column(db.Date, nullable=False)
+    input_count = db.Column(db.Integer, nullable=False)
+    allocation_count = db.Column(db.Integer, nullable=False)
+    max_input_id = db.Column(db.Integer, nullable=False)
+    total_scope1_kg = db.Column(db.Float, nullable=False, default=0.0)
+    total_scope2_kg = db.Column(db.Float, nullable=False, default=0.0)
+    total_scope3_kg = db.Column(db.Float, nullable=False, default=0.0)
+    # 'YYYY-MM-01' -> [allocation rows, emissions_kg, max input id]
+    monthly = db.Column(db.JSON, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f'<ArchiveFile {self.path}>'
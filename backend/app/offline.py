@@ -0,0 +1,344 @@
+"""
+Offline Calculator (No Database).
+
+Runs the emission calculation over activity files (e.g. a client's
+spreadsheets) without loading them into the database:
+
+    flask calculate_files activities.csv --factors catalogue.csv --output results.csv
+    python -m app.offline activities.xlsx --totals totals.json --workers 8
+
+`python -m app.offline` needs neither a database nor `DATABASE_URL`.
+
+Factors come from a catalogue file in any format `flask import_factors`
+accepts, or from the built-in `SEED_DATA` catalogue. Each activity row
+names its factor with `factor_id` (when the catalogue has ids) or
+`factor_name`, optionally narrowed by `factor_source`; when a name has
+several units (e.g. natural gas per kWh and per m³), the factor in the
+activity's unit is preferred, then the first one it converts to.
+
+The arithmetic is `CalculationService`'s: the activity is converted to
+the factor's unit with `convert_units` (Pint) and multiplied by the
+factor value. Conversions are linear, so Pint is called once per
+(activity unit, factor unit) pair and the ratio applied to whole columns.
+
+Files are read in chunks of `--chunk-rows` rows that are calculated in a
+process pool and written in input order. Every input column is kept;
+the results add scope, category, factor, converted value, emissions and
+an `error` column (rows that cannot be calculated are kept, with the
+reason). Scope and category totals are printed and can be saved as JSON.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import click
+import numpy as np
+import pandas as pd
+from .factor_import import iter_catalogue_rows, normalize_factor_row
+from .seed import SEED_DATA
+from .utils import convert_units
+
+# --- Factor Catalogue ---
+
+class OfflineCatalogue:
+    """Factors indexed for lookup by id and by (name, source)."""
+
+    def __init__(self, factors):
+        """
+        Args:
+            factors (list[dict]): Normalized factors (see `normalize_factor_row`),
+                optionally with an 'id'.
+        """
+        self.factors = factors
+        self.by_id = {}
+        self.by_name = {}
+        for factor in factors:
+            if factor.get('id') is not None:
+                self.by_id[str(factor['id'])] = factor
+            self.by_name.setdefault(factor['name'].lower(), []).append(factor)
+        self._resolved = {}
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Reads a catalogue file, or the built-in `SEED_DATA` without one.
+
+        Raises:
+            ValueError: If a catalogue row is invalid.
+        """
+        factors = []
+        for line_number, row in enumerate(iter_catalogue_rows(path) if path else SEED_DATA, start=1):
+            try:
+                factor = normalize_factor_row(row)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'Factor row {line_number}: {e}')
+            if row.get('id') not in (None, ''):
+                factor['id'] = str(row['id']).strip()
+            factors.append(factor)
+        return cls(factors)
+
+    def resolve(self, factor_id, name, source, unit):
+        """
+        Finds the factor for an activity and the ratio converting the
+        activity's unit to the factor's.
+
+        Returns:
+            tuple: (factor, ratio, None) or (None, None, error message).
+        """
+        key = (factor_id, name, source, unit)
+        if key not in self._resolved:
+            self._resolved[key] = self._resolve(*key)
+        return self._resolved[key]
+
+    def _resolve(self, factor_id, name, source, unit):
+        if factor_id:
+            factor = self.by_id.get(factor_id)
+            candidates = [factor] if factor is not None else []
+            label = f"id '{factor_id}'"
+        else:
+            candidates = [
+                factor for factor in self.by_name.get(name.lower(), [])
+                if not source or (factor['source'] or '').lower() == source.lower()
+            ]
+            label = f"'{name}'" + (f" ({source})" if source else '')
+        if not candidates:
+            return None, None, f'Unknown emission factor {label}.'
+        if not unit:
+            return None, None, 'Missing activity_unit.'
+
+        error = None
+        for factor in sorted(candidates, key=lambda f: f['unit'] != unit):
+            try:
+                return factor, convert_units(1.0, unit, factor['unit']), None
+            except ValueError as e:
+                error = str(e)
+        return None, None, error
+
+
+# --- Calculation ---
+
+_catalogue = None
+
+
+def _init_worker(catalogue):
+    global _catalogue
+    _catalogue = catalogue
+
+
+def _column(df, name):
+    """Returns a column by case-insensitive name as stripped strings, or None."""
+    for column in df.columns:
+        if str(column).strip().lower() == name:
+            return df[column].fillna('').astype(str).str.strip()
+    return None
+
+
+def calculate_chunk(df, catalogue=None):
+    """
+    Calculates the emissions of a chunk of activity rows.
+
+    Args:
+        df (pd.DataFrame): Activity rows (see the module docstring).
+        catalogue (OfflineCatalogue): The factors (default: the worker's).
+
+    Returns:
+        tuple: (the rows with the result columns, their totals as returned
+        by `chunk_totals`).
+    """
+    catalogue = catalogue or _catalogue
+    rows = len(df)
+    empty = pd.Series([''] * rows, index=df.index)
+    factor_ids = _column(df, 'factor_id')
+    names = _column(df, 'factor_name')
+    if factor_ids is None and names is None:
+        raise ValueError('Activity files need a factor_id or factor_name column.')
+    factor_ids = factor_ids if factor_ids is not None else empty
+    names = names if names is not None else empty
+    sources = _column(df, 'factor_source')
+    sources = sources if sources is not None else empty
+    units = _column(df, 'activity_unit')
+    units = units if units is not None else empty
+    values = _column(df, 'activity_value')
+    values = pd.to_numeric(values, errors='coerce') if values is not None else pd.Series(np.nan, index=df.index)
+
+    resolved = [
+        catalogue.resolve(*key)
+        for key in zip(factor_ids.tolist(), names.tolist(), sources.tolist(), units.tolist())
+    ]
+    factors = [factor for factor, _, _ in resolved]
+    ratio = np.array([r if r is not None else np.nan for _, r, _ in resolved], dtype=float)
+    factor_value = np.array([f['factor_value'] if f else np.nan for f in factors], dtype=float)
+    errors = [error or '' for _, _, error in resolved]
+    for i, value in enumerate(values.isna().tolist()):
+        if value and not errors[i]:
+            errors[i] = 'Invalid activity_value.'
+
+    result = df.copy()
+    converted = values.to_numpy(dtype=float) * ratio
+    failed = np.array([bool(error) for error in errors], dtype=bool)
+    result['scope'] = pd.array([f['scope'] if f else None for f in factors], dtype='Int64')
+    result['category'] = [f['category'] if f else '' for f in factors]
+    result['factor_value'] = factor_value
+    result['factor_unit'] = [f['unit'] if f else '' for f in factors]
+    result['converted_value'] = np.where(failed, np.nan, converted)
+    result['calculated_emissions_kg'] = np.where(failed, np.nan, converted * factor_value)
+    result['error'] = errors
+    # Failed rows have no scope, category or factor
+    result.loc[failed, ['scope', 'factor_value']] = None
+    result.loc[failed, ['category', 'factor_unit']] = ''
+    return result, chunk_totals(result)
+
+
+def chunk_totals(result):
+    """Sums a calculated chunk by scope and category."""
+    ok = result[result['error'] == '']
+    return {
+        'rows': len(result),
+        'errors': len(result) - len(ok),
+        'scopes': {int(k): float(v) for k, v in ok.groupby('scope')['calculated_emissions_kg'].sum().items()},
+        'categories': {str(k): float(v) for k, v in ok.groupby('category')['calculated_emissions_kg'].sum().items()},
+    }
+
+
+def merge_totals(totals, part):
+    """Adds chunk totals into running totals (in place)."""
+    totals['rows'] += part['rows']
+    totals['errors'] += part['errors']
+    for field in ('scopes', 'categories'):
+        for key, value in part[field].items():
+            totals[field][key] = totals[field].get(key, 0.0) + value
+
+
+# --- Files ---
+
+def iter_activity_chunks(path, chunk_rows):
+    """
+    Reads an activity file in chunks, keeping every cell as text.
+
+    Args:
+        path (str): A `.csv`, `.xlsx` or `.xls` file (Excel needs `openpyxl`/`xlrd`).
+        chunk_rows (int): Rows per chunk.
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows, encoding='utf-8-sig')
+    if extension in ('.xlsx', '.xls'):
+        try:
+            df = pd.read_excel(path, dtype=str, keep_default_na=False)
+        except ImportError as e:
+            raise ValueError(f'Reading Excel files needs an optional package: {e}')
+        return (df.iloc[start:start + chunk_rows].copy() for start in range(0, len(df), chunk_rows))
+    raise ValueError(f"Unsupported activity file format '{extension}'. Use .csv or .xlsx.")
+
+
+def calculate_files(paths, output, catalogue, workers=None, chunk_rows=50000, max_pending=None):
+    """
+    Calculates every row of the activity files and writes the results as CSV.
+
+    Args:
+        paths (list[str]): Activity files.
+        output (str): The results file.
+        catalogue (OfflineCatalogue): The factors.
+        workers (int): Worker processes (default: CPU count); 0 or 1
+            calculates in this process.
+        chunk_rows (int): Rows per chunk.
+        max_pending (int): Chunks read ahead of the writer (default:
+            twice the workers), which bounds memory.
+
+    Returns:
+        dict: Row, error and emission totals (overall, by scope and by
+        category), the elapsed seconds and the throughput.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    max_pending = max_pending or 2 * max(workers, 1)
+    totals = {'rows': 0, 'errors': 0, 'scopes': {}, 'categories': {}}
+    started = time.perf_counter()
+
+    def chunks():
+        for path in paths:
+            for chunk in iter_activity_chunks(path, chunk_rows):
+                if len(paths) > 1:
+                    chunk.insert(0, 'source_file', os.path.basename(path))
+                yield chunk
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(catalogue,)
+    ) if workers > 1 else None
+    header = True
+    try:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            pending = deque()
+
+            def write_next():
+                nonlocal header
+                result, part = pending.popleft().result() if pool else pending.popleft()
+                result.to_csv(f, header=header, index=False)
+                header = False
+                merge_totals(totals, part)
+
+            for chunk in chunks():
+                pending.append(pool.submit(calculate_chunk, chunk) if pool else calculate_chunk(chunk, catalogue))
+                if len(pending) >= max_pending:
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    totals['scopes'] = {str(scope): value for scope, value in sorted(totals['scopes'].items())}
+    totals['categories'] = dict(sorted(totals['categories'].items()))
+    totals['total_emissions_kg'] = sum(totals['scopes'].values())
+    totals['seconds'] = round(seconds, 3)
+    totals['rows_per_second'] = round(totals['rows'] / seconds, 1) if seconds else None
+    return totals
+
+
+@click.command(name='calculate_files')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--factors', type=click.Path(exists=True, dir_okay=False),
+              help='Factor catalogue (.csv, .json, .jsonl); default: the built-in seed catalogue.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Results CSV (default: <first file>.results.csv).')
+@click.option('--totals', 'totals_path', type=click.Path(dir_okay=False), help='Also write the totals as JSON.')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count; 1: no pool).')
+@click.option('--chunk-rows', type=int, default=50000, show_default=True, help='Rows per chunk.')
+def calculate_files_command(paths, factors, output, totals_path, workers, chunk_rows):
+    """
+    Calculates emissions for activity files without using the database.
+
+    Each row needs activity_value, activity_unit and factor_id or
+    factor_name (optionally factor_source). Results keep the input
+    columns and add the calculation; totals are printed by scope.
+    """
+    output = output or f'{os.path.splitext(paths[0])[0]}.results.csv'
+    try:
+        catalogue = OfflineCatalogue.load(factors)
+        totals = calculate_files(list(paths), output, catalogue, workers=workers, chunk_rows=chunk_rows)
+    except ValueError as e:
+        click.echo(f'Error: {str(e)}')
+        raise SystemExit(1)
+
+    click.echo(
+        f"Calculated {totals['rows']:,} rows in {totals['seconds']:.2f}s "
+        f"({totals['rows_per_second'] or 0:,.0f} rows/s) using {len(catalogue.factors)} factors; "
+        f"{totals['errors']:,} rows with errors."
+    )
+    for scope, value in totals['scopes'].items():
+        click.echo(f'  Scope {scope}: {value:,.2f} kg CO2e')
+    click.echo(f"  Total:   {totals['total_emissions_kg']:,.2f} kg CO2e")
+    click.echo(f'Results written to {output}')
+    if totals_path:
+        with open(totals_path, 'w') as f:
+            json.dump(totals, f, indent=2)
+        click.echo(f'Totals written to {totals_path}')
+
+
+if __name__ == '__main__':
+    calculate_files_command()
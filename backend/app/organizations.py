@@ -0,0 +1,91 @@
+"""
+Organization Membership.
+
+Organization rollups (`GET /api/organization/summary`) cover the users
+of one `Organization`. Membership is granted by an operator with
+`flask add_org_member` and revoked with `flask remove_org_member`; the
+`company_name` users type in at registration is only a label, so
+claiming another company's name grants no access to its totals.
+"""
+
+import click
+from sqlalchemy import select
+from . import db
+from .models import Organization, User
+
+
+def add_member(email, organization_name):
+    """
+    Makes a user a member of an organization, creating it if needed.
+
+    A user belongs to at most one organization; an existing membership
+    is replaced.
+
+    Args:
+        email (str): The user's email.
+        organization_name (str): The organization.
+
+    Returns:
+        Organization: The organization joined.
+
+    Raises:
+        ValueError: If no user has this email.
+    """
+    user = db.session.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    if user is None:
+        raise ValueError(f"No user with email '{email}'.")
+    organization = db.session.execute(
+        select(Organization).where(Organization.name == organization_name)
+    ).scalar_one_or_none()
+    if organization is None:
+        organization = Organization(name=organization_name)
+        db.session.add(organization)
+        db.session.flush()
+    user.organization_id = organization.id
+    db.session.commit()
+    return organization
+
+
+def remove_member(email):
+    """
+    Removes a user from their organization.
+
+    Returns:
+        bool: False if the user was not a member of any.
+
+    Raises:
+        ValueError: If no user has this email.
+    """
+    user = db.session.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    if user is None:
+        raise ValueError(f"No user with email '{email}'.")
+    if user.organization_id is None:
+        return False
+    user.organization_id = None
+    db.session.commit()
+    return True
+
+
+@click.command(name='add_org_member')
+@click.argument('email')
+@click.argument('organization')
+def add_org_member_command(email, organization):
+    """Grants a user access to an organization's rollup."""
+    try:
+        add_member(email, organization)
+    except ValueError as e:
+        click.echo(f'Error adding member: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f"Added {email} to '{organization}'.")
+
+
+@click.command(name='remove_org_member')
+@click.argument('email')
+def remove_org_member_command(email):
+    """Revokes a user's organization membership."""
+    try:
+        removed = remove_member(email)
+    except ValueError as e:
+        click.echo(f'Error removing member: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Removed {email} from their organization.' if removed else f'{email} is not in an organization.')
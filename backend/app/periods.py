@@ -0,0 +1,197 @@
+"""
+Reporting Periods.
+
+This file turns batch report requests into concrete date ranges. A
+request can list explicit periods, name generators that expand a fiscal
+year into its months, quarters and/or the full year, or both. It also
+derives the comparison periods used by the period-over-period endpoint.
+
+Fiscal years are named after the calendar year in which they end, so
+with `fiscal_year_start_month=4` FY2025 runs from 2024-04-01 to
+2025-03-31. With the default start month (1) a fiscal year is simply the
+calendar year.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+Period = namedtuple('Period', ['report_name', 'start_date', 'end_date'])
+
+GENERATORS = ('monthly', 'quarterly', 'annual')
+
+COMPARISON_PRESETS = ('previous_period', 'previous_year')
+
+# Upper bound on the number of periods one comparison may include
+MAX_COMPARISON_PERIODS = 12
+
+# Upper bound on the number of reports one batch request may create
+MAX_BATCH_PERIODS = 120
+
+# Upper bound on the days between a batch's first and last day: the batch
+# is computed on a daily grid over that span (about ten years)
+MAX_BATCH_SPAN_DAYS = 3660
+
+
+def _add_months(year, month, months):
+    """Returns the (year, month) that is `months` after (year, month)."""
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def _month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_months(day, months):
+    """Moves a date by whole months, clamping to the end of shorter months."""
+    year, month = _add_months(day.year, day.month, months)
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def previous_period(start_date, end_date):
+    """
+    Returns the period immediately before a range.
+
+    Ranges made of whole calendar months are shifted by that many months
+    (so February compares with January); other ranges by their length.
+    """
+    if start_date.day == 1 and end_date == _month_end(end_date.year, end_date.month):
+        months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+        year, month = _add_months(end_date.year, end_date.month, -months)
+        return _shift_months(start_date, -months), _month_end(year, month)
+    length = end_date - start_date + timedelta(days=1)
+    return start_date - length, end_date - length
+
+
+def previous_year(start_date, end_date):
+    """Returns the same range one year earlier."""
+    start = _shift_months(start_date, -12)
+    if end_date == _month_end(end_date.year, end_date.month):
+        return start, _month_end(end_date.year - 1, end_date.month)
+    return start, _shift_months(end_date, -12)
+
+
+def comparison_periods(start_date, end_date, presets=(), ranges=()):
+    """
+    Builds the comparison periods for a base range.
+
+    Args:
+        start_date (date): Start of the base period.
+        end_date (date): End of the base period.
+        presets (Iterable[str]): Any of 'previous_period', 'previous_year'.
+        ranges (Iterable[str]): Explicit ranges as 'YYYY-MM-DD:YYYY-MM-DD'.
+
+    Returns:
+        list[tuple[date, date]]: The comparison periods, presets first.
+
+    Raises:
+        ValueError: If a preset or range is invalid, or none is given.
+    """
+    periods = []
+    for preset in presets:
+        if preset == 'previous_period':
+            periods.append(previous_period(start_date, end_date))
+        elif preset == 'previous_year':
+            periods.append(previous_year(start_date, end_date))
+        else:
+            raise ValueError(f"Unknown comparison '{preset}'. Use {', '.join(COMPARISON_PRESETS)}.")
+    for text in ranges:
+        first, _, last = text.partition(':')
+        start, end = datetime.fromisoformat(first).date(), datetime.fromisoformat(last).date()
+        if end < start:
+            raise ValueError(f"Comparison period '{text}' ends before it starts.")
+        periods.append((start, end))
+    if not periods:
+        raise ValueError('Provide at least one comparison period.')
+    return periods
+
+
+def fiscal_year_periods(fiscal_year, generators, start_month=1, name_prefix=None):
+    """
+    Expands a fiscal year into monthly, quarterly and/or annual periods.
+
+    Args:
+        fiscal_year (int): The fiscal year (named by the year it ends in).
+        generators (Iterable[str]): Any of 'monthly', 'quarterly', 'annual'.
+        start_month (int): The first month (1-12) of the fiscal year.
+        name_prefix (str): Prefix for report names (default "FY<year>").
+
+    Returns:
+        list[Period]: The periods, months first, then quarters, then the year.
+
+    Raises:
+        ValueError: If a generator or the start month is invalid.
+    """
+    unknown = [g for g in generators if g not in GENERATORS]
+    if unknown:
+        raise ValueError(f"Unknown period generator(s): {', '.join(unknown)}. Use {', '.join(GENERATORS)}.")
+    if not 1 <= start_month <= 12:
+        raise ValueError('fiscal_year_start_month must be between 1 and 12.')
+
+    prefix = name_prefix or f'FY{fiscal_year}'
+    first_year = fiscal_year if start_month == 1 else fiscal_year - 1
+    months = [_add_months(first_year, start_month, offset) for offset in range(12)]
+
+    periods = []
+    if 'monthly' in generators:
+        for year, month in months:
+            periods.append(Period(
+                f'{prefix} {calendar.month_abbr[month]} {year}',
+                date(year, month, 1), _month_end(year, month)
+            ))
+    if 'quarterly' in generators:
+        for quarter in range(4):
+            (y1, m1), (y2, m2) = months[quarter * 3], months[quarter * 3 + 2]
+            periods.append(Period(f'{prefix} Q{quarter + 1}', date(y1, m1, 1), _month_end(y2, m2)))
+    if 'annual' in generators:
+        (y1, m1), (y2, m2) = months[0], months[-1]
+        periods.append(Period(prefix, date(y1, m1, 1), _month_end(y2, m2)))
+    return periods
+
+
+def parse_batch_periods(data):
+    """
+    Builds the list of periods from a batch report payload.
+
+    Args:
+        data (dict): The request body. Supports `periods` (a list of
+            {report_name, start_date, end_date}) and/or `fiscal_year` with
+            `generate` (a list of generators), `fiscal_year_start_month`
+            and `name_prefix`.
+
+    Returns:
+        list[Period]: The requested periods.
+
+    Raises:
+        ValueError: If the payload is malformed, requests too many periods
+            or spans too many days.
+    """
+    periods = []
+    for item in data.get('periods') or []:
+        if not isinstance(item, dict) or not all(k in item for k in Period._fields):
+            raise ValueError('Each period needs report_name, start_date and end_date.')
+        start_date = datetime.fromisoformat(item['start_date']).date()
+        end_date = datetime.fromisoformat(item['end_date']).date()
+        if end_date < start_date:
+            raise ValueError(f"Period '{item['report_name']}' ends before it starts.")
+        periods.append(Period(item['report_name'], start_date, end_date))
+
+    if data.get('fiscal_year') is not None:
+        generators = data.get('generate') or list(GENERATORS)
+        if isinstance(generators, str):
+            generators = [generators]
+        periods.extend(fiscal_year_periods(
+            int(data['fiscal_year']), generators,
+            start_month=int(data.get('fiscal_year_start_month', 1)),
+            name_prefix=data.get('name_prefix')
+        ))
+
+    if not periods:
+        raise ValueError('Provide a list of periods or a fiscal_year to generate them from.')
+    if len(periods) > MAX_BATCH_PERIODS:
+        raise ValueError(f'A batch may contain at most {MAX_BATCH_PERIODS} periods.')
+    span = (max(p.end_date for p in periods) - min(p.start_date for p in periods)).days + 1
+    if span > MAX_BATCH_SPAN_DAYS:
+        raise ValueError(f'A batch may span at most {MAX_BATCH_SPAN_DAYS} days ({span} requested).')
+    return periods
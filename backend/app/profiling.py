@@ -0,0 +1,272 @@
+"""
+On-Demand Request Profiling.
+
+Profiles single requests in production, so a slow request reported by a
+tenant can be analysed without reproducing it. A request is profiled when:
+
+- It carries `X-Profile-Token` equal to `PROFILING_TOKEN` (admins only;
+  the header trigger is disabled while the token is unset), or
+- It is picked at random with probability `PROFILING_SAMPLE_RATE`.
+
+For each profiled request the following are written to `PROFILING_DIR`:
+
+- `<id>.prof`: the cProfile statistics in the standard `pstats` format
+  (open with `python -m pstats`, snakeviz, etc.).
+- `<id>.json`: request details, the time spent in SQL (driver execution
+  and SQLAlchemy), Pint conversions, pandas/numpy and JSON serialization,
+  and the top allocation sites from tracemalloc.
+
+Only the newest `PROFILING_MAX_FILES` profiles are kept. They are listed
+by `GET /api/profiles` and downloaded from `GET /api/profiles/<id>`,
+both of which also require the profiling token.
+
+The breakdown is approximate: a category's time is the cumulative time of
+calls entering it from outside, measured under cProfile's overhead.
+tracemalloc tracks the whole process, so allocations of concurrent
+requests in other threads are included.
+"""
+
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from flask import Blueprint, current_app, g, jsonify, request, send_from_directory
+from .auth import decode_auth_token
+from .metrics import current_sql_stats
+
+PROFILE_HEADER = 'X-Profile-Token'
+# Query parameters whose values are not written to profiles
+REDACTED_QUERY_PARAMETERS = {'ticket', 'access_token', 'token'}
+
+# Function locations (file path or built-in name) -> breakdown category
+CATEGORIES = (
+    ('sql', ('/sqlalchemy/', 'sqlite3', 'psycopg2')),
+    ('pint', ('/pint/',)),
+    ('pandas', ('/pandas/', '/numpy/')),
+    ('serialization', ('/json/', '/flask/json/', '_json.')),
+)
+
+profiles = Blueprint('profiles', __name__)
+
+# tracemalloc is process-wide; it runs while any profiled request does
+_tracing_lock = threading.Lock()
+_tracing_requests = 0
+
+
+def _category(function):
+    filename, _, name = function
+    location = filename if filename != '~' else name
+    for category, markers in CATEGORIES:
+        if any(marker in location for marker in markers):
+            return category
+    return None
+
+
+def time_breakdown(stats):
+    """
+    Splits profiled time into categories.
+
+    Args:
+        stats (pstats.Stats): The request's profile.
+
+    Returns:
+        dict: Seconds per category.
+    """
+    totals = {category: 0.0 for category, _ in CATEGORIES}
+    categories = {function: _category(function) for function in stats.stats}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        category = categories[function]
+        if category is None:
+            continue
+        for caller, caller_stats in callers.items():
+            if categories.get(caller) != category:
+                totals[category] += caller_stats[3]
+    return totals
+
+
+def _start_tracing(frames):
+    global _tracing_requests
+    with _tracing_lock:
+        if _tracing_requests == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _tracing_requests += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracing(before, top_n):
+    global _tracing_requests
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    with _tracing_lock:
+        _tracing_requests -= 1
+        if _tracing_requests == 0:
+            tracemalloc.stop()
+    top = [
+        {
+            'location': str(diff.traceback),
+            'size_kb': round(diff.size_diff / 1024, 1),
+            'count': diff.count_diff,
+        }
+        for diff in after.compare_to(before, 'lineno')[:top_n]
+        if diff.size_diff > 0
+    ]
+    return top, peak
+
+
+def _has_profiling_token():
+    token = current_app.config.get('PROFILING_TOKEN')
+    supplied = request.headers.get(PROFILE_HEADER)
+    return bool(token) and supplied is not None and hmac.compare_digest(supplied, token)
+
+
+def _should_profile():
+    if request.blueprint == 'profiles' or request.endpoint in (None, 'metrics.expose_metrics'):
+        return False
+    if _has_profiling_token():
+        return True
+    rate = current_app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _logged_path():
+    """The request path and query, without credentials (e.g. stream tickets)."""
+    args = [
+        (name, '[redacted]' if name in REDACTED_QUERY_PARAMETERS else value)
+        for name, value in request.args.items(multi=True)
+    ]
+    return f'{request.path}?{urlencode(args)}' if args else request.path
+
+
+def _user_id():
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        user_id = decode_auth_token(auth_header.split(' ')[1])
+        if not isinstance(user_id, str):
+            return user_id
+    return None
+
+
+# --- Request Hooks ---
+
+def _start_profile():
+    if not _should_profile():
+        return
+    g.profile_started = time.perf_counter()
+    g.profile_snapshot = _start_tracing(current_app.config.get('PROFILING_TRACEMALLOC_FRAMES', 1))
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    duration = time.perf_counter() - g.pop('profile_started')
+    top_allocations, peak = _stop_tracing(
+        g.pop('profile_snapshot'), current_app.config.get('PROFILING_TOP_N', 25)
+    )
+
+    try:
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        directory = current_app.config['PROFILING_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+
+        stats = pstats.Stats(profiler)
+        breakdown = time_breakdown(stats)
+        sql = current_sql_stats()
+        breakdown['sql_execute'] = sql.duration if sql is not None else 0.0
+        summary = {
+            'id': profile_id,
+            'method': request.method,
+            'path': _logged_path(),
+            'endpoint': request.endpoint,
+            'user_id': _user_id(),
+            'status': response.status_code,
+            'triggered_by': 'header' if _has_profiling_token() else 'sampling',
+            'duration_seconds': duration,
+            'profiled_seconds': stats.total_tt,
+            'sql_statements': sql.count if sql is not None else 0,
+            'breakdown_seconds': breakdown,
+            'peak_traced_kb': round(peak / 1024, 1),
+            'top_allocations': top_allocations,
+        }
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        _rotate(directory, current_app.config.get('PROFILING_MAX_FILES', 200))
+        response.headers['X-Profile-Id'] = profile_id
+    except OSError:
+        current_app.logger.exception('Could not write request profile')
+    return response
+
+
+def _rotate(directory, max_profiles):
+    """Deletes the oldest profiles beyond `max_profiles`."""
+    summaries = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in summaries[:max(len(summaries) - max_profiles, 0)]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, name[:-len('.json')] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+# --- Index Endpoints ---
+
+@profiles.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """
+    Lists the stored profiles, newest first (summaries without the
+    allocation details).
+    """
+    if not _has_profiling_token():
+        return jsonify({'message': 'Profiling token required.'}), 403
+
+    directory = current_app.config['PROFILING_DIR']
+    names = sorted(
+        (name for name in os.listdir(directory) if name.endswith('.json')), reverse=True
+    ) if os.path.isdir(directory) else []
+    summaries = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary.pop('top_allocations', None)
+        summaries.append(summary)
+    return jsonify(summaries), 200
+
+
+@profiles.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Returns one profile's summary, or its pstats file with `?format=prof`.
+    """
+    if not _has_profiling_token():
+        return jsonify({'message': 'Profiling token required.'}), 403
+
+    suffix = '.prof' if request.args.get('format') == 'prof' else '.json'
+    return send_from_directory(
+        current_app.config['PROFILING_DIR'], f'{profile_id}{suffix}',
+        as_attachment=suffix == '.prof'
+    )
+
+
+def init_profiling(app):
+    """
+    Installs the profiling hooks and index endpoints. Call it before the
+    other instrumentation so the profile covers their hooks too.
+    """
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.register_blueprint(profiles)
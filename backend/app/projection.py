@@ -0,0 +1,184 @@
+"""
+Sparse Fieldsets and Pagination for List Endpoints.
+
+List endpoints accept `fields` (a comma-separated list of the item keys
+wanted, e.g. `fields=id,report_name,total_all_scopes_kg`) and `page` /
+`per_page`. Every endpoint describes its items once, as a mapping of
+item key to `Field`: the SQL expression, how to serialize its value and
+the join it needs. So:
+
+- Only the requested columns are selected, as plain rows; no ORM object
+  is loaded and `to_dict()` is not called.
+- A join (e.g. to `emission_factors` for an input's factor name) is only
+  added when a requested field needs it.
+- `id` is always returned, so clients can still address the items.
+
+Without `fields` every field is returned, in the same shape as the
+model's `to_dict()`.
+"""
+
+import math
+from collections import namedtuple
+from sqlalchemy import func, select
+from . import db
+from .models import EmissionFactor, GridIntensityProfile, ReadingBlock, Report, ReportSchedule, UserInput
+
+# `join` is a (target, onclause) pair, or None for a column of the listed table
+Field = namedtuple('Field', ['column', 'serialize', 'join'], defaults=[None, None])
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+FACTOR_JOIN = (EmissionFactor, UserInput.factor_id == EmissionFactor.id)
+
+INPUT_FIELDS = {
+    'id': Field(UserInput.id),
+    'user_id': Field(UserInput.user_id),
+    'factor_id': Field(UserInput.factor_id),
+    'factor_name': Field(EmissionFactor.name, join=FACTOR_JOIN),
+    'scope': Field(EmissionFactor.scope, join=FACTOR_JOIN),
+    'activity_value': Field(UserInput.activity_value),
+    'activity_unit': Field(UserInput.activity_unit),
+    'date_period_start': Field(UserInput.date_period_start, isoformat),
+    'date_period_end': Field(UserInput.date_period_end, isoformat),
+    'calculated_emissions_kg': Field(UserInput.calculated_emissions_kg),
+    'created_at': Field(UserInput.created_at, isoformat),
+}
+
+REPORT_FIELDS = {
+    'id': Field(Report.id),
+    'report_name': Field(Report.report_name),
+    'start_date': Field(Report.start_date, isoformat),
+    'end_date': Field(Report.end_date, isoformat),
+    'total_scope1_kg': Field(Report.total_scope1_kg),
+    'total_scope2_kg': Field(Report.total_scope2_kg),
+    'total_scope3_kg': Field(Report.total_scope3_kg),
+    'total_all_scopes_kg': Field(Report.total_all_scopes_kg),
+    'generated_at': Field(Report.generated_at, isoformat),
+}
+
+READING_BLOCK_FIELDS = {
+    'id': Field(ReadingBlock.id),
+    'series_key': Field(ReadingBlock.series_key),
+    'factor_id': Field(ReadingBlock.factor_id),
+    'block_start': Field(ReadingBlock.block_start, isoformat),
+    'block_end': Field(ReadingBlock.block_end, isoformat),
+    'resolution_minutes': Field(ReadingBlock.resolution_minutes),
+    'unit': Field(ReadingBlock.unit),
+    'reading_count': Field(ReadingBlock.reading_count),
+    'total_activity': Field(ReadingBlock.total_activity),
+    'total_emissions_kg': Field(ReadingBlock.total_emissions_kg),
+}
+
+SCHEDULE_FIELDS = {
+    'id': Field(ReportSchedule.id),
+    'name': Field(ReportSchedule.name),
+    'cron': Field(ReportSchedule.cron),
+    'period': Field(ReportSchedule.period),
+    'name_template': Field(ReportSchedule.name_template),
+    'enabled': Field(ReportSchedule.enabled),
+    'last_due_at': Field(ReportSchedule.last_due_at, isoformat),
+}
+
+GRID_PROFILE_FIELDS = {
+    'id': Field(GridIntensityProfile.id),
+    'region': Field(GridIntensityProfile.region),
+    'year': Field(GridIntensityProfile.year),
+    'basis': Field(GridIntensityProfile.basis),
+    # The hourly values are float32; only their length is read
+    'hours': Field(func.length(GridIntensityProfile.values), lambda size: size // 4),
+    'source': Field(GridIntensityProfile.source),
+}
+
+
+def parse_fields(args, fields):
+    """
+    Reads the `fields` query parameter.
+
+    Args:
+        args: The request's query parameters.
+        fields (dict): The endpoint's fields (e.g., `REPORT_FIELDS`).
+
+    Returns:
+        list[str]: The requested keys plus `id`, in the order of `fields`.
+
+    Raises:
+        ValueError: If a requested key is not one of `fields`.
+    """
+    requested = {name.strip() for name in args.get('fields', '').split(',') if name.strip()}
+    if not requested:
+        return list(fields)
+    unknown = requested - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(fields)}")
+    return [name for name in fields if name in requested or name == 'id']
+
+
+def parse_page(args, default_per_page=DEFAULT_PER_PAGE):
+    """
+    Reads `page` (from 1) and `per_page` (capped at `MAX_PER_PAGE`).
+
+    Returns:
+        tuple[int, int]: The page and page size.
+    """
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = min(max(args.get('per_page', default_per_page, type=int), 1), MAX_PER_PAGE)
+    return page, per_page
+
+
+def projected_page(fields, names, where, order_by, page, per_page):
+    """
+    Selects one page of the requested fields.
+
+    The page is read first; the total is only counted when the page is
+    full or not the first one (otherwise it is the page's length).
+
+    Args:
+        fields (dict): The endpoint's fields.
+        names (list[str]): The keys to return (see `parse_fields`).
+        where (list): Filter clauses.
+        order_by (list): Sort order; should end with a unique column.
+        page (int): The page, from 1.
+        per_page (int): The page size.
+
+    Returns:
+        tuple[list[dict], int]: The items and the total number of items.
+    """
+    selected = [fields[name] for name in names]
+    statement = select(*(field.column.label(name) for name, field in zip(names, selected)))
+    # Each join once, however many of its fields were requested
+    joins = {id(field.join): field.join for field in selected if field.join is not None}
+    for target, onclause in joins.values():
+        statement = statement.join(target, onclause)
+    rows = db.session.execute(
+        statement.where(*where).order_by(*order_by).limit(per_page).offset((page - 1) * per_page)
+    ).all()
+
+    items = [
+        {
+            name: field.serialize(value) if field.serialize and value is not None else value
+            for name, field, value in zip(names, selected, row)
+        }
+        for row in rows
+    ]
+    if page == 1 and len(rows) < per_page:
+        return items, len(rows)
+    # The filters name the listed table, so the count needs no join
+    table = fields['id'].column.table
+    total = db.session.execute(select(func.count()).select_from(table).where(*where)).scalar_one()
+    return items, total
+
+
+def page_response(key, items, total, page, per_page):
+    """The paginated response body shared by every list endpoint."""
+    return {
+        key: items,
+        'total_pages': math.ceil(total / per_page),
+        'current_page': page,
+        'total_items': total
+    }
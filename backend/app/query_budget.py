@@ -0,0 +1,108 @@
+"""
+Query Budgets and N+1 Detection.
+
+Routes declare how many SQL statements they are allowed to execute with
+the `@query_budget(n)` decorator. After each request the statements
+recorded by `metrics.py` are checked against that budget, and repeated
+statements that differ only in their parameters are flagged as a
+suspected N+1 pattern.
+
+Behaviour is controlled by `QUERY_BUDGET_MODE`:
+- 'off':   no checks (production default).
+- 'warn':  log a warning (development).
+- 'raise': raise `QueryBudgetExceeded` so the test fails (testing).
+"""
+
+import re
+from flask import current_app, request
+from .metrics import current_sql_stats
+
+# Collapses `IN (?, ?, ?)` style lists so that statements differing only
+# in the number of bound parameters are treated as the same statement.
+_PARAM_LIST_RE = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in 'raise' mode when a request breaks its query budget."""
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Decorator declaring the maximum number of SQL statements a route
+    may execute, including the user lookup done by `@token_required`.
+
+    Args:
+        max_queries (int): The statement budget for one request.
+    """
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+
+def normalize_statement(statement):
+    """
+    Reduces a SQL statement to a shape that ignores parameter values.
+    Statements are already parameterized, so only whitespace and
+    variable-length parameter lists need normalizing.
+    """
+    statement = _WHITESPACE_RE.sub(' ', statement.strip())
+    return _PARAM_LIST_RE.sub('(?)', statement)
+
+
+def find_repeated_statements(statements, threshold):
+    """
+    Groups executed statements by their normalized shape.
+
+    Args:
+        statements (Counter): Raw statement text -> execution count.
+        threshold (int): Minimum executions to be reported.
+
+    Returns:
+        dict: Normalized statement -> execution count, for every
+              statement executed at least `threshold` times.
+    """
+    shapes = {}
+    for statement, count in statements.items():
+        shape = normalize_statement(statement)
+        shapes[shape] = shapes.get(shape, 0) + count
+    return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+
+def _check_query_budget(response):
+    mode = current_app.config.get('QUERY_BUDGET_MODE', 'off')
+    stats = current_sql_stats()
+    if mode == 'off' or stats is None or request.endpoint is None:
+        return response
+
+    problems = []
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None and stats.count > budget:
+        problems.append(
+            f'{request.method} {request.path} executed {stats.count} SQL statements '
+            f'(budget: {budget}).'
+        )
+
+    threshold = current_app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 3)
+    for shape, count in find_repeated_statements(stats.statements, threshold).items():
+        problems.append(
+            f'Suspected N+1 in {request.method} {request.path}: '
+            f'statement executed {count} times: {shape}'
+        )
+
+    if problems:
+        message = '\n'.join(problems)
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+    return response
+
+
+def init_query_budget(app):
+    """Registers the post-request budget check on the app."""
+    app.after_request(_check_query_budget)
@@ -0,0 +1,287 @@
+"""
+Compact Reading Storage (Dense Time Series).
+
+This file stores high-frequency activity readings (e.g., 15-minute meter
+data) as `ReadingBlock` rows: one calendar month of one series per row,
+packed as a zlib-compressed float32 array indexed by interval. Each block
+has a fixed unit and emission factor and keeps its activity and emission
+totals, so a year of 15-minute readings is 12 rows instead of 35,040
+`user_inputs` rows.
+
+Queries use the stored totals for every block they cover completely and
+only load and decode `values` for blocks cut by a range boundary (see
+`block_contributions`), whose results feed the same report and dashboard
+aggregations as regular inputs.
+"""
+
+import calendar
+import zlib
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select, update
+from . import db
+from .digests import record_changes
+from .models import EmissionFactor, ReadingBlock
+from .utils import convert_units
+
+VALUE_DTYPE = np.dtype('<f4')
+
+# Supported interval lengths must divide a day evenly
+DEFAULT_RESOLUTION_MINUTES = 15
+
+
+def encode_values(values):
+    """Packs a block's readings (NaN for missing intervals)."""
+    return zlib.compress(np.asarray(values, dtype=VALUE_DTYPE).tobytes(), 6)
+
+
+def decode_values(blob):
+    """Unpacks a block's readings into a float32 array."""
+    return np.frombuffer(zlib.decompress(blob), dtype=VALUE_DTYPE)
+
+
+def _intervals_per_day(resolution_minutes):
+    if resolution_minutes <= 0 or 1440 % resolution_minutes:
+        raise ValueError('resolution_minutes must evenly divide a day (e.g., 5, 15, 30, 60).')
+    return 1440 // resolution_minutes
+
+
+def _month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+# --- Ingestion ---
+
+def store_readings(user_id, df, factor_id, unit='kWh', resolution_minutes=DEFAULT_RESOLUTION_MINUTES):
+    """
+    Packs readings into monthly blocks, merging them into existing blocks.
+    A later reading for the same interval replaces the earlier one.
+
+    Args:
+        user_id (int): The owning user's ID.
+        df (pandas.DataFrame): Readings with meter_id, timestamp (UTC) and
+            kwh columns (see `interval.read_readings`); `kwh` holds the
+            activity in `unit`.
+        factor_id (int): The emission factor applied to every reading.
+        unit (str): The unit of the readings.
+        resolution_minutes (int): The interval length.
+
+    Returns:
+        dict: Counts of readings, blocks created and blocks updated.
+
+    Raises:
+        ValueError: If the factor or unit is invalid.
+    """
+    if df.empty:
+        raise ValueError('No readings to store.')
+    per_day = _intervals_per_day(resolution_minutes)
+
+    factor = db.session.get(EmissionFactor, factor_id)
+    if factor is None:
+        raise ValueError('Emission factor not found.')
+    # kg CO2e per unit of reading, converted once for the whole upload
+    emissions_per_unit = factor.factor_value * convert_units(1.0, unit, factor.unit)
+
+    # 1. Assign every reading to a (series, month) block and an interval slot
+    timestamps = df['timestamp']
+    years = timestamps.dt.year.to_numpy()
+    months = timestamps.dt.month.to_numpy()
+    slots = (
+        (timestamps.dt.day.to_numpy() - 1) * per_day
+        + (timestamps.dt.hour.to_numpy() * 60 + timestamps.dt.minute.to_numpy()) // resolution_minutes
+    )
+    series_codes, series_keys = pd.factorize(df['meter_id'])
+    group = series_codes.astype(np.int64) * 1_000_000 + years * 12 + (months - 1)
+    order = np.argsort(group, kind='stable')
+    group, slots, activity = group[order], slots[order], df['kwh'].to_numpy()[order]
+    boundaries = np.flatnonzero(np.diff(group)) + 1
+
+    # 2. Load the blocks being merged into, in one query
+    block_keys = {}
+    for start in np.concatenate([[0], boundaries]):
+        key = int(group[start])
+        year, month = divmod(key % 1_000_000, 12)
+        block_keys[key] = (str(series_keys[key // 1_000_000]), date(year, month + 1, 1))
+
+    existing = {
+        (block.series_key, block.block_start): block
+        for block in db.session.execute(
+            select(ReadingBlock.id, ReadingBlock.series_key, ReadingBlock.block_start,
+                   ReadingBlock.resolution_minutes, ReadingBlock.total_emissions_kg,
+                   ReadingBlock.values).where(
+                ReadingBlock.user_id == user_id,
+                ReadingBlock.factor_id == factor_id,
+                ReadingBlock.series_key.in_({series for series, _ in block_keys.values()}),
+                ReadingBlock.block_start.in_({start for _, start in block_keys.values()})
+            )
+        )
+    }
+
+    # 3. Overlay the readings and recompute each block's totals
+    inserts, updates, digest_changes = [], [], []
+    for group_slots, group_activity, start in zip(
+        np.split(slots, boundaries), np.split(activity, boundaries), np.concatenate([[0], boundaries])
+    ):
+        series_key, block_start = block_keys[int(group[start])]
+        block_start, block_end = _month_bounds(block_start.year, block_start.month)
+        current = existing.get((series_key, block_start))
+        if current is not None and current.resolution_minutes != resolution_minutes:
+            raise ValueError(
+                f"Series '{series_key}' is stored at {current.resolution_minutes}-minute resolution."
+            )
+
+        values = (
+            decode_values(current.values).copy() if current is not None
+            else np.full(block_end.day * per_day, np.nan, dtype=VALUE_DTYPE)
+        )
+        values[group_slots] = group_activity
+        present = ~np.isnan(values)
+        total_activity = float(values[present].sum(dtype=np.float64))
+        row = {
+            'reading_count': int(present.sum()),
+            'total_activity': total_activity,
+            'total_emissions_kg': total_activity * emissions_per_unit,
+            'values': encode_values(values),
+        }
+        if current is not None:
+            updates.append({'id': current.id, **row})
+            digest_changes.append(
+                (user_id, block_start, 0, row['total_emissions_kg'] - current.total_emissions_kg, None)
+            )
+        else:
+            digest_changes.append((user_id, block_start, 1, row['total_emissions_kg'], None))
+            inserts.append({
+                'user_id': user_id, 'factor_id': factor_id, 'series_key': series_key,
+                'block_start': block_start, 'block_end': block_end,
+                'resolution_minutes': resolution_minutes, 'unit': unit, **row
+            })
+
+    try:
+        if inserts:
+            db.session.execute(insert(ReadingBlock), inserts)
+        if updates:
+            db.session.execute(update(ReadingBlock), updates)
+        record_changes(digest_changes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'readings': int(len(df)),
+        'blocks_created': len(inserts),
+        'blocks_updated': len(updates),
+    }
+
+
+# --- Queries ---
+
+def block_contributions(user_id, start_date, end_date, split_dates=()):
+    """
+    Returns the emissions of a user's reading blocks within a date range
+    as (day, scope, category, emissions_kg) tuples.
+
+    A block lying completely inside the range, and not cut by any of
+    `split_dates`, contributes its stored total on its first day. Only the
+    remaining blocks are loaded and decoded, and contribute one tuple per
+    day with readings.
+
+    Args:
+        user_id (int): The user's ID.
+        start_date (date): The start of the range (inclusive).
+        end_date (date): The end of the range (inclusive).
+        split_dates (Iterable[date]): Extra boundaries (first days of
+            periods) at which callers need exact per-day values.
+
+    Returns:
+        list[tuple]: The contributions.
+    """
+    blocks = db.session.execute(
+        select(
+            ReadingBlock.id, ReadingBlock.block_start, ReadingBlock.block_end,
+            ReadingBlock.resolution_minutes, ReadingBlock.total_activity,
+            ReadingBlock.total_emissions_kg, EmissionFactor.scope, EmissionFactor.category
+        ).join(
+            EmissionFactor, ReadingBlock.factor_id == EmissionFactor.id
+        ).where(
+            ReadingBlock.user_id == user_id,
+            ReadingBlock.block_start <= end_date,
+            ReadingBlock.block_end >= start_date
+        )
+    ).all()
+
+    split_dates = sorted(set(split_dates))
+    contributions, partial = [], []
+    for block in blocks:
+        inside = block.block_start >= start_date and block.block_end <= end_date
+        cut = any(block.block_start < day <= block.block_end for day in split_dates)
+        if inside and not cut:
+            contributions.append((block.block_start, block.scope, block.category, block.total_emissions_kg))
+        elif block.total_activity:
+            partial.append(block)
+
+    if partial:
+        # Decode only the blocks a boundary falls into
+        blobs = dict(db.session.execute(
+            select(ReadingBlock.id, ReadingBlock.values).where(
+                ReadingBlock.id.in_([block.id for block in partial])
+            )
+        ).all())
+        for block in partial:
+            per_unit = block.total_emissions_kg / block.total_activity
+            days = block.block_end.day
+            daily = np.nansum(decode_values(blobs[block.id]).reshape(days, -1), axis=1, dtype=np.float64)
+            first = max(block.block_start, start_date)
+            last = min(block.block_end, end_date)
+            for offset in range((first - block.block_start).days, (last - block.block_start).days + 1):
+                if daily[offset]:
+                    contributions.append((
+                        block.block_start + timedelta(days=offset), block.scope, block.category,
+                        float(daily[offset]) * per_unit
+                    ))
+    return contributions
+
+
+def block_user_scope_totals(first_user_id, last_user_id, start_date, end_date):
+    """
+    Emissions per user and scope of the reading blocks in a range made of
+    whole calendar months, for a range of user ids. Such a range never
+    cuts a block, so the stored totals are summed by the database.
+
+    Returns:
+        list[tuple[int, int, float]]: (user_id, scope, emissions_kg).
+    """
+    if start_date.day != 1 or (end_date + timedelta(days=1)).day != 1:
+        raise ValueError('block_user_scope_totals needs a range of whole months.')
+    return [
+        tuple(row) for row in db.session.execute(
+            select(
+                ReadingBlock.user_id, EmissionFactor.scope,
+                db.func.sum(ReadingBlock.total_emissions_kg)
+            ).join(
+                EmissionFactor, ReadingBlock.factor_id == EmissionFactor.id
+            ).where(
+                ReadingBlock.user_id.between(first_user_id, last_user_id),
+                ReadingBlock.block_start >= start_date,
+                ReadingBlock.block_end <= end_date
+            ).group_by(ReadingBlock.user_id, EmissionFactor.scope)
+        )
+    ]
+
+
+def block_readings(block):
+    """
+    Decodes one block into its readings.
+
+    Returns:
+        list[dict]: {timestamp, value} for every interval with a reading.
+    """
+    values = decode_values(block.values)
+    present = np.flatnonzero(~np.isnan(values))
+    first = pd.Timestamp(block.block_start, tz='UTC')
+    timestamps = first + pd.to_timedelta(present * block.resolution_minutes, unit='min')
+    return [
+        {'timestamp': ts.isoformat(), 'value': float(value)}
+        for ts, value in zip(timestamps, values[present])
+    ]
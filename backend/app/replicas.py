@@ -0,0 +1,241 @@
+"""
+Read-Replica Routing.
+
+This file provides a routing session that sends the queries of read-only
+routes to replica databases, while everything else (and every flush) goes
+to the primary database.
+
+- Replicas are configured as `SQLALCHEMY_BINDS` entries whose key starts
+  with `replica_` (see `config.py`).
+- Routes opt in with the `@read_replica` decorator.
+- After a successful write, the user is pinned to the primary for
+  `READ_YOUR_WRITES_SECONDS`, so they see their own writes. The pin is
+  kept per user id (from the bearer token) in a pin store: in-process by
+  default, or shared by every worker through Redis when
+  `READ_YOUR_WRITES_BACKEND_URL` is set. Browsers also get a cookie.
+- A replica that raises a connection-level error is taken out of rotation
+  for `REPLICA_RETRY_SECONDS`, and the failed request is re-run on the
+  primary.
+"""
+
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InterfaceError, OperationalError
+from .sharding import shard_bind
+
+REPLICA_BIND_PREFIX = 'replica_'
+PIN_COOKIE_NAME = 'ghg_pin_primary'
+
+# Engine id -> time.monotonic() at which the replica may be retried
+_unhealthy_until = {}
+
+
+def replica_engines(db):
+    """Returns the configured replica engines, ordered by bind key."""
+    return [
+        engine for key, engine in sorted(db.engines.items(), key=lambda item: str(item[0]))
+        if key is not None and key.startswith(REPLICA_BIND_PREFIX)
+    ]
+
+
+def _healthy_replicas(db):
+    now = time.monotonic()
+    return [
+        engine for engine in replica_engines(db)
+        if _unhealthy_until.get(id(engine), 0) <= now
+    ]
+
+
+class RoutingSession(Session):
+    """
+    A Flask-SQLAlchemy session that reads from a replica when the current
+    request has been routed to one. Flushes always use the primary.
+
+    Statements on per-user tables go to the selected shard first (see
+    `sharding.py`); replicas only serve the primary's data.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = shard_bind(mapper, clause)
+            if shard is not None:
+                return shard
+        if bind is None and not self._flushing and has_request_context() \
+                and g.get('db_role') == 'replica':
+            replicas = _healthy_replicas(self._db)
+            if replicas:
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# --- Failure Detection ---
+
+@event.listens_for(Engine, 'handle_error')
+def _mark_replica_failure(exception_context):
+    """
+    Takes a replica out of rotation after a connection-level error and
+    flags the current request so `@read_replica` re-runs it on the primary.
+    """
+    engine = exception_context.engine
+    if engine is None or not has_request_context() or g.get('db_role') != 'replica':
+        return
+
+    db = current_app.extensions['sqlalchemy']
+    if engine not in replica_engines(db):
+        return
+
+    if exception_context.is_disconnect or isinstance(
+        exception_context.sqlalchemy_exception, (OperationalError, InterfaceError)
+    ):
+        retry_after = current_app.config.get('REPLICA_RETRY_SECONDS', 30)
+        _unhealthy_until[id(engine)] = time.monotonic() + retry_after
+        g.replica_failed = True
+        current_app.logger.warning(
+            'Replica %s failed, falling back to primary: %s',
+            engine.url.render_as_string(hide_password=True),
+            exception_context.original_exception
+        )
+
+
+# --- Route Decorator ---
+
+def _request_user_id():
+    """The user id of the request's bearer token (no database lookup)."""
+    from .auth import decode_auth_token
+
+    parts = request.headers.get('Authorization', '').split(' ')
+    if len(parts) != 2:
+        return None
+    user_id = decode_auth_token(parts[1])
+    return None if isinstance(user_id, str) else user_id
+
+
+def _is_pinned_to_primary():
+    store = current_app.extensions.get('ghg_pin_store')
+    user_id = g.get('user_id') or _request_user_id()
+    if store is not None and user_id is not None and store.is_pinned(user_id):
+        return True
+    try:
+        pinned_until = float(request.cookies.get(PIN_COOKIE_NAME, 0))
+    except ValueError:
+        return False
+    return pinned_until > time.time()
+
+
+def read_replica(f):
+    """
+    Decorator routing a read-only endpoint to a replica.
+
+    Place it above `@token_required` so the user lookup is also served
+    by the replica. Falls back to the primary when no replica is
+    configured, the client is pinned, or the replica fails mid-request.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        from . import db
+
+        if not replica_engines(db) or _is_pinned_to_primary():
+            return f(*args, **kwargs)
+
+        g.db_role = 'replica'
+        try:
+            try:
+                response = f(*args, **kwargs)
+            except Exception:
+                if not g.get('replica_failed'):
+                    raise
+                response = None
+
+            if not g.pop('replica_failed', False):
+                return response
+
+            # The view may have swallowed the error; discard its result
+            # and run it again against the primary.
+            db.session.rollback()
+            g.db_role = 'primary'
+            return f(*args, **kwargs)
+        finally:
+            g.pop('db_role', None)
+
+    return decorated
+
+
+# --- Read-Your-Writes Pinning ---
+
+class LocalPinStore:
+    """Pins kept in this process (enough for a single worker)."""
+
+    # Expired pins are dropped once the store holds this many users
+    PRUNE_SIZE = 10000
+
+    def __init__(self):
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def pin(self, user_id, seconds):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) >= self.PRUNE_SIZE:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+            self._until[user_id] = now + seconds
+
+    def is_pinned(self, user_id):
+        return self._until.get(user_id, 0) > time.monotonic()
+
+
+class RedisPinStore:
+    """Pins shared by every worker, as Redis keys expiring with the pin."""
+
+    KEY_PREFIX = 'ghg:pin:'
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+
+    def pin(self, user_id, seconds):
+        try:
+            self._redis.set(f'{self.KEY_PREFIX}{user_id}', 1, px=int(seconds * 1000))
+        except self._errors:
+            current_app.logger.exception('Failed to pin user %s to the primary', user_id)
+
+    def is_pinned(self, user_id):
+        try:
+            return bool(self._redis.exists(f'{self.KEY_PREFIX}{user_id}'))
+        except self._errors:
+            # Reading from the primary is always correct, only slower
+            return True
+
+
+def _pin_after_write(response):
+    """
+    Pins the user (and the browser, through a cookie) to the primary
+    after a successful write, so their next reads are not served by a
+    replica that has not caught up yet.
+    """
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        if window > 0:
+            user_id = g.get('user_id')
+            if user_id is not None:
+                current_app.extensions['ghg_pin_store'].pin(user_id, window)
+            response.set_cookie(
+                PIN_COOKIE_NAME, str(time.time() + window),
+                max_age=window, httponly=True, samesite='Lax'
+            )
+    return response
+
+
+def init_replicas(app):
+    """Installs read-your-writes pinning when replicas are configured."""
+    if any(key.startswith(REPLICA_BIND_PREFIX) for key in app.config.get('SQLALCHEMY_BINDS', {})):
+        url = app.config.get('READ_YOUR_WRITES_BACKEND_URL')
+        app.extensions['ghg_pin_store'] = RedisPinStore(url) if url else LocalPinStore()
+        app.after_request(_pin_after_write)
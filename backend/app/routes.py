@@ -5,12 +5,31 @@ This file defines the RESTful API routes for the application, excluding auth rou
 All routes here are protected and require a valid JWT.
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from . import db
-from .models import EmissionFactor, UserInput, Report
+from .models import EmissionFactor, GridIntensityProfile, ReadingBlock, ReportSchedule, UserInput, Report
 from .auth import token_required
+from .query_budget import query_budget
+from .admission import cost_class
+from .replicas import read_replica
 from .services import CalculationService
+from .events import dashboard_channel, format_sse, get_broker, get_stream_slots, issue_stream_ticket
+from .factor_cache import bump_catalogue_version, get_factor_cache
+from .http_cache import is_not_modified, not_modified, with_cache_headers
+from .digests import find_stale_reports
+from .interval import import_interval_readings, read_readings, readings_from_records
+from .reading_blocks import DEFAULT_RESOLUTION_MINUTES, block_readings, store_readings
+from .periods import MAX_COMPARISON_PERIODS, comparison_periods, parse_batch_periods
+from .scheduler import create_schedule
+from .ingest_buffer import BufferFull, get_ingest_buffer, prefers_async
+from .sharding import replicate_catalogue
+from .projection import (
+    GRID_PROFILE_FIELDS, INPUT_FIELDS, READING_BLOCK_FIELDS, REPORT_FIELDS, SCHEDULE_FIELDS,
+    page_response, parse_fields, parse_page, projected_page
+)
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
 
 # Define the Blueprint for API routes
 api = Blueprint('api', __name__)
@@ -22,19 +41,53 @@ calc_service = CalculationService()
 # --- Emission Factor Routes ---
 
 @api.route('/factors', methods=['GET'])
+@query_budget(3)
+@read_replica
 @token_required
 def get_factors(current_user):
     """
     Get all available emission factors.
     Used to populate dropdowns in the frontend.
+    Served from the in-process factor cache.
     """
     try:
-        factors = EmissionFactor.query.order_by(EmissionFactor.category, EmissionFactor.name).all()
-        return jsonify([factor.to_dict() for factor in factors]), 200
+        catalogue = get_factor_cache().get()
+        # The catalogue version changes whenever a factor is added
+        etag = f'factors-v{catalogue.version}'
+        proxy_max_age = current_app.config['FACTORS_PROXY_MAX_AGE']
+        if is_not_modified(etag):
+            return not_modified(etag, proxy_max_age=proxy_max_age)
+        return with_cache_headers(jsonify(catalogue.factors), etag, proxy_max_age=proxy_max_age), 200
     except Exception as e:
         return jsonify({'message': f'Error fetching factors: {str(e)}'}), 500
 
+
+@api.route('/factors/search', methods=['GET'])
+@query_budget(3)
+@read_replica
+@token_required
+def search_factors(current_user):
+    """
+    Typeahead search over factor name, category, unit and source.
+
+    Query parameters:
+        q: Free text; every word must prefix a word of the factor.
+        scope: Optional scope filter (1, 2 or 3).
+        page, per_page: Pagination (per_page is capped at 100).
+    """
+    query = request.args.get('q', '', type=str)
+    scope = request.args.get('scope', None, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    try:
+        catalogue = get_factor_cache().get()
+        return jsonify(catalogue.index.search(query, scope=scope, page=page, per_page=per_page)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error searching factors: {str(e)}'}), 500
+
 @api.route('/factors', methods=['POST'])
+@query_budget(6)
 @token_required
 def add_factor(current_user):
     """
@@ -56,7 +109,10 @@ def add_factor(current_user):
             source=data.get('source')
         )
         db.session.add(new_factor)
+        bump_catalogue_version()
         db.session.commit()
+        replicate_catalogue()
+        get_factor_cache().invalidate()
         return jsonify(new_factor.to_dict()), 201
     except Exception as e:
         db.session.rollback()
@@ -66,11 +122,14 @@ def add_factor(current_user):
 # --- Data Input Routes ---
 
 @api.route('/inputs', methods=['POST'])
+@query_budget(7)
 @token_required
 def submit_input(current_user):
     """
     Submit a new activity input.
     This endpoint calls the CalculationService.
+    With `Prefer: respond-async` and write-behind ingestion enabled, the
+    input is buffered and committed shortly afterwards (202 Accepted).
     """
     data = request.get_json()
     
@@ -79,6 +138,29 @@ def submit_input(current_user):
     if not all(field in data for field in required_fields):
         return jsonify({'message': 'Missing required fields.'}), 400
 
+    buffer = get_ingest_buffer()
+    if buffer is not None and prefers_async(request):
+        try:
+            row = calc_service.prepare_input(data, current_user.id)
+            buffer.append(row)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        except BufferFull as e:
+            response = jsonify({'message': 'Too many inputs waiting to be saved. Please retry shortly.'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        response = jsonify({
+            'status': 'accepted',
+            'factor_id': row['factor_id'],
+            'scope': row['scope'],
+            'date_period_start': row['date_period_start'].isoformat(),
+            'calculated_emissions_kg': row['calculated_emissions_kg'],
+        })
+        response.status_code = 202
+        response.headers['Preference-Applied'] = 'respond-async'
+        return response
+
     try:
         # Use the service to handle calculation and saving
         new_input = calc_service.calculate_single_input(data, current_user.id)
@@ -91,30 +173,182 @@ def submit_input(current_user):
         return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
 
 
+@api.route('/meter-readings', methods=['POST'])
+@query_budget(9)
+@cost_class('expensive')
+@token_required
+def import_meter_readings(current_user):
+    """
+    Import interval (e.g., 15-minute) meter readings and calculate their
+    Scope 2 emissions with an hourly grid intensity profile.
+    Accepts a CSV upload (`file`, with meter_id, timestamp, kwh columns)
+    or a JSON body with a `readings` list; `region`, `factor_id` and the
+    optional `basis` come from the form or JSON body. Meter-months
+    imported before are replaced.
+    """
+    upload = request.files.get('file')
+    data = request.form if upload else (request.get_json(silent=True) or {})
+
+    if not data.get('region') or not data.get('factor_id'):
+        return jsonify({'message': 'region and factor_id are required.'}), 400
+
+    try:
+        if upload:
+            readings = read_readings(upload.stream)
+        else:
+            readings = readings_from_records(data.get('readings') or [])
+        result = import_interval_readings(
+            current_user.id, readings,
+            region=data['region'],
+            factor_id=int(data['factor_id']),
+            basis=data.get('basis', 'location')
+        )
+        return jsonify(result), 201
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception('Meter reading import failed')
+        return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+@api.route('/reading-blocks', methods=['POST'])
+@query_budget(5)
+@cost_class('expensive')
+@token_required
+def store_reading_blocks(current_user):
+    """
+    Store high-frequency readings in compact monthly blocks.
+    Accepts the same CSV upload or JSON `readings` list as
+    `/meter-readings`, plus `factor_id`, `unit` and `resolution_minutes`.
+    """
+    upload = request.files.get('file')
+    data = request.form if upload else (request.get_json(silent=True) or {})
+
+    if not data.get('factor_id'):
+        return jsonify({'message': 'factor_id is required.'}), 400
+
+    try:
+        readings = read_readings(upload.stream) if upload else readings_from_records(data.get('readings') or [])
+        result = store_readings(
+            current_user.id, readings,
+            factor_id=int(data['factor_id']),
+            unit=data.get('unit', 'kWh'),
+            resolution_minutes=int(data.get('resolution_minutes', DEFAULT_RESOLUTION_MINUTES))
+        )
+        return jsonify(result), 201
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception('Reading block import failed')
+        return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+@api.route('/reading-blocks', methods=['GET'])
+@query_budget(3)
+@read_replica
+@token_required
+def get_reading_blocks(current_user):
+    """
+    List the user's reading blocks (totals only, readings are not decoded).
+    Optional filters: `series_key`, `start_date`, `end_date`; supports
+    `fields`, `page` and `per_page` (see `projection.py`).
+    """
+    try:
+        where = [ReadingBlock.user_id == current_user.id]
+        if request.args.get('series_key'):
+            where.append(ReadingBlock.series_key == request.args['series_key'])
+        if request.args.get('start_date'):
+            where.append(ReadingBlock.block_end >= datetime.fromisoformat(request.args['start_date']).date())
+        if request.args.get('end_date'):
+            where.append(ReadingBlock.block_start <= datetime.fromisoformat(request.args['end_date']).date())
+    except ValueError as e:
+        return jsonify({'message': f'Date format error: {str(e)}. Please use YYYY-MM-DD.'}), 400
+
+    try:
+        names = parse_fields(request.args, READING_BLOCK_FIELDS)
+        page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        blocks, total = projected_page(
+            READING_BLOCK_FIELDS, names, where,
+            [ReadingBlock.series_key, ReadingBlock.block_start, ReadingBlock.id], page, per_page
+        )
+        return jsonify(page_response('reading_blocks', blocks, total, page, per_page)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching reading blocks: {str(e)}'}), 500
+
+
+@api.route('/reading-blocks/<int:block_id>/readings', methods=['GET'])
+@query_budget(2)
+@read_replica
+@token_required
+def get_block_readings(current_user, block_id):
+    """
+    Decode and return the individual readings of one block.
+    """
+    try:
+        block = ReadingBlock.query.options(undefer(ReadingBlock.values)).filter_by(
+            id=block_id, user_id=current_user.id
+        ).first()
+        if not block:
+            return jsonify({'message': 'Reading block not found or access denied.'}), 404
+        return jsonify({**block.to_dict(), 'readings': block_readings(block)}), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching readings: {str(e)}'}), 500
+
+
+@api.route('/grid-profiles', methods=['GET'])
+@query_budget(3)
+@read_replica
+@token_required
+def get_grid_profiles(current_user):
+    """
+    List the available hourly grid intensity profiles (without values).
+    Supports `fields`, `page` and `per_page` (see `projection.py`).
+    """
+    try:
+        names = parse_fields(request.args, GRID_PROFILE_FIELDS)
+        page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        profiles, total = projected_page(
+            GRID_PROFILE_FIELDS, names, [],
+            [GridIntensityProfile.region, GridIntensityProfile.year, GridIntensityProfile.basis,
+             GridIntensityProfile.id],
+            page, per_page
+        )
+        return jsonify(page_response('grid_profiles', profiles, total, page, per_page)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching grid profiles: {str(e)}'}), 500
+
+
 @api.route('/inputs', methods=['GET'])
+@query_budget(3)
+@read_replica
 @token_required
 def get_inputs(current_user):
     """
     Get historical user inputs, with pagination.
+    Supports `fields` (see `projection.py`); the factor is only joined
+    when `factor_name` or `scope` is requested.
     """
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    try:
+        names = parse_fields(request.args, INPUT_FIELDS)
+        page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     try:
-        inputs_pagination = UserInput.query.filter_by(
-            user_id=current_user.id
-        ).order_by(
-            UserInput.date_period_start.desc(), UserInput.created_at.desc()
-        ).paginate(
-            page=page, per_page=per_page, error_out=False
+        inputs, total = projected_page(
+            INPUT_FIELDS, names, [UserInput.user_id == current_user.id],
+            [UserInput.date_period_start.desc(), UserInput.created_at.desc(), UserInput.id.desc()],
+            page, per_page
         )
-        
-        return jsonify({
-            'inputs': [input_item.to_dict() for input_item in inputs_pagination.items],
-            'total_pages': inputs_pagination.pages,
-            'current_page': inputs_pagination.page,
-            'total_items': inputs_pagination.total
-        }), 200
+        return jsonify(page_response('inputs', inputs, total, page, per_page)), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching inputs: {str(e)}'}), 500
@@ -123,6 +357,9 @@ def get_inputs(current_user):
 # --- Reporting & Dashboard Routes ---
 
 @api.route('/dashboard/summary', methods=['GET'])
+@query_budget(5)
+@cost_class('moderate')
+@read_replica
 @token_required
 def get_dashboard_summary(current_user):
     """
@@ -135,7 +372,95 @@ def get_dashboard_summary(current_user):
         return jsonify({'message': f'Error fetching dashboard data: {str(e)}'}), 500
 
 
+@api.route('/organization/summary', methods=['GET'])
+@query_budget(5)
+@cost_class('moderate')
+@read_replica
+@token_required
+def get_organization_summary(current_user):
+    """
+    Scope totals across all members of the current user's organization,
+    gathered from every shard holding them. Only members granted by an
+    operator (see organizations.py) may read it.
+    """
+    if current_user.organization_id is None:
+        return jsonify({'message': 'You are not a member of an organization.'}), 403
+    try:
+        summary = calc_service.get_organization_summary(current_user.organization_id)
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching organization summary: {str(e)}'}), 500
+
+
+@api.route('/dashboard/stream-ticket', methods=['POST'])
+@query_budget(1)
+@token_required
+def create_stream_ticket(current_user):
+    """
+    Issues a single-use ticket for `GET /api/dashboard/stream?ticket=`.
+
+    EventSource cannot send the `Authorization` header; the ticket is
+    passed in the URL instead of the auth token, which would otherwise
+    end up in access logs.
+    """
+    return jsonify({
+        'ticket': issue_stream_ticket(current_user.id),
+        'expires_in': current_app.config.get('SSE_TICKET_SECONDS', 30)
+    }), 201
+
+
+@api.route('/dashboard/stream', methods=['GET'])
+@query_budget(1)
+@token_required
+def stream_dashboard_updates(current_user):
+    """
+    Server-Sent Events stream of incremental dashboard updates.
+
+    Pushes an `input_created` event (scope, month bucket and emissions
+    delta) whenever the user saves an input. The client applies the
+    deltas to the summary it already fetched instead of polling.
+    """
+    slots = get_stream_slots()
+    if not slots.acquire():
+        retry_after = current_app.config.get('SSE_RETRY_AFTER_SECONDS', 30)
+        return jsonify({'message': 'Too many live streams, please retry shortly.'}), 503, \
+            {'Retry-After': str(retry_after)}
+
+    try:
+        subscription = get_broker().subscribe(dashboard_channel(current_user.id))
+    except Exception:
+        slots.release()
+        raise
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+
+    # Idle streams must not hold a database connection
+    db.session.remove()
+
+    def event_stream():
+        try:
+            yield format_sse({'type': 'ready'}, event='ready')
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    # Comment line keeps proxies from closing the connection
+                    yield ': keep-alive\n\n'
+                else:
+                    yield format_sse(message, event=message['type'])
+        finally:
+            subscription.close()
+
+    response = Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs even when the client leaves before the first event
+    response.call_on_close(slots.release)
+    return response
+
+
 @api.route('/reports', methods=['POST'])
+@query_budget(8)
+@cost_class('expensive')
 @token_required
 def generate_report(current_user):
     """
@@ -143,25 +468,14 @@ def generate_report(current_user):
     """
     data = request.get_json()
 
-    # --- START OF DEBUGGING ---
-    print(f"\n--- GENERATE REPORT: RECEIVED DATA ---")
-    print(f"Data type: {type(data)}")
-    print(f"Data content: {data}")
-    print(f"----------------------------------------\n")
-    # --- END OF DEBUGGING ---
-
     # Basic validation
     required_fields = ['report_name', 'start_date', 'end_date']
     
     # Add a check for 'data' being None or not a dict
     if not isinstance(data, dict):
-        print("--- GENERATE REPORT: FAILED (data is not a dictionary) ---")
         return jsonify({'message': 'Invalid JSON payload received.'}), 400
         
     if not all(field in data for field in required_fields):
-        print(f"--- GENERATE REPORT: FAILED (Missing fields) ---")
-        print(f"Required: {required_fields}")
-        print(f"Got keys: {list(data.keys()) if data else 'None'}")
         return jsonify({'message': 'Missing required fields.'}), 400
 
     try:
@@ -175,55 +489,290 @@ def generate_report(current_user):
             start_date=start_date,
             end_date=end_date
         )
-        print("--- GENERATE REPORT: SUCCESS ---")
         return jsonify(new_report.to_dict()), 201
         
     except ValueError as e:
         # Catch date formatting errors
-        print(f"--- GENERATE REPORT: FAILED (Date format error) ---")
-        print(f"Error: {str(e)}")
+        current_app.logger.info('Report generation rejected: %s', e)
         return jsonify({'message': f'Date format error: {str(e)}. Please use YYYY-MM-DD.'}), 400
     except Exception as e:
-        print(f"--- GENERATE REPORT: FAILED (Unexpected error) ---")
-        print(f"Error: {str(e)}")
+        current_app.logger.exception('Report generation failed')
+        db.session.rollback()
+        return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
+
+
+@api.route('/reports/batch', methods=['POST'])
+@query_budget(7)
+@cost_class('expensive')
+@token_required
+def generate_reports_batch(current_user):
+    """
+    Generate several reports (e.g., every month, quarter and the full
+    fiscal year) in one pass over the data. See `periods.py` for the
+    accepted payload.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({'message': 'Invalid JSON payload received.'}), 400
+
+    try:
+        periods = parse_batch_periods(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': f'Invalid periods: {str(e)}'}), 400
+
+    try:
+        reports = calc_service.generate_reports_batch(current_user.id, periods)
+        return jsonify({'reports': [report.to_dict() for report in reports]}), 201
+    except Exception as e:
+        current_app.logger.exception('Batch report generation failed')
         db.session.rollback()
         return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
 
 
+def _parse_date_range(args):
+    """
+    Reads `start_date` and `end_date` (YYYY-MM-DD) from query parameters.
+
+    Raises:
+        ValueError: If either date is missing or malformed.
+    """
+    if not args.get('start_date') or not args.get('end_date'):
+        raise ValueError('start_date and end_date are required')
+    start_date = datetime.fromisoformat(args['start_date']).date()
+    end_date = datetime.fromisoformat(args['end_date']).date()
+    if end_date < start_date:
+        raise ValueError('end_date must not be before start_date')
+    return start_date, end_date
+
+
+@api.route('/report-schedules', methods=['POST'])
+@query_budget(3)
+@token_required
+def add_report_schedule(current_user):
+    """
+    Schedule automatic reports for the current user, e.g.
+    {"name": "Monthly", "cron": "0 2 1 * *", "period": "monthly"}.
+    Reports are generated by `flask run_schedules` (see `scheduler.py`).
+    """
+    data = request.get_json()
+    if not isinstance(data, dict) or not data.get('name') or not data.get('cron'):
+        return jsonify({'message': 'Missing required fields: name, cron'}), 400
+
+    try:
+        schedule = create_schedule(
+            data['name'], data['cron'], period=data.get('period', 'monthly'),
+            user_id=current_user.id, name_template=data.get('name_template')
+        )
+        return jsonify(schedule.to_dict()), 201
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error saving schedule: {str(e)}'}), 500
+
+
+@api.route('/report-schedules', methods=['GET'])
+@query_budget(3)
+@read_replica
+@token_required
+def get_report_schedules(current_user):
+    """
+    List the current user's report schedules.
+    Supports `fields`, `page` and `per_page` (see `projection.py`).
+    """
+    try:
+        names = parse_fields(request.args, SCHEDULE_FIELDS)
+        page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        schedules, total = projected_page(
+            SCHEDULE_FIELDS, names, [ReportSchedule.user_id == current_user.id],
+            [ReportSchedule.id], page, per_page
+        )
+        return jsonify(page_response('schedules', schedules, total, page, per_page)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching schedules: {str(e)}'}), 500
+
+
+@api.route('/reports/breakdown', methods=['GET'])
+@query_budget(5)
+@cost_class('moderate')
+@read_replica
+@token_required
+def get_report_breakdown(current_user):
+    """
+    Row-level breakdown of a date range: totals per scope and category,
+    summary statistics and approximate percentiles per input.
+    Rows are streamed in chunks, so memory use stays flat for any range.
+    """
+    try:
+        start_date, end_date = _parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': f'Date format error: {str(e)}. Please use YYYY-MM-DD.'}), 400
+
+    try:
+        breakdown = calc_service.get_report_breakdown(current_user.id, start_date, end_date)
+        return jsonify(breakdown), 200
+    except Exception as e:
+        return jsonify({'message': f'Error generating breakdown: {str(e)}'}), 500
+
+
+@api.route('/reports/stale', methods=['GET'])
+@query_budget(3)
+@cost_class('moderate')
+@read_replica
+@token_required
+def get_stale_reports(current_user):
+    """
+    List the user's reports whose source data changed after they were
+    generated, by comparing monthly digests (see `digests.py`).
+    """
+    try:
+        return jsonify(find_stale_reports(user_id=current_user.id)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error checking reports: {str(e)}'}), 500
+
+
+@api.route('/reports/compare', methods=['GET'])
+@query_budget(5)
+@cost_class('expensive')
+@read_replica
+@token_required
+def compare_periods(current_user):
+    """
+    Period-over-period totals and deltas per scope and category.
+    Takes the base period as `start_date`/`end_date` plus any number of
+    `compare=previous_period|previous_year` presets and/or
+    `range=YYYY-MM-DD:YYYY-MM-DD` comparison periods.
+    """
+    try:
+        start_date, end_date = _parse_date_range(request.args)
+        comparisons = comparison_periods(
+            start_date, end_date,
+            presets=request.args.getlist('compare'),
+            ranges=request.args.getlist('range')
+        )
+    except ValueError as e:
+        return jsonify({'message': f'Invalid periods: {str(e)}'}), 400
+    if len(comparisons) > MAX_COMPARISON_PERIODS:
+        return jsonify({'message': f'At most {MAX_COMPARISON_PERIODS} comparison periods are allowed.'}), 400
+
+    try:
+        comparison = calc_service.compare_periods(current_user.id, (start_date, end_date), comparisons)
+        return jsonify(comparison), 200
+    except Exception as e:
+        return jsonify({'message': f'Error comparing periods: {str(e)}'}), 500
+
+
+@api.route('/reports/details.csv', methods=['GET'])
+@query_budget(5)
+@cost_class('expensive')
+@read_replica
+@token_required
+def export_report_details(current_user):
+    """
+    Per-input detail report for a date range, streamed as CSV.
+    """
+    try:
+        start_date, end_date = _parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': f'Date format error: {str(e)}. Please use YYYY-MM-DD.'}), 400
+
+    rows = calc_service.iter_input_details_csv(current_user.id, start_date, end_date)
+    filename = f'emissions_{start_date.isoformat()}_{end_date.isoformat()}.csv'
+    return Response(stream_with_context(rows), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+
+@api.route('/analytics/range', methods=['GET'])
+@query_budget(7)
+@cost_class('moderate')
+@read_replica
+@token_required
+def get_range_summary(current_user):
+    """
+    Totals and category breakdown for an arbitrary date range.
+    Intended for interactive range sliders; see `analytics_cache.py`.
+    """
+    try:
+        start_date, end_date = _parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': f'Date format error: {str(e)}. Please use YYYY-MM-DD.'}), 400
+
+    try:
+        return jsonify(calc_service.get_range_summary(current_user.id, start_date, end_date)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching range summary: {str(e)}'}), 500
+
+
 @api.route('/reports', methods=['GET'])
+@query_budget(3)
+@read_replica
 @token_required
 def get_reports(current_user):
     """
-    Get a list of past generated reports.
+    Get a list of past generated reports, newest first, with pagination.
+    Supports `fields` (see `projection.py`).
     """
     try:
-        reports = Report.query.filter_by(
-            user_id=current_user.id
-        ).order_by(
-            Report.generated_at.desc()
-        ).all()
-        
-        return jsonify([report.to_dict() for report in reports]), 200
+        names = parse_fields(request.args, REPORT_FIELDS)
+        page, per_page = parse_page(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        reports, total = projected_page(
+            REPORT_FIELDS, names, [Report.user_id == current_user.id],
+            [Report.generated_at.desc(), Report.id.desc()], page, per_page
+        )
+        return jsonify(page_response('reports', reports, total, page, per_page)), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching reports: {str(e)}'}), 500
 
 
+def _report_etag(report_id, generated_at):
+    return f'report-{report_id}-{generated_at.strftime("%Y%m%d%H%M%S%f")}'
+
+
 @api.route('/reports/<int:report_id>', methods=['GET'])
+@query_budget(3)
+@read_replica
 @token_required
 def get_report_details(current_user, report_id):
     """
     Get details for a specific report.
+
+    Reports are immutable snapshots, so a client revalidating its copy
+    gets a 304 after a single-column lookup, without loading the report.
     """
     try:
+        max_age = current_app.config['REPORT_CACHE_MAX_AGE']
+        cache_control = f'private, max-age={max_age}, immutable'
+        if request.if_none_match or request.if_modified_since:
+            generated_at = db.session.execute(
+                select(Report.generated_at).where(Report.id == report_id, Report.user_id == current_user.id)
+            ).scalar()
+            if generated_at is None:
+                return jsonify({'message': 'Report not found or access denied.'}), 404
+            etag = _report_etag(report_id, generated_at)
+            if is_not_modified(etag, generated_at):
+                return not_modified(etag, generated_at, cache_control, max_age)
+
         report = Report.query.filter_by(
             id=report_id, user_id=current_user.id
         ).first()
         
         if not report:
             return jsonify({'message': 'Report not found or access denied.'}), 404
-            
-        return jsonify(report.to_dict()), 200
+
+        return with_cache_headers(
+            jsonify(report.to_dict()), _report_etag(report.id, report.generated_at),
+            report.generated_at, cache_control, max_age
+        ), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching report details: {str(e)}'}), 500
\ No newline at end of file
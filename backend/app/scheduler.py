@@ -0,0 +1,499 @@
+"""
+Scheduled Reports.
+
+This file generates reports automatically from `ReportSchedule` rows,
+each a cron expression (UTC) and the period to report on when it fires
+(the last complete month, quarter or year). `flask run_schedules` is
+meant to be called regularly (e.g., every few minutes from cron) and
+processes every occurrence that is due:
+
+- The users a run covers are split into id ranges ("partitions"), stored
+  as `ScheduleCheckpoint` rows when the run starts.
+- Each partition is one transaction: a grouped query over the monthly
+  allocations and one over the reading blocks give every user's scope
+  totals, and all reports are written with one multi-row INSERT that
+  commits together with the checkpoint. An interrupted run resumes with
+  the partitions that are not done.
+- Partitions are spread over a process pool; every worker builds its own
+  app and database connections. With shards, each partition is written
+  by every shard in parallel (see `sharding.py`).
+
+Only users with data in the period get a report.
+"""
+
+import calendar
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from . import db
+from .allocations import allocated_user_scope_totals
+from .digests import load_indexes
+from .models import ReportSchedule, Report, ScheduleCheckpoint, ScheduleRun, User
+from .periods import previous_period
+from .reading_blocks import block_user_scope_totals
+from .sharding import scatter_gather, sharding_enabled
+
+SCHEDULE_PERIODS = ('monthly', 'quarterly', 'annual')
+
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# (low, high) of the minute, hour, day-of-month, month and day-of-week fields
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# How far back to look for the latest occurrence (covers "0 0 29 2 *")
+MAX_LOOKBACK_DAYS = 8 * 366
+
+CronSpec = namedtuple('CronSpec', ['minutes', 'hours', 'days', 'months', 'weekdays', 'any_day', 'any_weekday'])
+
+
+# --- Cron Expressions ---
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        expression, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expression == '*':
+            first, last = low, high
+        elif '-' in expression:
+            first, last = (int(value) for value in expression.split('-', 1))
+        else:
+            first = int(expression)
+            last = high if step > 1 else first
+        if step < 1 or not low <= first <= last <= high:
+            raise ValueError(f"Invalid cron field '{text}' (allowed {low}-{high}).")
+        values.update(range(first, last + 1, step))
+    return frozenset(values)
+
+
+def parse_cron(expression):
+    """
+    Parses a five-field cron expression (minute hour day-of-month month
+    day-of-week) or an alias such as '@monthly'. Fields accept `*`,
+    numbers, ranges, lists and steps. As in cron, when both day fields
+    are restricted a day matches either of them.
+
+    Returns:
+        CronSpec: The allowed values of every field.
+
+    Raises:
+        ValueError: If the expression is malformed.
+    """
+    expression = CRON_ALIASES.get(expression.strip(), expression)
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError('A cron expression needs 5 fields: minute hour day-of-month month day-of-week.')
+    try:
+        minutes, hours, days, months, weekdays = (
+            _parse_field(text, low, high) for text, (low, high) in zip(fields, CRON_FIELDS)
+        )
+    except ValueError as e:
+        if 'cron' in str(e):
+            raise
+        raise ValueError(f"Invalid cron expression '{expression}'.")
+    # Sunday is both 0 and 7
+    weekdays = frozenset(day % 7 for day in weekdays)
+    return CronSpec(minutes, hours, days, months, weekdays, fields[2].startswith('*'), fields[4].startswith('*'))
+
+
+def _day_matches(spec, day):
+    if day.month not in spec.months:
+        return False
+    in_days = day.day in spec.days
+    # isoweekday: Monday=1 .. Sunday=7
+    in_weekdays = day.isoweekday() % 7 in spec.weekdays
+    if spec.any_day or spec.any_weekday:
+        return in_days and in_weekdays
+    return in_days or in_weekdays
+
+
+def previous_occurrence(spec, now):
+    """
+    Returns the latest time at or before `now` matching a cron spec.
+
+    Args:
+        spec (CronSpec): The parsed expression.
+        now (datetime): The reference time (naive UTC).
+
+    Returns:
+        datetime|None: The occurrence, or None if there is none recently.
+    """
+    now = now.replace(second=0, microsecond=0)
+    hours = sorted(spec.hours, reverse=True)
+    minutes = sorted(spec.minutes, reverse=True)
+    day = now.date()
+    for offset in range(MAX_LOOKBACK_DAYS):
+        if _day_matches(spec, day):
+            for hour in hours:
+                if offset == 0 and hour > now.hour:
+                    continue
+                for minute in minutes:
+                    if offset == 0 and hour == now.hour and minute > now.minute:
+                        continue
+                    return datetime(day.year, day.month, day.day, hour, minute)
+        day -= timedelta(days=1)
+    return None
+
+
+# --- Periods ---
+
+def scheduled_period(period, due_at):
+    """
+    The last complete period before an occurrence.
+
+    Args:
+        period (str): 'monthly', 'quarterly' or 'annual'.
+        due_at (datetime): The occurrence.
+
+    Returns:
+        tuple[date, date, str]: Start, end and a label such as "Mar 2025",
+        "Q1 2025" or "2025".
+    """
+    day = due_at.date()
+    if period == 'monthly':
+        start, end = previous_period(
+            date(day.year, day.month, 1), date(day.year, day.month, calendar.monthrange(day.year, day.month)[1])
+        )
+        return start, end, f'{calendar.month_abbr[start.month]} {start.year}'
+    if period == 'quarterly':
+        first_month = (day.month - 1) // 3 * 3 + 1
+        start, end = previous_period(
+            date(day.year, first_month, 1),
+            date(day.year, first_month + 2, calendar.monthrange(day.year, first_month + 2)[1])
+        )
+        return start, end, f'Q{(start.month - 1) // 3 + 1} {start.year}'
+    if period == 'annual':
+        return date(day.year - 1, 1, 1), date(day.year - 1, 12, 31), str(day.year - 1)
+    raise ValueError(f"Unknown period '{period}'. Use {', '.join(SCHEDULE_PERIODS)}.")
+
+
+# --- Schedules ---
+
+def create_schedule(name, cron, period='monthly', user_id=None, name_template=None, now=None):
+    """
+    Validates and saves a schedule. It first fires at its next occurrence
+    (past occurrences are not backfilled).
+
+    Returns:
+        ReportSchedule: The saved schedule (committed).
+
+    Raises:
+        ValueError: If the cron expression, period or template is invalid.
+    """
+    spec = parse_cron(cron)
+    if period not in SCHEDULE_PERIODS:
+        raise ValueError(f"Unknown period '{period}'. Use {', '.join(SCHEDULE_PERIODS)}.")
+    name_template = name_template or '{label} report'
+    try:
+        name_template.format(label='')
+    except (KeyError, IndexError, ValueError):
+        raise ValueError('name_template may only use the {label} placeholder.')
+
+    schedule = ReportSchedule(
+        user_id=user_id, name=name, cron=cron, period=period, name_template=name_template,
+        enabled=True, last_due_at=previous_occurrence(spec, now or datetime.utcnow())
+    )
+    db.session.add(schedule)
+    db.session.commit()
+    return schedule
+
+
+def due_schedules(now):
+    """
+    Finds enabled schedules with an occurrence not processed yet.
+
+    Returns:
+        list[tuple[ReportSchedule, datetime]]: Schedules and their latest
+        occurrence.
+    """
+    due = []
+    for schedule in db.session.execute(select(ReportSchedule).filter_by(enabled=True)).scalars():
+        due_at = previous_occurrence(parse_cron(schedule.cron), now)
+        if due_at is not None and (schedule.last_due_at is None or due_at > schedule.last_due_at):
+            due.append((schedule, due_at))
+    return due
+
+
+def plan_partitions(user_ids, partition_size):
+    """Splits sorted user ids into (first_user_id, last_user_id) ranges."""
+    return [
+        (user_ids[i], user_ids[min(i + partition_size, len(user_ids)) - 1])
+        for i in range(0, len(user_ids), partition_size)
+    ]
+
+
+def start_run(schedule, due_at, partition_size):
+    """
+    Creates the run for an occurrence and its partition checkpoints, in
+    one transaction.
+
+    Returns:
+        ScheduleRun: The run (committed).
+    """
+    start, end, _ = scheduled_period(schedule.period, due_at)
+    if schedule.user_id is not None:
+        partitions = [(schedule.user_id, schedule.user_id)]
+    else:
+        user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()
+        partitions = plan_partitions(user_ids, partition_size)
+
+    run = ScheduleRun(schedule_id=schedule.id, due_at=due_at, period_start=start, period_end=end,
+                      status='running', reports_created=0)
+    db.session.add(run)
+    db.session.flush()
+    if partitions:
+        db.session.execute(insert(ScheduleCheckpoint), [
+            {'run_id': run.id, 'partition': index, 'first_user_id': first, 'last_user_id': last,
+             'done': False, 'reports_created': 0}
+            for index, (first, last) in enumerate(partitions)
+        ])
+    db.session.commit()
+    return run
+
+
+def partition_reports(first, last, start, end, report_name):
+    """
+    Builds the report rows of the users in [first, last] that have data
+    in the period, with three queries.
+
+    Returns:
+        list[dict]: The `Report` column values, ordered by user id.
+    """
+    # 1. Two grouped queries give every user's scope totals
+    totals = {}
+    for user_id, scope, emissions in (
+        allocated_user_scope_totals(first, last, start, end) + block_user_scope_totals(first, last, start, end)
+    ):
+        totals.setdefault(user_id, [0.0, 0.0, 0.0])[scope - 1] += emissions or 0.0
+
+    # 2. One query loads the digests the reports are built from
+    indexes = load_indexes(list(totals), start, end) if totals else {}
+
+    values = []
+    for user_id in sorted(totals):
+        scope1, scope2, scope3 = totals[user_id]
+        digest_rows, digest_emissions, digest_max_id = indexes[user_id].combined(start, end)
+        values.append({
+            'user_id': user_id, 'report_name': report_name, 'start_date': start, 'end_date': end,
+            'total_scope1_kg': scope1, 'total_scope2_kg': scope2, 'total_scope3_kg': scope3,
+            'total_all_scopes_kg': scope1 + scope2 + scope3,
+            'digest_row_count': digest_rows, 'digest_emissions_kg': digest_emissions,
+            'digest_max_input_id': digest_max_id
+        })
+    return values
+
+
+def _write_shard_reports(first, last, start, end, report_name):
+    """
+    Writes a partition's reports on the current shard, skipping users who
+    already have the report (a shard committed before the run was
+    interrupted).
+    """
+    values = partition_reports(first, last, start, end, report_name)
+    existing = set(db.session.execute(
+        select(Report.user_id).where(
+            Report.user_id.between(first, last), Report.report_name == report_name,
+            Report.start_date == start, Report.end_date == end
+        )
+    ).scalars()) if values else set()
+    values = [row for row in values if row['user_id'] not in existing]
+    try:
+        if values:
+            db.session.execute(insert(Report), values)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(values)
+
+
+def generate_partition(run_id, partition):
+    """
+    Generates the reports of one partition of a run and marks its
+    checkpoint done, in one transaction.
+
+    With shards, every shard writes its users' reports in parallel and in
+    its own transaction, then the checkpoint is marked done on the primary.
+
+    Returns:
+        int: The number of reports created (0 if it was already done).
+    """
+    checkpoint = db.session.get(ScheduleCheckpoint, (run_id, partition))
+    if checkpoint is None or checkpoint.done:
+        return 0
+    run = db.session.get(ScheduleRun, run_id)
+    schedule = db.session.get(ReportSchedule, run.schedule_id)
+    start, end, label = scheduled_period(schedule.period, run.due_at)
+    first, last = checkpoint.first_user_id, checkpoint.last_user_id
+    report_name = schedule.name_template.format(label=label)
+
+    if sharding_enabled():
+        values = None
+        created = sum(scatter_gather(_write_shard_reports, first, last, start, end, report_name))
+    else:
+        values = partition_reports(first, last, start, end, report_name)
+        created = len(values)
+
+    # 3. The reports and the checkpoint commit together; the checkpoint
+    # update only matches if no other worker finished the partition first
+    try:
+        claimed = db.session.execute(
+            update(ScheduleCheckpoint).where(
+                ScheduleCheckpoint.run_id == run_id,
+                ScheduleCheckpoint.partition == partition,
+                ScheduleCheckpoint.done.is_(False)
+            ).values(done=True, reports_created=created)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return 0
+        if values:
+            db.session.execute(insert(Report), values)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created
+
+
+def finish_run(run):
+    """Marks a run completed and its schedule as processed up to it."""
+    run.reports_created = db.session.execute(
+        select(func.coalesce(func.sum(ScheduleCheckpoint.reports_created), 0)).where(
+            ScheduleCheckpoint.run_id == run.id
+        )
+    ).scalar_one()
+    run.status = 'completed'
+    run.finished_at = datetime.utcnow()
+    schedule = db.session.get(ReportSchedule, run.schedule_id)
+    if schedule.last_due_at is None or run.due_at > schedule.last_due_at:
+        schedule.last_due_at = run.due_at
+    db.session.commit()
+
+
+# --- Process Pool ---
+
+def _init_worker(config_name):
+    # Each worker has its own app, engine and connection pool
+    from . import create_app
+    app = create_app(config_name)
+    app.app_context().push()
+
+
+def _run_partition(task):
+    return generate_partition(*task)
+
+
+def run_schedules(now=None, workers=None, partition_size=None, config_name=None):
+    """
+    Processes every due occurrence, resuming interrupted runs first.
+
+    Args:
+        now (datetime): The reference time (naive UTC, default: now).
+        workers (int): Worker processes; 0 or 1 runs in this process.
+        partition_size (int): Users per partition.
+        config_name (str): The configuration workers load (default:
+            $FLASK_CONFIG, as in run.py).
+
+    Returns:
+        dict: Runs, partitions and reports processed, the wall-clock
+        time and reports per second.
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    workers = current_app.config['SCHEDULER_WORKERS'] if workers is None else workers
+    partition_size = partition_size or current_app.config['SCHEDULER_PARTITION_SIZE']
+
+    # 1. Interrupted runs, then new occurrences
+    runs = db.session.execute(select(ScheduleRun).filter_by(status='running')).scalars().all()
+    resumed = {(run.schedule_id, run.due_at) for run in runs}
+    for schedule, due_at in due_schedules(now):
+        if (schedule.id, due_at) not in resumed:
+            runs.append(start_run(schedule, due_at, partition_size))
+
+    # 2. Every partition not done yet
+    tasks = db.session.execute(
+        select(ScheduleCheckpoint.run_id, ScheduleCheckpoint.partition).where(
+            ScheduleCheckpoint.run_id.in_([run.id for run in runs]),
+            ScheduleCheckpoint.done.is_(False)
+        ).order_by(ScheduleCheckpoint.run_id, ScheduleCheckpoint.partition)
+    ).all()
+    tasks = [tuple(task) for task in tasks]
+
+    if workers > 1 and len(tasks) > 1:
+        # Forked workers must not share the parent's pooled connections
+        db.engine.dispose()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            initializer=_init_worker,
+            initargs=(config_name or os.getenv('FLASK_CONFIG', 'default'),)
+        ) as pool:
+            created = sum(pool.map(_run_partition, tasks))
+    else:
+        created = sum(_run_partition(task) for task in tasks)
+
+    # 3. Close the runs
+    for run in runs:
+        finish_run(run)
+
+    seconds = time.perf_counter() - started
+    return {
+        'runs': len(runs),
+        'partitions': len(tasks),
+        'reports': created,
+        'seconds': seconds,
+        'reports_per_second': created / seconds if seconds > 0 else 0.0,
+    }
+
+
+# --- CLI ---
+
+@click.command(name='add_schedule')
+@click.argument('name')
+@click.argument('cron')
+@click.option('--period', type=click.Choice(SCHEDULE_PERIODS), default='monthly', show_default=True,
+              help='The complete period before each occurrence to report on.')
+@click.option('--user-id', type=int, default=None, help='Only this user (default: every user).')
+@click.option('--name-template', default=None, help='Report name, e.g. "{label} emissions".')
+def add_schedule_command(name, cron, period, user_id, name_template):
+    """Adds a report schedule, e.g. `flask add_schedule Monthly "0 2 1 * *"`."""
+    try:
+        schedule = create_schedule(name, cron, period=period, user_id=user_id, name_template=name_template)
+    except ValueError as e:
+        click.echo(f'Error adding schedule: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Added schedule {schedule.id} ({schedule.cron}, {schedule.period}).')
+
+
+@click.command(name='run_schedules')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: SCHEDULER_WORKERS).')
+@click.option('--partition-size', type=int, default=None,
+              help='Users per partition (default: SCHEDULER_PARTITION_SIZE).')
+@click.option('--now', 'now', default=None, help='Reference time (ISO 8601, UTC) instead of the current time.')
+def run_schedules_command(workers, partition_size, now):
+    """Generates the reports of every due schedule."""
+    try:
+        stats = run_schedules(
+            now=datetime.fromisoformat(now) if now else None,
+            workers=workers, partition_size=partition_size
+        )
+    except Exception as e:
+        click.echo(f'Error running schedules: {str(e)}')
+        raise SystemExit(1)
+    click.echo(
+        f"Processed {stats['runs']} run(s), {stats['partitions']} partition(s): "
+        f"{stats['reports']} reports in {stats['seconds']:.2f}s "
+        f"({stats['reports_per_second']:.1f} reports/s)."
+    )
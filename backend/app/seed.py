@@ -3,11 +3,12 @@ Database Seeding Script.
 
 This file provides a Flask CLI command `flask seed_db` to
 pre-populate the `EmissionFactor` table with realistic data.
+Large catalogues are loaded with `flask import_factors` instead.
 """
 
 import click
 from . import db
-from .models import EmissionFactor
+from .factor_import import import_factor_rows
 
 # A list of realistic emission factors
 # Sources: EPA, DEFRA, etc. (values are illustrative)
@@ -44,34 +45,19 @@ def seed_db_command():
     """
     Seeds the database with emission factors.
     
-    This command clears the existing EmissionFactor table and
-    populates it with the data from SEED_DATA.
+    This command upserts the data from SEED_DATA into the EmissionFactor
+    table. Existing factors (and the inputs that reference them) are kept.
     """
     try:
-        # Clear existing data
-        db.session.query(EmissionFactor).delete()
-        db.session.commit()
-        
         click.echo('Seeding emission factors...')
         
-        # Add new data
-        for item in SEED_DATA:
-            factor = EmissionFactor(
-                name=item['name'],
-                category=item['category'],
-                scope=item['scope'],
-                factor_value=item['factor_value'],
-                unit=item['unit'],
-                co2e_unit=item['co2e_unit'],
-                source=item['source']
-            )
-            db.session.add(factor)
-        
-        # Commit the session
-        db.session.commit()
+        result = import_factor_rows(SEED_DATA)
         
-        click.echo(f'Successfully seeded {len(SEED_DATA)} emission factors.')
+        click.echo(
+            f"Successfully seeded {len(SEED_DATA)} emission factors "
+            f"({result['inserted']} new, {result['updated']} updated)."
+        )
         
     except Exception as e:
         db.session.rollback()
-        click.echo(f'Error seeding database: {str(e)}')
\ No newline at end of file
+        click.echo(f'Error seeding database: {str(e)}')
@@ -3,16 +3,79 @@ Core Business Logic (Service Layer).
 
 This file contains the `CalculationService` which handles the core
 business logic for calculating emissions and generating reports.
-It uses Pandas for data aggregation and `utils.py` (Pint) for
-unit conversions.
+It uses Pandas for data aggregation (streamed in chunks, see
+`aggregation.py`) and `utils.py` (Pint) for unit conversions.
 """
 
+import csv
+import io
+from itertools import chain
+import numpy as np
 import pandas as pd
+from flask import current_app
 from . import db
-from .models import UserInput, EmissionFactor, Report, User
+from .models import UserInput, EmissionFactor, InputAllocation, Organization, ReadingBlock, Report, User
 from .utils import convert_units
+from .aggregation import (
+    CategoryTotals, PerScope, QuantileSketch, ScopeTotals, SummaryStats,
+    fold_chunks, iter_chunks
+)
+from .events import publish_input_created
+from .analytics_cache import get_analytics_cache
+from .factor_cache import get_factor_cache
+from .reading_blocks import block_contributions
+from .archive import DETAIL_COLUMNS, archive_summary, archived_category_allocations, archived_inputs
+from .allocations import (
+    allocated_category_totals, allocated_daily_totals, allocated_scope_totals, allocation_rows,
+    category_totals_in_periods
+)
+from .digests import allocation_changes, range_digests, record_changes
+from .sharding import current_shard, scatter_gather
+from sqlalchemy import func, insert, select
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
+from datetime import datetime, timedelta
+
+
+def month_bucket(column):
+    """
+    Returns a SQL expression truncating a date column to a 'YYYY-MM' string.
+    PostgreSQL uses `date_trunc`; SQLite (used in tests) uses `strftime`.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.strftime('%Y-%m', column)
+    return db.func.to_char(db.func.date_trunc('month', column), 'YYYY-MM')
+
+
+def overlapping(start_date, end_date):
+    """Filters inputs whose period (start to end, or the start day) overlaps a range."""
+    return (
+        UserInput.date_period_start <= end_date,
+        func.coalesce(UserInput.date_period_end, UserInput.date_period_start) >= start_date
+    )
+
+
+def insert_reports(values):
+    """
+    Inserts reports with one multi-row INSERT .. RETURNING (which also
+    loads the server defaults) and returns them in the order of `values`.
+
+    PostgreSQL keeps that order with `sort_by_parameter_order`. SQLite
+    (used in tests) cannot, and SQLAlchemy would fall back to one INSERT
+    per row, so there the returned rows are matched back to `values`
+    instead; rows with the same name and dates are interchangeable, as
+    their totals are the same.
+    """
+    ordered = db.engine.dialect.name != 'sqlite'
+    statement = insert(Report).returning(Report, sort_by_parameter_order=ordered)
+    reports = db.session.scalars(statement, values).all()
+    if ordered:
+        return reports
+
+    by_key = {}
+    for report in reports:
+        by_key.setdefault((report.report_name, report.start_date, report.end_date), []).append(report)
+    return [by_key[(row['report_name'], row['start_date'], row['end_date'])].pop(0) for row in values]
+
 
 class CalculationService:
     """
@@ -26,7 +89,8 @@ class CalculationService:
         Args:
             user_input_data (dict): Data from the API request.
                                     Expected keys: 'factor_id', 'activity_value',
-                                    'activity_unit', 'date_period_start'.
+                                    'activity_unit', 'date_period_start' and
+                                    optionally 'date_period_end'.
             user_id (int): The ID of the authenticated user.
             
         Returns:
@@ -59,18 +123,34 @@ class CalculationService:
             # TODO: Handle conversion if factor.co2e_unit is not 'kg CO2e'
             # For now, we assume all results are stored as kg.
 
-            # 4. Create and save the UserInput record
+            # 4. Create and save the UserInput record, with its share of
+            # emissions in every month it covers
+            period_end = user_input_data.get('date_period_end')
             new_input = UserInput(
                 user_id=user_id,
                 factor_id=factor_id,
                 activity_value=activity_value,
                 activity_unit=activity_unit,
                 date_period_start=datetime.fromisoformat(user_input_data['date_period_start']).date(),
+                date_period_end=datetime.fromisoformat(period_end).date() if period_end else None,
                 calculated_emissions_kg=calculated_emissions
             )
             
+            scope, category = factor.scope, factor.category
             db.session.add(new_input)
+            db.session.flush()
+            # A bulk INSERT keeps this one statement however many months
+            allocations = allocation_rows([(
+                new_input.id, user_id, scope, new_input.date_period_start,
+                new_input.date_period_end, calculated_emissions
+            )])
+            db.session.execute(insert(InputAllocation), allocations)
+            record_changes(allocation_changes(allocations))
             db.session.commit()
+
+            # 5. Update the analytics cache and push the delta to the
+            # user's open dashboards
+            self._after_input_created(new_input, scope, category, allocations)
             
             return new_input
 
@@ -83,6 +163,78 @@ class CalculationService:
             raise ValueError(str(e))
 
 
+    def prepare_input(self, user_input_data, user_id):
+        """
+        Validates an activity input and calculates its emissions without
+        saving it. The factor comes from the factor cache, so this does
+        not query the database when the cache is current. Used by the
+        write-behind ingestion mode (see `ingest_buffer.py`).
+
+        Args:
+            user_input_data (dict): Data from the API request (as for
+                                    `calculate_single_input`).
+            user_id (int): The ID of the authenticated user.
+
+        Returns:
+            dict: The `user_inputs` column values, plus the factor's
+            'scope' and 'category'.
+
+        Raises:
+            ValueError: If the input is invalid or unit conversion fails.
+        """
+        try:
+            factor_id = int(user_input_data['factor_id'])
+            activity_value = float(user_input_data['activity_value'])
+            activity_unit = user_input_data['activity_unit']
+            period_start = datetime.fromisoformat(user_input_data['date_period_start']).date()
+            period_end = user_input_data.get('date_period_end')
+            period_end = datetime.fromisoformat(period_end).date() if period_end else None
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid input: {str(e)}")
+
+        factor = get_factor_cache().get().by_id.get(factor_id)
+        if factor is None:
+            raise ValueError(f"EmissionFactor with id {factor_id} not found.")
+
+        converted_value = convert_units(
+            value=activity_value,
+            from_unit=activity_unit,
+            to_unit=factor['unit']
+        )
+        return {
+            'user_id': user_id,
+            'factor_id': factor_id,
+            'activity_value': activity_value,
+            'activity_unit': activity_unit,
+            'date_period_start': period_start,
+            'date_period_end': period_end,
+            'calculated_emissions_kg': converted_value * factor['factor_value'],
+            'scope': factor['scope'],
+            'category': factor['category'],
+        }
+
+
+    def _after_input_created(self, new_input, scope, category, allocations):
+        """
+        Feeds a saved input to the analytics cache and publishes a
+        dashboard delta. Both are best-effort and never fail the request.
+        """
+        cache = get_analytics_cache()
+        if cache is not None:
+            try:
+                cache.add_input(new_input, scope, category)
+            except Exception:
+                current_app.logger.exception('Failed to update analytics cache')
+                cache.discard(new_input.user_id)
+
+        try:
+            publish_input_created(new_input, scope, [
+                (allocation['month'], allocation['emissions_kg']) for allocation in allocations
+            ])
+        except Exception:
+            current_app.logger.exception('Failed to publish dashboard update')
+
+
     def generate_report(self, user_id, report_name, start_date, end_date):
         """
         Generates an aggregated report for a user over a date range and saves it.
@@ -97,41 +249,28 @@ class CalculationService:
             Report: The newly created and saved Report object.
         """
         try:
-            # 1. Query all UserInputs for the user in the date range.
-            # We join with EmissionFactor to get the 'scope'.
-            query = db.session.query(
-                UserInput.calculated_emissions_kg,
-                EmissionFactor.scope
-            ).join(
-                EmissionFactor, UserInput.factor_id == EmissionFactor.id
-            ).filter(
-                UserInput.user_id == user_id,
-                UserInput.date_period_start >= start_date,
-                UserInput.date_period_start <= end_date
+            # 1. Sum the monthly allocations in the range; only the ones
+            # cut by the range boundaries are pro-rated (see allocations.py)
+            allocated = pd.DataFrame.from_records(
+                allocated_scope_totals(user_id, start_date, end_date),
+                columns=['scope', 'calculated_emissions_kg']
             )
 
-            # 2. Load data into a Pandas DataFrame
-            # --- START OF FIX ---
-            # We explicitly pass the SQLAlchemy engine (`db.engine`)
-            # instead of `db.session.bind` to avoid ambiguity.
-            df = pd.read_sql(query.statement, con=db.engine)
-            # --- END OF FIX ---
-            
-            if df.empty:
-                # Create an empty report
-                totals = {1: 0.0, 2: 0.0, 3: 0.0}
-            else:
-                # 3. Aggregate using Pandas
-                scope_totals = df.groupby('scope')['calculated_emissions_kg'].sum()
-                # Convert to dictionary, fill missing scopes with 0
-                totals = {
-                    1: scope_totals.get(1, 0.0),
-                    2: scope_totals.get(2, 0.0),
-                    3: scope_totals.get(3, 0.0)
-                }
+            # 2. Fold them, and any reading blocks in the range, into
+            # per-scope totals
+            scope_totals = ScopeTotals()
+            fold_chunks(
+                chain([allocated], self._reading_block_chunks(user_id, start_date, end_date)),
+                [scope_totals]
+            )
+            totals = scope_totals.result()
 
             total_all_scopes = sum(totals.values())
 
+            # 3. Record the digest of the data the totals were built from,
+            # so later changes can be detected (see digests.py)
+            digest_rows, digest_emissions, digest_max_id = range_digests(user_id, [(start_date, end_date)])[0]
+
             # 4. Create and save the Report object
             new_report = Report(
                 user_id=user_id,
@@ -141,7 +280,10 @@ class CalculationService:
                 total_scope1_kg=totals[1],
                 total_scope2_kg=totals[2],
                 total_scope3_kg=totals[3],
-                total_all_scopes_kg=total_all_scopes
+                total_all_scopes_kg=total_all_scopes,
+                digest_row_count=digest_rows,
+                digest_emissions_kg=digest_emissions,
+                digest_max_input_id=digest_max_id
             )
             
             db.session.add(new_report)
@@ -156,6 +298,393 @@ class CalculationService:
             db.session.rollback()
             raise ValueError(str(e))
             
+    def generate_reports_batch(self, user_id, periods):
+        """
+        Generates and saves several reports with a single scan.
+        
+        The allocations over the union of all periods are read once and
+        spread into daily totals per scope; these are turned into prefix
+        sums so every period's totals are two lookups, however much the
+        periods overlap.
+        All reports are inserted in one transaction.
+        
+        Args:
+            user_id (int): The user's ID.
+            periods (list[Period]): The periods (see `periods.py`).
+            
+        Returns:
+            list[Report]: The saved reports, in the order requested.
+        """
+        try:
+            first_day = min(p.start_date for p in periods)
+            last_day = max(p.end_date for p in periods)
+            first_ord = first_day.toordinal()
+
+            # 1. One grouped scan of the allocations over the union range,
+            # spread into a (day, scope) grid
+            daily = allocated_daily_totals(user_id, first_day, last_day)
+
+            # Reading blocks are decoded only where a period boundary cuts them
+            split_dates = {p.start_date for p in periods} | {p.end_date + timedelta(days=1) for p in periods}
+            for day, scope, _, emissions in block_contributions(user_id, first_day, last_day, split_dates):
+                daily[day.toordinal() - first_ord, scope - 1] += emissions
+
+            # 2. Take prefix sums, so prefix[j] - prefix[i] is the total of days [i, j)
+            prefix = np.vstack([np.zeros((1, 3)), np.cumsum(daily, axis=0)])
+
+            # 3. Build every report and insert them with one bulk
+            # INSERT .. RETURNING, which also loads the server defaults
+            digests = range_digests(user_id, [(p.start_date, p.end_date) for p in periods])
+            values = []
+            for period, (digest_rows, digest_emissions, digest_max_id) in zip(periods, digests):
+                i = period.start_date.toordinal() - first_ord
+                j = period.end_date.toordinal() - first_ord + 1
+                totals = [float(value) for value in prefix[j] - prefix[i]]
+                values.append({
+                    'user_id': user_id,
+                    'report_name': period.report_name,
+                    'start_date': period.start_date,
+                    'end_date': period.end_date,
+                    'total_scope1_kg': totals[0],
+                    'total_scope2_kg': totals[1],
+                    'total_scope3_kg': totals[2],
+                    'total_all_scopes_kg': sum(totals),
+                    'digest_row_count': digest_rows,
+                    'digest_emissions_kg': digest_emissions,
+                    'digest_max_input_id': digest_max_id
+                })
+
+            reports = insert_reports(values)
+            # Detach the loaded rows so committing does not expire them
+            # (which would reload each report one query at a time)
+            for report in reports:
+                db.session.expunge(report)
+            db.session.commit()
+            return reports
+            
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise ValueError(f"Database error: {str(e)}")
+        except Exception as e:
+            db.session.rollback()
+            raise ValueError(str(e))
+
+    def compare_periods(self, user_id, base, comparisons):
+        """
+        Totals for a base period and comparison periods, per scope and
+        category, with absolute and percentage deltas.
+        
+        Inputs count with their monthly allocations pro-rated to each
+        period, and reading blocks with the days of readings inside it,
+        exactly as in reports. The allocations of all periods are read
+        with a single grouped query (see `allocated_category_totals`).
+        
+        Args:
+            user_id (int): The user's ID.
+            base (tuple[date, date]): The base period.
+            comparisons (list[tuple[date, date]]): The periods to compare with.
+            
+        Returns:
+            dict: `periods` (base first) and `rows`/`scopes`/`total`
+                  entries holding a `totals` list aligned with `periods`,
+                  plus `delta` and `pct` lists (base minus each comparison;
+                  `pct` is None when the comparison total is zero).
+        """
+        periods = [base] + list(comparisons)
+        period_totals = allocated_category_totals(user_id, periods)
+        self._add_block_totals(period_totals, user_id, periods)
+
+        def with_deltas(totals):
+            base_total = totals[0]
+            return {
+                'totals': totals,
+                'delta': [base_total - other for other in totals[1:]],
+                'pct': [
+                    (base_total - other) / other * 100 if other else None
+                    for other in totals[1:]
+                ]
+            }
+
+        category_totals = {}
+        for index, totals in enumerate(period_totals):
+            for key, total in totals.items():
+                category_totals.setdefault(key, [0.0] * len(periods))[index] += total
+
+        scope_totals = {scope: [0.0] * len(periods) for scope in (1, 2, 3)}
+        category_rows = []
+        for (scope, category), totals in sorted(category_totals.items()):
+            for index, value in enumerate(totals):
+                scope_totals[scope][index] += value
+            category_rows.append({'scope': scope, 'category': category, **with_deltas(totals)})
+
+        return {
+            'periods': [
+                {'start_date': start.isoformat(), 'end_date': end.isoformat()} for start, end in periods
+            ],
+            'rows': category_rows,
+            'scopes': {f'scope{scope}': with_deltas(totals) for scope, totals in scope_totals.items()},
+            'total': with_deltas([sum(values) for values in zip(*scope_totals.values())])
+        }
+
+    def _add_block_totals(self, period_totals, user_id, periods):
+        """
+        Adds the reading-block emissions of every period to its
+        {(scope, category): emissions_kg} totals, in place.
+        """
+        first_day = min(start for start, _ in periods)
+        last_day = max(end for _, end in periods)
+        split_dates = {start for start, _ in periods} | {end + timedelta(days=1) for _, end in periods}
+        for day, scope, category, emissions in block_contributions(user_id, first_day, last_day, split_dates):
+            for totals, (start, end) in zip(period_totals, periods):
+                if start <= day <= end:
+                    totals[(scope, category)] = totals.get((scope, category), 0.0) + emissions
+
+    def _reading_block_chunks(self, user_id, start_date, end_date):
+        """
+        Yields the user's reading-block emissions in the range as one chunk
+        shaped like the detail query (see `reading_blocks.py`): a row per
+        block, or per day of readings where the range cuts the block.
+        """
+        contributions = block_contributions(user_id, start_date, end_date)
+        if contributions:
+            blocks = pd.DataFrame.from_records(
+                contributions,
+                columns=['date_period_start', 'scope', 'category', 'calculated_emissions_kg']
+            )
+            blocks['emissions_in_range_kg'] = blocks['calculated_emissions_kg']
+            yield blocks.reindex(columns=DETAIL_COLUMNS + ['emissions_in_range_kg'])
+
+    def _archived_chunks(self, user_id, start_date, end_date):
+        """
+        Yields the user's archived inputs in the range as one chunk shaped
+        like the detail query (see `archive.py`).
+        """
+        archived = archived_inputs(user_id, start_date, end_date)
+        if len(archived):
+            yield archived
+
+    def _chunk_settings(self):
+        """Chunk size and memory ceiling for streamed report queries."""
+        limit_mb = current_app.config.get('REPORT_STREAM_MEMORY_LIMIT_MB')
+        return {
+            'max_chunk_rows': current_app.config.get('REPORT_STREAM_CHUNK_ROWS', 50000),
+            'memory_limit_bytes': int(limit_mb * 1024 * 1024) if limit_mb else None
+        }
+
+    def _detail_query(self, user_id, start_date, end_date):
+        """Row-level inputs (with their factor) whose period overlaps a date range."""
+        return db.session.query(
+            UserInput.id,
+            UserInput.date_period_start,
+            EmissionFactor.scope,
+            EmissionFactor.category,
+            EmissionFactor.name.label('factor_name'),
+            UserInput.activity_value,
+            UserInput.activity_unit,
+            UserInput.calculated_emissions_kg,
+            UserInput.date_period_end
+        ).join(
+            EmissionFactor, UserInput.factor_id == EmissionFactor.id
+        ).filter(
+            UserInput.user_id == user_id,
+            *overlapping(start_date, end_date)
+        )
+
+    def _detail_chunks(self, statement, user_id, start_date, end_date):
+        """
+        Yields the archived and live inputs of a range, then its reading
+        blocks, each with `emissions_in_range_kg`: the input's emissions
+        pro-rated to its days inside the range, which is what its monthly
+        allocations add up to in a report.
+        """
+        for df in chain(
+            self._archived_chunks(user_id, start_date, end_date),
+            iter_chunks(db.session, statement, **self._chunk_settings())
+        ):
+            starts = pd.to_datetime(df['date_period_start']).to_numpy(dtype='datetime64[D]')
+            ends = pd.to_datetime(df['date_period_end'].fillna(df['date_period_start'])).to_numpy(dtype='datetime64[D]')
+            first = np.maximum(starts, np.datetime64(start_date, 'D'))
+            last = np.minimum(ends, np.datetime64(end_date, 'D'))
+            df['emissions_in_range_kg'] = df['calculated_emissions_kg'] * (
+                ((last - first).astype(np.int64) + 1) / ((ends - starts).astype(np.int64) + 1)
+            )
+            yield df
+        yield from self._reading_block_chunks(user_id, start_date, end_date)
+
+    def get_report_breakdown(self, user_id, start_date, end_date, percentiles=(50, 90, 95, 99)):
+        """
+        Computes a row-level breakdown of a date range in streaming mode:
+        totals per scope and category, summary statistics and approximate
+        percentiles of per-input emissions (overall and per scope).
+        Inputs count with their emissions inside the range, and reading
+        blocks with one row each, so the totals match a report.
+        
+        Args:
+            user_id (int): The user's ID.
+            start_date (date): The start of the range.
+            end_date (date): The end of the range.
+            percentiles (tuple): The percentiles to estimate.
+            
+        Returns:
+            dict: The breakdown. Memory use is bounded by one chunk.
+        """
+        value_column = 'emissions_in_range_kg'
+        scopes = ScopeTotals(value_column)
+        categories = CategoryTotals(value_column)
+        stats = SummaryStats(value_column)
+        quantiles = QuantileSketch(value_column)
+        scope_quantiles = PerScope(lambda: QuantileSketch(value_column))
+
+        statement = self._detail_query(user_id, start_date, end_date).statement
+        fold_chunks(
+            self._detail_chunks(statement, user_id, start_date, end_date),
+            [scopes, categories, stats, quantiles, scope_quantiles]
+        )
+
+        totals = scopes.result()
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'scope_totals': {f'scope{scope}': total for scope, total in totals.items()},
+            'category_totals': categories.result(),
+            'summary': stats.result(),
+            'percentiles': quantiles.result(percentiles),
+            'scope_percentiles': scope_quantiles.result(percentiles)
+        }
+
+    def iter_input_details_csv(self, user_id, start_date, end_date):
+        """
+        Streams a per-input detail report as CSV text, one chunk at a time.
+        
+        Every input whose period overlaps the range is listed, with its
+        `emissions_in_range_kg`. Archived inputs come first, as they are
+        older than the live ones; reading blocks come last, without an id.
+
+        Yields:
+            str: The header, then the CSV lines of each chunk.
+        """
+        statement = self._detail_query(user_id, start_date, end_date).order_by(
+            UserInput.date_period_start, UserInput.id
+        ).statement
+
+        header_written = False
+        for df in self._detail_chunks(statement, user_id, start_date, end_date):
+            buffer = io.StringIO()
+            df.to_csv(buffer, header=not header_written, index=False, quoting=csv.QUOTE_MINIMAL)
+            header_written = True
+            yield buffer.getvalue()
+
+        if not header_written:
+            yield ','.join(DETAIL_COLUMNS + ['emissions_in_range_kg']) + '\n'
+            
+    def get_range_summary(self, user_id, start_date, end_date):
+        """
+        Totals and category breakdown for an arbitrary date range.
+        
+        Inputs count with their allocations pro-rated to the range, as in
+        reports. The live inputs are served from the columnar analytics
+        cache when it is enabled, otherwise from one grouped query over
+        their allocations; archived inputs and reading blocks in the range
+        are added in both cases. `input_count` counts the inputs whose
+        period overlaps the range.
+        
+        Args:
+            user_id (int): The user's ID.
+            start_date (date): The start of the range (inclusive).
+            end_date (date): The end of the range (inclusive).
+            
+        Returns:
+            dict: Scope totals, total, input count and category totals.
+        """
+        period = [(start_date, end_date)]
+        cache = get_analytics_cache()
+        if cache is not None:
+            # The cache holds the live inputs only
+            summary = cache.get(user_id).range_summary(start_date, end_date)
+            period_totals = category_totals_in_periods(
+                archived_category_allocations(user_id, start_date, end_date), period
+            )
+        else:
+            summary = {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+                'scope_totals': {'scope1': 0.0, 'scope2': 0.0, 'scope3': 0.0},
+                'total': 0.0,
+                'input_count': db.session.execute(
+                    select(func.count(UserInput.id)).where(
+                        UserInput.user_id == user_id, *overlapping(start_date, end_date)
+                    )
+                ).scalar_one(),
+                'category_totals': {}
+            }
+            period_totals = allocated_category_totals(user_id, period)
+        summary['input_count'] += len(archived_inputs(user_id, start_date, end_date))
+        self._add_block_totals(period_totals, user_id, period)
+
+        for (scope, category), total in period_totals[0].items():
+            summary['scope_totals'][f'scope{scope}'] += total
+            summary['category_totals'][category] = summary['category_totals'].get(category, 0.0) + total
+        summary['total'] = sum(summary['scope_totals'].values())
+        return summary
+            
+    def get_organization_summary(self, organization_id):
+        """
+        Scope totals of every member of an organization.
+
+        The users may live on different shards: each shard sums its own
+        users in parallel (see `sharding.scatter_gather`) and the partial
+        totals are added up.
+
+        Args:
+            organization_id (int): The organization.
+
+        Returns:
+            dict: The organization's name, number of users and totals per scope.
+        """
+        # The organization's name comes with its members, in one query
+        name, users_by_shard = None, {}
+        for name, user_id, shard in db.session.execute(
+            select(Organization.name, User.id, User.shard).outerjoin(
+                User, User.organization_id == Organization.id
+            ).where(Organization.id == organization_id)
+        ):
+            if user_id is not None:
+                users_by_shard.setdefault(shard, []).append(user_id)
+
+        def shard_totals():
+            user_ids = users_by_shard[current_shard()]
+            totals = {}
+            for model, emissions in (
+                (UserInput, UserInput.calculated_emissions_kg),
+                (ReadingBlock, ReadingBlock.total_emissions_kg),
+            ):
+                for scope, total in db.session.execute(
+                    select(EmissionFactor.scope, db.func.sum(emissions)).join(
+                        EmissionFactor, model.factor_id == EmissionFactor.id
+                    ).where(model.user_id.in_(user_ids)).group_by(EmissionFactor.scope)
+                ):
+                    totals[scope] = totals.get(scope, 0.0) + (total or 0.0)
+            for scope, total in archive_summary(user_ids)[0].items():
+                totals[scope] = totals.get(scope, 0.0) + total
+            return totals
+
+        scope_totals = {}
+        if users_by_shard:
+            for totals in scatter_gather(shard_totals, shards=list(users_by_shard)):
+                for scope, total in totals.items():
+                    scope_totals[scope] = scope_totals.get(scope, 0.0) + total
+
+        return {
+            'organization': name,
+            'users': sum(len(user_ids) for user_ids in users_by_shard.values()),
+            'scope_summary': {
+                'scope1': scope_totals.get(1, 0.0),
+                'scope2': scope_totals.get(2, 0.0),
+                'scope3': scope_totals.get(3, 0.0),
+                'total': sum(scope_totals.values())
+            }
+        }
+
     def get_dashboard_summary(self, user_id):
         """
         Generates high-level summary data for the user's dashboard.
@@ -180,23 +709,48 @@ class CalculationService:
         )
         
         scope_totals = {row.scope: row.total_emissions for row in query.all()}
+
+        # Reading blocks add their stored totals (never decoded here)
+        block_query = db.session.query(
+            EmissionFactor.scope,
+            month_bucket(ReadingBlock.block_start).label('month'),
+            db.func.sum(ReadingBlock.total_emissions_kg).label('total_emissions')
+        ).join(
+            EmissionFactor, ReadingBlock.factor_id == EmissionFactor.id
+        ).filter(
+            ReadingBlock.user_id == user_id
+        ).group_by(
+            EmissionFactor.scope, 'month'
+        )
+        # Archived inputs only add their files' summary statistics
+        archived_scopes, block_months = archive_summary(user_id)
+        for scope, total in archived_scopes.items():
+            scope_totals[scope] = scope_totals.get(scope, 0.0) + total
+        for row in block_query.all():
+            scope_totals[row.scope] = scope_totals.get(row.scope, 0.0) + row.total_emissions
+            block_months[row.month] = block_months.get(row.month, 0.0) + row.total_emissions
         
         # 2. Get Time Series Data (e.g., last 12 months)
-        # This query groups by year and month
+        # Multi-month inputs are spread over their months by their allocations
+        # Grouped by the bucket itself: 'month' would name the table column
+        allocation_month = month_bucket(InputAllocation.month)
         time_series_query = db.session.query(
-            db.func.date_trunc('month', UserInput.date_period_start).label('month'),
-            db.func.sum(UserInput.calculated_emissions_kg).label('total_emissions')
+            allocation_month.label('month'),
+            db.func.sum(InputAllocation.emissions_kg).label('total_emissions')
         ).filter(
-            UserInput.user_id == user_id
+            InputAllocation.user_id == user_id
         ).group_by(
-            'month'
+            allocation_month
         ).order_by(
-            'month'
+            allocation_month
         )
         
+        monthly = {row.month: row.total_emissions for row in time_series_query.all()}
+        for month, total in block_months.items():
+            monthly[month] = monthly.get(month, 0.0) + total
         time_series = [
-            {'month': row.month.strftime('%Y-%m'), 'total_emissions': row.total_emissions}
-            for row in time_series_query.all()
+            {'month': month, 'total_emissions': monthly[month]}
+            for month in sorted(monthly)
         ]
         
         return {
@@ -0,0 +1,629 @@
+"""
+User-Based Sharding.
+
+This file spreads the per-user tables over several databases ("shards"),
+while users, the factor catalogue and the other shared tables stay on the
+primary database.
+
+- Shards are configured as `SQLALCHEMY_BINDS` entries whose key starts
+  with `shard_` (see `config.py`). The primary is a shard too: it keeps
+  the data of users created before sharding was enabled.
+- The shard map is the `users.shard` column (NULL for the primary). New
+  users are placed on a `shard_` bind by a hash of their email, and
+  `@token_required` selects the user's shard for the request.
+- `RoutingSession.get_bind` sends every statement touching a per-user
+  table (`SHARDED_TABLES`) to the selected shard. Outside a request, code
+  selects one with `shard_context`, or runs on all of them in parallel
+  with `scatter_gather`.
+- Every shard holds the full schema. The `emission_factors` catalogue is
+  copied to each shard whenever it changes, so inputs still join their
+  factors in SQL, and each user's row is copied to their shard for the
+  foreign keys.
+- `flask move_user` and `flask rebalance_shards` move users between
+  shards; `flask init_shards` prepares new ones.
+"""
+
+import time
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import click
+from flask import current_app, g
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.sql.util import find_tables
+
+SHARD_BIND_PREFIX = 'shard_'
+# How the primary is named on the command line (NULL in `users.shard`)
+PRIMARY_SHARD = 'primary'
+
+# Tables whose rows belong to one user and live on that user's shard.
+# `ingested_segments` is committed together with the inputs it records.
+SHARDED_TABLES = frozenset({
+    'user_inputs', 'input_allocations', 'reading_blocks',
+    'monthly_digests', 'reports', 'ingested_segments', 'archive_files',
+})
+
+
+class ShardRoutingError(RuntimeError):
+    """Raised when a per-user table is queried without a usable shard."""
+    pass
+
+
+class ShardMoving(Exception):
+    """Raised when the user's data is being moved to another shard."""
+    pass
+
+
+class ShardMoveConflict(RuntimeError):
+    """Raised when a user's rows changed on the old shard during a move."""
+    pass
+
+
+def shard_binds(app=None):
+    """Returns the configured `shard_` bind keys, in order."""
+    app = app or current_app
+    return app.extensions['ghg_sharding']['binds']
+
+
+def sharding_enabled(app=None):
+    return bool(shard_binds(app))
+
+
+def shard_names():
+    """Every shard: None for the primary, then the `shard_` binds."""
+    return [None] + shard_binds()
+
+
+def parse_shard(name):
+    """Maps a command-line shard name to its `users.shard` value."""
+    if name in (None, '', PRIMARY_SHARD):
+        return None
+    if name not in shard_binds():
+        raise ValueError(f"Unknown shard '{name}'.")
+    return name
+
+
+def shard_label(shard):
+    return PRIMARY_SHARD if shard is None else shard
+
+
+def engine_for(shard):
+    """Returns the engine of a shard (None is the primary)."""
+    from . import db
+
+    if shard is None:
+        return db.engine
+    try:
+        return db.engines[shard]
+    except KeyError:
+        raise ShardRoutingError(f"Shard '{shard}' is not configured.") from None
+
+
+# --- Statement Routing ---
+
+def _touches_sharded_table(mapper, clause):
+    if mapper is not None and mapper.local_table.name in SHARDED_TABLES:
+        return True
+    if clause is None:
+        return False
+    return any(
+        getattr(table, 'name', None) in SHARDED_TABLES
+        for table in find_tables(clause, include_crud=True, include_joins=True)
+    )
+
+
+def shard_bind(mapper=None, clause=None):
+    """
+    Returns the engine of the selected shard for a statement on a
+    per-user table, or None to let the session pick the bind as usual
+    (shared tables, users on the primary, sharding not configured).
+
+    Raises:
+        ShardRoutingError: If no shard was selected, rather than silently
+            reading or writing another shard's data.
+    """
+    if not current_app.extensions['ghg_sharding']['binds'] or not _touches_sharded_table(mapper, clause):
+        return None
+    if 'shard' not in g:
+        raise ShardRoutingError(
+            'A per-user table was queried before a shard was selected '
+            '(use @token_required, shard_context or scatter_gather).'
+        )
+    return None if g.shard is None else engine_for(g.shard)
+
+
+def current_shard():
+    """The shard selected for this context (None for the primary)."""
+    return g.get('shard')
+
+
+def select_user_shard(user):
+    """
+    Routes the rest of the request to the user's shard.
+
+    Raises:
+        ShardMoving: If the user's data is being moved.
+    """
+    if user.shard_moving:
+        raise ShardMoving(user.id)
+    g.shard = user.shard
+
+
+@contextmanager
+def shard_context(shard):
+    """
+    Runs a block against one shard, in a fresh app context: its own `g`
+    and its own session, so rows of different shards (whose ids overlap)
+    never share an identity map.
+    """
+    with current_app.app_context():
+        g.shard = shard
+        yield
+
+
+def scatter_gather(fn, *args, shards=None, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` on every shard in parallel, one thread
+    (and session) per shard. Statements run on those threads do not count
+    against the request's query budget.
+
+    Without shards configured `fn` runs once, in the current context.
+
+    Args:
+        shards (list): The shards to query (default: all of them).
+
+    Returns:
+        list: The results, in shard order.
+    """
+    if not sharding_enabled():
+        return [fn(*args, **kwargs)]
+    shards = shard_names() if shards is None else list(shards)
+    app = current_app._get_current_object()
+
+    def call(shard):
+        with app.app_context():
+            g.shard = shard
+            return fn(*args, **kwargs)
+
+    if len(shards) == 1:
+        return [call(shards[0])]
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard') as pool:
+        return list(pool.map(call, shards))
+
+
+def users_by_shard(user_ids, for_write=False):
+    """
+    Groups user ids by the shard holding their data.
+
+    Args:
+        user_ids (Iterable[int]): The users.
+        for_write (bool): Refuse users being moved, whose rows written to
+            the old shard now would be lost.
+
+    Raises:
+        ShardMoving: With `for_write`, if one of the users is being moved.
+    """
+    from . import db
+    from .models import User
+
+    user_ids = set(user_ids)
+    if not sharding_enabled():
+        return {None: sorted(user_ids)} if user_ids else {}
+    grouped = {}
+    for user_id, shard, moving in db.session.execute(
+        select(User.id, User.shard, User.shard_moving).where(User.id.in_(user_ids)).order_by(User.id)
+    ):
+        if moving and for_write:
+            raise ShardMoving(user_id)
+        grouped.setdefault(shard, []).append(user_id)
+    return grouped
+
+
+# --- Placement and Replication ---
+
+def place_user(user):
+    """Assigns a new user to a `shard_` bind (stable hash of the email)."""
+    binds = shard_binds()
+    if binds:
+        user.shard = binds[zlib.crc32(user.email.lower().encode('utf-8')) % len(binds)]
+
+
+def _user_copy(row):
+    # The copy only satisfies foreign keys; credentials and organization
+    # membership stay on the primary
+    return {
+        'id': row.id, 'username': row.username, 'email': row.email,
+        'password_hash': '', 'company_name': row.company_name,
+        'shard': row.shard, 'shard_moving': False,
+    }
+
+
+def copy_user_to_shard(user):
+    """Copies a (flushed) user's row to their shard, in the session's transaction."""
+    from . import db
+    from .models import User
+
+    if user.shard is not None:
+        db.session.execute(
+            insert(User.__table__).values(_user_copy(user)),
+            bind_arguments={'bind': engine_for(user.shard)}
+        )
+
+
+def replicate_catalogue():
+    """
+    Copies new and changed emission factors from the primary to every
+    `shard_` bind. Factors keep their ids, so inputs reference the same
+    factor on every database.
+
+    Returns:
+        int: The number of factor rows written.
+    """
+    from . import db
+    from .models import EmissionFactor
+
+    binds = shard_binds()
+    if not binds:
+        return 0
+    table = EmissionFactor.__table__
+    factors = {row['id']: dict(row) for row in db.session.execute(select(table)).mappings()}
+
+    def copy():
+        with engine_for(current_shard()).begin() as conn:
+            existing = {row['id']: dict(row) for row in conn.execute(select(table)).mappings()}
+            inserts = [row for factor_id, row in factors.items() if factor_id not in existing]
+            updates = [
+                {**row, 'factor_key': factor_id} for factor_id, row in factors.items()
+                if factor_id in existing and existing[factor_id] != row
+            ]
+            if inserts:
+                conn.execute(insert(table), inserts)
+            if updates:
+                conn.execute(update(table).where(table.c.id == bindparam('factor_key')), updates)
+        return len(inserts) + len(updates)
+
+    return sum(scatter_gather(copy, shards=binds))
+
+
+def referenced_factor_ids():
+    """The ids of the factors used by any input, on any shard."""
+    from . import db
+    from .models import UserInput
+
+    def referenced():
+        return set(db.session.execute(select(UserInput.factor_id).distinct()).scalars())
+
+    return set().union(*scatter_gather(referenced))
+
+
+# --- Moving Users ---
+
+def _moved_tables():
+    from .models import ArchiveFile, InputAllocation, MonthlyDigest, ReadingBlock, Report, UserInput
+
+    # Copy order; allocations reference inputs, so deletes run in reverse
+    return [
+        model.__table__
+        for model in (UserInput, InputAllocation, ReadingBlock, MonthlyDigest, Report, ArchiveFile)
+    ]
+
+
+def _read_user_rows(conn, user_id):
+    return {
+        table.name: [dict(row) for row in conn.execute(
+            select(table).where(table.c.user_id == user_id).order_by(*table.primary_key.columns)
+        ).mappings()]
+        for table in _moved_tables()
+    }
+
+
+def _delete_user_rows(conn, user_id):
+    for table in reversed(_moved_tables()):
+        conn.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def _remap_max_id(old_ids, new_ids):
+    """
+    Maps an "up to input id" watermark (digests, reports) from old to new
+    input ids: the largest new id among the inputs at or below it.
+    """
+    running, prefix = 0, []
+    for new_id in new_ids:
+        running = max(running, new_id)
+        prefix.append(running)
+
+    def remap(value):
+        if value is None:
+            return None
+        index = bisect_right(old_ids, value)
+        return prefix[index - 1] if index else 0
+    return remap
+
+
+def _copy_user_rows(conn, rows):
+    """
+    Inserts one user's rows into a shard. Rows get new ids there, as the
+    old ones may be taken; references to input ids are remapped. Archive
+    files stay where they are on disk, only their rows are copied.
+    """
+    inputs, allocations, blocks, digests, reports, archives = _moved_tables()
+
+    def without_id(row):
+        return {key: value for key, value in row.items() if key != 'id'}
+
+    old_ids = [row['id'] for row in rows[inputs.name]]
+    new_ids = conn.execute(
+        insert(inputs).returning(inputs.c.id, sort_by_parameter_order=True),
+        [without_id(row) for row in rows[inputs.name]]
+    ).scalars().all() if old_ids else []
+    new_input_id = dict(zip(old_ids, new_ids))
+    remap = _remap_max_id(old_ids, new_ids)
+
+    copies = {
+        allocations.name: [
+            {**without_id(row), 'input_id': new_input_id[row['input_id']]} for row in rows[allocations.name]
+        ],
+        blocks.name: [without_id(row) for row in rows[blocks.name]],
+        digests.name: [{**row, 'max_input_id': remap(row['max_input_id'])} for row in rows[digests.name]],
+        reports.name: [
+            {**without_id(row), 'digest_max_input_id': remap(row['digest_max_input_id'])}
+            for row in rows[reports.name]
+        ],
+        archives.name: [without_id(row) for row in rows[archives.name]],
+    }
+    for table in (allocations, blocks, digests, reports, archives):
+        if copies[table.name]:
+            conn.execute(insert(table), copies[table.name])
+    return len(old_ids) + sum(len(values) for values in copies.values())
+
+
+def move_user(user_id, target):
+    """
+    Moves a user's data to another shard.
+
+    The user's requests get 503 while the rows are copied. Requests that
+    were routed before the move started may still be writing to the old
+    shard, so the copy waits `SHARD_MOVE_GRACE_SECONDS` for them first.
+    The old shard's rows are read again just before they are deleted: if
+    they changed, the move is abandoned (the user stays on the old shard)
+    instead of losing the write. Otherwise the shard map is switched and
+    the rows deleted; re-running an interrupted move is safe. Inputs and
+    reports get new ids on the target shard.
+
+    Args:
+        user_id (int): The user to move.
+        target (str): A `shard_` bind, or None for the primary.
+
+    Returns:
+        int: The number of rows moved (0 if already there).
+
+    Raises:
+        ValueError: If the user does not exist.
+        ShardMoveConflict: If the user's rows changed during the copy.
+    """
+    from . import db
+    from .analytics_cache import get_analytics_cache
+    from .models import User
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise ValueError(f'User {user_id} not found.')
+    source = user.shard
+    if source == target and not user.shard_moving:
+        return 0
+    source_engine, target_engine = engine_for(source), engine_for(target)
+
+    user.shard_moving = True
+    db.session.commit()
+    try:
+        # 1. Let requests routed before the flag was set finish, then read
+        # everything the user owns on the old shard
+        rows = None
+        if source != target:
+            time.sleep(current_app.config.get('SHARD_MOVE_GRACE_SECONDS', 10))
+            with source_engine.connect() as conn:
+                rows = _read_user_rows(conn, user_id)
+
+        # 2. Copy it in one transaction, replacing leftovers of an
+        # interrupted move
+        moved = 0
+        if rows is not None:
+            with target_engine.begin() as conn:
+                _delete_user_rows(conn, user_id)
+                users = User.__table__
+                if target is not None and conn.execute(
+                    select(users.c.id).where(users.c.id == user_id)
+                ).first() is None:
+                    conn.execute(insert(users), [_user_copy(user)])
+                moved = _copy_user_rows(conn, rows)
+
+        # 3. Make sure no late write landed on the old shard, switch the
+        # map and clean up the old shard
+        if rows is not None:
+            with source_engine.begin() as conn:
+                if _read_user_rows(conn, user_id) != rows:
+                    raise ShardMoveConflict(
+                        f'The rows of user {user_id} changed during the move; it was abandoned, run it again.'
+                    )
+                user.shard, user.shard_moving = target, False
+                db.session.commit()
+                _delete_user_rows(conn, user_id)
+                if source is not None:
+                    conn.execute(delete(User.__table__).where(User.__table__.c.id == user_id))
+        else:
+            user.shard, user.shard_moving = target, False
+            db.session.commit()
+    except Exception:
+        if user.shard_moving:
+            db.session.rollback()
+            user.shard_moving = False
+            db.session.commit()
+        raise
+
+    cache = get_analytics_cache()
+    if cache is not None:
+        cache.discard(user_id)
+    return moved
+
+
+def plan_rebalance(loads, targets, max_moves):
+    """
+    Plans moves that even out the number of inputs per shard.
+
+    Each step moves one user from the fullest shard to the emptiest
+    target: the user that best halves the gap between them (trying the
+    next fullest shards when every user is too big). Planning stops when
+    no move narrows a gap.
+
+    Args:
+        loads (dict): Shard -> {user_id: input rows}.
+        targets (list): The shards users may be moved to.
+        max_moves (int): Maximum number of moves.
+
+    Returns:
+        list[tuple]: (user_id, source, target, rows) moves, in order.
+    """
+    loads = {shard: dict(users) for shard, users in loads.items()}
+    for shard in targets:
+        loads.setdefault(shard, {})
+    totals = {shard: sum(users.values()) for shard, users in loads.items()}
+
+    def best_move(target):
+        # From the fullest shard that has a user small enough to move
+        for source in sorted(totals, key=lambda shard: -totals[shard]):
+            gap = totals[source] - totals[target]
+            candidates = [(user_id, rows) for user_id, rows in loads[source].items() if 0 < rows < gap]
+            if candidates:
+                user_id, rows = min(candidates, key=lambda item: (abs(gap - 2 * item[1]), item[0]))
+                return source, user_id, rows
+        return None
+
+    moves = []
+    while len(moves) < max_moves and targets:
+        target = min(targets, key=lambda shard: totals[shard])
+        move = best_move(target)
+        if move is None:
+            break
+        source, user_id, rows = move
+        del loads[source][user_id]
+        loads[target][user_id] = rows
+        totals[source] -= rows
+        totals[target] += rows
+        moves.append((user_id, source, target, rows))
+    return moves
+
+
+def _input_counts():
+    from . import db
+    from .models import UserInput
+
+    return dict(db.session.execute(
+        select(UserInput.user_id, func.count(UserInput.id)).group_by(UserInput.user_id)
+    ).all())
+
+
+def rebalance_shards(max_moves=100, dry_run=False):
+    """
+    Counts every shard's inputs in parallel and moves users from the
+    fullest shards to the emptiest `shard_` binds (see `plan_rebalance`).
+    The primary only gives users away.
+
+    Returns:
+        list[tuple]: The (user_id, source, target, rows) moves made; users
+        whose rows changed during their move are skipped.
+    """
+    shards = shard_names()
+    loads = dict(zip(shards, scatter_gather(_input_counts, shards=shards)))
+    moves = plan_rebalance(loads, shard_binds(), max_moves)
+    if dry_run:
+        return moves
+    made = []
+    for move in moves:
+        try:
+            move_user(move[0], move[2])
+        except ShardMoveConflict as e:
+            current_app.logger.warning('Skipped move: %s', e)
+            continue
+        made.append(move)
+    return made
+
+
+def init_shards():
+    """
+    Creates missing tables on every `shard_` bind, copies the catalogue
+    and the rows of the users mapped to each shard.
+
+    Returns:
+        int: The number of shards prepared.
+    """
+    from . import db
+    from .models import User
+
+    users = User.__table__
+    for shard in shard_binds():
+        engine = engine_for(shard)
+        db.metadata.create_all(engine)
+        mapped = db.session.execute(select(users).where(users.c.shard == shard)).all()
+        with engine.begin() as conn:
+            present = set(conn.execute(select(users.c.id)).scalars())
+            missing = [_user_copy(row) for row in mapped if row.id not in present]
+            if missing:
+                conn.execute(insert(users), missing)
+    replicate_catalogue()
+    return len(shard_binds())
+
+
+# --- CLI ---
+
+@click.command(name='init_shards')
+def init_shards_command():
+    """Creates the schema on new shards and copies the shared rows to them."""
+    try:
+        prepared = init_shards()
+    except Exception as e:
+        click.echo(f'Error preparing shards: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Prepared {prepared} shard(s).')
+
+
+@click.command(name='move_user')
+@click.argument('user_id', type=int)
+@click.argument('shard')
+def move_user_command(user_id, shard):
+    """Moves a user's data to SHARD (a `shard_` bind or `primary`)."""
+    start = time.perf_counter()
+    try:
+        moved = move_user(user_id, parse_shard(shard))
+    except Exception as e:
+        click.echo(f'Error moving user {user_id}: {str(e)}')
+        raise SystemExit(1)
+    click.echo(f'Moved {moved} rows of user {user_id} to {shard} in {time.perf_counter() - start:.2f}s.')
+
+
+@click.command(name='rebalance_shards')
+@click.option('--max-moves', type=int, default=100, show_default=True, help='Maximum users to move.')
+@click.option('--dry-run', is_flag=True, help='Print the planned moves without moving anyone.')
+def rebalance_shards_command(max_moves, dry_run):
+    """Moves users between shards until their input counts are even."""
+    start = time.perf_counter()
+    try:
+        moves = rebalance_shards(max_moves=max_moves, dry_run=dry_run)
+    except Exception as e:
+        click.echo(f'Error rebalancing shards: {str(e)}')
+        raise SystemExit(1)
+    for user_id, source, target, rows in moves:
+        click.echo(f'user {user_id}\t{shard_label(source)} -> {shard_label(target)}\t{rows} inputs')
+    verb = 'Planned' if dry_run else 'Made'
+    click.echo(f'{verb} {len(moves)} move(s) in {time.perf_counter() - start:.2f}s.')
+
+
+def init_sharding(app):
+    """Records the configured shards; the routing itself is in `RoutingSession`."""
+    app.extensions['ghg_sharding'] = {
+        # `shard_10` sorts after `shard_9`
+        'binds': sorted((
+            key for key in app.config.get('SQLALCHEMY_BINDS', {})
+            if key.startswith(SHARD_BIND_PREFIX)
+        ), key=lambda key: (len(key), key)),
+    }
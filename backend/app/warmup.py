@@ -0,0 +1,189 @@
+"""
+Worker Warm-Up and Readiness.
+
+Under gunicorn with `preload_app` (see `gunicorn.conf.py`) the
+application is created once in the master process, which also:
+
+- Loads the factor catalogue into the factor cache.
+- Parses every factor unit with the Pint registry, so unit definitions
+  and parse caches exist before forking.
+- Runs a tiny pandas aggregation, importing its lazily loaded modules.
+
+Workers then share these pages copy-on-write instead of building their
+own. The master closes its database connections before forking, because
+a connection must never be used by two processes.
+
+Each worker then warms up before it accepts requests: it restarts the
+event relay, opens `WARMUP_DB_CONNECTIONS` connections per database
+engine, and revalidates the factor cache (one version check when the
+catalogue has not changed). `GET /ready` answers 200 once the worker
+has warmed up and 503 before; a failed warm-up is retried in the
+background every `WARMUP_RETRY_SECONDS`. The development server never
+warms up, so `/ready` stays 503 there unless `warm_up` is called.
+"""
+
+import threading
+import time
+import pandas as pd
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import text
+from . import db
+from .events import get_broker
+from .factor_cache import get_factor_cache
+from .utils import ureg
+
+readiness = Blueprint('readiness', __name__)
+
+
+class WarmupState:
+    """The warm-up progress of the current process."""
+
+    def __init__(self):
+        self.status = 'cold'
+        self.error = None
+        self.duration = None
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == 'ready'
+
+
+def prime_units(factors):
+    """
+    Parses each factor's unit and its base units, filling the Pint
+    registry's caches. Units Pint does not know are skipped; they fail
+    at conversion time as before.
+
+    Args:
+        factors (list[dict]): Factors in `to_dict` shape.
+
+    Returns:
+        int: The number of distinct units parsed.
+    """
+    parsed = 0
+    for unit in sorted({factor['unit'] for factor in factors if factor['unit']}):
+        try:
+            ureg.get_base_units(ureg.parse_units(unit))
+        except Exception:
+            continue
+        parsed += 1
+    return parsed
+
+
+def _prime_pandas():
+    # The first groupby imports and initializes pandas' aggregation modules
+    frame = pd.DataFrame({'scope': [1, 2, 2], 'calculated_emissions_kg': [1.0, 2.0, 3.0]})
+    frame.groupby('scope')['calculated_emissions_kg'].sum()
+
+
+def preload(app):
+    """
+    Fills process-wide caches in the gunicorn master before it forks the
+    workers, then closes the master's database connections.
+    """
+    with app.app_context():
+        try:
+            catalogue = get_factor_cache().get()
+            units = prime_units(catalogue.factors)
+            app.logger.info('Preloaded %d factors and %d units', len(catalogue.factors), units)
+        except Exception:
+            # Workers load the catalogue themselves when they warm up
+            app.logger.exception('Could not preload the factor catalogue')
+        finally:
+            db.session.remove()
+        _prime_pandas()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def after_fork(app):
+    """
+    Prepares a freshly forked worker: drops pooled connections inherited
+    from the master without closing them (they belong to the master) and
+    restarts the event relay thread, which does not survive the fork.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        get_broker().after_fork()
+
+
+def _open_connections(engine, count):
+    # Hold them all at once so the pool really grows to `count`
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text('SELECT 1'))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_up(app):
+    """
+    Warms up the current worker and marks it ready.
+
+    Returns:
+        bool: True if the warm-up succeeded.
+    """
+    state = app.extensions['ghg_warmup']
+    with state.lock:
+        if state.ready:
+            return True
+        state.status = 'warming'
+        start = time.perf_counter()
+        with app.app_context():
+            try:
+                for engine in db.engines.values():
+                    _open_connections(engine, app.config.get('WARMUP_DB_CONNECTIONS', 2))
+                cache = get_factor_cache()
+                cache.invalidate()
+                prime_units(cache.get().factors)
+            except Exception as e:
+                state.status, state.error = 'failed', str(e)
+                app.logger.exception('Worker warm-up failed')
+                return False
+            finally:
+                db.session.remove()
+        state.status, state.error = 'ready', None
+        state.duration = time.perf_counter() - start
+        app.logger.info('Worker warmed up in %.2fs', state.duration)
+        return True
+
+
+def warm_up_until_ready(app):
+    """
+    Warms up the worker; if that fails, keeps retrying in a background
+    thread so the worker can still answer `/ready` meanwhile.
+    """
+    if warm_up(app):
+        return
+
+    def retry():
+        while not warm_up(app):
+            time.sleep(app.config.get('WARMUP_RETRY_SECONDS', 5))
+
+    threading.Thread(target=retry, name='ghg-warmup', daemon=True).start()
+
+
+@readiness.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 once this worker has warmed up, else 503.
+    """
+    state = current_app.extensions['ghg_warmup']
+    body = {'status': state.status}
+    if state.ready:
+        body['warmup_seconds'] = round(state.duration, 3)
+    elif state.error:
+        body['error'] = state.error
+    return jsonify(body), 200 if state.ready else 503
+
+
+def init_warmup(app):
+    """Creates the warm-up state and registers the readiness endpoint."""
+    app.extensions['ghg_warmup'] = WarmupState()
+    app.register_blueprint(readiness)
@@ -0,0 +1,486 @@
+"""
+Load Test: Concurrent User Journeys over HTTP.
+
+Drives a running app instance (e.g. behind gunicorn) with scripted user
+journeys and reports throughput, latency percentiles and error rates per
+endpoint. Each journey is what a user does in one visit:
+
+    register (first visit) or log in -> GET factors -> POST inputs
+    -> GET dashboard summary -> POST report (sometimes) -> GET reports
+    -> GET the newest report
+
+Two load models:
+- Closed loop (default): `--concurrency` virtual users run journeys back
+  to back, with `--think-time` seconds between steps.
+- Open loop (`--arrival-rate N`): journeys start as a Poisson process of
+  N per second, whatever the response times, and are run by up to
+  `--concurrency` threads. Journeys waiting for a thread count towards
+  their latency (reported as `queue_wait`), so an overloaded server shows
+  up as growing latency instead of a lower request rate.
+
+Results are written as JSON with `--output`. `--compare` prints the
+change against an earlier result file, and `--max-regression` makes the
+run fail when the p95 latency of an endpoint grew by more than that
+percentage, so capacity can be compared between releases.
+
+The factor catalogue must not be empty (`flask seed_db`). Rate-limited
+requests (429) are counted separately from errors and retried once after
+their `Retry-After`, as the frontend does.
+
+Usage (from the backend directory, with the app running):
+    gunicorn run:app -c gunicorn.conf.py
+    python benchmarks/loadtest.py --url http://localhost:5000 --concurrency 20 --duration 60
+    python benchmarks/loadtest.py --arrival-rate 5 --duration 120 --output results/v1.json
+    python benchmarks/loadtest.py --arrival-rate 5 --duration 120 --compare results/v1.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+PERCENTILES = (50, 95, 99)
+
+
+# --- Measurements ---
+
+class Stats:
+    """Latencies and status codes per endpoint, shared by all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.journeys = 0
+        self.failed_journeys = 0
+        self.journey_latencies = []
+        self.queue_waits = []
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def record_journey(self, seconds, queue_wait, failed):
+        with self._lock:
+            self.journeys += 1
+            self.failed_journeys += failed
+            self.journey_latencies.append(seconds)
+            if queue_wait is not None:
+                self.queue_waits.append(queue_wait)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of `values` (in milliseconds)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return round(ordered[rank] * 1000, 2)
+
+
+def _latency_summary(values):
+    summary = {f'p{p}_ms': percentile(values, p) for p in PERCENTILES}
+    summary['mean_ms'] = round(sum(values) / len(values) * 1000, 2) if values else None
+    summary['max_ms'] = round(max(values) * 1000, 2) if values else None
+    return summary
+
+
+def summarize(stats, elapsed):
+    """Builds the machine-readable result of a run."""
+    endpoints = {}
+    for endpoint in sorted(stats.latencies):
+        statuses = stats.statuses[endpoint]
+        requests = sum(statuses.values())
+        # 0 stands for connection failures and timeouts
+        errors = sum(n for status, n in statuses.items() if status == 0 or (status >= 400 and status != 429))
+        endpoints[endpoint] = {
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 2),
+            'error_rate': round(errors / requests, 4),
+            'rejected_rate': round(statuses.get(429, 0) / requests, 4),
+            'statuses': {str(status): n for status, n in sorted(statuses.items())},
+            **_latency_summary(stats.latencies[endpoint]),
+        }
+    requests = sum(e['requests'] for e in endpoints.values())
+    errors = sum(e['error_rate'] * e['requests'] for e in endpoints.values())
+    return {
+        'totals': {
+            'elapsed_seconds': round(elapsed, 2),
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 2) if elapsed else 0.0,
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'journeys': stats.journeys,
+            'journeys_per_second': round(stats.journeys / elapsed, 2) if elapsed else 0.0,
+            'failed_journeys': stats.failed_journeys,
+            'journey': _latency_summary(stats.journey_latencies),
+            'queue_wait': _latency_summary(stats.queue_waits) if stats.queue_waits else None,
+        },
+        'endpoints': endpoints,
+    }
+
+
+# --- HTTP Client ---
+
+class Client:
+    """A user's session: its token, cached factor ETag and timings."""
+
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.token = None
+        self.factors_etag = None
+        self.factors = None
+
+    def request(self, method, path, endpoint, body=None, headers=None, retry=True):
+        """
+        Sends one request and records its latency under `endpoint`.
+
+        Returns:
+            tuple: (status, parsed JSON body or None, response headers).
+            Status 0 means the request did not complete.
+        """
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(self.base_url + path, data, headers, method=method),
+                         timeout=self.timeout) as response:
+                status, payload, response_headers = response.status, response.read(), response.headers
+        except HTTPError as e:
+            status, payload, response_headers = e.code, e.read(), e.headers
+        except (URLError, socket.timeout, ConnectionError):
+            status, payload, response_headers = 0, b'', {}
+        self.stats.record(endpoint, status, time.perf_counter() - start)
+
+        if status == 429 and retry:
+            time.sleep(float(response_headers.get('Retry-After', 1)))
+            return self.request(method, path, endpoint, body, headers, retry=False)
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        return status, parsed, response_headers
+
+
+class Account:
+    """Credentials of a virtual user; registered on its first journey."""
+
+    def __init__(self, run_id, number):
+        self.username = f'load-{run_id}-{number}'
+        self.email = f'{self.username}@loadtest.invalid'
+        self.password = 'load-test-password'
+        self.registered = False
+        self.lock = threading.Lock()
+
+
+# --- Journeys ---
+
+def run_journey(client, account, options, rng):
+    """
+    Runs one visit of `account`.
+
+    Returns:
+        bool: False if a step failed and the journey was abandoned.
+    """
+    def think():
+        if options.think_time > 0:
+            time.sleep(rng.expovariate(1 / options.think_time))
+
+    client.token = None
+    if not account.registered:
+        status, body, _ = client.request('POST', '/auth/register', 'POST /auth/register', {
+            'username': account.username, 'email': account.email,
+            'password': account.password, 'company_name': 'Load Test Ltd'
+        })
+        account.registered = status in (201, 409)
+    else:
+        status, body, _ = client.request('POST', '/auth/login', 'POST /auth/login', {
+            'email': account.email, 'password': account.password
+        })
+    if status not in (200, 201):
+        return False
+    client.token = body['auth_token']
+    think()
+
+    # The browser revalidates its cached catalogue
+    headers = {'If-None-Match': client.factors_etag} if client.factors_etag else {}
+    status, body, response_headers = client.request('GET', '/api/factors', 'GET /api/factors', headers=headers)
+    if status == 200:
+        client.factors = body
+        client.factors_etag = response_headers.get('ETag')
+    elif status != 304 or client.factors is None:
+        return False
+    if not client.factors:
+        raise SystemExit('The factor catalogue is empty; run `flask seed_db` first.')
+    think()
+
+    today = date.today()
+    for _ in range(options.inputs_per_journey):
+        factor = rng.choice(client.factors)
+        month = rng.randint(1, 12)
+        status, _, _ = client.request('POST', '/api/inputs', 'POST /api/inputs', {
+            'factor_id': factor['id'],
+            'activity_value': round(rng.uniform(10, 5000), 2),
+            'activity_unit': factor['unit'],
+            'date_period_start': date(today.year - 1, month, 1).isoformat(),
+        })
+        if status != 201:
+            return False
+        think()
+
+    status, _, _ = client.request('GET', '/api/dashboard/summary', 'GET /api/dashboard/summary')
+    if status != 200:
+        return False
+    think()
+
+    if rng.random() < options.report_ratio:
+        status, _, _ = client.request('POST', '/api/reports', 'POST /api/reports', {
+            'report_name': f'FY{today.year - 1}',
+            'start_date': f'{today.year - 1}-01-01',
+            'end_date': f'{today.year - 1}-12-31',
+        })
+        if status != 201:
+            return False
+        think()
+
+    status, body, _ = client.request('GET', '/api/reports?fields=report_name', 'GET /api/reports')
+    if status != 200:
+        return False
+    if body['reports']:
+        think()
+        status, _, _ = client.request('GET', f"/api/reports/{body['reports'][0]['id']}", 'GET /api/reports/<id>')
+        if status != 200:
+            return False
+    return True
+
+
+def _timed_journey(stats, client, account, options, rng, queued_at=None):
+    start = time.perf_counter()
+    queue_wait = start - queued_at if queued_at is not None else None
+    with account.lock:
+        try:
+            ok = run_journey(client, account, options, rng)
+        except (KeyError, TypeError):
+            # Unexpected response body
+            ok = False
+    elapsed = time.perf_counter() - (queued_at if queued_at is not None else start)
+    stats.record_journey(elapsed, queue_wait, not ok)
+
+
+def run_closed_loop(options, stats, accounts, deadline):
+    """Each thread is one virtual user running journeys back to back."""
+    def worker(number):
+        rng = random.Random(options.seed + number)
+        client = Client(options.url, stats, options.timeout)
+        account = accounts[number % len(accounts)]
+        while time.monotonic() < deadline:
+            _timed_journey(stats, client, account, options, rng)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(options.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(options, stats, accounts, deadline):
+    """Starts journeys at Poisson-distributed times on a thread pool."""
+    pending = queue.Queue()
+    clients = {}
+
+    def worker(number):
+        rng = random.Random(options.seed + number)
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            account_number, queued_at = item
+            # One session (token, cached factors) per account
+            client = clients.setdefault(account_number, Client(options.url, stats, options.timeout))
+            _timed_journey(stats, client, accounts[account_number], options, rng, queued_at)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(options.concurrency)]
+    for thread in threads:
+        thread.start()
+
+    rng = random.Random(options.seed)
+    next_start = time.perf_counter()
+    while time.monotonic() < deadline:
+        next_start += rng.expovariate(options.arrival_rate)
+        time.sleep(max(0.0, next_start - time.perf_counter()))
+        pending.put((rng.randrange(len(accounts)), next_start))
+
+    # Journeys still queued at the deadline are dropped
+    dropped = 0
+    while True:
+        try:
+            pending.get_nowait()
+            dropped += 1
+        except queue.Empty:
+            break
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return dropped
+
+
+# --- Reporting ---
+
+def print_summary(result):
+    totals = result['totals']
+    print(f"\n{'endpoint':<30} {'requests':>9} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'429':>6}")
+    for endpoint, e in result['endpoints'].items():
+        print(f"{endpoint:<30} {e['requests']:>9,} {e['throughput_rps']:>8.1f} {_ms(e['p50_ms']):>9} "
+              f"{_ms(e['p95_ms']):>9} {_ms(e['p99_ms']):>9} {e['error_rate']:>7.1%} {e['rejected_rate']:>6.1%}")
+    journey = totals['journey']
+    print(f"\n{totals['requests']:,} requests in {totals['elapsed_seconds']}s "
+          f"({totals['throughput_rps']} req/s), error rate {totals['error_rate']:.2%}")
+    print(f"{totals['journeys']:,} journeys ({totals['journeys_per_second']}/s, "
+          f"{totals['failed_journeys']} failed), journey p50/p95/p99 "
+          f"{_ms(journey['p50_ms'])}/{_ms(journey['p95_ms'])}/{_ms(journey['p99_ms'])} ms")
+    if totals['queue_wait']:
+        print(f"Queue wait p95 {_ms(totals['queue_wait']['p95_ms'])} ms, "
+              f"{result['meta'].get('dropped_journeys', 0)} journeys dropped at the deadline")
+
+
+def _ms(value):
+    return '-' if value is None else f'{value:,.1f}'
+
+
+def _change(new, old):
+    if new is None or not old:
+        return '-'
+    return f'{(new - old) / old:+.1%}'
+
+
+def compare(result, baseline, max_regression=None):
+    """
+    Prints the change of each endpoint against a baseline result.
+
+    Returns:
+        list: Endpoints whose p95 latency grew by more than `max_regression` percent.
+    """
+    print(f"\nCompared with {baseline['meta'].get('label') or baseline['meta']['started_at']}:")
+    print(f"{'endpoint':<30} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>15}")
+    regressions = []
+    for endpoint, e in result['endpoints'].items():
+        old = baseline['endpoints'].get(endpoint)
+        if old is None:
+            print(f'{endpoint:<30} (new)')
+            continue
+        print(f"{endpoint:<30} {_change(e['throughput_rps'], old['throughput_rps']):>9} "
+              f"{_change(e['p50_ms'], old['p50_ms']):>9} {_change(e['p95_ms'], old['p95_ms']):>9} "
+              f"{_change(e['p99_ms'], old['p99_ms']):>9} "
+              f"{old['error_rate']:>6.1%} -> {e['error_rate']:>5.1%}")
+        if (max_regression is not None and e['p95_ms'] is not None and old['p95_ms']
+                and (e['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 > max_regression):
+            regressions.append(endpoint)
+    totals, old_totals = result['totals'], baseline['totals']
+    print(f"{'total':<30} {_change(totals['throughput_rps'], old_totals['throughput_rps']):>9} "
+          f"{'':>9} {_change(totals['journey']['p95_ms'], old_totals['journey']['p95_ms']):>9} "
+          f"{'':>9} {old_totals['error_rate']:>6.1%} -> {totals['error_rate']:>5.1%}")
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='base URL of the app')
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='virtual users (closed loop) or worker threads (open loop)')
+    parser.add_argument('--arrival-rate', type=float,
+                        help='journeys started per second (open loop); default: closed loop')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to generate load')
+    parser.add_argument('--users', type=int,
+                        help='distinct accounts (default: --concurrency); each registers once')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='mean seconds between the steps of a journey')
+    parser.add_argument('--inputs-per-journey', type=int, default=3)
+    parser.add_argument('--report-ratio', type=float, default=0.2,
+                        help='fraction of journeys generating a report')
+    parser.add_argument('--timeout', type=float, default=30, help='request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', help='name of this run in result files (e.g. a release)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float,
+                        help='with --compare, exit 1 if an endpoint p95 grew by more than this percent')
+    options = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    accounts = [Account(run_id, n) for n in range(options.users or options.concurrency)]
+    stats = Stats()
+    meta = {
+        'label': options.label,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'revision': _git_revision(),
+        'url': options.url,
+        'mode': 'open' if options.arrival_rate else 'closed',
+        'concurrency': options.concurrency,
+        'arrival_rate': options.arrival_rate,
+        'duration_seconds': options.duration,
+        'users': len(accounts),
+        'think_time_seconds': options.think_time,
+        'inputs_per_journey': options.inputs_per_journey,
+        'report_ratio': options.report_ratio,
+    }
+    print(f"Running {meta['mode']}-loop load against {options.url} for {options.duration:g}s "
+          f"({options.concurrency} threads"
+          f"{f', {options.arrival_rate:g} journeys/s' if options.arrival_rate else ''}, "
+          f"{len(accounts)} users)")
+
+    start = time.perf_counter()
+    deadline = time.monotonic() + options.duration
+    if options.arrival_rate:
+        meta['dropped_journeys'] = run_open_loop(options, stats, accounts, deadline)
+    else:
+        run_closed_loop(options, stats, accounts, deadline)
+    result = {'meta': meta, **summarize(stats, time.perf_counter() - start)}
+    print_summary(result)
+
+    if options.output:
+        os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+        with open(options.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'\nResults written to {options.output}')
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(result, json.load(f), options.max_regression)
+        if regressions:
+            print(f"\np95 regression above {options.max_regression:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,11 +25,135 @@ class Config:
     # Define the database URI
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
+    # Optional read replicas (comma-separated URLs), registered as
+    # `replica_<n>` binds and used by routes marked `@read_replica`.
+    # Optional shards (comma-separated URLs), registered as `shard_<n>`
+    # binds holding the per-user tables (see `app/sharding.py`)
+    SQLALCHEMY_BINDS = {
+        f'{prefix}_{index}': url.strip()
+        for prefix, variable in (('replica', 'DATABASE_REPLICA_URLS'), ('shard', 'DATABASE_SHARD_URLS'))
+        for index, url in enumerate(os.environ.get(variable, '').split(','))
+        if url.strip()
+    }
+    # Clients are pinned to the primary for this long after a write
+    READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+    # Redis URL sharing those pins between workers (in-process when unset)
+    READ_YOUR_WRITES_BACKEND_URL = os.environ.get('READ_YOUR_WRITES_BACKEND_URL')
+    # A failed replica is skipped for this long before being retried
+    REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+    # Requests of a user being moved between shards get 503 with this Retry-After
+    SHARD_MOVE_RETRY_AFTER = int(os.environ.get('SHARD_MOVE_RETRY_AFTER', '5'))
+    # A move waits this long for requests routed before it started (longer
+    # than the slowest write request), then copies the user's rows
+    SHARD_MOVE_GRACE_SECONDS = float(os.environ.get('SHARD_MOVE_GRACE_SECONDS', '10'))
+
+    # Live dashboard updates (Server-Sent Events)
+    # Set to a redis:// URL to fan out events across workers and hosts
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL')
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_QUEUE_SIZE = 100
+    # Every open stream holds a request thread (see gunicorn.conf.py); above
+    # this many per worker, new streams get 503 so API calls keep threads
+    SSE_MAX_STREAMS_PER_WORKER = int(os.environ.get('SSE_MAX_STREAMS_PER_WORKER', '16'))
+    SSE_RETRY_AFTER_SECONDS = 30
+    # Lifetime of the single-use tickets that open a stream
+    SSE_TICKET_SECONDS = 30
+
+    # How often workers check whether the factor catalogue changed
+    FACTOR_CACHE_CHECK_SECONDS = 5
+
+    # Worker warm-up under gunicorn (see app/warmup.py): connections opened
+    # per database engine, and the delay between retries of a failed warm-up
+    WARMUP_DB_CONNECTIONS = int(os.environ.get('WARMUP_DB_CONNECTIONS', '2'))
+    WARMUP_RETRY_SECONDS = 5
+
+    # HTTP caching (see app/http_cache.py). Reports never change once
+    # generated; browsers revalidate factors with their ETag on every
+    # use, and nginx may serve them for this long first
+    REPORT_CACHE_MAX_AGE = int(os.environ.get('REPORT_CACHE_MAX_AGE', '86400'))
+    FACTORS_PROXY_MAX_AGE = int(os.environ.get('FACTORS_PROXY_MAX_AGE', '60'))
+
+    # Streamed report aggregation: rows per chunk and a per-chunk memory ceiling
+    REPORT_STREAM_CHUNK_ROWS = int(os.environ.get('REPORT_STREAM_CHUNK_ROWS', '50000'))
+    REPORT_STREAM_MEMORY_LIMIT_MB = float(os.environ.get('REPORT_STREAM_MEMORY_LIMIT_MB', '64'))
+
+    # Optional per-user columnar cache for date-range queries
+    ANALYTICS_CACHE_ENABLED = os.environ.get('ANALYTICS_CACHE_ENABLED', 'false').lower() == 'true'
+    ANALYTICS_CACHE_MAX_MB = float(os.environ.get('ANALYTICS_CACHE_MAX_MB', '256'))
+    # Cached series are re-checked against the database at most this often
+    ANALYTICS_CACHE_VALIDATE_SECONDS = 2
+
+    # Scheduled reports (`flask run_schedules`): worker processes and the
+    # number of users per partition (one transaction and checkpoint each)
+    SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '4'))
+    SCHEDULER_PARTITION_SIZE = int(os.environ.get('SCHEDULER_PARTITION_SIZE', '500'))
+
+    # Admission control for routes with a `@cost_class` (see app/admission.py)
+    ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+    # Set to a redis:// URL to share limits across workers and hosts
+    ADMISSION_BACKEND_URL = os.environ.get('ADMISSION_BACKEND_URL')
+    # Concurrency slots of crashed workers expire after this long (Redis only)
+    ADMISSION_LEASE_SECONDS = 120
+    ADMISSION_RETRY_AFTER_SECONDS = 1
+    # Per-user and global concurrency, and per-user token buckets
+    # (`rate` tokens per second, at most `burst`), by cost class
+    ADMISSION_COST_CLASSES = {
+        'moderate': {'user_concurrency': 4, 'global_concurrency': 16, 'rate': 5.0, 'burst': 30},
+        'expensive': {
+            'user_concurrency': 2,
+            'global_concurrency': int(os.environ.get('ADMISSION_EXPENSIVE_CONCURRENCY', '4')),
+            'rate': 0.5,
+            'burst': 20,
+        },
+    }
+
+    # Write-behind ingestion (see app/ingest_buffer.py): when enabled,
+    # `POST /api/inputs` with `Prefer: respond-async` is buffered in
+    # INGEST_BUFFER_DIR (persistent local storage) and answered with 202
+    INGEST_BUFFER_ENABLED = os.environ.get('INGEST_BUFFER_ENABLED', 'false').lower() == 'true'
+    INGEST_BUFFER_DIR = os.environ.get('INGEST_BUFFER_DIR') or os.path.join(basedir, 'instance', 'ingest')
+    # Uncommitted rows per process before requests get 503 (backpressure)
+    INGEST_BUFFER_MAX_ROWS = int(os.environ.get('INGEST_BUFFER_MAX_ROWS', '50000'))
+    # Rows per flush transaction, and the longest a row waits for one
+    INGEST_FLUSH_BATCH_ROWS = int(os.environ.get('INGEST_FLUSH_BATCH_ROWS', '1000'))
+    INGEST_FLUSH_INTERVAL_SECONDS = float(os.environ.get('INGEST_FLUSH_INTERVAL_SECONDS', '1'))
+    # How often flushers look for segments left by crashed processes
+    INGEST_RECOVERY_INTERVAL_SECONDS = 30
+    INGEST_RETRY_AFTER_SECONDS = 1
+    INGEST_BUFFER_FSYNC = True
+
+    # Cold-storage archive (see app/archive.py): `flask archive_inputs`
+    # moves inputs ended over ARCHIVE_AFTER_MONTHS ago into files in ARCHIVE_DIR
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(basedir, 'instance', 'archive')
+    ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', '24'))
+    ARCHIVE_FILE_MAX_ROWS = int(os.environ.get('ARCHIVE_FILE_MAX_ROWS', '100000'))
+
+    # Expose Prometheus metrics on /metrics
+    # (multi-worker aggregation is enabled via PROMETHEUS_MULTIPROC_DIR)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # On-demand request profiling (see app/profiling.py). Requests with an
+    # `X-Profile-Token` header matching PROFILING_TOKEN are always profiled
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+    PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(basedir, 'instance', 'profiles')
+    PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '200'))
+    # Allocation sites reported per profile, and traceback depth kept by tracemalloc
+    PROFILING_TOP_N = 25
+    PROFILING_TRACEMALLOC_FRAMES = 1
+
+    # Per-route SQL statement budgets (see app/query_budget.py)
+    # 'off', 'warn' or 'raise'
+    QUERY_BUDGET_MODE = 'off'
+    # Identical statements repeated this often in one request are flagged as N+1
+    QUERY_N_PLUS_ONE_THRESHOLD = 3
+
 
 class DevelopmentConfig(Config):
     """Development-specific configuration."""
     DEBUG = True
     SQLALCHEMY_ECHO = False # Set to True to see SQL queries in logs
+    QUERY_BUDGET_MODE = 'warn'
 
 
 class TestingConfig(Config):
@@ -37,8 +161,17 @@ class TestingConfig(Config):
     TESTING = True
     # Use an in-memory SQLite database for testing
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {}
     # Disable CSRF protection in testing forms (if you use Flask-WTF)
     WTF_CSRF_ENABLED = False
+    # Fail tests that exceed a route's query budget
+    QUERY_BUDGET_MODE = 'raise'
+    # Always re-check the catalogue version so tests see their own writes
+    FACTOR_CACHE_CHECK_SECONDS = 0
+    # Tests fire requests faster than any client would
+    ADMISSION_CONTROL_ENABLED = False
+    # No request is in flight while a test moves a user
+    SHARD_MOVE_GRACE_SECONDS = 0
 
 
 class ProductionConfig(Config):
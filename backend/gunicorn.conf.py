@@ -0,0 +1,82 @@
+"""
+Gunicorn Configuration.
+
+Loaded automatically by `gunicorn` from the working directory
+(and explicitly via `-c gunicorn.conf.py` in the Dockerfile).
+"""
+
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+
+# Threaded workers let idle SSE streams (/api/dashboard/stream) wait in a
+# thread instead of occupying a whole sync worker process each. Streams
+# still hold their thread, so each worker serves at most
+# SSE_MAX_STREAMS_PER_WORKER of them (503 beyond) and keeps the rest for the API.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+
+# Import the app (pandas, Pint, the unit registry and the factor
+# catalogue) once in the master; workers share it copy-on-write.
+# Code changes then need a full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# --- Prometheus Multiprocess Mode ---
+# Each worker writes its metric samples to this directory so that
+# `/metrics` can aggregate them across the whole process group.
+# It must be set before the app imports `prometheus_client`.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/ghg_metrics')
+# Stale metric files left by a previous master are cleared here, before
+# the preloaded app writes its own (it loads after this file, and before
+# `on_starting`). A HUP re-reads this file in the same master, whose
+# workers' files must survive, hence the marker.
+if not os.environ.get('GHG_METRICS_DIR_CLEARED'):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.environ['GHG_METRICS_DIR_CLEARED'] = '1'
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def when_ready(server):
+    """Fills the shared caches before the first worker is forked."""
+    if server.cfg.preload_app:
+        from app.warmup import preload
+        preload(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    """Drops state a worker must not share with the master."""
+    if server.cfg.preload_app:
+        from app.warmup import after_fork
+        after_fork(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    """
+    Warms the worker up before it accepts its first request, and starts
+    its write-behind flusher (which also replays segments of dead workers).
+    """
+    from app.warmup import warm_up_until_ready
+    warm_up_until_ready(worker.wsgi)
+    buffer = worker.wsgi.extensions.get('ghg_ingest_buffer')
+    if buffer is not None:
+        buffer.start()
+
+
+def worker_exit(server, worker):
+    """Commits the worker's buffered inputs before it exits."""
+    app = getattr(worker, 'wsgi', None)
+    buffer = app.extensions.get('ghg_ingest_buffer') if app is not None else None
+    if buffer is not None:
+        try:
+            buffer.close()
+        except Exception:
+            # Left for recovery by another worker or `flask flush_ingest_buffer`
+            server.log.exception('Could not flush the write-behind buffer')
+
+
+def child_exit(server, worker):
+    """Marks a dead worker's live gauges as stale."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,29 @@
+"""Add catalogue versions
+
+Revision ID: 3b9f4c2a7d10
+Revises: e1c07dfdc88c
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f4c2a7d10'
+down_revision = 'e1c07dfdc88c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalogue_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('catalogue_versions')
@@ -0,0 +1,34 @@
+"""Add grid intensity profiles
+
+Revision ID: 7c2e91d04b5a
+Revises: 3b9f4c2a7d10
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e91d04b5a'
+down_revision = '3b9f4c2a7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('grid_intensity_profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('region', sa.String(length=100), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('basis', sa.String(length=20), nullable=False),
+    sa.Column('values', sa.LargeBinary(), nullable=False),
+    sa.Column('source', sa.String(length=255), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('region', 'year', 'basis', name='uq_grid_profile_region_year_basis')
+    )
+
+
+def downgrade():
+    op.drop_table('grid_intensity_profiles')
@@ -0,0 +1,44 @@
+"""Add reading blocks
+
+Revision ID: a84d3f6e2c91
+Revises: 7c2e91d04b5a
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a84d3f6e2c91'
+down_revision = '7c2e91d04b5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reading_blocks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('factor_id', sa.Integer(), nullable=False),
+    sa.Column('series_key', sa.String(length=100), nullable=False),
+    sa.Column('block_start', sa.Date(), nullable=False),
+    sa.Column('block_end', sa.Date(), nullable=False),
+    sa.Column('resolution_minutes', sa.Integer(), nullable=False),
+    sa.Column('unit', sa.String(length=50), nullable=False),
+    sa.Column('reading_count', sa.Integer(), nullable=False),
+    sa.Column('total_activity', sa.Float(), nullable=False),
+    sa.Column('total_emissions_kg', sa.Float(), nullable=False),
+    sa.Column('values', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['factor_id'], ['emission_factors.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'series_key', 'factor_id', 'block_start', name='uq_reading_block_series_month')
+    )
+    op.create_index('ix_reading_blocks_user_start', 'reading_blocks', ['user_id', 'block_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_reading_blocks_user_start', table_name='reading_blocks')
+    op.drop_table('reading_blocks')
@@ -0,0 +1,29 @@
+"""Add ingested segments of the write-behind input buffer
+
+Revision ID: b46e0c9a3f52
+Revises: f2b6a0d71c38
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b46e0c9a3f52'
+down_revision = 'f2b6a0d71c38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingested_segments',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('flushed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('ingested_segments')
@@ -0,0 +1,28 @@
+"""Add the user shard map
+
+Revision ID: c3d8e5f1a2b4
+Revises: b46e0c9a3f52
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e5f1a2b4'
+down_revision = 'b46e0c9a3f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('shard_moving', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('shard_moving')
+        batch_op.drop_column('shard')
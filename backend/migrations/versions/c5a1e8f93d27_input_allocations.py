@@ -0,0 +1,101 @@
+"""Add input allocations
+
+Existing inputs are allocated by the upgrade itself, so reports never see
+an empty allocation table. `flask allocate_inputs` is only needed for
+inputs written by an older app version after the upgrade.
+
+Revision ID: c5a1e8f93d27
+Revises: a84d3f6e2c91
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1e8f93d27'
+down_revision = 'a84d3f6e2c91'
+branch_labels = None
+depends_on = None
+
+# Inputs read and allocated per batch by the backfill
+BACKFILL_BATCH_ROWS = 10000
+
+# The tables as of this revision (the app's models may have moved on)
+user_inputs = sa.table(
+    'user_inputs',
+    sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('factor_id', sa.Integer),
+    sa.column('date_period_start', sa.Date), sa.column('date_period_end', sa.Date),
+    sa.column('calculated_emissions_kg', sa.Float),
+)
+emission_factors = sa.table('emission_factors', sa.column('id', sa.Integer), sa.column('scope', sa.Integer))
+
+
+def month_shares(start, end, emissions):
+    """
+    Splits an input over the months it covers, in proportion to their
+    days (the same rule as `allocations.allocate`).
+    """
+    if end is None or end < start:
+        end = start
+    days = (end - start).days + 1
+    month = start.replace(day=1)
+    while month <= end:
+        next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        alloc_start, alloc_end = max(month, start), min(next_month - timedelta(days=1), end)
+        yield month, alloc_start, alloc_end, emissions * ((alloc_end - alloc_start).days + 1) / days
+        month = next_month
+
+
+def backfill_allocations(allocations):
+    """Allocates every existing input, in batches of `BACKFILL_BATCH_ROWS` ids."""
+    bind = op.get_bind()
+    statement = sa.select(
+        user_inputs.c.id, user_inputs.c.user_id, emission_factors.c.scope,
+        user_inputs.c.date_period_start, user_inputs.c.date_period_end,
+        user_inputs.c.calculated_emissions_kg,
+    ).join(emission_factors, user_inputs.c.factor_id == emission_factors.c.id).order_by(user_inputs.c.id)
+    last_id = 0
+    while True:
+        batch = bind.execute(
+            statement.where(user_inputs.c.id > last_id).limit(BACKFILL_BATCH_ROWS)
+        ).all()
+        if not batch:
+            break
+        rows = [
+            {
+                'input_id': input_id, 'user_id': user_id, 'scope': scope, 'month': month,
+                'alloc_start': alloc_start, 'alloc_end': alloc_end, 'emissions_kg': share
+            }
+            for input_id, user_id, scope, start, end, emissions in batch
+            for month, alloc_start, alloc_end, share in month_shares(start, end, emissions or 0.0)
+        ]
+        op.bulk_insert(allocations, rows)
+        last_id = batch[-1].id
+
+
+def upgrade():
+    allocations = op.create_table('input_allocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('input_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('alloc_start', sa.Date(), nullable=False),
+    sa.Column('alloc_end', sa.Date(), nullable=False),
+    sa.Column('emissions_kg', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['input_id'], ['user_inputs.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_input_allocations_input_id'), 'input_allocations', ['input_id'], unique=False)
+    op.create_index('ix_input_allocations_user_month', 'input_allocations', ['user_id', 'month'], unique=False)
+    backfill_allocations(allocations)
+
+
+def downgrade():
+    op.drop_index('ix_input_allocations_user_month', table_name='input_allocations')
+    op.drop_index(op.f('ix_input_allocations_input_id'), table_name='input_allocations')
+    op.drop_table('input_allocations')
@@ -0,0 +1,43 @@
+"""Add archive files of the cold-storage input archive
+
+Revision ID: d7a4c2e9b815
+Revises: c3d8e5f1a2b4
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a4c2e9b815'
+down_revision = 'c3d8e5f1a2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('min_date', sa.Date(), nullable=False),
+    sa.Column('max_date', sa.Date(), nullable=False),
+    sa.Column('input_count', sa.Integer(), nullable=False),
+    sa.Column('allocation_count', sa.Integer(), nullable=False),
+    sa.Column('max_input_id', sa.Integer(), nullable=False),
+    sa.Column('total_scope1_kg', sa.Float(), nullable=False),
+    sa.Column('total_scope2_kg', sa.Float(), nullable=False),
+    sa.Column('total_scope3_kg', sa.Float(), nullable=False),
+    sa.Column('monthly', sa.JSON(), nullable=False),
+    sa.Column('size_bytes', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_archive_files_user_dates', 'archive_files', ['user_id', 'min_date', 'max_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_archive_files_user_dates', table_name='archive_files')
+    op.drop_table('archive_files')
@@ -0,0 +1,42 @@
+"""Add monthly digests and report digest columns
+
+Existing data is summarized with `flask rebuild_digests` after upgrading.
+
+Revision ID: d93b27c4f1e8
+Revises: c5a1e8f93d27
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b27c4f1e8'
+down_revision = 'c5a1e8f93d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('monthly_digests',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('emissions_kg', sa.Float(), nullable=False),
+    sa.Column('max_input_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('digest_row_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('digest_emissions_kg', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('digest_max_input_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_column('digest_max_input_id')
+        batch_op.drop_column('digest_emissions_kg')
+        batch_op.drop_column('digest_row_count')
+    op.drop_table('monthly_digests')
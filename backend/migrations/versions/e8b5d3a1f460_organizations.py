@@ -0,0 +1,40 @@
+"""Add organizations and user membership
+
+Revision ID: e8b5d3a1f460
+Revises: d7a4c2e9b815
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b5d3a1f460'
+down_revision = 'd7a4c2e9b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('organizations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    # Memberships are granted by operators: the self-declared
+    # `company_name` is deliberately not carried over
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('organization_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_users_organization_id'), ['organization_id'], unique=False)
+        batch_op.create_foreign_key('fk_users_organization_id', 'organizations', ['organization_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_users_organization_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_users_organization_id'))
+        batch_op.drop_column('organization_id')
+    op.drop_table('organizations')
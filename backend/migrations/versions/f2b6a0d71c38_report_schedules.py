@@ -0,0 +1,67 @@
+"""Add report schedules, schedule runs and checkpoints
+
+Revision ID: f2b6a0d71c38
+Revises: d93b27c4f1e8
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6a0d71c38'
+down_revision = 'd93b27c4f1e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_schedules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('cron', sa.String(length=100), nullable=False),
+    sa.Column('period', sa.String(length=20), nullable=False),
+    sa.Column('name_template', sa.String(length=255), nullable=False),
+    sa.Column('enabled', sa.Boolean(), nullable=False),
+    sa.Column('last_due_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_schedules', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_schedules_user_id'), ['user_id'], unique=False)
+
+    op.create_table('schedule_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('schedule_id', sa.Integer(), nullable=False),
+    sa.Column('due_at', sa.DateTime(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('period_end', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('reports_created', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['schedule_id'], ['report_schedules.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('schedule_id', 'due_at', name='uq_schedule_run_due')
+    )
+    op.create_table('schedule_checkpoints',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('partition', sa.Integer(), nullable=False),
+    sa.Column('first_user_id', sa.Integer(), nullable=False),
+    sa.Column('last_user_id', sa.Integer(), nullable=False),
+    sa.Column('done', sa.Boolean(), nullable=False),
+    sa.Column('reports_created', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['run_id'], ['schedule_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('run_id', 'partition')
+    )
+
+
+def downgrade():
+    op.drop_table('schedule_checkpoints')
+    op.drop_table('schedule_runs')
+    with op.batch_alter_table('report_schedules', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_schedules_user_id'))
+    op.drop_table('report_schedules')
@@ -0,0 +1,32 @@
+"""Add series keys to user inputs
+
+Revision ID: f5c2a9d8e317
+Revises: e8b5d3a1f460
+Create Date: 2026-10-22 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c2a9d8e317'
+down_revision = 'e8b5d3a1f460'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Interval inputs imported before did not record their meter; they
+    # keep a NULL key and are not replaced by later imports
+    with op.batch_alter_table('user_inputs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('series_key', sa.String(length=100), nullable=True))
+        batch_op.create_unique_constraint(
+            'uq_user_input_series_month', ['user_id', 'series_key', 'factor_id', 'date_period_start']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('user_inputs', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_input_series_month', type_='unique')
+        batch_op.drop_column('series_key')
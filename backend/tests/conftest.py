@@ -0,0 +1,68 @@
+"""
+Shared Test Helpers.
+
+Every test module builds its own app and client, with the factors it
+needs. These fixtures return helpers that act through the API on the
+client passed to them. They hold no state, so they are session-scoped
+and module-scoped fixtures can use them too.
+"""
+
+import json
+import pytest
+
+PASSWORD = 'secret123'
+
+
+def bearer(token):
+    """The `Authorization` header for a token."""
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture(scope='session')
+def sign_up():
+    """
+    `sign_up(client, name, **fields)` registers `name` (with the email
+    `<name>@example.com`) and returns the response body.
+    """
+    def sign_up(client, name, **fields):
+        response = client.post('/auth/register', json={
+            'username': name, 'email': f'{name}@example.com', 'password': PASSWORD, **fields
+        })
+        assert response.status_code == 201
+        return json.loads(response.data)
+    return sign_up
+
+
+@pytest.fixture(scope='session')
+def register(sign_up):
+    """`register(client, name='user', **fields)` registers a user and returns their auth headers."""
+    def register(client, name='user', **fields):
+        return bearer(sign_up(client, name, **fields)['auth_token'])
+    return register
+
+
+@pytest.fixture(scope='session')
+def login():
+    """`login(client, email)` logs a user in and returns their auth headers."""
+    def login(client, email, password=PASSWORD):
+        response = client.post('/auth/login', json={'email': email, 'password': password})
+        assert response.status_code == 200
+        return bearer(json.loads(response.data)['auth_token'])
+    return login
+
+
+@pytest.fixture(scope='session')
+def add_input():
+    """
+    `add_input(client, headers, start, end=None, value=100, factor_id=1,
+    unit='kWh')` saves an input through the API and returns it.
+    """
+    def add_input(client, headers, start, end=None, value=100, factor_id=1, unit='kWh'):
+        payload = {'factor_id': factor_id, 'activity_value': value, 'activity_unit': unit,
+                   'date_period_start': start}
+        if end:
+            payload['date_period_end'] = end
+        response = client.post('/api/inputs', headers=headers, json=payload)
+        assert response.status_code == 201
+        return response.json
+    return add_input
@@ -0,0 +1,98 @@
+"""
+Tests for Admission Control.
+"""
+
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.admission import AdmissionController, LocalAdmissionBackend, get_admission_controller
+from app.models import EmissionFactor
+from config import TestingConfig, config
+
+LIMITS = {'expensive': {'user_concurrency': 1, 'global_concurrency': 2, 'rate': 1.0, 'burst': 3}}
+
+
+def test_token_bucket_refills_over_time():
+    backend = LocalAdmissionBackend()
+    with mock.patch('app.admission.time.monotonic', return_value=100.0):
+        assert [backend.take_token('k', 0.5, 2) for _ in range(2)] == [0.0, 0.0]
+        assert backend.take_token('k', 0.5, 2) == pytest.approx(2.0)
+    with mock.patch('app.admission.time.monotonic', return_value=102.0):
+        assert backend.take_token('k', 0.5, 2) == 0.0
+
+
+def test_concurrency_limits_per_user_and_globally():
+    controller = AdmissionController(LocalAdmissionBackend(), LIMITS)
+
+    first, rejection = controller.admit('expensive', 'user-1')
+    assert rejection is None
+    assert controller.admit('expensive', 'user-1')[1] == ('user_concurrency', 1)
+
+    second, _ = controller.admit('expensive', 'user-2')
+    assert controller.admit('expensive', 'user-3')[1] == ('global_concurrency', 1)
+
+    # A rejected request must not keep user-3's slot
+    first()
+    third, rejection = controller.admit('expensive', 'user-3')
+    assert rejection is None
+    second()
+    third()
+
+
+def test_rate_limit_reports_retry_after():
+    controller = AdmissionController(LocalAdmissionBackend(), {'expensive': {'rate': 0.25, 'burst': 1}})
+    release, _ = controller.admit('expensive', 'user-1')
+    release()
+    assert controller.admit('expensive', 'user-1')[1] == ('rate', 4)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    class AdmissionTestingConfig(TestingConfig):
+        ADMISSION_CONTROL_ENABLED = True
+        ADMISSION_COST_CLASSES = LIMITS
+
+    monkeypatch.setitem(config, 'admission_testing', AdmissionTestingConfig)
+    app = create_app('admission_testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def headers(client, register):
+    return register(client, 'tenant')
+
+
+REPORT = {'report_name': 'FY', 'start_date': '2025-01-01', 'end_date': '2025-12-31'}
+
+
+def test_busy_user_gets_429_while_cheap_routes_still_work(client, headers):
+    # Another request of the same user is in progress
+    release, _ = get_admission_controller().admit('expensive', 'user-1')
+
+    response = client.post('/api/reports', headers=headers, json=REPORT)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert response.json['reason'] == 'user_concurrency'
+    assert client.get('/api/reports', headers=headers).status_code == 200
+
+    release()
+    assert client.post('/api/reports', headers=headers, json=REPORT).status_code == 201
+
+
+def test_burst_is_rate_limited(client, headers):
+    statuses = [client.post('/api/reports', headers=headers, json=REPORT).status_code for _ in range(5)]
+    assert statuses[:3] == [201, 201, 201]
+    assert statuses[3] == 429
+
+    response = client.post('/api/reports', headers=headers, json=REPORT)
+    assert response.json['reason'] == 'rate'
+    assert int(response.headers['Retry-After']) >= 1
@@ -0,0 +1,104 @@
+"""
+Tests for Chunked Streaming Aggregation.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from app import create_app, db
+from app.aggregation import (
+    MemoryLimitExceeded, QuantileSketch, ScopeTotals, SummaryStats, fold_chunks, iter_chunks
+)
+from app.models import EmissionFactor
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE rows (scope INTEGER, calculated_emissions_kg REAL)'))
+        conn.execute(
+            text('INSERT INTO rows VALUES (:scope, :value)'),
+            [{'scope': 1 + i % 3, 'value': float(i)} for i in range(10000)]
+        )
+    return engine
+
+
+def test_chunks_are_bounded_and_fold_to_exact_totals(engine):
+    scopes, stats, sizes = ScopeTotals(), SummaryStats(), []
+
+    def recording(chunks):
+        for df in chunks:
+            sizes.append(len(df))
+            yield df
+
+    with engine.connect() as conn:
+        rows = fold_chunks(
+            recording(iter_chunks(conn, text('SELECT * FROM rows'), max_chunk_rows=1500)),
+            [scopes, stats]
+        )
+
+    assert rows == 10000
+    assert max(sizes) <= 1500
+    assert scopes.result()[1] == sum(float(i) for i in range(0, 10000, 3))
+    assert stats.result()['max_kg'] == 9999.0
+
+
+def test_memory_ceiling_shrinks_chunks(engine):
+    with engine.connect() as conn:
+        sizes = [len(df) for df in iter_chunks(
+            conn, text('SELECT * FROM rows'), max_chunk_rows=5000, memory_limit_bytes=20000
+        )]
+    assert sum(sizes) == 10000
+    assert max(sizes[1:]) < 1000
+
+
+def test_memory_ceiling_is_enforced(engine):
+    with engine.connect() as conn:
+        with pytest.raises(MemoryLimitExceeded):
+            list(iter_chunks(conn, text('SELECT * FROM rows'), memory_limit_bytes=100))
+
+
+def test_quantile_sketch_is_within_relative_accuracy():
+    values = np.random.default_rng(42).lognormal(mean=3, sigma=1.5, size=50000)
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for chunk in np.array_split(values, 7):
+        sketch.fold(pd.DataFrame({'calculated_emissions_kg': chunk}))
+
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method='lower')
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.03)
+
+
+def test_breakdown_endpoint(register, add_input):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Diesel', category='Fuel', scope=1, factor_value=2.0, unit='liter'
+        ))
+        db.session.commit()
+        client = app.test_client()
+        headers = register(client, 'breakdown')
+        for day in range(1, 11):
+            add_input(client, headers, f'2025-01-{day:02d}', value=day, unit='liter')
+
+        response = client.get(
+            '/api/reports/breakdown?start_date=2025-01-01&end_date=2025-01-31', headers=headers
+        )
+        data = response.json
+        assert response.status_code == 200
+        assert data['scope_totals']['scope1'] == pytest.approx(110.0)
+        assert data['summary']['count'] == 10
+        assert data['category_totals'] == [{'scope': 1, 'category': 'Fuel', 'total_kg': 110.0}]
+        assert data['percentiles']['p50'] == pytest.approx(10.0, rel=0.02)
+
+        response = client.get(
+            '/api/reports/details.csv?start_date=2025-01-01&end_date=2025-01-05', headers=headers
+        )
+        lines = response.data.decode('utf-8').strip().split('\n')
+        assert lines[0].startswith('id,date_period_start,scope,category,factor_name')
+        assert len(lines) == 6
+        db.session.remove()
+        db.drop_all()
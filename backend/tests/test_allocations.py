@@ -0,0 +1,120 @@
+"""
+Tests for Input Apportionment.
+"""
+
+from datetime import date, timedelta
+import pytest
+from app import allocations, create_app, db
+from app.allocations import allocate, allocate_missing_inputs, allocated_category_totals, allocated_scope_totals
+from app.models import EmissionFactor, InputAllocation, User, UserInput
+
+
+def test_allocate_weights_months_by_days():
+    row, month, start, end, emissions = allocate(
+        [date(2025, 1, 15), date(2025, 3, 1)], [date(2025, 3, 15), None], [900.0, 10.0]
+    )
+
+    assert row.tolist() == [0, 0, 0, 1]
+    assert month.tolist() == [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1), date(2025, 3, 1)]
+    assert start.tolist()[0] == date(2025, 1, 15) and end.tolist()[2] == date(2025, 3, 15)
+    # 17 + 28 + 15 = 60 days
+    assert emissions.tolist() == pytest.approx([255.0, 420.0, 225.0, 10.0])
+
+
+def test_allocate_rejects_reversed_periods():
+    with pytest.raises(ValueError):
+        allocate([date(2025, 2, 1)], [date(2025, 1, 1)], [1.0])
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_quarterly_bill_is_spread_across_reports_and_dashboard(client, register):
+    headers = register(client, 'bills')
+
+    response = client.post('/api/inputs', headers=headers, json={
+        'factor_id': 1, 'activity_value': 900, 'activity_unit': 'kWh',
+        'date_period_start': '2025-01-15', 'date_period_end': '2025-03-15'
+    })
+    assert response.status_code == 201
+    assert InputAllocation.query.count() == 3
+
+    february = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Feb', 'start_date': '2025-02-01', 'end_date': '2025-02-28'
+    }).json
+    assert february['total_scope1_kg'] == pytest.approx(420)
+
+    # Boundary months are pro-rated by day
+    partial = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Late Jan', 'start_date': '2025-01-25', 'end_date': '2025-03-10'
+    }).json
+    assert partial['total_scope1_kg'] == pytest.approx(15 * (7 + 28 + 10))
+
+    batch = client.post('/api/reports/batch', headers=headers, json={
+        'fiscal_year': 2025, 'generate': ['monthly']
+    }).json['reports']
+    assert [r['total_scope1_kg'] for r in batch[:4]] == pytest.approx([255, 420, 225, 0])
+
+    summary = client.get('/api/dashboard/summary', headers=headers).json
+    assert [m['total_emissions'] for m in summary['time_series']] == pytest.approx([255, 420, 225])
+
+
+def test_backfill_allocates_existing_inputs(client):
+    db.session.add(User(username='legacy', email='legacy@example.com', password='secret123'))
+    db.session.flush()
+    db.session.add_all([
+        UserInput(user_id=1, factor_id=1, activity_value=1, activity_unit='kWh',
+                  date_period_start=date(2024, 12, 20), date_period_end=date(2025, 1, 9),
+                  calculated_emissions_kg=21.0)
+        for _ in range(5)
+    ])
+    db.session.commit()
+
+    assert allocate_missing_inputs(chunk_rows=2) == 5
+    assert allocate_missing_inputs() == 0
+    assert InputAllocation.query.count() == 10
+    assert db.session.query(db.func.sum(InputAllocation.emissions_kg)).scalar() == pytest.approx(105)
+
+
+def test_allocations_inside_a_range_are_summed_by_the_database(client, monkeypatch):
+    db.session.add(User(username='daily', email='daily@example.com', password='secret123'))
+    db.session.flush()
+    # A bill cut by the range start, ten days in February and every day of March
+    periods = [(date(2025, 1, 15), date(2025, 3, 15))] + [
+        (day, None) for day in [date(2025, 2, 11) + timedelta(days=i) for i in range(10)]
+        + [date(2025, 3, 1) + timedelta(days=i) for i in range(31)]
+    ]
+    db.session.add_all([
+        UserInput(user_id=1, factor_id=1, activity_value=1, activity_unit='kWh',
+                  date_period_start=start, date_period_end=end, calculated_emissions_kg=60.0 if end else 1.0)
+        for start, end in periods
+    ])
+    db.session.commit()
+    allocate_missing_inputs()
+    start, end = date(2025, 2, 10), date(2025, 4, 20)
+
+    # Every allocation inside the range in one row, plus the cut February share
+    rows = allocated_scope_totals(1, start, end)
+    assert len(rows) == 2
+    assert sum(total for _, total in rows) == pytest.approx(19 + 15 + 41)
+
+    # Per-span rows only in the boundary months: February's 11, March in one
+    returned = []
+    totals_in_periods = allocations.category_totals_in_periods
+    monkeypatch.setattr(allocations, 'category_totals_in_periods',
+                        lambda rows, periods: returned.append(len(rows)) or totals_in_periods(rows, periods))
+    totals = allocated_category_totals(1, [(start, end)])
+    assert returned == [12]
+    assert totals[0][(1, 'Fuel')] == pytest.approx(19 + 15 + 41)
@@ -0,0 +1,153 @@
+"""
+Tests for the Per-User Analytics Cache.
+"""
+
+from datetime import date, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app import create_app, db
+from app.analytics_cache import AnalyticsCache, UserSeries, get_analytics_cache
+from app.models import EmissionFactor, User, UserInput
+from app.factor_import import import_factor_rows
+from app.seed import SEED_DATA
+
+
+def make_rows(n, start=date(2024, 1, 1)):
+    rng = np.random.default_rng(7)
+    rows = []
+    for i in range(n):
+        day = start + timedelta(days=int(rng.integers(0, 365)))
+        # Every fourth input is a bill covering up to three months
+        end = day + timedelta(days=int(rng.integers(1, 92))) if i % 4 == 0 else None
+        rows.append((i + 1, day, end, 1 + i % 3, f'Category {i % 5}', 1 + i % 10, float(rng.uniform(0, 100))))
+    return rows
+
+
+def brute_force(rows, start, end):
+    """Every input pro-rated by its days inside the range."""
+    totals, count = {'scope1': 0.0, 'scope2': 0.0, 'scope3': 0.0}, 0
+    for _, first, last, scope, _, _, emissions in rows:
+        last = last or first
+        inside = (min(last, end) - max(first, start)).days + 1
+        if inside > 0:
+            totals[f'scope{scope}'] += emissions * inside / ((last - first).days + 1)
+            count += 1
+    return totals, count
+
+
+def test_range_summary_matches_brute_force():
+    rows = make_rows(2000)
+    series = UserSeries(rows)
+
+    for start, end in [(date(2024, 1, 1), date(2024, 12, 31)),
+                       (date(2024, 3, 15), date(2024, 3, 15)),
+                       (date(2024, 6, 1), date(2024, 8, 31)),
+                       (date(2025, 1, 1), date(2025, 2, 1))]:
+        summary = series.range_summary(start, end)
+        totals, count = brute_force(rows, start, end)
+        assert summary['input_count'] == count
+        for key, value in totals.items():
+            assert summary['scope_totals'][key] == pytest.approx(value)
+        assert sum(summary['category_totals'].values()) == pytest.approx(summary['total'])
+
+
+def test_single_inserts_keep_prefix_sums_consistent():
+    rows = make_rows(500)
+    series = UserSeries(rows[:400])
+    for row in rows[400:]:
+        series.extend([row])
+
+    rebuilt = UserSeries(rows)
+    start, end = date(2024, 2, 1), date(2024, 10, 31)
+    assert series.range_summary(start, end)['scope_totals'] == pytest.approx(
+        rebuilt.range_summary(start, end)['scope_totals']
+    )
+    assert series.row_count == 500 and series.max_input_id == 500
+
+
+@pytest.fixture
+def cached_app():
+    app = create_app('testing')
+    app.config['ANALYTICS_CACHE_ENABLED'] = True
+    from app.analytics_cache import init_analytics_cache
+    init_analytics_cache(app)
+    with app.app_context():
+        db.create_all()
+        import_factor_rows(SEED_DATA)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_range_endpoint_uses_cache_and_sees_new_inputs(cached_app, register, add_input):
+    client = cached_app.test_client()
+    headers = register(client, 'ranger')
+    factor = EmissionFactor.query.filter_by(scope=2).first()
+
+    def submit(day, quantity):
+        add_input(client, headers, day, value=quantity, factor_id=factor.id, unit=factor.unit)
+
+    submit('2024-01-10', 100)
+    params = {'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+    first = client.get('/api/analytics/range', headers=headers, query_string=params).json
+    assert first['input_count'] == 1
+
+    # Inserted incrementally without reloading the user's series
+    submit('2024-02-10', 50)
+    second = client.get('/api/analytics/range', headers=headers, query_string=params).json
+    assert second['input_count'] == 2
+    assert second['scope_totals']['scope2'] == pytest.approx(150 * factor.factor_value)
+
+
+def test_cache_picks_up_rows_written_elsewhere(cached_app, register):
+    client = cached_app.test_client()
+    register(client, 'ranger')
+    factor = EmissionFactor.query.first()
+    cache = get_analytics_cache()
+    cache.validate_interval = 0
+    user = User.query.filter_by(username='ranger').first()
+
+    assert cache.get(user.id).row_count == 0
+    db.session.add(UserInput(
+        user_id=user.id, factor_id=factor.id, activity_value=1, activity_unit=factor.unit,
+        date_period_start=date(2024, 5, 1), date_period_end=date(2024, 5, 1),
+        calculated_emissions_kg=7.5
+    ))
+    db.session.commit()
+
+    series = cache.get(user.id)
+    assert series.row_count == 1
+    assert series.range_summary(date(2024, 1, 1), date(2024, 12, 31))['total'] == pytest.approx(7.5)
+
+
+def test_memory_budget_counts_series_grown_in_place():
+    cache = AnalyticsCache(max_bytes=10 ** 9, validate_interval=60)
+    rows = make_rows(1000)
+    cache._store(1, UserSeries(rows[:1]))
+
+    for input_id, day, end, scope, category, factor_id, emissions in rows[1:]:
+        cache.add_input(SimpleNamespace(
+            id=input_id, user_id=1, date_period_start=day, date_period_end=end, factor_id=factor_id,
+            calculated_emissions_kg=emissions
+        ), scope, category)
+    series = cache._entries[1]
+    assert series.row_count == 1000
+    assert cache.total_bytes == series.nbytes
+
+    cache.discard(1)
+    assert cache.total_bytes == 0
+
+
+def test_grown_series_are_evicted_over_budget():
+    rows = make_rows(1000)
+    cache = AnalyticsCache(max_bytes=UserSeries(rows).nbytes + 10, validate_interval=60)
+    cache._store(1, UserSeries(rows[:1]))
+    cache._store(2, UserSeries(rows[:1]))
+    for row in rows[1:]:
+        cache._entries[1].extend([row])
+        cache._store(1, cache._entries[1])
+
+    # User 2 (least recently used) made room for user 1's growth
+    assert list(cache._entries) == [1]
+    assert cache.total_bytes == cache._entries[1].nbytes
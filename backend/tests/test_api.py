@@ -119,4 +119,18 @@ def test_access_protected_route_with_token(test_client, new_user):
     
     assert response.status_code == 200
     # The response should be a list (even if empty, from seeding)
-    assert isinstance(json.loads(response.data), list)
\ No newline at end of file
+    assert isinstance(json.loads(response.data), list)
+
+
+def test_metrics_endpoint(test_client):
+    """
+    Test that request and SQL metrics are exposed in the Prometheus format.
+    """
+    test_client.get('/api/factors')
+    response = test_client.get('/metrics')
+    body = response.data.decode('utf-8')
+
+    assert response.status_code == 200
+    assert 'ghg_http_requests_total{endpoint="/api/factors",method="GET",status="401"}' in body
+    assert 'ghg_http_request_duration_seconds_bucket' in body
+    assert 'ghg_sql_statements_per_request_count' in body
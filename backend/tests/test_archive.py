@@ -0,0 +1,154 @@
+"""
+Tests for the Cold-Storage Archive.
+
+Every test saves the same inputs, most of them ended before `CUTOFF`.
+Archiving them must not change any answer of the reporting endpoints.
+"""
+
+import os
+from datetime import date
+import pytest
+from app import archive, create_app, db
+from app.archive import archive_closed_inputs, default_cutoff
+from app.digests import rebuild_digests
+from app.models import ArchiveFile, EmissionFactor, InputAllocation, UserInput
+from config import TestingConfig, config
+
+INPUTS = [
+    # A quarterly bill cut by the February report
+    ('2023-01-15', '2023-03-15', 900),
+    ('2023-02-10', None, 50),
+    ('2023-11-20', None, 30),
+    ('2024-06-01', '2024-06-30', 120),
+    # Not ended before the cutoff: stays live
+    ('2025-02-10', None, 10),
+]
+CUTOFF = date(2025, 1, 1)
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    class ArchiveTestingConfig(TestingConfig):
+        ARCHIVE_DIR = str(tmp_path / 'archive')
+
+    monkeypatch.setitem(config, 'archive_testing', ArchiveTestingConfig)
+    archive.read_archive_file.cache_clear()
+    app = create_app('archive_testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client, register, add_input):
+    headers = register(client, 'archived')
+    for start, end, value in INPUTS:
+        add_input(client, headers, start, end, value=value)
+    return headers
+
+
+def answers(client, headers):
+    """The responses of every endpoint that reads the inputs."""
+    february = {'start_date': '2023-02-01', 'end_date': '2023-02-28'}
+    years = {'start_date': '2023-01-01', 'end_date': '2025-12-31'}
+    return {
+        'report': client.post('/api/reports', headers=headers, json={
+            'report_name': 'Feb', **february
+        }).json['total_all_scopes_kg'],
+        'batch': [report['total_all_scopes_kg'] for report in client.post(
+            '/api/reports/batch', headers=headers, json={'fiscal_year': 2023, 'generate': ['quarterly']}
+        ).json['reports']],
+        'dashboard': client.get('/api/dashboard/summary', headers=headers).json,
+        'breakdown': client.get('/api/reports/breakdown', headers=headers, query_string=years).json['scope_totals'],
+        'compare': client.get('/api/reports/compare', headers=headers, query_string=[
+            ('start_date', '2024-01-01'), ('end_date', '2024-12-31'), ('compare', 'previous_year')
+        ]).json['total'],
+        'range': client.get('/api/analytics/range', headers=headers, query_string=february).json,
+        'csv_lines': len(client.get('/api/reports/details.csv', headers=headers, query_string=years).data.splitlines()),
+    }
+
+
+def test_default_cutoff_is_months_ago(app):
+    assert default_cutoff(date(2026, 3, 17)) == date(2024, 3, 1)
+
+
+def test_archived_inputs_still_count_everywhere(app, client, headers):
+    before = answers(client, headers)
+
+    result = archive_closed_inputs(CUTOFF)
+    assert result == {'users': 1, 'inputs': 4, 'files': 2}
+    assert UserInput.query.count() == 1 and InputAllocation.query.count() == 1
+    assert ArchiveFile.query.count() == 2
+    assert all(os.path.exists(os.path.join(app.config['ARCHIVE_DIR'], f.path)) for f in ArchiveFile.query)
+
+    after = answers(client, headers)
+    assert after['report'] == pytest.approx(420.0 + 50.0)
+    assert after['batch'] == pytest.approx(before['batch'])
+    assert after['breakdown'] == pytest.approx(before['breakdown'])
+    assert after['compare']['totals'] == pytest.approx(before['compare']['totals'])
+    assert after['range']['total'] == pytest.approx(before['range']['total'])
+    # The quarterly bill overlaps February too
+    assert after['range']['input_count'] == before['range']['input_count'] == 2
+    assert after['dashboard'] == before['dashboard']
+    assert after['csv_lines'] == before['csv_lines'] == 6
+
+
+def test_files_outside_the_range_are_not_opened(app, client, headers, monkeypatch):
+    archive_closed_inputs(CUTOFF)
+    opened = []
+    read = archive.read_archive_file
+    monkeypatch.setattr(archive, 'read_archive_file', lambda path: opened.append(path) or read(path))
+
+    # Only live data in the range
+    response = client.get('/api/reports/breakdown', headers=headers, query_string={
+        'start_date': '2025-01-01', 'end_date': '2025-12-31'
+    })
+    assert response.json['scope_totals']['scope1'] == pytest.approx(10.0)
+    assert opened == []
+
+    # A file lying entirely inside a report's range is answered from its statistics
+    response = client.post('/api/reports', headers=headers, json={
+        'report_name': '2024', 'start_date': '2024-01-01', 'end_date': '2024-12-31'
+    })
+    assert response.json['total_all_scopes_kg'] == pytest.approx(120.0)
+    assert opened == []
+
+    # Only the 2023 file overlaps February 2023
+    client.post('/api/reports', headers=headers, json={
+        'report_name': 'Feb', 'start_date': '2023-02-01', 'end_date': '2023-02-28'
+    })
+    assert [os.path.basename(path)[:4] for path in opened] == ['2023']
+
+
+def test_archived_reports_are_not_stale(client, headers):
+    client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q1', 'start_date': '2023-01-01', 'end_date': '2023-03-31'
+    })
+    archive_closed_inputs(CUTOFF)
+    assert client.get('/api/reports/stale', headers=headers).json == []
+
+    # Rebuilding the digests takes the archived months from the statistics
+    rebuild_digests()
+    assert client.get('/api/reports/stale', headers=headers).json == []
+
+
+def test_archive_inputs_command(app, headers):
+    result = app.test_cli_runner().invoke(args=['archive_inputs', '--before', '2024-01-01', '--max-rows', '1'])
+    assert result.exit_code == 0
+    assert 'Archived 3 inputs of 1 users' in result.output
+    assert ArchiveFile.query.count() == 3
+    # Running again finds nothing left to archive
+    result = app.test_cli_runner().invoke(args=['archive_inputs', '--before', '2024-01-01'])
+    assert 'Archived 0 inputs' in result.output
@@ -0,0 +1,92 @@
+"""
+Tests for Multi-Period Batch Reports.
+"""
+
+from datetime import date
+import pytest
+from app import create_app, db
+from app.models import EmissionFactor, Report
+from app.periods import fiscal_year_periods, parse_batch_periods
+
+
+def test_fiscal_year_expands_to_seventeen_periods():
+    periods = fiscal_year_periods(2025, ['monthly', 'quarterly', 'annual'], start_month=4)
+
+    assert len(periods) == 17
+    assert periods[0].start_date == date(2024, 4, 1)
+    assert periods[11].end_date == date(2025, 3, 31)
+    assert periods[12].report_name == 'FY2025 Q1'
+    assert (periods[13].start_date, periods[13].end_date) == (date(2024, 7, 1), date(2024, 9, 30))
+    assert periods[-1] == ('FY2025', date(2024, 4, 1), date(2025, 3, 31))
+
+
+def test_parse_batch_periods_validates():
+    with pytest.raises(ValueError):
+        parse_batch_periods({})
+    with pytest.raises(ValueError):
+        parse_batch_periods({'fiscal_year': 2025, 'generate': ['weekly']})
+    with pytest.raises(ValueError):
+        parse_batch_periods({'periods': [
+            {'report_name': 'Bad', 'start_date': '2025-02-01', 'end_date': '2025-01-01'}
+        ]})
+    # The daily grid would cover decades
+    with pytest.raises(ValueError, match='span'):
+        parse_batch_periods({'periods': [
+            {'report_name': 'Old', 'start_date': '1990-01-01', 'end_date': '1990-12-31'},
+            {'report_name': 'New', 'start_date': '2025-01-01', 'end_date': '2025-12-31'}
+        ]})
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Diesel', category='Fuel', scope=1,
+            factor_value=2.0, unit='liter', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_batch_matches_individual_reports(client, register, add_input):
+    headers = register(client, 'closer')
+    factor_id = EmissionFactor.query.first().id
+
+    for day, litres in [('2025-01-15', 10), ('2025-02-28', 20), ('2025-05-01', 30), ('2025-12-31', 40)]:
+        add_input(client, headers, day, value=litres, factor_id=factor_id, unit='liter')
+
+    response = client.post('/api/reports/batch', headers=headers, json={
+        'fiscal_year': 2025,
+        'generate': ['monthly', 'quarterly', 'annual'],
+        'periods': [{'report_name': 'Custom', 'start_date': '2025-02-01', 'end_date': '2025-05-01'}]
+    })
+    assert response.status_code == 201
+    reports = {r['report_name']: r for r in response.json['reports']}
+
+    assert len(reports) == 18
+    assert Report.query.count() == 18
+    assert reports['FY2025 Jan 2025']['total_scope1_kg'] == pytest.approx(20)
+    assert reports['FY2025 Mar 2025']['total_all_scopes_kg'] == 0
+    assert reports['FY2025 Q1']['total_scope1_kg'] == pytest.approx(60)
+    assert reports['FY2025 Q4']['total_scope1_kg'] == pytest.approx(80)
+    assert reports['FY2025']['total_all_scopes_kg'] == pytest.approx(200)
+    assert reports['Custom']['total_scope1_kg'] == pytest.approx(100)
+    assert all(r['generated_at'] for r in reports.values())
+
+    single = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Single', 'start_date': '2025-02-01', 'end_date': '2025-05-01'
+    }).json
+    assert single['total_all_scopes_kg'] == pytest.approx(reports['Custom']['total_all_scopes_kg'])
+
+
+def test_batch_rejects_bad_payload(client, register):
+    headers = register(client, 'closer')
+
+    response = client.post('/api/reports/batch', headers=headers, json={
+        'fiscal_year': 2025, 'generate': ['hourly']
+    })
+    assert response.status_code == 400
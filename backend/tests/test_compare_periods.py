@@ -0,0 +1,72 @@
+"""
+Tests for the Period-over-Period Comparison.
+"""
+
+from datetime import date
+import pytest
+from app import create_app, db
+from app.models import EmissionFactor
+from app.periods import previous_period, previous_year
+
+
+def test_previous_period_shifts_whole_months_and_day_ranges():
+    assert previous_period(date(2025, 3, 1), date(2025, 3, 31)) == (date(2025, 2, 1), date(2025, 2, 28))
+    assert previous_period(date(2025, 1, 1), date(2025, 3, 31)) == (date(2024, 10, 1), date(2024, 12, 31))
+    assert previous_period(date(2025, 1, 8), date(2025, 1, 14)) == (date(2025, 1, 1), date(2025, 1, 7))
+
+
+def test_previous_year_keeps_month_ends():
+    assert previous_year(date(2024, 2, 1), date(2024, 2, 29)) == (date(2023, 2, 1), date(2023, 2, 28))
+    assert previous_year(date(2025, 2, 1), date(2025, 2, 28)) == (date(2024, 2, 1), date(2024, 2, 29))
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            EmissionFactor(name='Diesel', category='Fuel', scope=1,
+                           factor_value=1.0, unit='liter', source='Test'),
+            EmissionFactor(name='Grid', category='Electricity', scope=2,
+                           factor_value=1.0, unit='kWh', source='Test'),
+        ])
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_compare_returns_totals_and_deltas(client, register, add_input):
+    headers = register(client, 'trends')
+    diesel, grid = EmissionFactor.query.order_by(EmissionFactor.id).all()
+
+    for factor, unit, day, value in [
+        (diesel, 'liter', '2025-03-05', 150), (diesel, 'liter', '2025-02-10', 100),
+        (diesel, 'liter', '2024-03-20', 50), (grid, 'kWh', '2025-02-15', 40),
+    ]:
+        add_input(client, headers, day, value=value, factor_id=factor.id, unit=unit)
+
+    response = client.get('/api/reports/compare', headers=headers, query_string=[
+        ('start_date', '2025-03-01'), ('end_date', '2025-03-31'),
+        ('compare', 'previous_period'), ('compare', 'previous_year')
+    ])
+    assert response.status_code == 200
+    body = response.json
+
+    assert [p['start_date'] for p in body['periods']] == ['2025-03-01', '2025-02-01', '2024-03-01']
+    fuel = next(row for row in body['rows'] if row['category'] == 'Fuel')
+    assert fuel['totals'] == [150, 100, 50]
+    assert fuel['delta'] == [50, 100]
+    assert fuel['pct'] == [pytest.approx(50), pytest.approx(200)]
+
+    assert body['scopes']['scope2'] == {'totals': [0, 40, 0], 'delta': [-40, 0], 'pct': [-100, None]}
+    assert body['total']['totals'] == [150, 140, 50]
+
+
+def test_compare_requires_a_comparison(client, register):
+    headers = register(client, 'trends')
+
+    response = client.get('/api/reports/compare', headers=headers,
+                          query_string={'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+    assert response.status_code == 400
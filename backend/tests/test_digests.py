@@ -0,0 +1,124 @@
+"""
+Tests for Report Staleness Detection.
+"""
+
+import time
+from datetime import date
+import pytest
+from app import create_app, db
+from app.digests import find_stale_reports, rebuild_digests
+from app.models import EmissionFactor, MonthlyDigest, Report, User
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def digests():
+    return {
+        (d.user_id, d.month): (d.row_count, round(d.emissions_kg, 6), d.max_input_id)
+        for d in MonthlyDigest.query.all()
+    }
+
+
+def test_late_input_makes_covering_reports_stale(client, register, add_input):
+    headers = register(client)
+    add_input(client, headers, '2025-01-10')
+    add_input(client, headers, '2025-01-15', '2025-03-15', value=900)
+
+    q1 = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+    }).json
+    q2 = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q2', 'start_date': '2025-04-01', 'end_date': '2025-06-30'
+    }).json
+    assert client.get('/api/reports/stale', headers=headers).json == []
+
+    # A late February bill only affects Q1
+    add_input(client, headers, '2025-02-20', value=5)
+    stale = client.get('/api/reports/stale', headers=headers).json
+    assert [report['id'] for report in stale] == [q1['id']]
+
+    # Regenerating brings it back in line
+    client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q1 (revised)', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+    })
+    assert [report['id'] for report in find_stale_reports()] == [q1['id']]
+    assert q2['id'] not in [report['id'] for report in find_stale_reports()]
+
+
+def test_batch_reports_record_digests_and_blocks_count(client, register, add_input):
+    headers = register(client)
+    add_input(client, headers, '2025-05-03')
+    response = client.post('/api/reports/batch', headers=headers, json={
+        'fiscal_year': 2025, 'generate': ['monthly', 'annual']
+    })
+    assert response.status_code == 201
+    assert all(report.digest_row_count is not None for report in Report.query.all())
+    assert find_stale_reports() == []
+
+    readings = [{'meter_id': 'm1', 'timestamp': '2025-07-01T00:00:00Z', 'kwh': 2.0}]
+    assert client.post('/api/reading-blocks', headers=headers, json={
+        'factor_id': 1, 'readings': readings
+    }).status_code == 201
+    stale = {report['report_name'] for report in find_stale_reports()}
+    assert stale == {'FY2025 Jul 2025', 'FY2025'}
+
+
+def test_rebuild_matches_incremental_digests(client, register, add_input):
+    headers = register(client)
+    add_input(client, headers, '2024-12-20', '2025-02-10', value=520)
+    add_input(client, headers, '2025-02-01')
+    client.post('/api/reading-blocks', headers=headers, json={'factor_id': 1, 'readings': [
+        {'meter_id': 'm1', 'timestamp': '2025-02-03T00:15:00Z', 'kwh': 1.5},
+        {'meter_id': 'm1', 'timestamp': '2025-03-03T00:15:00Z', 'kwh': 2.5},
+    ]})
+
+    incremental = digests()
+    assert incremental[(1, date(2025, 2, 1))][0] == 3
+    assert rebuild_digests() == len(incremental)
+    assert digests() == incremental
+
+
+def test_reports_without_digests_are_stale(client, register):
+    register(client)
+    db.session.add(Report(
+        user_id=1, report_name='Legacy', start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+        total_scope1_kg=0, total_scope2_kg=0, total_scope3_kg=0, total_all_scopes_kg=0
+    ))
+    db.session.commit()
+    assert [report['report_name'] for report in find_stale_reports()] == ['Legacy']
+
+
+def test_checking_many_reports_is_fast(client, register, add_input):
+    headers = register(client)
+    add_input(client, headers, '2025-01-10')
+    user = db.session.get(User, 1)
+    client.post('/api/reports/batch', headers=headers, json={'fiscal_year': 2025})
+    template = Report.query.filter_by(report_name='FY2025 Q1').one()
+    db.session.add_all([
+        Report(
+            user_id=user.id, report_name=f'Copy {i}', start_date=template.start_date,
+            end_date=template.end_date, total_scope1_kg=0, total_scope2_kg=0, total_scope3_kg=0,
+            total_all_scopes_kg=0, digest_row_count=template.digest_row_count,
+            digest_emissions_kg=template.digest_emissions_kg,
+            digest_max_input_id=template.digest_max_input_id
+        )
+        for i in range(5000)
+    ])
+    db.session.commit()
+
+    started = time.perf_counter()
+    assert find_stale_reports() == []
+    assert time.perf_counter() - started < 2.0
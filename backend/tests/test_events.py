@@ -0,0 +1,135 @@
+"""
+Live Dashboard Event Tests.
+
+Tests the in-process broker and the SSE stream endpoint.
+"""
+
+import json
+import pytest
+from app import create_app, db
+from app.events import InProcessBroker, dashboard_channel
+from app.models import EmissionFactor
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.2, unit='kWh'
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_broker_delivers_only_to_channel_subscribers():
+    broker = InProcessBroker()
+    mine = broker.subscribe(dashboard_channel(1))
+    other = broker.subscribe(dashboard_channel(2))
+
+    broker.publish(dashboard_channel(1), {'type': 'input_created'})
+
+    assert mine.get(timeout=0) == {'type': 'input_created'}
+    assert other.get(timeout=0) is None
+
+    mine.close()
+    other.close()
+    assert broker._subscriptions == {}
+
+
+def test_broker_drops_messages_for_stalled_subscribers():
+    broker = InProcessBroker(max_queue_size=1)
+    subscription = broker.subscribe('channel')
+
+    broker.publish('channel', {'n': 1})
+    broker.publish('channel', {'n': 2})
+
+    assert subscription.get(timeout=0) == {'n': 1}
+    assert subscription.get(timeout=0) is None
+
+
+def ticket_for(client, token):
+    response = client.post('/api/dashboard/stream-ticket', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+    return response.json['ticket']
+
+
+def test_stream_pushes_input_deltas(app, sign_up):
+    client = app.test_client()
+    token = sign_up(client, 'streamer')['auth_token']
+
+    stream = client.get(
+        f'/api/dashboard/stream?ticket={ticket_for(client, token)}',
+        headers={'Accept': 'text/event-stream'},
+        buffered=False
+    )
+    assert stream.status_code == 200
+    assert stream.mimetype == 'text/event-stream'
+    events = stream.response
+    assert next(events).startswith(b'event: ready')
+
+    client.post('/api/inputs', headers={'Authorization': f'Bearer {token}'}, json={
+        'factor_id': 1, 'activity_value': 2, 'activity_unit': 'MWh',
+        'date_period_start': '2025-03-10'
+    })
+
+    message = next(events).decode('utf-8')
+    payload = json.loads(message.split('data: ', 1)[1])
+    assert message.startswith('event: input_created')
+    assert payload['scope'] == 2
+    assert payload['month'] == '2025-03'
+    assert payload['delta_kg'] == pytest.approx(400.0)
+    stream.close()
+
+
+def test_streams_over_the_worker_limit_get_503(app, monkeypatch, sign_up):
+    monkeypatch.setattr(app.extensions['ghg_stream_slots'], 'limit', 1)
+    client = app.test_client()
+    token = sign_up(client, 'crowded')['auth_token']
+
+    def open_stream():
+        return client.get(
+            f'/api/dashboard/stream?ticket={ticket_for(client, token)}',
+            headers={'Accept': 'text/event-stream'},
+            buffered=False
+        )
+
+    first = open_stream()
+    assert first.status_code == 200
+    rejected = open_stream()
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == '30'
+
+    # Closing a stream frees its slot, even before any event was read
+    first.close()
+    again = open_stream()
+    assert again.status_code == 200
+    again.close()
+    assert app.extensions['ghg_stream_slots'].open == 0
+
+
+def test_stream_tickets_are_single_use(app, sign_up):
+    client = app.test_client()
+    token = sign_up(client, 'ticketed')['auth_token']
+    ticket = ticket_for(client, token)
+
+    def open_stream(query):
+        return client.get(f'/api/dashboard/stream?{query}', headers={'Accept': 'text/event-stream'}, buffered=False)
+
+    # The auth token is no longer accepted in the URL
+    assert open_stream(f'access_token={token}').status_code == 401
+
+    stream = open_stream(f'ticket={ticket}')
+    assert stream.status_code == 200
+    stream.close()
+    replayed = open_stream(f'ticket={ticket}')
+    assert replayed.status_code == 401
+    assert 'already used' in replayed.json['message']
+
+    # A ticket is not an auth token either
+    response = client.get('/api/dashboard/summary', headers={'Authorization': f'Bearer {ticket_for(client, token)}'})
+    assert response.status_code == 401
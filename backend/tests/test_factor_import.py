@@ -0,0 +1,104 @@
+"""
+Tests for the Emission Factor Catalogue Importer.
+"""
+
+import csv
+import json
+import time
+import pytest
+from datetime import date
+from app import create_app, db
+from app.factor_import import import_factor_catalogue, import_factor_rows, iter_catalogue_rows
+from app.models import EmissionFactor, User, UserInput
+from app.seed import SEED_DATA
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_json_array_is_streamed(tmp_path):
+    path = tmp_path / 'catalogue.json'
+    path.write_text(json.dumps(SEED_DATA, indent=2))
+
+    rows = list(iter_catalogue_rows(str(path)))
+
+    assert rows == SEED_DATA
+
+
+def test_import_inserts_updates_and_reports_counts(app, tmp_path):
+    import_factor_rows(SEED_DATA)
+    changed = [dict(row) for row in SEED_DATA]
+    changed[0]['factor_value'] = 0.2
+    changed.append({'name': 'Biomass', 'category': 'Fuel', 'scope': 1,
+                    'factor_value': 0.015, 'unit': 'kWh', 'source': 'DEFRA 2024'})
+    changed.append({'name': 'Broken', 'category': 'Fuel', 'scope': 7,
+                    'factor_value': 1, 'unit': 'kWh'})
+    changed.append(dict(changed[1]))
+    path = tmp_path / 'catalogue.csv'
+    write_csv(path, changed)
+
+    result = import_factor_catalogue(str(path))
+
+    assert result['inserted'] == 1
+    assert result['updated'] == 1
+    assert result['unchanged'] == len(SEED_DATA) - 1
+    assert result['duplicates'] == 1
+    assert result['invalid'] == 1
+    assert EmissionFactor.query.count() == len(SEED_DATA) + 1
+    assert EmissionFactor.query.filter_by(
+        name='Natural Gas', unit='kWh'
+    ).one().factor_value == 0.2
+
+
+def test_referenced_factors_are_left_alone(app):
+    import_factor_rows(SEED_DATA)
+    user = User(username='importer', email='import@example.com', password='secret123')
+    db.session.add(user)
+    db.session.commit()
+    factor = EmissionFactor.query.filter_by(name='Natural Gas', unit='kWh').one()
+    db.session.add(UserInput(
+        user_id=user.id, factor_id=factor.id, activity_value=10, activity_unit='kWh',
+        date_period_start=date(2025, 1, 1), calculated_emissions_kg=1.83
+    ))
+    db.session.commit()
+
+    changed = [dict(row) for row in SEED_DATA]
+    changed[0]['factor_value'] = 0.5
+    result = import_factor_rows(changed)
+
+    assert result['skipped_referenced'] == 1
+    assert result['updated'] == 0
+    db.session.refresh(factor)
+    assert factor.factor_value == 0.183
+
+
+def test_large_catalogue_uses_bulk_statements(app, tmp_path):
+    rows = [
+        {'name': f'Factor {i}', 'category': 'Fuel', 'scope': 1 + i % 3,
+         'factor_value': i / 1000, 'unit': 'kWh', 'source': 'Bulk'}
+        for i in range(10000)
+    ]
+    path = tmp_path / 'catalogue.jsonl'
+    path.write_text('\n'.join(json.dumps(row) for row in rows))
+
+    start = time.perf_counter()
+    result = import_factor_catalogue(str(path))
+    elapsed = time.perf_counter() - start
+
+    assert result['inserted'] == 10000
+    assert EmissionFactor.query.count() == 10000
+    assert elapsed < 10
@@ -0,0 +1,79 @@
+"""
+Tests for the Factor Search Index and Cache.
+"""
+
+import time
+import pytest
+from app import create_app, db
+from app.factor_cache import FactorSearchIndex, get_factor_cache
+from app.factor_import import import_factor_rows
+from app.seed import SEED_DATA
+
+
+def make_factors(rows):
+    return [dict(row, id=i + 1) for i, row in enumerate(rows)]
+
+
+def names(result):
+    return [factor['name'] for factor in result['factors']]
+
+
+def test_prefix_tokens_must_all_match():
+    index = FactorSearchIndex(make_factors(SEED_DATA))
+
+    assert names(index.search('grid germ')) == ['Grid Electricity (Germany)']
+    assert names(index.search('COMMUT bus')) == ['Employee Commuting (Bus)']
+    assert index.search('grid nothing')['total_items'] == 0
+
+
+def test_search_matches_unit_and_source_and_filters_scope():
+    index = FactorSearchIndex(make_factors(SEED_DATA))
+
+    assert index.search('tonne')['total_items'] == 2
+    assert index.search('defra', scope=2)['factors'][0]['name'] == 'Grid Electricity (UK Average)'
+    assert index.search('', scope=2)['total_items'] == 4
+
+
+def test_search_paginates():
+    index = FactorSearchIndex(make_factors(SEED_DATA))
+
+    page = index.search('', page=2, per_page=8)
+
+    assert page['total_items'] == len(SEED_DATA)
+    assert page['total_pages'] == 3
+    assert len(page['factors']) == 8
+
+
+def test_large_catalogue_search_is_fast():
+    rows = [
+        {'name': f'Fuel type {i} blend {i % 97}', 'category': f'Category {i % 40}',
+         'scope': 1 + i % 3, 'factor_value': 1.0, 'unit': 'kWh', 'source': 'DEFRA 2024'}
+        for i in range(10000)
+    ]
+    index = FactorSearchIndex(make_factors(rows))
+
+    start = time.perf_counter()
+    for query in ('fuel 123', 'blend 9', 'cat', 'defra kwh 42'):
+        index.search(query, per_page=20)
+    per_query = (time.perf_counter() - start) / 4
+
+    assert per_query < 0.05
+
+
+def test_cache_rebuilds_when_catalogue_changes(register):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        headers = register(client, 'searcher')
+
+        assert client.get('/api/factors/search?q=diesel', headers=headers).json['total_items'] == 0
+        first = get_factor_cache().get()
+
+        import_factor_rows(SEED_DATA)
+
+        response = client.get('/api/factors/search?q=diesel', headers=headers)
+        assert response.json['total_items'] == 2
+        assert get_factor_cache().get().version > first.version
+        db.session.remove()
+        db.drop_all()
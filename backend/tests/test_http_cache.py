@@ -0,0 +1,84 @@
+"""
+Tests for HTTP Conditional Caching.
+"""
+
+import pytest
+from app import create_app, db
+from app.factor_cache import bump_catalogue_version
+from app.models import EmissionFactor
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_factors_revalidate_until_the_catalogue_changes(client, register):
+    headers = register(client)
+    first = client.get('/api/factors', headers=headers)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert first.headers['X-Accel-Expires'] == '60'
+    assert 'Authorization' in first.headers['Vary']
+
+    repeat = client.get('/api/factors', headers={**headers, 'If-None-Match': etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    # nginx may weaken the ETag when compressing
+    assert client.get('/api/factors', headers={**headers, 'If-None-Match': f'W/{etag}'}).status_code == 304
+
+    db.session.add(EmissionFactor(
+        name='Diesel', category='Fuel', scope=1, factor_value=2.7, unit='liter', source='Test'
+    ))
+    bump_catalogue_version()
+    db.session.commit()
+    changed = client.get('/api/factors', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.json) == 2
+
+
+def test_reports_are_cached_as_immutable_snapshots(client, register):
+    headers = register(client)
+    report = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+    }).json
+
+    first = client.get(f"/api/reports/{report['id']}", headers=headers)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, max-age=86400, immutable'
+    assert first.headers['X-Accel-Expires'] == '86400'
+
+    by_etag = client.get(f"/api/reports/{report['id']}", headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert by_etag.status_code == 304
+    assert by_etag.headers['ETag'] == first.headers['ETag']
+    by_date = client.get(f"/api/reports/{report['id']}", headers={
+        **headers, 'If-Modified-Since': first.headers['Last-Modified']
+    })
+    assert by_date.status_code == 304
+
+    # A stale validator still gets the full report
+    stale = client.get(f"/api/reports/{report['id']}", headers={**headers, 'If-None-Match': '"report-0"'})
+    assert stale.status_code == 200 and stale.json['report_name'] == 'Q1'
+
+
+def test_validators_do_not_leak_other_users_reports(client, register):
+    owner = register(client, 'owner')
+    report = client.post('/api/reports', headers=owner, json={
+        'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+    }).json
+    etag = client.get(f"/api/reports/{report['id']}", headers=owner).headers['ETag']
+
+    other = register(client, 'other')
+    response = client.get(f"/api/reports/{report['id']}", headers={**other, 'If-None-Match': etag})
+    assert response.status_code == 404
@@ -0,0 +1,109 @@
+"""
+Tests for the Write-Behind Input Buffer.
+"""
+
+import os
+import shutil
+import pytest
+from app import create_app, db
+from app.ingest_buffer import IngestBuffer, get_ingest_buffer, recover_segments
+from app.models import EmissionFactor, InputAllocation, MonthlyDigest, UserInput
+from config import TestingConfig, config
+
+ASYNC = {'Prefer': 'respond-async'}
+INPUT = {
+    'factor_id': 1, 'activity_value': 100, 'activity_unit': 'kWh',
+    'date_period_start': '2025-01-15', 'date_period_end': '2025-02-14'
+}
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    class IngestTestingConfig(TestingConfig):
+        INGEST_BUFFER_ENABLED = True
+        INGEST_BUFFER_DIR = str(tmp_path / 'ingest')
+        INGEST_BUFFER_MAX_ROWS = 3
+
+    monkeypatch.setitem(config, 'ingest_testing', IngestTestingConfig)
+    # Tests flush explicitly instead of from the background thread
+    monkeypatch.setattr(IngestBuffer, 'start', lambda self: None)
+    app = create_app('ingest_testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.5, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client, register):
+    return register(client, 'gateway')
+
+
+def test_buffered_input_is_committed_by_flush(app, client, headers):
+    response = client.post('/api/inputs', headers={**headers, **ASYNC}, json=INPUT)
+    assert response.status_code == 202
+    assert response.headers['Preference-Applied'] == 'respond-async'
+    assert response.json['calculated_emissions_kg'] == pytest.approx(50.0)
+    assert db.session.query(UserInput).count() == 0
+
+    assert get_ingest_buffer().flush(force=True) == 1
+    assert db.session.query(UserInput).count() == 1
+    assert sorted(a.month.month for a in db.session.query(InputAllocation)) == [1, 2]
+    assert sum(d.emissions_kg for d in db.session.query(MonthlyDigest)) == pytest.approx(50.0)
+    assert os.listdir(app.config['INGEST_BUFFER_DIR']) == []
+
+
+def test_without_preference_input_is_saved_synchronously(client, headers):
+    response = client.post('/api/inputs', headers=headers, json=INPUT)
+    assert response.status_code == 201
+    assert db.session.query(UserInput).count() == 1
+
+
+def test_invalid_input_is_rejected_before_buffering(client, headers):
+    response = client.post('/api/inputs', headers={**headers, **ASYNC}, json={**INPUT, 'activity_unit': 'km'})
+    assert response.status_code == 400
+    assert get_ingest_buffer().pending == 0
+
+
+def test_full_buffer_applies_backpressure(client, headers):
+    statuses = [client.post('/api/inputs', headers={**headers, **ASYNC}, json=INPUT).status_code for _ in range(4)]
+    assert statuses == [202, 202, 202, 503]
+
+    get_ingest_buffer().flush(force=True)
+    assert client.post('/api/inputs', headers={**headers, **ASYNC}, json=INPUT).status_code == 202
+
+
+def test_segments_of_dead_process_are_replayed_once(app, client, headers, tmp_path):
+    for _ in range(2):
+        client.post('/api/inputs', headers={**headers, **ASYNC}, json=INPUT)
+    directory = app.config['INGEST_BUFFER_DIR']
+    [name] = os.listdir(directory)
+
+    # A live process's segment is locked and left alone
+    assert recover_segments(directory) == 0
+
+    # The process dies: its lock is released, the file stays
+    get_ingest_buffer()._active.file.close()
+    with open(os.path.join(directory, name), 'ab') as f:
+        f.write(b'{"user_id": 1, "factor')
+    shutil.copy(os.path.join(directory, name), tmp_path / name)
+
+    assert recover_segments(directory) == 2
+    assert db.session.query(UserInput).count() == 2
+
+    # Crash after the commit but before the file was deleted
+    shutil.copy(tmp_path / name, os.path.join(directory, name))
+    assert recover_segments(directory) == 0
+    assert db.session.query(UserInput).count() == 2
+    assert os.listdir(directory) == []
@@ -0,0 +1,145 @@
+"""
+Tests for Interval Meter Data and Hourly Grid Intensity.
+"""
+
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from app import create_app, db
+from app.interval import (
+    hourly_intensities, meter_month_totals, pack_profile, readings_from_records, save_profile
+)
+from app.models import EmissionFactor, InputAllocation, UserInput
+
+
+def hourly_profile(year=2025):
+    # Intensity equals the hour of the day, so results are easy to check
+    hours = 8760 if year != 2024 else 8784
+    return np.arange(hours) % 24 * 0.01
+
+
+def test_profile_length_must_match_year():
+    with pytest.raises(ValueError):
+        pack_profile(np.zeros(8760), 2024)
+    assert len(pack_profile(np.zeros(8784), 2024)) == 8784 * 4
+
+
+def test_readings_align_to_hour_of_year():
+    df = readings_from_records([
+        {'meter_id': 'A', 'timestamp': '2025-01-01T00:15:00Z', 'kwh': 1},
+        {'meter_id': 'A', 'timestamp': '2025-03-01T13:45:00+01:00', 'kwh': 1},
+    ])
+    intensities = hourly_intensities(df['timestamp'], {2025: hourly_profile()})
+    # The second reading is 12:45 UTC
+    assert intensities.tolist() == pytest.approx([0.0, 0.12])
+
+
+def test_meter_month_totals_are_dot_products():
+    timestamps = pd.date_range('2025-01-01', '2025-02-28 23:45', freq='15min', tz='UTC')
+    df = readings_from_records(
+        [{'meter_id': meter, 'timestamp': ts.isoformat(), 'kwh': 0.25} for meter in ('B', 'A') for ts in timestamps]
+    )
+    totals = meter_month_totals(df, {2025: hourly_profile()})
+
+    assert totals[['meter_id', 'month']].values.tolist() == [['A', 1], ['A', 2], ['B', 1], ['B', 2]]
+    # 1 kWh per hour, so a month's emissions are days * sum of the daily profile
+    daily = sum(hour * 0.01 for hour in range(24))
+    assert totals['kwh'].tolist() == pytest.approx([744, 672, 744, 672])
+    assert totals['emissions_kg'].tolist() == pytest.approx([31 * daily, 28 * daily] * 2, rel=1e-6)
+    assert totals['readings'].tolist() == [2976, 2688, 2976, 2688]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity (Hourly)', category='Electricity', scope=2,
+            factor_value=0.2, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        save_profile('GB', 2025, hourly_profile(), source='Test')
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_upload_creates_one_input_per_meter_month(app, register):
+    client = app.test_client()
+    headers = register(client, 'meters')
+    factor_id = EmissionFactor.query.first().id
+
+    timestamps = pd.date_range('2025-01-01', '2025-03-31 23:45', freq='15min', tz='UTC')
+    csv = pd.DataFrame({
+        'meter_id': np.repeat(['M1', 'M2', 'M3'], len(timestamps)),
+        'timestamp': np.tile(timestamps.strftime('%Y-%m-%dT%H:%M:%SZ'), 3),
+        'kwh': 0.25,
+    }).to_csv(index=False)
+
+    response = client.post('/api/meter-readings', headers=headers, data={
+        'region': 'GB', 'factor_id': str(factor_id),
+        'file': (io.BytesIO(csv.encode()), 'readings.csv')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    assert response.json['readings'] == 3 * len(timestamps)
+    assert response.json['inputs_created'] == 9
+    assert UserInput.query.count() == 9
+    assert response.json['total_emissions_kg'] == pytest.approx(3 * 90 * 2.76, rel=1e-6)
+
+    profiles = client.get('/api/grid-profiles', headers=headers).json['grid_profiles']
+    assert profiles == [{'id': 1, 'region': 'GB', 'year': 2025, 'basis': 'location',
+                         'hours': 8760, 'source': 'Test'}]
+
+
+def test_reimport_replaces_meter_months(app, register):
+    client = app.test_client()
+    headers = register(client, 'meters')
+    factor_id = EmissionFactor.query.first().id
+
+    def upload(start, end, kwh):
+        timestamps = pd.date_range(start, end, freq='15min', tz='UTC')
+        return client.post('/api/meter-readings', headers=headers, json={
+            'region': 'GB', 'factor_id': factor_id, 'readings': [
+                {'meter_id': meter, 'timestamp': timestamp.isoformat(), 'kwh': kwh}
+                for meter in ('M1', 'M2') for timestamp in timestamps
+            ]
+        })
+
+    def report_total():
+        return client.post('/api/reports', headers=headers, json={
+            'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+        }).json['total_scope2_kg']
+
+    first = upload('2025-01-01', '2025-02-28 23:45', 0.25).json
+    assert first['inputs_created'] == 4 and first['inputs_updated'] == 0
+    total = report_total()
+    assert total == pytest.approx(2 * 59 * 2.76)
+
+    # The same file again changes nothing
+    again = upload('2025-01-01', '2025-02-28 23:45', 0.25)
+    assert again.status_code == 201
+    assert again.json['inputs_created'] == 0 and again.json['inputs_updated'] == 4
+    assert UserInput.query.count() == 4 and InputAllocation.query.count() == 4
+    assert report_total() == pytest.approx(total)
+
+    # A corrected February replaces that month only; March is new
+    corrected = upload('2025-02-01', '2025-03-31 23:45', 0.5).json
+    assert corrected['inputs_created'] == 2 and corrected['inputs_updated'] == 2
+    assert report_total() == pytest.approx(2 * (31 + 2 * 28 + 2 * 31) * 2.76)
+    summary = client.get('/api/dashboard/summary', headers=headers).json
+    assert summary['scope_summary']['scope2'] == pytest.approx(report_total())
+
+
+def test_missing_profile_year_is_rejected(app, register):
+    client = app.test_client()
+    headers = register(client, 'meters')
+
+    response = client.post('/api/meter-readings', headers=headers, json={
+        'region': 'GB', 'factor_id': EmissionFactor.query.first().id,
+        'readings': [{'meter_id': 'M1', 'timestamp': '2024-06-01T10:00:00Z', 'kwh': 1.0}]
+    })
+    assert response.status_code == 400
+    assert '2024' in response.json['message']
@@ -0,0 +1,70 @@
+"""
+Tests for the Offline Calculator.
+"""
+
+import json
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from app.offline import OfflineCatalogue, calculate_chunk, calculate_files, calculate_files_command
+from app.utils import convert_units
+
+ACTIVITIES = pd.DataFrame({
+    'Site': ['London', 'Leeds', 'Leeds', 'Paris', 'Berlin'],
+    'factor_name': ['Natural Gas', 'natural gas', 'Diesel (100% mineral)', 'Unobtainium', 'Natural Gas'],
+    'activity_value': ['1000', '50', '10', '5', 'n/a'],
+    'activity_unit': ['kWh', 'm^3', 'gallon', 'kg', 'kWh'],
+})
+
+
+def test_rows_are_calculated_like_the_service():
+    result, totals = calculate_chunk(ACTIVITIES, OfflineCatalogue.load())
+
+    # The factor in the activity's unit wins among same-named factors
+    assert result['factor_unit'].tolist()[:3] == ['kWh', 'cubic_meter', 'liter']
+    assert result['calculated_emissions_kg'].iloc[0] == pytest.approx(1000 * 0.183)
+    assert result['calculated_emissions_kg'].iloc[1] == pytest.approx(50 * 2.045)
+    assert result['calculated_emissions_kg'].iloc[2] == pytest.approx(convert_units(10, 'gallon', 'liter') * 2.68)
+    assert result['error'].iloc[3] == "Unknown emission factor 'Unobtainium'."
+    assert result['error'].iloc[4] == 'Invalid activity_value.'
+    assert result['Site'].tolist() == ACTIVITIES['Site'].tolist()
+
+    assert totals['rows'] == 5 and totals['errors'] == 2
+    assert totals['scopes'] == {1: pytest.approx(183 + 102.25 + convert_units(10, 'gallon', 'liter') * 2.68)}
+
+
+def test_factor_file_with_ids(tmp_path):
+    factors = tmp_path / 'factors.csv'
+    factors.write_text('id,name,category,scope,factor_value,unit,source\n7,Heat,Energy,2,0.2,kWh,Test\n')
+    result, _ = calculate_chunk(
+        pd.DataFrame({'factor_id': ['7', '8'], 'activity_value': ['2', '2'], 'activity_unit': ['MWh', 'kWh']}),
+        OfflineCatalogue.load(str(factors))
+    )
+    assert result['calculated_emissions_kg'].iloc[0] == pytest.approx(400.0)
+    assert result['error'].iloc[1] == "Unknown emission factor id '8'."
+
+
+def test_process_pool_matches_inline_and_keeps_order(tmp_path):
+    path = tmp_path / 'activities.csv'
+    pd.concat([ACTIVITIES] * 40, ignore_index=True).to_csv(path, index=False)
+    catalogue = OfflineCatalogue.load()
+
+    inline = calculate_files([str(path)], str(tmp_path / 'inline.csv'), catalogue, workers=1, chunk_rows=7)
+    pooled = calculate_files([str(path)], str(tmp_path / 'pooled.csv'), catalogue, workers=2, chunk_rows=7)
+
+    assert pooled['rows'] == inline['rows'] == 200
+    assert pooled['scopes'] == pytest.approx(inline['scopes'])
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'inline.csv'), pd.read_csv(tmp_path / 'pooled.csv'))
+
+
+def test_command_writes_results_and_totals(tmp_path):
+    path = tmp_path / 'activities.csv'
+    ACTIVITIES.to_csv(path, index=False)
+    result = CliRunner().invoke(calculate_files_command, [
+        str(path), '--workers', '1', '--totals', str(tmp_path / 'totals.json')
+    ])
+    assert result.exit_code == 0, result.output
+    assert 'Calculated 5 rows' in result.output
+    assert len(pd.read_csv(tmp_path / 'activities.results.csv')) == 5
+    totals = json.loads((tmp_path / 'totals.json').read_text())
+    assert totals['errors'] == 2 and list(totals['scopes']) == ['1']
@@ -0,0 +1,87 @@
+"""
+Tests for On-Demand Request Profiling.
+"""
+
+import pstats
+import pytest
+from app import create_app, db
+from app.models import EmissionFactor
+from config import TestingConfig, config
+
+TOKEN = 'profile-secret'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    class ProfilingTestingConfig(TestingConfig):
+        PROFILING_TOKEN = TOKEN
+        PROFILING_DIR = str(tmp_path / 'profiles')
+        PROFILING_MAX_FILES = 2
+
+    monkeypatch.setitem(config, 'profiling_testing', ProfilingTestingConfig)
+    app = create_app('profiling_testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Diesel', category='Fuel', scope=1,
+            factor_value=2.68, unit='liter', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def headers(client, register):
+    return register(client, 'slow')
+
+
+def test_only_requests_with_the_token_are_profiled(client, headers):
+    assert 'X-Profile-Id' not in client.get('/api/factors', headers=headers).headers
+    assert 'X-Profile-Id' not in client.get(
+        '/api/factors', headers={**headers, 'X-Profile-Token': 'wrong'}
+    ).headers
+    assert client.get('/api/profiles').status_code == 403
+
+
+def test_profile_captures_cpu_allocations_and_breakdown(client, headers):
+    response = client.post('/api/inputs', headers={**headers, 'X-Profile-Token': TOKEN}, json={
+        'factor_id': 1, 'activity_value': 10, 'activity_unit': 'gallon', 'date_period_start': '2025-01-15'
+    })
+    assert response.status_code == 201
+    profile_id = response.headers['X-Profile-Id']
+
+    summary = client.get(f'/api/profiles/{profile_id}', headers={'X-Profile-Token': TOKEN}).json
+    assert summary['endpoint'] == 'api.submit_input'
+    assert summary['user_id'] == 1 and summary['status'] == 201
+    assert summary['sql_statements'] > 0
+    breakdown = summary['breakdown_seconds']
+    assert set(breakdown) == {'sql', 'pint', 'pandas', 'serialization', 'sql_execute'}
+    # gallon -> liter goes through Pint
+    assert breakdown['pint'] > 0 and breakdown['sql'] > 0
+    assert isinstance(summary['top_allocations'], list)
+
+    prof = client.get(f'/api/profiles/{profile_id}?format=prof', headers={'X-Profile-Token': TOKEN})
+    assert prof.status_code == 200
+    path = config['profiling_testing'].PROFILING_DIR + f'/{profile_id}.prof'
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_profiles_are_rotated_and_listed(client, headers):
+    ids = [
+        client.get('/api/factors', headers={**headers, 'X-Profile-Token': TOKEN}).headers['X-Profile-Id']
+        for _ in range(3)
+    ]
+    listed = client.get('/api/profiles', headers={'X-Profile-Token': TOKEN}).json
+    assert [profile['id'] for profile in listed] == sorted(ids[1:], reverse=True)
+    assert 'top_allocations' not in listed[0]
+    assert client.get(f'/api/profiles/{ids[0]}', headers={'X-Profile-Token': TOKEN}).status_code == 404
+
+
+def test_credentials_in_the_query_are_not_written(client, headers):
+    profile_id = client.get(
+        '/api/factors?category=Fuel&ticket=secret-ticket', headers={**headers, 'X-Profile-Token': TOKEN}
+    ).headers['X-Profile-Id']
+    summary = client.get(f'/api/profiles/{profile_id}', headers={'X-Profile-Token': TOKEN}).json
+    assert summary['path'] == '/api/factors?category=Fuel&ticket=%5Bredacted%5D'
@@ -0,0 +1,100 @@
+"""
+Tests for Sparse Fieldsets and Pagination.
+"""
+
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import EmissionFactor
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Diesel', category='Fuel', scope=1,
+            factor_value=2.0, unit='liter', source='Test'
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client, register, add_input):
+    headers = register(client, 'lists')
+    for day in range(1, 6):
+        add_input(client, headers, f'2025-02-0{day}', value=day, unit='liter')
+        client.post('/api/reports', headers=headers, json={
+            'report_name': f'R{day}', 'start_date': '2025-02-01', 'end_date': f'2025-02-0{day}'
+        })
+    return headers
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_without_fields_items_match_to_dict(client, headers):
+    inputs = client.get('/api/inputs', headers=headers).json['inputs']
+    assert inputs[0] == {
+        'id': 5, 'user_id': 1, 'factor_id': 1, 'factor_name': 'Diesel', 'scope': 1,
+        'activity_value': 5.0, 'activity_unit': 'liter', 'date_period_start': '2025-02-05',
+        'date_period_end': None, 'calculated_emissions_kg': 10.0,
+        'created_at': inputs[0]['created_at']
+    }
+
+
+def test_only_requested_columns_are_selected(client, headers, statements):
+    response = client.get('/api/inputs?fields=activity_value,calculated_emissions_kg', headers=headers)
+    assert response.json['inputs'][0] == {'id': 5, 'activity_value': 5.0, 'calculated_emissions_kg': 10.0}
+    page_query = statements[-1]
+    assert 'emission_factors' not in page_query and 'created_at' not in page_query.split('ORDER BY')[0]
+
+    # The factor is joined only for a field that needs it
+    response = client.get('/api/inputs?fields=factor_name', headers=headers)
+    assert response.json['inputs'][0] == {'id': 5, 'factor_name': 'Diesel'}
+    assert 'JOIN emission_factors' in statements[-1]
+
+
+def test_unknown_fields_are_rejected(client, headers):
+    response = client.get('/api/reports?fields=report_name,digest_row_count', headers=headers)
+    assert response.status_code == 400
+    assert 'digest_row_count' in response.json['message']
+
+
+def test_reports_are_paginated_newest_first(client, headers, statements):
+    first = client.get('/api/reports?per_page=2&fields=report_name', headers=headers).json
+    assert first == {
+        'reports': [{'id': 5, 'report_name': 'R5'}, {'id': 4, 'report_name': 'R4'}],
+        'total_pages': 3, 'current_page': 1, 'total_items': 5
+    }
+    last = client.get('/api/reports?per_page=2&page=3', headers=headers).json
+    assert [report['report_name'] for report in last['reports']] == ['R1']
+
+    # A first page holding every item needs no count query
+    del statements[:]
+    response = client.get('/api/reports', headers=headers).json
+    assert response['total_items'] == 5 and len(response['reports']) == 5
+    assert len(statements) == 2
+
+
+def test_per_page_is_clamped(client, headers):
+    response = client.get('/api/inputs?per_page=0&fields=id', headers=headers).json
+    assert response['inputs'] == [{'id': 5}] and response['total_pages'] == 5
@@ -0,0 +1,366 @@
+"""
+Query Count Tests.
+
+Pins the number of SQL statements executed by every route in
+`routes.py` and `auth.py`, and checks the N+1 detector itself.
+A change to any of these numbers should be a deliberate decision.
+"""
+
+import json
+import numpy as np
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import create_app, db
+from app.interval import save_profile
+from app.models import EmissionFactor
+from app.organizations import add_member
+from app.query_budget import QueryBudgetExceeded, find_repeated_statements, query_budget
+
+
+@pytest.fixture(scope='module')
+def app():
+    """Creates a test app with a fuel and an electricity factor and a grid profile."""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Diesel', category='Fuel', scope=1,
+            factor_value=2.68, unit='liter', source='Test'
+        ))
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.2, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        save_profile('GB', 2025, np.full(8760, 0.1), source='Test')
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='module')
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='module')
+def auth_headers(client, register):
+    return register(client, 'budget')
+
+
+READINGS = [
+    {'meter_id': 'M1', 'timestamp': f'2025-03-0{day}T0{hour}:00:00Z', 'kwh': 1.0}
+    for day in (1, 2) for hour in (0, 1)
+]
+RANGE = {'start_date': '2025-02-10', 'end_date': '2025-03-20'}
+
+
+@contextmanager
+def count_queries():
+    """Counts SQL statements executed inside the block."""
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'after_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', listener)
+
+
+def test_register_query_count(client):
+    with count_queries() as statements:
+        response = client.post('/auth/register', json={
+            'username': 'counted', 'email': 'counted@example.com', 'password': 'secret123'
+        })
+    assert response.status_code == 201
+    assert len(statements) == 4
+
+
+def test_login_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/auth/login', json={
+            'email': 'budget@example.com', 'password': 'secret123'
+        })
+    assert response.status_code == 200
+    assert len(statements) == 1
+
+
+def test_get_factors_query_count(client, auth_headers):
+    # Cold cache: user + catalogue version + catalogue load
+    with count_queries() as statements:
+        response = client.get('/api/factors', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 3
+
+    # Warm cache: user + catalogue version only
+    with count_queries() as statements:
+        response = client.get('/api/factors', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_search_factors_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/factors/search?q=die', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_add_factor_query_count(client, auth_headers):
+    # user + insert + version bump (update, then insert of the first row) + refresh
+    with count_queries() as statements:
+        response = client.post('/api/factors', headers=auth_headers, json={
+            'name': 'Petrol', 'category': 'Fuel', 'scope': 1,
+            'factor_value': 2.33, 'unit': 'liter'
+        })
+    assert response.status_code == 201
+    assert len(statements) == 5
+
+
+def test_submit_input_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/inputs', headers=auth_headers, json={
+            'factor_id': 1, 'activity_value': 10, 'activity_unit': 'gallon',
+            'date_period_start': '2025-01-15', 'date_period_end': '2025-03-20'
+        })
+    assert response.status_code == 201
+    # The three monthly allocations are written with one multi-row INSERT,
+    # and their digests with one multi-row upsert
+    assert len(statements) == 7
+
+
+def test_get_inputs_query_count_is_constant(client, auth_headers, add_input):
+    for day in range(1, 6):
+        add_input(client, auth_headers, f'2025-02-0{day}', value=day, unit='liter')
+
+    with count_queries() as statements:
+        response = client.get('/api/inputs', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['inputs']) == 6
+    # user + one joined page query; the count is skipped on a partial first page
+    assert len(statements) == 2
+
+    with count_queries() as statements:
+        response = client.get('/api/inputs?per_page=2&page=2', headers=auth_headers)
+    assert response.json['total_items'] == 6 and response.json['total_pages'] == 3
+    # user + page + count, regardless of page size
+    assert len(statements) == 3
+
+
+def test_dashboard_summary_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/dashboard/summary', headers=auth_headers)
+    assert response.status_code == 200
+    # Scope totals, reading blocks, time series and the archive files
+    assert len(statements) == 5
+
+
+def test_generate_report_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/reports', headers=auth_headers, json={
+            'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+        })
+    assert response.status_code == 201
+    assert len(statements) == 7
+
+
+def test_batch_reports_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/reports/batch', headers=auth_headers, json={
+            'fiscal_year': 2025, 'generate': ['monthly', 'quarterly', 'annual']
+        })
+    assert response.status_code == 201
+    assert len(response.json['reports']) == 17
+    # User lookup, one grouped scan, the archive files, the reading-block
+    # totals, the monthly digests and one multi-row INSERT
+    assert len(statements) == 6
+
+
+def test_get_reports_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_get_report_details_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports/1', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_revalidated_report_skips_loading_it(client, auth_headers):
+    etag = client.get('/api/reports/1', headers=auth_headers).headers['ETag']
+    with count_queries() as statements:
+        response = client.get('/api/reports/1', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    # User lookup and the report's generated_at only
+    assert len(statements) == 2
+
+
+def test_meter_readings_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/meter-readings', headers=auth_headers, json={
+            'region': 'GB', 'factor_id': 2, 'readings': READINGS
+        })
+    assert response.status_code == 201
+    assert len(statements) == 7
+
+    # Re-importing the same days also deletes the inputs they replace
+    with count_queries() as statements:
+        response = client.post('/api/meter-readings', headers=auth_headers, json={
+            'region': 'GB', 'factor_id': 2, 'readings': READINGS
+        })
+    assert response.status_code == 201
+    assert len(statements) == 8
+
+
+def test_add_reading_block_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/reading-blocks', headers=auth_headers, json={
+            'factor_id': 2, 'readings': READINGS
+        })
+    assert response.status_code == 201
+    assert len(statements) == 5
+
+
+def test_get_reading_blocks_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reading-blocks', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_get_block_readings_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reading-blocks/1/readings', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_get_grid_profiles_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/grid-profiles', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_organization_summary_query_count(app, client, auth_headers):
+    with app.app_context():
+        add_member('budget@example.com', 'Acme')
+    with count_queries() as statements:
+        response = client.get('/api/organization/summary', headers=auth_headers)
+    assert response.status_code == 200
+    # User, the organization with its members, then the shard's input
+    # totals, reading-block totals and archive files
+    assert len(statements) == 5
+
+
+def test_dashboard_stream_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/dashboard/stream-ticket', headers=auth_headers)
+    assert response.status_code == 201
+    assert len(statements) == 1
+
+    # The ticket stands in for the token, so only the user is loaded
+    with count_queries() as statements:
+        stream = client.get(
+            f"/api/dashboard/stream?ticket={response.json['ticket']}",
+            headers={'Accept': 'text/event-stream'}, buffered=False
+        )
+        stream.close()
+    assert stream.status_code == 200
+    assert len(statements) == 1
+
+
+def test_report_schedules_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.post('/api/report-schedules', headers=auth_headers, json={
+            'name': 'Monthly', 'cron': '0 2 1 * *', 'period': 'monthly'
+        })
+    assert response.status_code == 201
+    assert len(statements) == 3
+
+    with count_queries() as statements:
+        response = client.get('/api/report-schedules', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+def test_report_breakdown_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports/breakdown', headers=auth_headers, query_string=RANGE)
+    assert response.status_code == 200
+    assert len(statements) == 5
+
+
+def test_stale_reports_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports/stale', headers=auth_headers)
+    assert response.status_code == 200
+    assert len(statements) == 3
+
+
+def test_compare_periods_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports/compare', headers=auth_headers, query_string={
+            **RANGE, 'compare': 'previous_year'
+        })
+    assert response.status_code == 200
+    assert len(statements) == 5
+
+
+def test_report_details_csv_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/reports/details.csv', headers=auth_headers, query_string=RANGE)
+        response.get_data()
+    assert response.status_code == 200
+    assert len(statements) == 5
+
+
+def test_analytics_range_query_count(client, auth_headers):
+    with count_queries() as statements:
+        response = client.get('/api/analytics/range', headers=auth_headers, query_string=RANGE)
+    assert response.status_code == 200
+    assert len(statements) == 7
+
+
+# --- Detector Tests ---
+
+def test_repeated_statements_are_grouped_by_shape():
+    statements = {
+        'SELECT * FROM t WHERE id = ?': 4,
+        'SELECT * FROM t WHERE id IN (?, ?)': 1,
+        'SELECT * FROM t WHERE id IN (?, ?, ?)': 2,
+        'SELECT 1': 1,
+    }
+    repeated = find_repeated_statements(statements, threshold=3)
+    assert repeated == {
+        'SELECT * FROM t WHERE id = ?': 4,
+        'SELECT * FROM t WHERE id IN (?)': 3,
+    }
+
+
+def test_budget_exceeded_raises_in_testing():
+    app = create_app('testing')
+
+    @app.route('/_n_plus_one')
+    @query_budget(1)
+    def n_plus_one():
+        for factor_id in (1, 2, 1):
+            db.session.expunge_all()
+            db.session.get(EmissionFactor, factor_id)
+        return 'ok'
+
+    with app.app_context():
+        db.create_all()
+        with pytest.raises(QueryBudgetExceeded) as e:
+            app.test_client().get('/_n_plus_one')
+        db.drop_all()
+    assert 'budget: 1' in str(e.value)
+    assert 'Suspected N+1' in str(e.value)
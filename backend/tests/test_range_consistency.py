@@ -0,0 +1,120 @@
+"""
+Tests for Consistent Date-Range Totals.
+
+Every endpoint that totals a date range must pro-rate inputs spanning
+its boundaries the way reports do, and count reading blocks, with or
+without the analytics cache and before and after archiving.
+"""
+
+import csv
+import io
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+from app import archive, create_app, db
+from app.analytics_cache import init_analytics_cache
+from app.archive import archive_closed_inputs
+from app.interval import readings_frame
+from app.models import EmissionFactor
+from app.reading_blocks import store_readings
+from config import TestingConfig, config
+
+INPUTS = [
+    # (factor, start, end, activity)
+    (1, '2023-01-15', '2023-03-15', 900),
+    (1, '2023-02-20', None, 50),
+    (2, '2023-04-10', None, 30),
+    (2, '2023-05-01', '2023-06-30', 610),
+    (1, '2025-02-10', None, 10),
+]
+RANGES = [
+    ('2023-02-10', '2023-05-20'),
+    ('2023-03-15', '2023-03-15'),
+    ('2023-01-01', '2023-12-31'),
+]
+
+
+@pytest.fixture(params=[False, True], ids=['database', 'cache'])
+def app(request, monkeypatch, tmp_path):
+    class ConsistencyTestingConfig(TestingConfig):
+        ARCHIVE_DIR = str(tmp_path / 'archive')
+        ANALYTICS_CACHE_ENABLED = request.param
+
+    monkeypatch.setitem(config, 'consistency_testing', ConsistencyTestingConfig)
+    archive.read_archive_file.cache_clear()
+    app = create_app('consistency_testing')
+    init_analytics_cache(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Natural Gas', category='Fuel', scope=1,
+            factor_value=1.0, unit='kWh', source='Test'
+        ))
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.5, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client, register, add_input):
+    headers = register(client, 'consistent')
+    for factor_id, start, end, value in INPUTS:
+        add_input(client, headers, start, end, value=value, factor_id=factor_id)
+
+    timestamps = pd.date_range('2023-03-01', '2023-06-30 23:45', freq='15min', tz='UTC')
+    store_readings(1, readings_frame(pd.DataFrame({
+        'meter_id': np.repeat(['M1'], len(timestamps)), 'timestamp': timestamps, 'kwh': 0.25,
+    })), factor_id=2)
+    return headers
+
+
+def totals(client, headers, start, end):
+    """The total of the range according to every endpoint."""
+    params = {'start_date': start, 'end_date': end}
+    report = client.post('/api/reports', headers=headers, json={'report_name': 'R', **params}).json
+    breakdown = client.get('/api/reports/breakdown', headers=headers, query_string=params).json
+    compare = client.get('/api/reports/compare', headers=headers, query_string={
+        **params, 'compare': 'previous_year'
+    }).json
+    summary = client.get('/api/analytics/range', headers=headers, query_string=params).json
+    details = client.get('/api/reports/details.csv', headers=headers, query_string=params)
+    rows = csv.DictReader(io.StringIO(details.get_data(as_text=True)))
+    return {
+        'report': report['total_all_scopes_kg'],
+        'breakdown': sum(breakdown['scope_totals'].values()),
+        'compare': compare['total']['totals'][0],
+        'range': summary['total'],
+        'csv': sum(float(row['emissions_in_range_kg']) for row in rows),
+    }
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+def test_every_endpoint_agrees_with_reports(client, headers, start, end):
+    before = totals(client, headers, start, end)
+    assert before['report'] > 0
+    for name, total in before.items():
+        assert total == pytest.approx(before['report']), name
+
+    assert archive_closed_inputs(date(2025, 1, 1))['inputs'] == 4
+    after = totals(client, headers, start, end)
+    for name, total in after.items():
+        assert total == pytest.approx(before['report']), name
+
+
+def test_a_cut_input_counts_by_its_days_in_range(client, headers):
+    # 28 of the bill's 60 days, the whole single-day input, no blocks yet
+    expected = 900 * 28 / 60 + 50
+    assert totals(client, headers, '2023-02-01', '2023-02-28') == pytest.approx(
+        dict.fromkeys(['report', 'breakdown', 'compare', 'range', 'csv'], expected)
+    )
@@ -0,0 +1,107 @@
+"""
+Tests for Compact Reading Storage.
+"""
+
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+from app.interval import readings_frame
+from app.models import EmissionFactor, ReadingBlock, User
+from app.reading_blocks import block_contributions, decode_values, encode_values, store_readings
+
+
+def readings(start, end, kwh=0.25, meters=('M1',)):
+    timestamps = pd.date_range(start, end, freq='15min', tz='UTC')
+    return readings_frame(pd.DataFrame({
+        'meter_id': np.repeat(list(meters), len(timestamps)),
+        'timestamp': np.tile(timestamps, len(meters)),
+        'kwh': kwh,
+    }))
+
+
+def test_values_round_trip_with_gaps():
+    values = np.array([1.5, np.nan, 2.0], dtype=np.float32)
+    decoded = decode_values(encode_values(values))
+    assert decoded[0] == 1.5 and np.isnan(decoded[1]) and decoded[2] == 2.0
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.5, unit='kWh', source='Test'
+        ))
+        db.session.add(User(username='dense', email='dense@example.com', password='secret123'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_store_packs_one_block_per_series_month_and_merges(app):
+    result = store_readings(1, readings('2025-01-01', '2025-02-28 23:45', meters=('M1', 'M2')), factor_id=1)
+    assert result == {'readings': 2 * 5664, 'blocks_created': 4, 'blocks_updated': 0}
+
+    # A second upload overwrites one day in January for M1
+    result = store_readings(1, readings('2025-01-10', '2025-01-10 23:45', kwh=1.0), factor_id=1)
+    assert result['blocks_updated'] == 1
+
+    block = ReadingBlock.query.filter_by(series_key='M1', block_start=date(2025, 1, 1)).one()
+    assert block.reading_count == 31 * 96
+    assert block.total_activity == pytest.approx(30 * 24 + 96)
+    assert block.total_emissions_kg == pytest.approx((30 * 24 + 96) * 0.5)
+
+
+def test_only_boundary_blocks_are_decoded(app):
+    store_readings(1, readings('2025-01-01', '2025-03-31 23:45'), factor_id=1)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        whole = block_contributions(1, date(2025, 1, 1), date(2025, 2, 28))
+        assert len(statements) == 1
+        partial = block_contributions(1, date(2025, 1, 1), date(2025, 2, 14))
+        assert len(statements) == 3
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert sum(c[3] for c in whole) == pytest.approx(59 * 24 * 0.5)
+    assert sum(c[3] for c in partial) == pytest.approx(45 * 24 * 0.5)
+    # Whole blocks contribute one row each; the cut block one row per day
+    assert len(partial) == 1 + 14
+
+
+def test_blocks_feed_reports_and_dashboard(app, login):
+    store_readings(1, readings('2025-01-01', '2025-03-31 23:45'), factor_id=1)
+    client = app.test_client()
+    headers = login(client, 'dense@example.com')
+
+    report = client.post('/api/reports', headers=headers, json={
+        'report_name': 'Mid Feb', 'start_date': '2025-02-15', 'end_date': '2025-03-31'
+    }).json
+    assert report['total_scope2_kg'] == pytest.approx(45 * 24 * 0.5)
+
+    batch = client.post('/api/reports/batch', headers=headers, json={
+        'periods': [
+            {'report_name': 'A', 'start_date': '2025-01-01', 'end_date': '2025-02-09'},
+            {'report_name': 'B', 'start_date': '2025-02-10', 'end_date': '2025-03-31'},
+        ]
+    }).json['reports']
+    assert [r['total_scope2_kg'] for r in batch] == pytest.approx([40 * 12, 50 * 12])
+
+    summary = client.get('/api/dashboard/summary', headers=headers).json
+    assert summary['scope_summary']['scope2'] == pytest.approx(90 * 12)
+    assert [m['month'] for m in summary['time_series']] == ['2025-01', '2025-02', '2025-03']
+
+    blocks = client.get('/api/reading-blocks', headers=headers).json['reading_blocks']
+    assert len(blocks) == 3
+    detail = client.get(f"/api/reading-blocks/{blocks[1]['id']}/readings", headers=headers).json
+    assert len(detail['readings']) == 28 * 96
+    assert detail['readings'][1] == {'timestamp': '2025-02-01T00:15:00+00:00', 'value': 0.25}
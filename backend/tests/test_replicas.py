@@ -0,0 +1,129 @@
+"""
+Read-Replica Routing Tests.
+
+Uses two SQLite files: one as the primary and one as a replica that
+deliberately holds different factor rows, so the tests can tell which
+database served each request.
+"""
+
+import json
+import pytest
+from sqlalchemy import insert, select
+from app import create_app, db
+from app.models import EmissionFactor, User
+from app import replicas
+from config import TestingConfig, config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class ReplicaTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"}
+        READ_YOUR_WRITES_SECONDS = 5
+
+    monkeypatch.setitem(config, 'replica_testing', ReplicaTestingConfig)
+    monkeypatch.setattr(replicas, '_unhealthy_until', {})
+
+    app = create_app('replica_testing')
+    with app.app_context():
+        replica = db.engines['replica_0']
+        db.create_all()
+        db.metadata.create_all(replica)
+
+        db.session.add(EmissionFactor(
+            name='Primary Factor', category='Fuel', scope=1, factor_value=1.0, unit='liter'
+        ))
+        db.session.commit()
+        with replica.begin() as conn:
+            conn.execute(insert(EmissionFactor), [{
+                'name': 'Replica Factor', 'category': 'Fuel', 'scope': 1,
+                'factor_value': 1.0, 'unit': 'liter', 'co2e_unit': 'kg CO2e'
+            }])
+        yield app
+        db.session.remove()
+    # The bind's metadata is registered on the shared `db`; drop it so
+    # later apps without replicas can still call create_all()
+    db.metadatas.pop('replica_0', None)
+
+
+@pytest.fixture
+def headers(app, register):
+    """Registers a user on the primary and copies the row to the replica."""
+    headers = register(app.test_client(), 'replica')
+    user_row = db.session.execute(select(User.__table__)).mappings().one()
+    with db.engines['replica_0'].begin() as conn:
+        conn.execute(insert(User.__table__), [dict(user_row)])
+    return headers
+
+
+def factor_names(response):
+    return [factor['name'] for factor in json.loads(response.data)]
+
+
+def test_read_only_route_uses_replica(app, headers):
+
+    # A fresh client carries no read-your-writes cookie
+    response = app.test_client().get('/api/factors', headers=headers)
+
+    assert response.status_code == 200
+    assert factor_names(response) == ['Replica Factor']
+
+
+def test_client_is_pinned_to_primary_after_write(app, headers):
+    client = app.test_client()
+
+    response = client.post('/api/factors', headers=headers, json={
+        'name': 'New Factor', 'category': 'Fuel', 'scope': 1,
+        'factor_value': 2.0, 'unit': 'liter'
+    })
+    assert response.status_code == 201
+    assert replicas.PIN_COOKIE_NAME in response.headers['Set-Cookie']
+
+    response = client.get('/api/factors', headers=headers)
+    assert factor_names(response) == ['New Factor', 'Primary Factor']
+
+
+def test_bearer_client_without_cookies_is_pinned_by_user(app, headers):
+
+    response = app.test_client().post('/api/factors', headers=headers, json={
+        'name': 'New Factor', 'category': 'Fuel', 'scope': 1,
+        'factor_value': 2.0, 'unit': 'liter'
+    })
+    assert response.status_code == 201
+
+    # A new client (no cookie jar) with the same token reads the primary
+    response = app.test_client(use_cookies=False).get('/api/factors', headers=headers)
+    assert factor_names(response) == ['New Factor', 'Primary Factor']
+
+    # Other users are not pinned
+    assert not app.extensions['ghg_pin_store'].is_pinned(999)
+    assert app.extensions['ghg_pin_store'].is_pinned(1)
+
+
+def test_failed_replica_falls_back_to_primary(app, headers):
+    replica = db.engines['replica_0']
+    db.metadata.drop_all(replica)
+
+    response = app.test_client().get('/api/factors', headers=headers)
+
+    assert response.status_code == 200
+    assert factor_names(response) == ['Primary Factor']
+    assert replicas._healthy_replicas(db) == []
+
+
+def test_writes_always_use_primary(app, headers):
+
+    response = app.test_client().post('/api/factors', headers=headers, json={
+        'name': 'Written Factor', 'category': 'Fuel', 'scope': 1,
+        'factor_value': 2.0, 'unit': 'liter'
+    })
+
+    assert response.status_code == 201
+    assert db.session.execute(
+        select(EmissionFactor.name).where(EmissionFactor.name == 'Written Factor')
+    ).scalar_one() == 'Written Factor'
+    with db.engines['replica_0'].connect() as conn:
+        assert conn.execute(
+            select(EmissionFactor.id).where(EmissionFactor.name == 'Written Factor')
+        ).first() is None
@@ -0,0 +1,131 @@
+"""
+Tests for Scheduled Reports.
+"""
+
+from datetime import date, datetime
+import pytest
+from app import create_app, db
+from app.digests import find_stale_reports
+from app.models import EmissionFactor, Report, ReportSchedule, ScheduleRun
+from app.scheduler import (
+    create_schedule, due_schedules, generate_partition, parse_cron,
+    previous_occurrence, run_schedules, scheduled_period, start_run
+)
+
+
+def test_previous_occurrence():
+    monthly = parse_cron('0 2 1 * *')
+    assert previous_occurrence(monthly, datetime(2025, 3, 10, 12, 0)) == datetime(2025, 3, 1, 2, 0)
+    assert previous_occurrence(monthly, datetime(2025, 3, 1, 1, 59)) == datetime(2025, 2, 1, 2, 0)
+    assert previous_occurrence(monthly, datetime(2025, 3, 1, 2, 0)) == datetime(2025, 3, 1, 2, 0)
+
+    # 2025-03-12 is a Wednesday
+    weekly = parse_cron('30 6 * * 1')
+    assert previous_occurrence(weekly, datetime(2025, 3, 12, 0, 0)) == datetime(2025, 3, 10, 6, 30)
+    every_15 = parse_cron('*/15 * * * *')
+    assert previous_occurrence(every_15, datetime(2025, 3, 12, 8, 44)) == datetime(2025, 3, 12, 8, 30)
+
+    # Both day fields restricted: the 13th or any Friday
+    either = parse_cron('0 0 13 * 5')
+    assert previous_occurrence(either, datetime(2025, 3, 13, 12, 0)) == datetime(2025, 3, 13, 0, 0)
+    assert previous_occurrence(either, datetime(2025, 3, 12, 12, 0)) == datetime(2025, 3, 7, 0, 0)
+    assert parse_cron('@monthly') == parse_cron('0 0 1 * *')
+
+
+@pytest.mark.parametrize('expression', ['0 2 1 *', '60 * * * *', '0 0 0 * *', 'a b c d e', '5-1 * * * *'])
+def test_invalid_cron_expressions(expression):
+    with pytest.raises(ValueError):
+        parse_cron(expression)
+
+
+def test_scheduled_period_is_the_last_complete_period():
+    due_at = datetime(2025, 1, 1, 2, 0)
+    assert scheduled_period('monthly', due_at) == (date(2024, 12, 1), date(2024, 12, 31), 'Dec 2024')
+    assert scheduled_period('quarterly', due_at) == (date(2024, 10, 1), date(2024, 12, 31), 'Q4 2024')
+    assert scheduled_period('annual', due_at) == (date(2024, 1, 1), date(2024, 12, 31), '2024')
+    assert scheduled_period('quarterly', datetime(2025, 5, 20)) == (date(2025, 1, 1), date(2025, 3, 31), 'Q1 2025')
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.5, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def users(client, register, add_input):
+    headers = [register(client, f'user{i}') for i in range(5)]
+    add_input(client, headers[0], '2025-02-10')
+    add_input(client, headers[0], '2025-01-15', '2025-03-15', value=590)
+    add_input(client, headers[1], '2025-02-28', value=40)
+    add_input(client, headers[3], '2025-03-01', value=10)   # Outside February
+    add_input(client, headers[4], '2025-02-01', value=60)
+    return headers
+
+
+def test_run_generates_reports_for_every_user_with_data(client, users):
+    create_schedule('Monthly', '0 2 1 * *', now=datetime(2025, 2, 15))
+    stats = run_schedules(now=datetime(2025, 3, 1, 2, 5), workers=0, partition_size=2)
+
+    assert stats['runs'] == 1 and stats['partitions'] == 3 and stats['reports'] == 3
+    reports = {report.user_id: report for report in Report.query.all()}
+    assert sorted(reports) == [1, 2, 5]
+    assert reports[2].report_name == 'Feb 2025 report'
+    assert (reports[2].start_date, reports[2].end_date) == (date(2025, 2, 1), date(2025, 2, 28))
+    assert reports[2].total_scope2_kg == pytest.approx(20.0)
+
+    # The same totals as an on-demand report, and not stale
+    expected = client.post('/api/reports', headers=users[0], json={
+        'report_name': 'Feb', 'start_date': '2025-02-01', 'end_date': '2025-02-28'
+    }).json
+    assert reports[1].total_all_scopes_kg == pytest.approx(expected['total_all_scopes_kg'])
+    assert find_stale_reports() == []
+
+    # The occurrence is processed once
+    assert due_schedules(datetime(2025, 3, 20)) == []
+    assert run_schedules(now=datetime(2025, 3, 20), workers=0)['reports'] == 0
+    assert Report.query.count() == 4
+    assert ScheduleRun.query.one().status == 'completed'
+
+
+def test_interrupted_run_resumes_remaining_partitions(client, users):
+    schedule = create_schedule('Monthly', '0 2 1 * *', now=datetime(2025, 2, 15))
+    run = start_run(schedule, datetime(2025, 3, 1, 2, 0), partition_size=2)
+    # Only the first partition finishes before the "crash"
+    assert generate_partition(run.id, 0) == 2
+    assert generate_partition(run.id, 0) == 0
+
+    stats = run_schedules(now=datetime(2025, 3, 1, 3, 0), workers=0, partition_size=2)
+    assert stats['runs'] == 1 and stats['partitions'] == 2 and stats['reports'] == 1
+    assert Report.query.count() == 3
+    assert ScheduleRun.query.one().reports_created == 3
+    assert db.session.get(ReportSchedule, schedule.id).last_due_at == datetime(2025, 3, 1, 2, 0)
+
+
+def test_user_schedules_api(client, users):
+    response = client.post('/api/report-schedules', headers=users[1], json={
+        'name': 'Quarterly', 'cron': '0 3 1 1,4,7,10 *', 'period': 'quarterly',
+        'name_template': '{label} emissions'
+    })
+    assert response.status_code == 201
+    assert client.post('/api/report-schedules', headers=users[1], json={
+        'name': 'Broken', 'cron': '0 3 1'
+    }).status_code == 400
+    assert [s['name'] for s in client.get('/api/report-schedules', headers=users[1]).json['schedules']] == ['Quarterly']
+    assert client.get('/api/report-schedules', headers=users[0]).json['schedules'] == []
+
+    # A user's schedule only covers that user
+    schedule = db.session.get(ReportSchedule, response.json['id'])
+    schedule.last_due_at = datetime(2025, 1, 1, 3, 0)
+    db.session.commit()
+    run_schedules(now=datetime(2025, 4, 1, 3, 0), workers=0)
+    assert [(r.user_id, r.report_name) for r in Report.query.all()] == [(2, 'Q1 2025 emissions')]
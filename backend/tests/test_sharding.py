@@ -0,0 +1,279 @@
+"""
+User-Based Sharding Tests.
+
+Uses three SQLite files: the primary and two shards, so the tests can
+check which database holds each user's rows.
+"""
+
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select, update
+from app import create_app, db
+from app.ingest_buffer import commit_segment_by_shard
+from app.models import EmissionFactor, InputAllocation, MonthlyDigest, Report, User, UserInput
+from app.organizations import add_member
+from app.scheduler import create_schedule, run_schedules
+from app.services import CalculationService
+from app import sharding
+from app.sharding import (
+    ShardMoveConflict, ShardRoutingError, init_shards, move_user, plan_rebalance, rebalance_shards
+)
+from config import TestingConfig, config
+
+SHARDS = ('shard_0', 'shard_1')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class ShardTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_BINDS = {shard: f"sqlite:///{tmp_path / shard}.db" for shard in SHARDS}
+
+    monkeypatch.setitem(config, 'shard_testing', ShardTestingConfig)
+
+    app = create_app('shard_testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(EmissionFactor(
+            name='Grid Electricity', category='Electricity', scope=2,
+            factor_value=0.5, unit='kWh', source='Test'
+        ))
+        db.session.commit()
+        init_shards()
+        yield app
+        db.session.remove()
+    # The binds' metadata is registered on the shared `db`; drop it so
+    # later apps without shards can still call create_all()
+    for shard in SHARDS:
+        db.metadatas.pop(shard, None)
+
+
+def count(shard, model, **filters):
+    """Counts rows directly on one database (None is the primary)."""
+    engine = db.engine if shard is None else db.engines[shard]
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model).filter_by(**filters)).scalar_one()
+
+
+@pytest.fixture
+def new_user(sign_up):
+    """`new_user(client, name, company_name='Acme')` returns the user's id and auth headers."""
+    def new_user(client, name, company_name='Acme'):
+        data = sign_up(client, name, company_name=company_name)
+        return data['user']['id'], {'Authorization': f"Bearer {data['auth_token']}"}
+    return new_user
+
+
+def test_user_data_lives_on_their_shard(app, new_user, add_input):
+    client = app.test_client()
+    user_id, headers = new_user(client, 'alice')
+    shard = db.session.get(User, user_id).shard
+    assert shard in SHARDS
+    other = next(name for name in SHARDS if name != shard)
+
+    add_input(client, headers, '2025-02-10')
+    assert client.post('/api/reports', headers=headers, json={
+        'report_name': 'Feb', 'start_date': '2025-02-01', 'end_date': '2025-02-28'
+    }).status_code == 201
+
+    assert count(shard, UserInput, user_id=user_id) == 1
+    assert count(shard, InputAllocation, user_id=user_id) == 1
+    assert count(shard, Report, user_id=user_id) == 1
+    assert count(None, UserInput) == 0 and count(other, UserInput) == 0
+    # The user row is copied for the foreign keys, without the password
+    with db.engines[shard].connect() as conn:
+        assert conn.execute(select(User.__table__.c.password_hash)).scalar_one() == ''
+
+    summary = client.get('/api/dashboard/summary', headers=headers).json
+    assert summary['scope_summary']['scope2'] == pytest.approx(50.0)
+
+
+def test_per_user_tables_need_a_shard(app):
+    with pytest.raises(ShardRoutingError):
+        db.session.execute(select(UserInput))
+    # Shared tables are still served by the primary
+    assert db.session.execute(select(EmissionFactor.name)).scalar_one() == 'Grid Electricity'
+
+
+def test_catalogue_is_replicated_to_every_shard(app, new_user):
+    client = app.test_client()
+    _, headers = new_user(client, 'admin')
+    response = client.post('/api/factors', headers=headers, json={
+        'name': 'Diesel', 'category': 'Fuel', 'scope': 1, 'factor_value': 2.7, 'unit': 'liter'
+    })
+    assert response.status_code == 201
+    for shard in SHARDS:
+        assert count(shard, EmissionFactor) == 2
+        assert count(shard, EmissionFactor, id=response.json['id'], name='Diesel') == 1
+
+
+def test_organization_summary_gathers_every_shard(app, new_user, add_input):
+    client = app.test_client()
+    alice, alice_headers = new_user(client, 'alice')
+    bob, bob_headers = new_user(client, 'bob')
+    _, other_headers = new_user(client, 'carol', company_name='Other Co')
+    add_input(client, alice_headers, '2025-02-10', value=100)
+    add_input(client, bob_headers, '2025-02-10', value=40)
+    add_input(client, other_headers, '2025-02-10', value=1000)
+
+    add_member('alice@example.com', 'Acme')
+    add_member('bob@example.com', 'Acme')
+    add_member('carol@example.com', 'Other Co')
+
+    # Make sure the two colleagues live on different shards
+    move_user(alice, 'shard_0')
+    move_user(bob, 'shard_1')
+
+    response = client.get('/api/organization/summary', headers=alice_headers)
+    assert response.status_code == 200
+    assert response.json['organization'] == 'Acme'
+    assert response.json['users'] == 2
+    assert response.json['scope_summary']['total'] == pytest.approx(70.0)
+
+
+def test_organization_summary_needs_a_granted_membership(app, new_user, add_input):
+    client = app.test_client()
+    _, alice_headers = new_user(client, 'alice')
+    add_input(client, alice_headers, '2025-02-10', value=100)
+    add_member('alice@example.com', 'Acme')
+
+    # Registering with the same company name grants nothing
+    _, mallory_headers = new_user(client, 'mallory', company_name='Acme')
+    response = client.get('/api/organization/summary', headers=mallory_headers)
+    assert response.status_code == 403
+
+    result = app.test_cli_runner().invoke(args=['add_org_member', 'mallory@example.com', 'Acme'])
+    assert result.exit_code == 0
+    assert client.get('/api/organization/summary', headers=mallory_headers).json['users'] == 2
+
+    result = app.test_cli_runner().invoke(args=['remove_org_member', 'mallory@example.com'])
+    assert result.exit_code == 0
+    assert client.get('/api/organization/summary', headers=mallory_headers).status_code == 403
+
+
+def test_move_user_copies_rows_and_switches_the_map(app, new_user, add_input):
+    client = app.test_client()
+    user_id, headers = new_user(client, 'alice')
+    source = db.session.get(User, user_id).shard
+    target = next(name for name in SHARDS if name != source)
+    add_input(client, headers, '2025-02-10', value=100)
+    add_input(client, headers, '2025-03-05', value=20)
+    client.post('/api/reports', headers=headers, json={
+        'report_name': 'Q1', 'start_date': '2025-01-01', 'end_date': '2025-03-31'
+    })
+
+    assert move_user(user_id, target) == 2 + 2 + 2 + 1
+    assert db.session.get(User, user_id).shard == target
+    assert count(source, UserInput) == 0 and count(source, User) == 0
+    assert count(target, UserInput, user_id=user_id) == 2
+    assert count(target, MonthlyDigest, user_id=user_id) == 2
+
+    # Requests follow the user, and the moved report is not stale
+    summary = client.get('/api/dashboard/summary', headers=headers).json
+    assert summary['scope_summary']['total'] == pytest.approx(60.0)
+    assert client.get('/api/reports/stale', headers=headers).json == []
+
+    # Back to the primary: no user copy is left on the shard
+    assert move_user(user_id, None) == 7
+    assert count(None, UserInput, user_id=user_id) == 2 and count(target, User) == 0
+    assert client.get('/api/inputs', headers=headers).status_code == 200
+
+
+def test_move_is_abandoned_when_a_late_write_lands_on_the_old_shard(app, monkeypatch, new_user, add_input):
+    client = app.test_client()
+    user_id, headers = new_user(client, 'alice')
+    source = db.session.get(User, user_id).shard
+    target = next(name for name in SHARDS if name != source)
+    add_input(client, headers, '2025-02-10', value=100)
+
+    # A request routed before the move started commits while rows are copied
+    copy_user_rows = sharding._copy_user_rows
+
+    def copy_with_late_write(conn, rows):
+        with db.engines[source].begin() as late:
+            late.execute(update(UserInput.__table__).where(
+                UserInput.__table__.c.user_id == user_id
+            ).values(activity_value=300))
+        return copy_user_rows(conn, rows)
+
+    monkeypatch.setattr(sharding, '_copy_user_rows', copy_with_late_write)
+    with pytest.raises(ShardMoveConflict):
+        move_user(user_id, target)
+    user = db.session.get(User, user_id)
+    assert user.shard == source and not user.shard_moving
+    assert count(source, UserInput, user_id=user_id, activity_value=300) == 1
+
+    # Running the move again copies the late write too
+    monkeypatch.setattr(sharding, '_copy_user_rows', copy_user_rows)
+    move_user(user_id, target)
+    assert count(source, UserInput) == 0
+    assert count(target, UserInput, user_id=user_id, activity_value=300) == 1
+
+
+def test_user_being_moved_gets_retry_after(app, new_user):
+    client = app.test_client()
+    user_id, headers = new_user(client, 'alice')
+    db.session.get(User, user_id).shard_moving = True
+    db.session.commit()
+
+    response = client.get('/api/inputs', headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_plan_rebalance_moves_users_towards_the_emptiest_shard():
+    loads = {None: {1: 40, 2: 30, 3: 10}, 'shard_0': {4: 10}, 'shard_1': {}}
+    moves = plan_rebalance(loads, ['shard_0', 'shard_1'], max_moves=10)
+    assert moves == [(1, None, 'shard_1', 40), (3, None, 'shard_0', 10)]
+    assert plan_rebalance(loads, ['shard_0', 'shard_1'], max_moves=1) == moves[:1]
+
+
+def test_rebalance_shards_drains_the_primary(app, new_user, add_input):
+    client = app.test_client()
+    users = [new_user(client, f'user{i}') for i in range(3)]
+    for index, (user_id, headers) in enumerate(users):
+        move_user(user_id, None)
+        for _ in range(index + 1):
+            add_input(client, headers, '2025-02-10')
+
+    moves = rebalance_shards(dry_run=True)
+    assert moves and count(None, UserInput) == 6
+    rebalance_shards()
+    assert count(None, UserInput) < 6
+    assert sum(count(shard, UserInput) for shard in (None, *SHARDS)) == 6
+
+
+def test_scheduled_reports_are_written_on_each_shard(app, new_user, add_input):
+    client = app.test_client()
+    alice, alice_headers = new_user(client, 'alice')
+    bob, bob_headers = new_user(client, 'bob')
+    add_input(client, alice_headers, '2025-02-10')
+    add_input(client, bob_headers, '2025-02-10')
+    move_user(alice, 'shard_0')
+    move_user(bob, 'shard_1')
+
+    create_schedule('Monthly', '0 2 1 * *', now=datetime(2025, 2, 15))
+    stats = run_schedules(now=datetime(2025, 3, 1, 2, 5), workers=0)
+    assert stats['reports'] == 2
+    assert count('shard_0', Report, user_id=alice) == 1
+    assert count('shard_1', Report, user_id=bob) == 1
+
+
+def test_buffered_segment_is_committed_on_each_users_shard(app, new_user):
+    client = app.test_client()
+    alice, _ = new_user(client, 'alice')
+    bob, _ = new_user(client, 'bob')
+    move_user(alice, 'shard_0')
+    move_user(bob, 'shard_1')
+    rows = [
+        CalculationService().prepare_input({
+            'factor_id': 1, 'activity_value': 10, 'activity_unit': 'kWh', 'date_period_start': '2025-02-10'
+        }, user_id)
+        for user_id in (alice, bob, alice)
+    ]
+
+    assert [len(inputs) for inputs, _ in commit_segment_by_shard('seg-1', rows)] == [2, 1]
+    assert count('shard_0', UserInput, user_id=alice) == 2
+    assert count('shard_1', UserInput, user_id=bob) == 1
+    # Replaying the segment inserts nothing twice
+    assert [len(inputs) for inputs, _ in commit_segment_by_shard('seg-1', rows)] == [0, 0]
@@ -0,0 +1,65 @@
+"""
+Tests for Worker Warm-Up and Readiness.
+"""
+
+from unittest import mock
+import pytest
+from app import create_app, db
+from app.events import InProcessBroker
+from app.models import EmissionFactor
+from app.warmup import prime_units, warm_up, warm_up_until_ready
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            EmissionFactor(name='Natural Gas', category='Fuel', scope=1, factor_value=0.18, unit='kWh', source='Test'),
+            EmissionFactor(name='Diesel', category='Fuel', scope=1, factor_value=2.7, unit='liter', source='Test'),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_ready_only_after_warm_up(app):
+    client = app.test_client()
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.json['status'] == 'cold'
+
+    assert warm_up(app)
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+    assert app.extensions['ghg_factor_cache']._snapshot is not None
+
+
+def test_failed_warm_up_is_retried(app):
+    with mock.patch('app.warmup._open_connections', side_effect=RuntimeError('db down')), \
+            mock.patch('app.warmup.threading.Thread') as thread:
+        warm_up_until_ready(app)
+
+    response = app.test_client().get('/ready')
+    assert response.status_code == 503
+    assert response.json == {'status': 'failed', 'error': 'db down'}
+
+    # The background retry succeeds once the database is back
+    thread.call_args.kwargs['target']()
+    assert app.test_client().get('/ready').status_code == 200
+
+
+def test_prime_units_skips_unknown_units():
+    factors = [{'unit': 'kWh'}, {'unit': 'kWh'}, {'unit': 'passenger_km_typo'}, {'unit': None}]
+    assert prime_units(factors) == 1
+
+
+def test_broker_forgets_parent_subscribers_after_fork():
+    broker = InProcessBroker()
+    subscription = broker.subscribe('user:1:dashboard')
+    broker.after_fork()
+    broker.publish('user:1:dashboard', {'total': 1})
+    assert subscription.get(timeout=0) is None
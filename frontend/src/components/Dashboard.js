@@ -1,8 +1,37 @@
 import React, { useState, useEffect } from 'react';
 // --- FIX: Import the function directly, not as part of the default 'api' object ---
-import { getDashboardSummary } from '../services/api';
+import { getDashboardSummary, openDashboardStream } from '../services/api';
 import Plot from 'react-plotly.js';
 
+/**
+ * Applies an `input_created` delta from the live stream to the summary:
+ * the scope total, the overall total and the affected month buckets.
+ */
+function applyInputDelta(summary, delta) {
+  const scopeKey = `scope${delta.scope}`;
+  const scopeSummary = {
+    ...summary.scope_summary,
+    [scopeKey]: (summary.scope_summary[scopeKey] || 0) + delta.delta_kg,
+    total: summary.scope_summary.total + delta.delta_kg,
+  };
+
+  // Multi-month inputs arrive split into their monthly shares
+  const months = delta.months || [{ month: delta.month, delta_kg: delta.delta_kg }];
+  const timeSeries = months.reduce((series, share) => {
+    const exists = series.some(d => d.month === share.month);
+    return exists
+      ? series.map(d =>
+          d.month === share.month
+            ? { ...d, total_emissions: d.total_emissions + share.delta_kg }
+            : d
+        )
+      : [...series, { month: share.month, total_emissions: share.delta_kg }]
+          .sort((a, b) => a.month.localeCompare(b.month));
+  }, summary.time_series);
+
+  return { ...summary, scope_summary: scopeSummary, time_series: timeSeries };
+}
+
 function Dashboard() {
   const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -23,6 +52,45 @@ function Dashboard() {
       });
   }, []); // The empty dependency array means this runs once on mount
 
+  useEffect(() => {
+    // Apply live deltas instead of polling the full summary
+    let stream = null;
+    let retry = null;
+    let closed = false;
+
+    const connect = () => {
+      openDashboardStream()
+        .then(opened => {
+          if (closed) {
+            opened.close();
+            return;
+          }
+          stream = opened;
+          stream.addEventListener('input_created', event => {
+            const delta = JSON.parse(event.data);
+            setSummary(current => (current ? applyInputDelta(current, delta) : current));
+          });
+          // Tickets are single-use, so EventSource's own reconnect cannot
+          // succeed: reconnect with a new ticket instead
+          stream.onerror = () => {
+            stream.close();
+            retry = setTimeout(connect, 5000);
+          };
+        })
+        .catch(err => {
+          console.error('Failed to open the live dashboard stream:', err);
+          retry = setTimeout(connect, 30000);
+        });
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (stream) stream.close();
+    };
+  }, []);
+
   if (loading) {
     return <div>Loading dashboard...</div>;
   }
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Formik, Form, Field, ErrorMessage } from 'formik';
 import * as Yup from 'yup';
 // --- FIX: Import named functions, not the default 'api' object ---
-import { getFactors, postInput } from '../services/api';
+import { searchFactors, postInput } from '../services/api';
 
 // Styles (same as Auth.js for consistency)
 const formContainerStyle = {
@@ -34,25 +34,32 @@ const InputSchema = Yup.object().shape({
     .positive('Value must be positive'),
   activity_unit: Yup.string().required('Unit is required'),
   date_period_start: Yup.date().required('Date is required'),
+  // Optional: bills covering several months are spread across them
+  date_period_end: Yup.date()
+    .nullable()
+    .min(Yup.ref('date_period_start'), 'End date must not be before the start date'),
 });
 
 function InputForm() {
   const [factors, setFactors] = useState([]);
   const [selectedFactor, setSelectedFactor] = useState(null);
   const [status, setStatus] = useState({ success: '', error: '' });
+  const [factorQuery, setFactorQuery] = useState('');
 
-  // Fetch emission factors on component mount
+  // Search emission factors server-side as the user types (debounced)
   useEffect(() => {
-    // --- FIX: Call imported function ---
-    getFactors()
-      .then(response => {
-        setFactors(response.data);
-      })
-      .catch(error => {
-        console.error('Failed to fetch factors:', error);
-        setStatus({ error: 'Could not load emission factors.' });
-      });
-  }, []);
+    const timer = setTimeout(() => {
+      searchFactors(factorQuery)
+        .then(response => {
+          setFactors(response.data.factors);
+        })
+        .catch(error => {
+          console.error('Failed to fetch factors:', error);
+          setStatus({ error: 'Could not load emission factors.' });
+        });
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [factorQuery]);
 
   const handleFactorChange = (e, setFieldValue) => {
     const factorId = e.target.value;
@@ -75,7 +82,8 @@ function InputForm() {
     setStatus({ success: '', error: '' });
 
     // --- FIX: Call imported function ---
-    postInput(values)
+    const { date_period_end, ...rest } = values;
+    postInput(date_period_end ? values : rest)
       .then(response => {
         setStatus({ success: 'Successfully added data!' });
         resetForm();
@@ -98,6 +106,7 @@ function InputForm() {
           activity_value: '',
           activity_unit: '',
           date_period_start: '',
+          date_period_end: '',
         }}
         validationSchema={InputSchema}
         onSubmit={handleSubmit}
@@ -107,6 +116,13 @@ function InputForm() {
           <Form>
             <div>
               <label>Activity Type (Emission Factor)</label>
+              <input
+                type="search"
+                placeholder="Search activities, e.g. diesel, grid uk, defra"
+                value={factorQuery}
+                onChange={(e) => setFactorQuery(e.target.value)}
+                style={fieldStyle}
+              />
               <Field
                 as="select"
                 name="factor_id"
@@ -160,6 +176,12 @@ function InputForm() {
               <ErrorMessage name="date_period_start" component="div" style={errorStyle} />
             </div>
 
+            <div>
+              <label>Period End (optional, e.g. for a quarterly bill)</label>
+              <Field type="date" name="date_period_end" style={fieldStyle} />
+              <ErrorMessage name="date_period_end" component="div" style={errorStyle} />
+            </div>
+
             {status.error && <div style={serverErrorStyle}>{status.error}</div>}
             {status.success && <div style={successStyle}>{status.success}</div>}
 
@@ -41,6 +41,19 @@ const buttonStyle = {
   margin: '8px'
 };
 
+// The columns the table and the CSV/PDF exports use
+const REPORT_LIST_FIELDS = [
+  'report_name',
+  'start_date',
+  'end_date',
+  'total_scope1_kg',
+  'total_scope2_kg',
+  'total_scope3_kg',
+  'total_all_scopes_kg',
+  'generated_at',
+];
+const REPORTS_PER_PAGE = 20;
+
 // --- Validation Schema (same as before) ---
 const ReportSchema = Yup.object().shape({
   report_name: Yup.string().required('Report name is required'),
@@ -52,16 +65,20 @@ const ReportSchema = Yup.object().shape({
 
 function Report() {
   const [reports, setReports] = useState([]);
+  const [page, setPage] = useState(1);
+  const [totalPages, setTotalPages] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [formStatus, setFormStatus] = useState({ success: '', error: '' });
 
-  // Function to fetch reports (same as before)
-  const fetchReports = () => {
+  // Fetch one page of reports, with only the columns shown
+  const fetchReports = (pageToLoad = page) => {
     setLoading(true);
-    getReports()
+    getReports(pageToLoad, REPORTS_PER_PAGE, REPORT_LIST_FIELDS)
       .then(response => {
-        setReports(response.data);
+        setReports(response.data.reports);
+        setTotalPages(response.data.total_pages);
+        setPage(response.data.current_page);
         setLoading(false);
       })
       .catch(err => {
@@ -72,7 +89,7 @@ function Report() {
   };
 
   useEffect(() => {
-    fetchReports();
+    fetchReports(1);
   }, []);
 
   // Handle new report generation (same as before)
@@ -82,7 +99,7 @@ function Report() {
       .then(response => {
         setFormStatus({ success: 'Report generated successfully!' });
         resetForm();
-        fetchReports(); // Refresh the list of reports
+        fetchReports(1); // Refresh the list; the new report is first
       })
       .catch(err => {
         setFormStatus({ error: err.response?.data?.message || 'Failed to generate report.' });
@@ -268,6 +285,17 @@ function Report() {
           </tbody>
         </table>
       )}
+      {!loading && !error && totalPages > 1 && (
+        <div style={{ marginTop: '1rem' }}>
+          <button onClick={() => fetchReports(page - 1)} disabled={page <= 1} style={buttonStyle}>
+            Previous
+          </button>
+          <span>Page {page} of {totalPages}</span>
+          <button onClick={() => fetchReports(page + 1)} disabled={page >= totalPages} style={buttonStyle}>
+            Next
+          </button>
+        </div>
+      )}
     </div>
   );
 }
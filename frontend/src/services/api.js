@@ -45,6 +45,25 @@ api.interceptors.response.use(
   }
 );
 
+/**
+ * Interceptor to retry reads rejected by admission control (429) once,
+ * after the delay given in Retry-After. Writes are not retried, so the
+ * user decides whether to resubmit.
+ */
+const MAX_RETRY_AFTER_SECONDS = 10;
+api.interceptors.response.use(
+  (response) => response,
+  (error) => {
+    const { config, response } = error;
+    if (response && response.status === 429 && config && config.method === 'get' && !config._retried) {
+      const seconds = Math.min(parseInt(response.headers['retry-after'], 10) || 1, MAX_RETRY_AFTER_SECONDS);
+      config._retried = true;
+      return new Promise((resolve) => setTimeout(resolve, seconds * 1000)).then(() => api(config));
+    }
+    return Promise.reject(error);
+  }
+);
+
 // --- Export API functions ---
 
 // Auth
@@ -53,18 +72,40 @@ export const register = (data) => api.post('/auth/register', data);
 
 // Factors
 export const getFactors = () => api.get('/api/factors');
+export const searchFactors = (q = '', page = 1, per_page = 50) =>
+  api.get('/api/factors/search', { params: { q, page, per_page } });
 
 // Inputs
 export const postInput = (data) => api.post('/api/inputs', data);
-export const getInputs = (page = 1, per_page = 20) =>
-  api.get(`/api/inputs?page=${page}&per_page=${per_page}`);
+// List endpoints are paginated; `fields` (e.g. ['id', 'scope']) limits the columns returned
+export const getInputs = (page = 1, per_page = 20, fields = []) =>
+  api.get('/api/inputs', { params: { page, per_page, fields: fields.join(',') || undefined } });
 
 // Dashboard
 export const getDashboardSummary = () => api.get('/api/dashboard/summary');
+// EventSource cannot send headers, so the stream is opened with a
+// single-use ticket (never the auth token, which would be logged with the URL)
+export const openDashboardStream = async () => {
+  const response = await api.post('/api/dashboard/stream-ticket');
+  return new EventSource(`/api/dashboard/stream?ticket=${encodeURIComponent(response.data.ticket)}`);
+};
 
 // Reports
-export const getReports = () => api.get('/api/reports');
+export const getReports = (page = 1, per_page = 20, fields = []) =>
+  api.get('/api/reports', { params: { page, per_page, fields: fields.join(',') || undefined } });
 export const postReport = (data) => api.post('/api/reports', data);
+// e.g. { fiscal_year: 2025, generate: ['monthly', 'quarterly', 'annual'] }
+export const postReportBatch = (data) => api.post('/api/reports/batch', data);
 export const getReportDetails = (id) => api.get(`/api/reports/${id}`);
+// compare: any of 'previous_period', 'previous_year'
+export const getPeriodComparison = (start_date, end_date, compare = ['previous_period']) => {
+  const params = new URLSearchParams({ start_date, end_date });
+  compare.forEach((preset) => params.append('compare', preset));
+  return api.get(`/api/reports/compare?${params.toString()}`);
+};
+export const getStaleReports = () => api.get('/api/reports/stale');
+export const getReportSchedules = (page = 1, per_page = 20) =>
+  api.get('/api/report-schedules', { params: { page, per_page } });
+export const postReportSchedule = (data) => api.post('/api/report-schedules', data);
 
 export default api;
\ No newline at end of file